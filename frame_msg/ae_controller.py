@@ -0,0 +1,188 @@
+import asyncio
+import math
+import time
+from typing import Awaitable, Callable, List, Optional
+
+from frame_msg import FrameMsg, TxCode, TxManualExpSettings
+
+from ae_history import print_debug
+
+# message codes used by lua/exposure_wb_frame_app.lua
+MANUALEXP_SETTINGS_MSG = 0x0c
+METERING_QUERY_MSG = 0x12
+
+METERING_KEYS = ['spot_r', 'spot_g', 'spot_b', 'matrix_r', 'matrix_g', 'matrix_b']
+
+# a change in metering smaller than this (in 8-bit levels) can't be told apart from noise
+MIN_DETECTABLE_CHANGE = 4
+
+class AutoExposureController:
+    """
+    Runs a host-side camera_auto_exposure_algo against Frame until the exposure is good, rather than for a
+    fixed number of iterations with a fixed wait after each new setting.
+
+    Each iteration stops early once the exposure is within tolerance of the target and the algorithm would only
+    nudge the registers (or can't move them any further because of its limits). After new settings are sent,
+    the metering stream is polled until it moves towards the level the new settings predict, so the wait is
+    only as long as the sensor actually takes; a fixed settle time remains the fallback when the predicted
+    change is too small to observe.
+    """
+    def __init__(
+        self,
+        frame: FrameMsg,
+        metering_queue: asyncio.Queue,
+        algo: Optional[Callable] = None,
+        exposure_tolerance: float = 0.1,
+        delta_tolerance: float = 0.02,
+        max_iterations: int = 10,
+        settle_timeout: float = 0.2,
+        sleep: Callable[[float], Awaitable] = asyncio.sleep,
+        clock: Callable[[], float] = time.monotonic,
+        quiet: bool = False,
+        **algo_params,
+    ):
+        """
+        Args:
+            frame: Connected Frame running lua/exposure_wb_frame_app.lua
+            metering_queue: Queue from an attached RxMeteringData
+            algo: camera_auto_exposure_algo to run (the proposed one by default)
+            exposure_tolerance: Largest relative difference between metered brightness and the target that counts as good
+            delta_tolerance: Largest relative change of any register that counts as settled
+            max_iterations: Iteration limit, as in the fixed loop
+            settle_timeout: Longest wait for new settings to show up in the metering (the hardware takes up to 200ms)
+            sleep: Coroutine function used for waiting (e.g. SimFrame.sleep)
+            clock: Time source in seconds for the timing stats (e.g. SimFrame.time_utc)
+            quiet: Don't print the algorithm's intermediate values (through its debug hook)
+            **algo_params: Settings passed to the algorithm (metering, target_exposure, shutter_limit etc.)
+        """
+        if algo is None:
+            from auto_exposure_batch import load_algo
+            algo = load_algo('proposed')
+
+        self.frame = frame
+        self.metering_queue = metering_queue
+        self.algo = algo
+        self.exposure_tolerance = exposure_tolerance
+        self.delta_tolerance = delta_tolerance
+        self.max_iterations = max_iterations
+        self.settle_timeout = settle_timeout
+        self.sleep = sleep
+        self.clock = clock
+        self.quiet = quiet
+        self.algo_params = algo_params
+
+        self.queries = 0
+
+    async def query_metering(self, timeout: float = 10.0) -> dict:
+        """Ask Frame for the current metering values and wait for them"""
+        await self.frame.send_message(METERING_QUERY_MSG, TxCode().pack())
+        self.queries += 1
+        return await asyncio.wait_for(self.metering_queue.get(), timeout=timeout)
+
+    @staticmethod
+    def registers(state: dict) -> List[int]:
+        """Register values for the algorithm state, as sent in TxManualExpSettings"""
+        return [int(state[key]) for key in ('shutter', 'analog_gain', 'red_gain', 'green_gain', 'blue_gain')]
+
+    def exposure_error(self, result: dict) -> float:
+        """Relative difference between the metered brightness (in the algorithm's metering mode) and the target"""
+        brightness = result['brightness']
+        metering = self.algo_params.get('metering', 'AVERAGE')
+        if metering == 'SPOT':
+            average = brightness['spot']['average']
+        elif metering == 'CENTER_WEIGHTED':
+            average = brightness['center_weighted_average']
+        else:
+            average = brightness['matrix']['average']
+        return average / self.algo_params.get('target_exposure', 0.18) - 1.0
+
+    def _run_algo(self, metering_data: dict, last_state: dict) -> dict:
+        return self.algo(metering_data=metering_data, last_state=last_state,
+                         debug=None if self.quiet else print_debug, **self.algo_params)
+
+    async def wait_for_settings(self, old_registers: List[int], new_registers: List[int], old_metering: dict) -> dict:
+        """
+        Poll the metering until it reflects the new registers, or settle_timeout passes.
+
+        The expected metering is the old metering scaled by the change in exposure (shutter x analog gain)
+        and in each channel's gain; the settings count as applied once the channel expected to change most
+        has moved at least halfway (in log terms) from its old level to the expected one.
+
+        Returns:
+            The latest metering, which can be used for the next iteration
+        """
+        exposure_ratio = (new_registers[0] * new_registers[1]) / max(old_registers[0] * old_registers[1], 1)
+        old_levels = [old_metering[key] for key in METERING_KEYS]
+        expected = []
+        for i, level in enumerate(old_levels):
+            channel = i % 3
+            gain_ratio = new_registers[2 + channel] / max(old_registers[2 + channel], 1)
+            expected.append(min(255.0, max(level, 1) * exposure_ratio * gain_ratio))
+
+        changes = [abs(e - max(level, 1)) for e, level in zip(expected, old_levels)]
+        watch = max(range(len(changes)), key=lambda i: changes[i])
+        deadline = self.clock() + self.settle_timeout
+
+        if changes[watch] < MIN_DETECTABLE_CHANGE:
+            # nothing observable to wait for: fall back to the worst case settle time
+            await self.sleep(self.settle_timeout)
+            return await self.query_metering()
+
+        old_log = math.log(max(old_levels[watch], 1))
+        expected_log = math.log(expected[watch])
+        while True:
+            metering = await self.query_metering()
+            moved = (math.log(max(metering[METERING_KEYS[watch]], 1)) - old_log) / (expected_log - old_log)
+            if moved >= 0.5 or self.clock() >= deadline:
+                return metering
+
+    async def run(self, last_state: dict) -> dict:
+        """
+        Adjust exposure and white balance until they are good, updating last_state in place.
+
+        Returns:
+            dict of converged (exposure within tolerance), iterations, elapsed time, metering queries and the
+            last algorithm result
+        """
+        start = self.clock()
+        queries = self.queries
+        converged = False
+        result = None
+
+        metering = await self.query_metering()
+        iterations = 0
+        while iterations < self.max_iterations:
+            iterations += 1
+            previous_state = dict(last_state)
+            old_registers = self.registers(previous_state)
+
+            result = self._run_algo(metering, last_state)
+            new_registers = self.registers(last_state)
+
+            exposure_ok = abs(self.exposure_error(result)) <= self.exposure_tolerance
+            deltas = [abs(new - old) / max(old, 1) for new, old in zip(new_registers, old_registers)]
+            gains_settled = max(deltas[2:]) <= self.delta_tolerance
+
+            if (exposure_ok and gains_settled) or max(deltas) <= self.delta_tolerance:
+                # exposure good and white balance settled, or the algorithm can't move the registers any
+                # further (e.g. at its limits): keep the settings Frame already has
+                last_state.update(previous_state)
+                converged = exposure_ok
+                break
+
+            await self.frame.send_message(MANUALEXP_SETTINGS_MSG, TxManualExpSettings(*new_registers).pack())
+            metering = await self.wait_for_settings(old_registers, new_registers, metering)
+        else:
+            converged = abs(self.exposure_error(self._measure(metering, last_state))) <= self.exposure_tolerance
+
+        return {
+            'converged': converged,
+            'iterations': iterations,
+            'elapsed': self.clock() - start,
+            'queries': self.queries - queries,
+            'result': result,
+        }
+
+    def _measure(self, metering_data: dict, last_state: dict) -> dict:
+        """Run the algorithm on a copy of the state, only to read the brightness it measures"""
+        return self._run_algo(metering_data, dict(last_state))
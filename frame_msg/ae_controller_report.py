@@ -0,0 +1,100 @@
+import argparse
+import asyncio
+import io
+
+import numpy as np
+from PIL import Image
+
+from ae_controller import AutoExposureController, MANUALEXP_SETTINGS_MSG, METERING_QUERY_MSG
+from auto_exposure_batch import INITIAL_STATE, load_algo
+from sensor_model import SCENES, SensorModel
+from sim_frame import SimFrame, SimExposureApp, load_scene
+from frame_msg import RxMeteringData, RxPhoto, TxCaptureSettings, TxCode, TxManualExpSettings
+
+TARGET_EXPOSURE = 0.18
+
+async def fixed_loop(sim, metering_queue, algo, last_state):
+    """The loop in exposure_wb_algo_proposed.py: 10 iterations, each followed by a 200ms wait"""
+    for i in range(10):
+        await sim.send_message(METERING_QUERY_MSG, TxCode().pack())
+        metering_data = await metering_queue.get()
+        result = algo(metering_data=metering_data, last_state=last_state)
+        await sim.send_message(MANUALEXP_SETTINGS_MSG, TxManualExpSettings(
+            int(result['shutter']), int(result['analog_gain']),
+            int(result['red_gain']), int(result['green_gain']), int(result['blue_gain'])).pack())
+        await sim.sleep(0.2)
+    return 10
+
+async def first_good_photo(scene_name, images, mode, last_state, seed=0):
+    """
+    Run one auto exposure loop and take a photo on a simulated Frame looking at the scene.
+
+    Returns:
+        (seconds of auto exposure, seconds until the photo arrived, iterations, exposure error of the photo)
+    """
+    sim = SimFrame()
+    sensor = SensorModel.from_scenes([scene_name], seed=seed)
+    app = SimExposureApp(sim, sensor, images, seed=seed)
+    app.registers = tuple(AutoExposureController.registers(last_state))
+
+    rx_metering_data = RxMeteringData()
+    metering_queue = await rx_metering_data.attach(sim)
+    rx_photo = RxPhoto(upright=False)
+    photo_queue = await rx_photo.attach(sim)
+
+    algo = load_algo('proposed')
+    if mode == 'fixed':
+        iterations = await fixed_loop(sim, metering_queue, algo, last_state)
+    else:
+        controller = AutoExposureController(sim, metering_queue, algo=algo, sleep=sim.sleep, clock=sim.time_utc,
+                                            quiet=True, target_exposure=TARGET_EXPOSURE)
+        iterations = (await controller.run(last_state))['iterations']
+
+    ae_time = sim.time_utc()
+    await sim.send_message(0x0d, TxCaptureSettings(resolution=512).pack())
+    jpeg_bytes = await photo_queue.get()
+    elapsed = sim.time_utc()
+
+    rx_photo.detach(sim)
+    rx_metering_data.detach(sim)
+
+    brightness = np.asarray(Image.open(io.BytesIO(jpeg_bytes)), dtype=np.float64).mean() / 255.0
+    return ae_time, elapsed, iterations, brightness / TARGET_EXPOSURE - 1.0
+
+async def main():
+    """
+    Compare the time to the first well exposed photo for the fixed 10-iteration auto exposure loop and the
+    convergence-aware controller on a simulated Frame, for each synthetic scene: from the default starting
+    settings (cold start) and again from the settings already found (stable light)
+    """
+    parser = argparse.ArgumentParser(description="Time to a well exposed photo, fixed auto exposure loop against the controller")
+    parser.add_argument('images', nargs='*', default=["images/koala.jpg"],
+                        help="image files to use as the camera's view (default: images/koala.jpg)")
+    images = load_scene(parser.parse_args().images)
+
+    print(f"{'scene':<16} {'start':<7} {'fixed loop':>29} {'controller':>29}")
+    print(f"{'':<16} {'':<7}" + f" {'AE':>6} {'photo':>6} {'iters':>6} {'error':>8}" * 2)
+    totals = {'fixed': [], 'controller': []}
+    ae_totals = {'fixed': [], 'controller': []}
+    for scene_name in SCENES:
+        row = {}
+        for mode in ('fixed', 'controller'):
+            state = dict(INITIAL_STATE['proposed'])
+            cold = await first_good_photo(scene_name, images, mode, state)
+            stable = await first_good_photo(scene_name, images, mode, state, seed=1)
+            row[mode] = (cold, stable)
+            ae_totals[mode] += [cold[0], stable[0]]
+            totals[mode] += [cold[1], stable[1]]
+
+        for start, i in (('cold', 0), ('stable', 1)):
+            f, c = row['fixed'][i], row['controller'][i]
+            print(f"{scene_name if i == 0 else '':<16} {start:<7} "
+                  f"{f[0]:6.2f} {f[1]:6.2f} {f[2]:6d} {f[3]:+8.1%} {c[0]:6.2f} {c[1]:6.2f} {c[2]:6d} {c[3]:+8.1%}")
+
+    print("\nAE: seconds of auto exposure, photo: seconds until the photo arrived (including the transfer), "
+          "error: photo brightness vs target")
+    print(f"mean auto exposure time: fixed {np.mean(ae_totals['fixed']):.2f}s, controller {np.mean(ae_totals['controller']):.2f}s")
+    print(f"mean time to first photo: fixed {np.mean(totals['fixed']):.2f}s, controller {np.mean(totals['controller']):.2f}s")
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,194 @@
+import argparse
+import time
+from typing import Optional
+
+import numpy as np
+
+# one auto exposure result (or metering sample) per record: 80 bytes, against a few KB for the nested result dict
+AE_RECORD_DTYPE = np.dtype([
+    ('time', '<f8'),
+    ('shutter', '<f4'),
+    ('analog_gain', '<f4'),
+    ('red_gain', '<f4'),
+    ('green_gain', '<f4'),
+    ('blue_gain', '<f4'),
+    ('error', '<f4'),
+    ('spot_r', '<f4'),
+    ('spot_g', '<f4'),
+    ('spot_b', '<f4'),
+    ('spot_average', '<f4'),
+    ('matrix_r', '<f4'),
+    ('matrix_g', '<f4'),
+    ('matrix_b', '<f4'),
+    ('matrix_average', '<f4'),
+    ('center_weighted_average', '<f4'),
+    ('scene_brightness', '<f4'),
+])
+
+def print_debug(stage: str, **values):
+    """
+    Debug hook for camera_auto_exposure_algo that prints its intermediate values, e.g. debug=print_debug.
+    The algorithm only builds and formats them when a hook is given.
+    """
+    if values:
+        print(f"{stage}: " + " / ".join(f"{name}: {value}" for name, value in values.items()))
+    else:
+        print(stage)
+
+class AutoExpHistory:
+    """
+    Fixed-capacity history of auto exposure results and metering samples in a NumPy structured array.
+    Once full, each new record overwrites the oldest, so memory stays the same however long the session runs.
+    Records are appended from one thread; records() returns a copy that is safe to use elsewhere.
+    """
+    def __init__(self, capacity: int = 3600):
+        """
+        Args:
+            capacity: Number of records kept (an hour of once-a-second results by default)
+        """
+        self._buffer = np.zeros(capacity, dtype=AE_RECORD_DTYPE)
+        self._next = 0
+        self._count = 0
+
+    @property
+    def capacity(self) -> int:
+        return len(self._buffer)
+
+    def __len__(self) -> int:
+        return self._count
+
+    def _append(self, record: tuple):
+        self._buffer[self._next] = record
+        self._next = (self._next + 1) % len(self._buffer)
+        self._count = min(self._count + 1, len(self._buffer))
+
+    def append(self, result: dict, timestamp: Optional[float] = None):
+        """
+        Add an auto exposure result: from RxAutoExpResult or camera_auto_exposure_algo, which share a shape
+
+        Args:
+            result: The result dict
+            timestamp: Time of the result in seconds (time.time() by default)
+        """
+        brightness = result['brightness']
+        spot = brightness['spot']
+        matrix = brightness['matrix']
+        self._append((
+            time.time() if timestamp is None else timestamp,
+            result['shutter'], result['analog_gain'], result['red_gain'], result['green_gain'], result['blue_gain'],
+            result['error'],
+            spot['r'], spot['g'], spot['b'], spot['average'],
+            matrix['r'], matrix['g'], matrix['b'], matrix['average'],
+            brightness['center_weighted_average'], brightness['scene'],
+        ))
+
+    def append_metering(self, metering_data: dict, timestamp: Optional[float] = None):
+        """
+        Add a metering sample from RxMeteringData, normalized to 0..1 as the algorithms use it;
+        the fields it doesn't have (settings, error and scene brightness) are NaN
+
+        Args:
+            metering_data: dict of spot_r/g/b, matrix_r/g/b (0-255)
+            timestamp: Time of the sample in seconds (time.time() by default)
+        """
+        spot = [metering_data[key] / 255.0 for key in ('spot_r', 'spot_g', 'spot_b')]
+        matrix = [metering_data[key] / 255.0 for key in ('matrix_r', 'matrix_g', 'matrix_b')]
+        spot_average = sum(spot) / 3.0
+        matrix_average = sum(matrix) / 3.0
+        nan = float('nan')
+        self._append((
+            time.time() if timestamp is None else timestamp,
+            nan, nan, nan, nan, nan, nan,
+            *spot, spot_average,
+            *matrix, matrix_average,
+            (spot_average + spot_average + matrix_average) / 3.0, nan,
+        ))
+
+    def records(self) -> np.ndarray:
+        """Copy of the records held, oldest first"""
+        if self._count < len(self._buffer):
+            return self._buffer[:self._count].copy()
+        return np.concatenate((self._buffer[self._next:], self._buffer[:self._next]))
+
+    def latest(self) -> Optional[np.void]:
+        """The most recent record, or None if there are none"""
+        if self._count == 0:
+            return None
+        return self._buffer[self._next - 1].copy()
+
+    def clear(self):
+        self._next = 0
+        self._count = 0
+
+    def save(self, path: str):
+        """Write the records, oldest first, to a binary .npy file (readable with load() or numpy.load())"""
+        np.save(path, self.records())
+
+    @staticmethod
+    def load(path: str) -> np.ndarray:
+        """Read records saved with save()"""
+        records = np.load(path)
+        if records.dtype != AE_RECORD_DTYPE:
+            raise ValueError(f"{path} does not hold auto exposure history records")
+        return records
+
+def summary(records: np.ndarray) -> str:
+    """One line per field of the records: the range and mean of the values present"""
+    if len(records) == 0:
+        return "no records"
+    lines = [f"{len(records)} records over {records['time'][-1] - records['time'][0]:.1f}s"]
+    for name in AE_RECORD_DTYPE.names[1:]:
+        values = records[name][~np.isnan(records[name])]
+        if len(values):
+            lines.append(f"{name:<24} min {values.min():12.4f}  mean {values.mean():12.4f}  max {values.max():12.4f}")
+    return "\n".join(lines)
+
+def main():
+    """
+    Print a summary of a saved history (python ae_history.py history.npy), or without arguments compare the
+    cost of the algorithm with and without its debug hook, and the memory of the history against a list of results
+    """
+    parser = argparse.ArgumentParser(description="Summarize a saved auto exposure history, or benchmark the history")
+    parser.add_argument('history', nargs='?', help="history file saved by AutoExpHistory.save() to summarize")
+    history_path = parser.parse_args().history
+    if history_path:
+        print(summary(AutoExpHistory.load(history_path)))
+        return
+
+    import contextlib
+    import io
+    import tracemalloc
+    from auto_exposure_batch import INITIAL_STATE, METERING_KEYS, load_algo, random_traces
+
+    algo = load_algo('proposed')
+    trace = [dict(zip(METERING_KEYS, (int(v) for v in sample))) for sample in random_traces(20000, 1, seed=0)[:, 0]]
+
+    timings = {}
+    for name, debug in (('no debug hook', None), ('print_debug (to a buffer)', print_debug)):
+        state = dict(INITIAL_STATE['proposed'])
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            for metering_data in trace:
+                algo(metering_data=metering_data, last_state=state, debug=debug)
+            timings[name] = (time.perf_counter() - start) / len(trace) * 1e6
+    print("camera_auto_exposure_algo per call: " + ", ".join(f"{name} {us:.1f}us" for name, us in timings.items()))
+
+    state = dict(INITIAL_STATE['proposed'])
+    results = [algo(metering_data=metering_data, last_state=state) for metering_data in trace]
+
+    tracemalloc.start()
+    kept = [dict(r, brightness={k: dict(v) if isinstance(v, dict) else v for k, v in r['brightness'].items()}) for r in results]
+    list_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del kept
+
+    history = AutoExpHistory(capacity=len(results))
+    start = time.perf_counter()
+    for i, result in enumerate(results):
+        history.append(result, timestamp=i * 0.1)
+    append_us = (time.perf_counter() - start) / len(results) * 1e6
+    print(f"{len(results)} results: list of dicts {list_bytes / 1e6:.1f}MB, ring buffer {history._buffer.nbytes / 1e6:.1f}MB "
+          f"({append_us:.1f}us per append)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import csv
+import json
+import os
+import time
+from typing import Dict, List
+
+import numpy as np
+
+from auto_exposure_batch import INITIAL_STATE, camera_auto_exposure_batch, param_grid
+from sensor_model import SCENES, SensorModel
+
+# parameter grids swept for each algorithm variant
+GRIDS = {
+    'fw25.031.0924': dict(
+        target_exposure=[0.14, 0.18, 0.22],
+        exposure_speed=[0.3, 0.5, 0.7, 0.9],
+        shutter_limit=[800.0, 1600.0, 3072.0],
+        analog_gain_limit=[16.0, 60.0],
+        white_balance_speed=[0.25, 0.5, 0.75],
+    ),
+    'proposed': dict(
+        target_exposure=[0.14, 0.18, 0.22],
+        exposure_speed=[0.3, 0.5, 0.7, 0.9],
+        shutter_limit=[1600.0, 3072.0, 6144.0],
+        analog_gain_limit=[16.0, 60.0],
+        rgb_gain_limit=[141.0, 511.0, 1023.0],
+        white_balance_speed=[0.25, 0.5, 0.75],
+    ),
+}
+
+ITERATIONS = 30
+
+# metering average within this fraction of the target counts as converged
+TOLERANCE = 0.1
+
+def to_registers(variant: str, state: dict) -> List[np.ndarray]:
+    """Register values sent in TxManualExpSettings for the algorithm state, as each variant's main() does"""
+    scale = 256.0 if variant == 'fw25.031.0924' else 1.0
+    return [np.trunc(state['shutter']), np.trunc(state['analog_gain'])] + \
+        [np.minimum(np.trunc(state[key] * scale), 1023.0) for key in ('red_gain', 'green_gain', 'blue_gain')]
+
+
+def simulate(variant: str, params: Dict[str, np.ndarray], scenes: List[str], iterations: int = ITERATIONS) -> dict:
+    """
+    Run the closed loop (meter, run the algorithm, apply the new registers) for every combination of
+    parameter set and scene, vectorized over both.
+
+    Returns:
+        dict of (iterations, configs, scenes) arrays: measured exposure, exposure error and white balance error
+    """
+    num_configs = len(next(iter(params.values())))
+    # the noise depends only on the scene and iteration, so results don't depend on how configs are chunked
+    sensor = SensorModel.from_scenes(scenes, noise=0.0)
+    noise = np.random.default_rng(0).normal(0.0, 1.0, (iterations, len(scenes), 6))
+
+    # broadcast parameters over (configs, scenes)
+    grid_params = {name: np.asarray(values)[:, None] for name, values in params.items()}
+    target = grid_params['target_exposure']
+    state = {key: np.full((num_configs, len(scenes)), value) for key, value in INITIAL_STATE[variant].items()}
+
+    measured = np.empty((iterations, num_configs, len(scenes)))
+    wb_error = np.empty_like(measured)
+    for i in range(iterations):
+        registers = to_registers(variant, state)
+        metering = np.clip(np.round(sensor.meter(*registers).astype(np.float64) + noise[i]), 0, 255).astype(np.uint8)
+        result = camera_auto_exposure_batch(metering, state, variant, **grid_params)
+        measured[i] = result['brightness']['matrix']['average']
+        wb_error[i] = sensor.white_balance_error(*registers[2:])
+
+    return {
+        'measured': measured,
+        'exposure_error': measured / target - 1.0,
+        'wb_error': wb_error,
+    }
+
+
+def metrics(run: dict) -> Dict[str, np.ndarray]:
+    """
+    Per (config, scene): iterations until the exposure stays within TOLERANCE of the target (-1 if it never
+    settles), overshoot past the target relative to the target, and the final white balance error
+    """
+    error = run['exposure_error']
+    iterations = error.shape[0]
+
+    within = np.abs(error) <= TOLERANCE
+    # the last iteration outside tolerance; converged from the one after it, if it stays within to the end
+    outside_from_end = np.argmax(~within[::-1], axis=0)
+    settled = np.where(within.all(axis=0), 0, iterations - outside_from_end)
+    converged = within[-1]
+    iterations_to_converge = np.where(converged, settled + 1, -1)
+
+    # overshoot: how far the exposure went past the target on the other side from where it started
+    starting_sign = np.sign(error[0])
+    overshoot = np.maximum(0.0, (-starting_sign * error).max(axis=0))
+
+    return {
+        'iterations_to_converge': iterations_to_converge,
+        'overshoot': overshoot,
+        'final_exposure_error': error[-1],
+        'final_wb_error': run['wb_error'][-1],
+    }
+
+
+def sweep_chunk(variant: str, params: Dict[str, np.ndarray], scenes: List[str]) -> Dict[str, np.ndarray]:
+    """Process pool worker: simulate a chunk of parameter sets over all scenes and return their metrics"""
+    return metrics(simulate(variant, params, scenes))
+
+
+def sweep(variant: str, grid: dict, scenes: List[str], workers: int = None, chunks: int = 16) -> List[dict]:
+    """
+    Sweep every parameter combination in grid across a process pool.
+
+    Returns:
+        One row per parameter set, with the settings, results aggregated over the scenes and per-scene details
+    """
+    params = param_grid(**grid)
+    num_configs = len(next(iter(params.values())))
+    bounds = np.linspace(0, num_configs, min(chunks, num_configs) + 1).astype(int)
+    chunk_params = [{name: values[a:b] for name, values in params.items()} for a, b in zip(bounds[:-1], bounds[1:])]
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(sweep_chunk, [variant] * len(chunk_params), chunk_params, [scenes] * len(chunk_params)))
+    m = {key: np.concatenate([r[key] for r in results]) for key in results[0]}
+
+    rows = []
+    for c in range(num_configs):
+        iters = m['iterations_to_converge'][c]
+        converged = iters >= 0
+        rows.append({
+            'variant': variant,
+            **{name: float(values[c]) for name, values in params.items()},
+            'scenes_converged': int(converged.sum()),
+            'mean_iterations_to_converge': float(iters[converged].mean()) if converged.any() else None,
+            'max_overshoot': float(m['overshoot'][c].max()),
+            'mean_abs_exposure_error': float(np.abs(m['final_exposure_error'][c]).mean()),
+            'mean_wb_error': float(m['final_wb_error'][c].mean()),
+            'scenes': {
+                scene: {
+                    'iterations_to_converge': int(iters[s]),
+                    'overshoot': float(m['overshoot'][c, s]),
+                    'final_exposure_error': float(m['final_exposure_error'][c, s]),
+                    'final_wb_error': float(m['final_wb_error'][c, s]),
+                } for s, scene in enumerate(scenes)
+            },
+        })
+    return rows
+
+
+def save(rows: List[dict], directory: str):
+    """Write the sweep to ae_sweep.json (with per-scene details) and ae_sweep.csv (one row per parameter set)"""
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, 'ae_sweep.json'), 'w') as f:
+        json.dump({'iterations': ITERATIONS, 'tolerance': TOLERANCE, 'scenes': SCENES, 'results': rows}, f, indent=2)
+
+    # columns in the order of the variant with the most parameters
+    fields = []
+    for row in sorted(rows, key=len, reverse=True):
+        fields += [key for key in row if key != 'scenes' and key not in fields]
+    with open(os.path.join(directory, 'ae_sweep.csv'), 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=fields)
+        writer.writeheader()
+        for row in rows:
+            writer.writerow({key: value for key, value in row.items() if key != 'scenes'})
+
+
+def main():
+    """
+    Sweep both camera_auto_exposure_algo variants over their parameter grids against the synthetic sensor,
+    print the best configurations and write the full results as CSV and JSON (to the directory given on
+    the command line, or the current directory)
+    """
+    parser = argparse.ArgumentParser(description="Sweep the auto exposure parameters against a synthetic sensor")
+    parser.add_argument('directory', nargs='?', default='.', help="directory for ae_sweep.csv and ae_sweep.json")
+    directory = parser.parse_args().directory
+    scenes = list(SCENES)
+
+    rows = []
+    for variant, grid in GRIDS.items():
+        start = time.perf_counter()
+        variant_rows = sweep(variant, grid, scenes)
+        print(f"{variant}: {len(variant_rows)} configurations x {len(scenes)} scenes x {ITERATIONS} iterations "
+              f"in {time.perf_counter() - start:.1f}s")
+        rows += variant_rows
+
+        # the best few by scenes converged, then iterations to converge, overshoot and white balance error
+        ranked = sorted(variant_rows, key=lambda r: (-r['scenes_converged'], r['mean_iterations_to_converge'] or 1e9,
+                                                     r['max_overshoot'], r['mean_wb_error']))
+        print(f"  {'target':>6} {'speed':>5} {'shutter':>7} {'again':>5} {'rgb':>5} {'wb':>4} "
+              f"{'conv':>5} {'iters':>5} {'overshoot':>9} {'wb err':>7}")
+        for row in ranked[:5]:
+            iters = row['mean_iterations_to_converge']
+            print(f"  {row['target_exposure']:6.2f} {row['exposure_speed']:5.2f} {row['shutter_limit']:7.0f} "
+                  f"{row['analog_gain_limit']:5.0f} {row.get('rgb_gain_limit', 1023.0):5.0f} {row['white_balance_speed']:4.2f} "
+                  f"{row['scenes_converged']:>2}/{len(scenes)} {iters if iters is None else round(iters, 1):>5} "
+                  f"{row['max_overshoot']:9.1%} {row['mean_wb_error']:7.3f}")
+
+    save(rows, directory)
+    print(f"Results written to {os.path.join(directory, 'ae_sweep.csv')} and ae_sweep.json")
+
+if __name__ == "__main__":
+    main()
@@ -23,6 +23,9 @@ async def main():
         # send the std lua files to Frame that handle data accumulation, TxCode signalling and audio
         await frame.upload_stdlua_libs(lib_names=['data', 'code', 'audio'])
 
+        # send the voice activity gating module used by the frame app (gating stays off unless enabled with a 0x31 message)
+        await frame.upload_file("lua/vad.lua", "vad.lua")
+
         # Send the main lua application from this project to Frame that will run the app
         await frame.upload_frame_app(local_filename="lua/audio_frame_app.lua")
 
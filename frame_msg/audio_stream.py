@@ -1,8 +1,14 @@
 import asyncio
 
-from frame_msg import FrameMsg, RxAudio, TxCode
+from frame_msg import FrameMsg, TxCode
 from pvspeaker import PvSpeaker
 
+from resampler import StreamingResampler, to_int16
+from vad import RxAudioVad, TxVadSettings
+
+# Frame streams 8kHz audio; resample for output devices that only accept other rates (e.g. 16000 or 48000)
+OUTPUT_SAMPLE_RATE = 16000
+
 async def main():
     """
     Subscribe to an Audio stream from Frame and play to the default output device using pvspeaker
@@ -31,6 +37,9 @@ async def main():
         # send the std lua files to Frame that handle data accumulation, TxCode signalling and audio
         await frame.upload_stdlua_libs(lib_names=['data', 'code', 'audio'])
 
+        # send the voice activity gating module used by the frame app
+        await frame.upload_file("lua/vad.lua", "vad.lua")
+
         # Send the main lua application from this project to Frame that will run the app
         await frame.upload_frame_app(local_filename="lua/audio_frame_app.lua")
 
@@ -43,17 +52,24 @@ async def main():
 
         # set up and start the audio output player
         speaker = PvSpeaker(
-            sample_rate=8000,
-            bits_per_sample=8,
+            sample_rate=OUTPUT_SAMPLE_RATE,
+            bits_per_sample=16,
             buffer_size_secs=5,
             device_index=-1)
 
         speaker.start()
 
+        # resampler stage between the RxAudio queue and the speaker, carrying its filter state across chunks
+        resampler = StreamingResampler(in_rate=8000, out_rate=OUTPUT_SAMPLE_RATE)
+
         # hook up the RxAudio receiver in streaming mode rather than whole clip mode
-        rx_audio = RxAudio(streaming=True)
+        # (RxAudioVad also expands the silence markers sent by Frame when voice activity gating is on)
+        rx_audio = RxAudioVad(streaming=True)
         audio_queue = await rx_audio.attach(frame)
 
+        # only send audio while someone is talking; custom thresholds can be set here in the constructor
+        await frame.send_message(0x31, TxVadSettings().pack())
+
         # Subscribe for streaming audio
         await frame.send_message(0x30, TxCode(value=1).pack())
 
@@ -65,15 +81,13 @@ async def main():
                 audio_samples = audio_queue.get_nowait()
 
                 # after streaming is canceled, a None will be put in the queue
+                # (play out the last samples still held in the resampler's filter)
                 if audio_samples is None:
+                    speaker.write(to_int16(resampler.flush()).tolist())
                     break
 
-                # since bits_per_sample == 8:
-                # reinterpret the bytes as signed 8-bit integers then shift to the uint8 range 0-255
-                pcm_data = bytearray(audio_samples)
-                for i in range(len(pcm_data)):
-                    # Convert signed 8-bit (-128 to 127) to unsigned 8-bit (0 to 255)
-                    pcm_data[i] = (pcm_data[i] if pcm_data[i] < 128 else pcm_data[i] - 256) + 128
+                # resample the signed 8-bit samples to signed 16-bit samples at the output rate
+                pcm_data = resampler.process_frame_pcm(audio_samples).tolist()
 
                 # Pass the audio samples to PvSpeaker
                 samples_remaining = pcm_data
@@ -100,6 +114,8 @@ async def main():
                 await stop_audio()
                 continue
 
+        print(f"PCM bytes received: {rx_audio.pcm_bytes}, silence gated: {rx_audio.silent_bytes} bytes in {rx_audio.silence_markers} markers")
+
         # stop the audio stream listener and clean up its resources
         rx_audio.detach(frame)
 
@@ -1,18 +1,27 @@
 import asyncio
-import io
-from PIL import Image
+import tempfile
 from pvspeaker import PvSpeaker
 
-from frame_msg import FrameMsg, RxAudio, RxPhoto, TxCode, TxCaptureSettings
+from frame_msg import FrameMsg, RxPhoto, TxCode, TxCaptureSettings
 import time
 
+from av_sync import AvTimeline, RxTimestamp
+from recorder import BackgroundRecorder
+from vad import RxAudioVad
+
 async def main():
     """
-    Subscribe to an Audio stream from Frame and play to the default output device using pvspeaker, and take periodic photos
+    Subscribe to an Audio stream from Frame and play to the default output device using pvspeaker, and take periodic photos.
+    Frame timestamps the audio stream and each photo so they can be saved on a synchronized timeline.
     """
     frame = FrameMsg()
     speaker = None
     stop_requested = False
+    rx_photo = None
+    rx_audio = None
+    rx_timestamp = None
+    timeline = None
+    recorder = None
 
     async def stop_streaming():
         nonlocal stop_requested
@@ -34,6 +43,9 @@ async def main():
         # send the std lua files to Frame that handle data accumulation, TxCode signalling, audio and camera
         await frame.upload_stdlua_libs(lib_names=['data', 'code', 'audio', 'camera'])
 
+        # send the voice activity gating module used by the frame app (gating stays off unless enabled with a 0x31 message)
+        await frame.upload_file("lua/vad.lua", "vad.lua")
+
         # Send the main lua application from this project to Frame that will run the app
         await frame.upload_frame_app(local_filename="lua/audio_video_frame_app.lua")
 
@@ -49,9 +61,35 @@ async def main():
         photo_queue = await rx_photo.attach(frame)
 
         # hook up the RxAudio receiver
-        rx_audio = RxAudio(streaming=True)
+        # (RxAudioVad keeps the byte count in step with Frame's even if voice activity gating is enabled)
+        rx_audio = RxAudioVad(streaming=True)
         audio_queue = await rx_audio.attach(frame)
 
+        # hook up the timestamp receiver and the timeline that lines up audio and photos
+        recording_dir = tempfile.mkdtemp(prefix="frame_av_")
+        rx_timestamp = RxTimestamp()
+        timestamp_queue = await rx_timestamp.attach(frame)
+
+        def drain_timestamps():
+            while not timestamp_queue.empty():
+                timeline.add_timestamp(timestamp_queue.get_nowait())
+
+        timeline = AvTimeline()
+
+        # mux the audio and the photos into an AVI file as they arrive, from a background writer thread
+        recorder = BackgroundRecorder(f"{recording_dir}/recording.avi", fps=10.0, audio_sample_rate=8000)
+        recorder.start()
+
+        # photos captured before the first audio sync point, placed in the recording once it arrives
+        unplaced_photos = []
+
+        def record_photos():
+            if timeline.has_audio_sync:
+                for photo in unplaced_photos:
+                    # place the photo in the recording at its capture time within the audio track
+                    recorder.add_frame(photo['jpeg'], t=timeline.audio_position(photo['frame_time']))
+                unplaced_photos.clear()
+
         # set up and start the audio output player
         speaker = PvSpeaker(
             sample_rate=8000,
@@ -80,6 +118,11 @@ async def main():
                 if audio_samples is None:
                     break
 
+                timeline.add_audio(audio_samples)
+                recorder.add_audio(audio_samples)
+                drain_timestamps()
+                record_photos()
+
                 # since bits_per_sample == 8:
                 # reinterpret the bytes as signed 8-bit integers then shift to the uint8 range 0-255
                 pcm_data = bytearray(audio_samples)
@@ -106,10 +149,13 @@ async def main():
                     await frame.send_message(0x0d, capture_msg_bytes)
                     start_time = current_time
                     jpeg_bytes = await asyncio.wait_for(photo_queue.get(), timeout=10.0)
-                    # TODO send/save photo
-                    # for the moment display the image in the system viewer
-                    image = Image.open(io.BytesIO(jpeg_bytes))
-                    image.show()
+                    # the capture timestamp arrives ahead of the image data
+                    drain_timestamps()
+                    photo = timeline.add_photo(jpeg_bytes)
+                    # a photo without a capture timestamp can't be placed on the timeline, so it isn't recorded
+                    if photo is not None:
+                        unplaced_photos.append(photo)
+                        record_photos()
 
 
             except asyncio.QueueEmpty:
@@ -132,21 +178,38 @@ async def main():
         speaker.flush()
         speaker.stop()
 
-        # stop the audio stream listener and clean up its resources
-        rx_audio.detach(frame)
-
-        # stop the photo listener and clean up its resources
-        rx_photo.detach(frame)
-
-        # unhook the print handler
-        frame.detach_print_response_handler()
-
-        # break out of the frame app loop and reboot Frame
-        await frame.stop_frame_app()
-
     except Exception as e:
         print(f"An error occurred: {e}")
     finally:
+        # finish the AVI file (header sizes and index) whatever ended the stream
+        if recorder:
+            recorder.stop()
+            print(f"Recording saved to: {', '.join(recorder.paths)}: {recorder.stats()}")
+
+        # save the synchronized audio, photos and timeline
+        if timeline is not None:
+            drain_timestamps()
+            if timeline.has_audio_sync:
+                timeline_path = timeline.save(recording_dir)
+                print(f"Timeline saved to: {timeline_path} (clock offset {timeline.clock.offset:.3f}s)")
+            else:
+                print("Timeline not saved: the stream ended before the first audio sync point")
+
+        # stop the listeners and clean up their resources
+        if rx_timestamp:
+            rx_timestamp.detach(frame)
+        if rx_audio:
+            rx_audio.detach(frame)
+        if rx_photo:
+            rx_photo.detach(frame)
+
+        if frame.is_connected():
+            # unhook the print handler
+            frame.detach_print_response_handler()
+
+            # break out of the frame app loop and reboot Frame
+            await frame.stop_frame_app()
+
         # clean disconnection
         await frame.disconnect()
 
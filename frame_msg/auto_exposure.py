@@ -1,9 +1,11 @@
 import asyncio
 from PIL import Image
-import io
+import tempfile
 
 from frame_msg import FrameMsg, RxPhoto, TxAutoExpSettings, TxCaptureSettings, TxCode, RxAutoExpResult
 
+from photo_pipeline import PhotoPipeline
+
 async def main():
     """
     Run the autoexposure algorithm on Frame repeatedly and print the changing values to the console
@@ -42,10 +44,15 @@ async def main():
         # the main app loop on Frame is running).
         # From this point we do message-passing with first-class types and send_message() (or send_data())
 
-        # hook up the RxPhoto receiver
-        rx_photo = RxPhoto()
+        # hook up the RxPhoto receiver; the photos are rotated upright by the pipeline below, not on the event loop
+        rx_photo = RxPhoto(upright=False)
         photo_queue = await rx_photo.attach(frame)
 
+        # decode, resize, thumbnail and save each photo in worker processes while the next one is captured
+        pipeline = PhotoPipeline(directory=tempfile.mkdtemp(prefix='frame_autoexp_'))
+        await pipeline.start()
+        processed = []
+
         # hook up the RxAutoExpResult receiver
         rx_autoexp = RxAutoExpResult()
         autoexp_queue = await rx_autoexp.attach(frame)
@@ -72,9 +79,14 @@ async def main():
             # get the jpeg bytes as soon as they're ready
             jpeg_bytes = await asyncio.wait_for(photo_queue.get(), timeout=10.0)
 
-            # display the image in the system viewer
-            image = Image.open(io.BytesIO(jpeg_bytes))
-            image.show()
+            # hand the photo to the pipeline and carry on
+            processed.append(await pipeline.submit(jpeg_bytes))
+
+        # display the saved images in the system viewer
+        for photo in await asyncio.gather(*processed):
+            Image.open(photo.paths['photo']).show()
+        await pipeline.close()
+        print(f"Photos saved to {pipeline.directory}: {pipeline.stats()}")
 
         # stop the photo receiver and clean up its resources
         rx_photo.detach(frame)
@@ -0,0 +1,421 @@
+import importlib.util
+import itertools
+import os
+import time
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+# column order of metering arrays, as in RxMeteringData results
+METERING_KEYS = ['spot_r', 'spot_g', 'spot_b', 'matrix_r', 'matrix_g', 'matrix_b']
+
+# fields of the exposure/white balance state carried from one step to the next
+STATE_KEYS = ['shutter', 'analog_gain', 'red_gain', 'green_gain', 'blue_gain']
+
+# the "brightness" dict of a result, as flattened keys, e.g. 'brightness.spot.r'
+BRIGHTNESS_KEYS = ([f'brightness.{area}.{field}' for area in ('spot', 'matrix') for field in ('r', 'g', 'b', 'average')]
+                   + ['brightness.center_weighted_average', 'brightness.scene'])
+
+METERING_MODES = ['SPOT', 'CENTER_WEIGHTED', 'AVERAGE']
+
+# the algorithm files, keyed by variant name
+ALGO_FILES = {
+    'fw25.031.0924': 'exposure_wb_algo_fw25.031.0924.py',
+    'proposed': 'exposure_wb_algo_proposed.py',
+}
+
+# default settings of camera_auto_exposure_algo in each variant
+DEFAULT_PARAMS = {
+    'fw25.031.0924': dict(metering="AVERAGE", target_exposure=0.18, exposure_speed=0.50, shutter_limit=1600.0,
+                          analog_gain_limit=60.0, white_balance_speed=0.5, brightness_constant=4166400.0,
+                          white_balance_min_activation=50, white_balance_max_activation=200),
+    'proposed': dict(metering="AVERAGE", target_exposure=0.18, exposure_speed=0.50, shutter_limit=3072.0,
+                     analog_gain_limit=16.0, rgb_gain_limit=141.0, white_balance_speed=0.5,
+                     brightness_constant=4166400.0, white_balance_min_activation=50, white_balance_max_activation=200),
+}
+
+# starting state used by each variant's main()
+INITIAL_STATE = {
+    'fw25.031.0924': dict(shutter=500.0, analog_gain=1.0, red_gain=1.9, green_gain=1.0, blue_gain=2.2),
+    'proposed': dict(shutter=1600.0, analog_gain=1.0, red_gain=121.6, green_gain=64.0, blue_gain=140.8),
+}
+
+def load_algo(variant: str):
+    """Import camera_auto_exposure_algo from one of the algorithm files (their names aren't valid module names)"""
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), ALGO_FILES[variant])
+    spec = importlib.util.spec_from_file_location(f"exposure_wb_algo_{variant.replace('.', '_')}", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.camera_auto_exposure_algo
+
+
+def metering_array(samples: Sequence) -> np.ndarray:
+    """
+    Convert RxMeteringData results (dicts, or lists of dicts for traces) into a uint8 array
+    with the six metering values in the last dimension
+    """
+    def convert(item):
+        if isinstance(item, dict):
+            return [item[key] for key in METERING_KEYS]
+        return [convert(i) for i in item]
+    return np.array(convert(samples), dtype=np.uint8)
+
+
+def _result_value(result: dict, key: str):
+    """A value from a result dict by its (possibly flattened, e.g. 'brightness.spot.r') key"""
+    for part in key.split('.'):
+        result = result[part]
+    return result
+
+
+def _check_range(value, low: float, high: float, message: str):
+    value = np.asarray(value)
+    if np.any(value < low) or np.any(value > high):
+        raise ValueError(message)
+
+
+def camera_auto_exposure_batch(
+    # Metering data (array of ..., 6 uint8 values: spot_r/g/b, matrix_r/g/b)
+    metering_data,
+    # Last state of exposure/white balance parameters (dict of arrays, updated in place)
+    last_state,
+    variant: str = 'proposed',
+    **params,
+):
+    """
+    Vectorized camera_auto_exposure_algo: one step of the chosen algorithm variant for many independent
+    streams at once (e.g. recorded traces x parameter sets), without the per-step prints.
+
+    Every operation is the float64 equivalent of the scalar code, in the same order, so results are
+    bit-for-bit identical to calling the scalar function on each stream. The one difference is that
+    where the fw25.031.0924 scalar code raises ZeroDivisionError (all-zero metering), this gives inf.
+
+    Args:
+        metering_data: uint8 array with the 6 metering values in the last dimension
+        last_state: dict of shutter, analog_gain, red_gain, green_gain and blue_gain arrays
+            (or scalars) broadcastable against the metering batch shape; replaced with the new state
+        variant: 'proposed' or 'fw25.031.0924'
+        **params: camera_auto_exposure_algo settings, each a scalar or an array broadcastable against
+            the batch shape; metering may be a string or an array of metering mode strings
+
+    Returns:
+        dict: Updated camera settings and metering information, as camera_auto_exposure_algo returns but with arrays
+    """
+    if variant not in DEFAULT_PARAMS:
+        raise ValueError(f"variant must be one of {list(DEFAULT_PARAMS)}")
+    unknown = set(params) - set(DEFAULT_PARAMS[variant])
+    if unknown:
+        raise TypeError(f"Unexpected parameters for {variant}: {sorted(unknown)}")
+    p = dict(DEFAULT_PARAMS[variant], **params)
+    proposed = variant == 'proposed'
+
+    # Validate inputs
+    metering = np.asarray(p['metering'])
+    if not np.all(np.isin(metering, METERING_MODES)):
+        raise ValueError("metering must be SPOT, CENTER_WEIGHTED or AVERAGE")
+    _check_range(p['target_exposure'], 0.0, 1.0, "exposure must be between 0 and 1")
+    _check_range(p['exposure_speed'], 0.0, 1.0, "exposure_speed must be between 0 and 1")
+    _check_range(p['shutter_limit'], 4.0, 16383.0, "shutter_limit must be between 4 and 16383")
+    _check_range(p['analog_gain_limit'], 1.0, 248.0, "analog_gain_limit must be between 1 and 248")
+    if proposed:
+        _check_range(p['rgb_gain_limit'], 0.0, 1023.0, "rgb_gain_limit must be between 0 and 1023")
+    _check_range(p['white_balance_speed'], 0.0, 1.0, "white_balance_speed must be between 0 and 1")
+
+    target_exposure = np.asarray(p['target_exposure'], dtype=np.float64)
+    exposure_speed = np.asarray(p['exposure_speed'], dtype=np.float64)
+    shutter_limit = np.asarray(p['shutter_limit'], dtype=np.float64)
+    analog_gain_limit = np.asarray(p['analog_gain_limit'], dtype=np.float64)
+    white_balance_speed = np.asarray(p['white_balance_speed'], dtype=np.float64)
+    brightness_constant = np.asarray(p['brightness_constant'], dtype=np.float64)
+    wb_min = np.asarray(p['white_balance_min_activation'], dtype=np.float64)
+    wb_max = np.asarray(p['white_balance_max_activation'], dtype=np.float64)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # Use current brightness from FPGA, normalized 0..1
+        m = np.asarray(metering_data, dtype=np.float64) / 255.0
+        spot_r, spot_g, spot_b = m[..., 0], m[..., 1], m[..., 2]
+        matrix_r, matrix_g, matrix_b = m[..., 3], m[..., 4], m[..., 5]
+
+        spot_average = (spot_r + spot_g + spot_b) / 3.0
+        matrix_average = (matrix_r + matrix_g + matrix_b) / 3.0
+        center_weighted_average = (spot_average + spot_average + matrix_average) / 3.0
+
+        def clamp_averages():
+            return (np.maximum(spot_average, 0.001), np.maximum(matrix_average, 0.001),
+                    np.maximum(center_weighted_average, 0.001))
+
+        # the proposed algorithm clamps the averages before they are used as divisors, fw25 only after
+        if proposed:
+            spot_average, matrix_average, center_weighted_average = clamp_averages()
+
+        # Auto exposure based on metering mode
+        average = np.where(metering == "SPOT", spot_average,
+                           np.where(metering == "CENTER_WEIGHTED", center_weighted_average, matrix_average))
+        error = exposure_speed * ((target_exposure / average) - 1) + 1
+
+        if not proposed:
+            spot_average, matrix_average, center_weighted_average = clamp_averages()
+
+        # Get current settings from last state
+        last_shutter = np.asarray(last_state["shutter"], dtype=np.float64)
+        last_analog_gain = np.asarray(last_state["analog_gain"], dtype=np.float64)
+        last_red_gain = np.asarray(last_state["red_gain"], dtype=np.float64)
+        last_green_gain = np.asarray(last_state["green_gain"], dtype=np.float64)
+        last_blue_gain = np.asarray(last_state["blue_gain"], dtype=np.float64)
+
+        # Adjust exposure - increase shutter first, then gain
+        up = error > 1
+        new_shutter_up = last_shutter * error
+        new_shutter_up = np.where(new_shutter_up > shutter_limit, shutter_limit, new_shutter_up)
+        error_up = error * (last_shutter / new_shutter_up)
+        new_gain_up = last_analog_gain * error_up
+        new_gain_up = np.where(new_gain_up > analog_gain_limit, analog_gain_limit, new_gain_up)
+        new_gain_up = np.where(error_up > 1, new_gain_up, last_analog_gain)
+
+        # Adjust exposure - decrease gain first, then shutter
+        new_gain_down = last_analog_gain * error
+        new_gain_down = np.where(new_gain_down < 1.0, 1.0, new_gain_down)
+        error_down = error * (last_analog_gain / new_gain_down)
+        new_shutter_down = last_shutter * error_down
+        new_shutter_down = np.where(new_shutter_down < 4.0, 4.0, new_shutter_down)
+        new_shutter_down = np.where(error_down < 1, new_shutter_down, last_shutter)
+
+        last_shutter = np.where(up, new_shutter_up, new_shutter_down)
+        last_analog_gain = np.where(up, new_gain_up, new_gain_down)
+        error = np.where(up, error_up, error_down)
+
+        # Prevent division by zero in auto white balance
+        matrix_r = np.maximum(matrix_r, 0.001)
+        matrix_g = np.maximum(matrix_g, 0.001)
+        matrix_b = np.maximum(matrix_b, 0.001)
+        last_red_gain = np.maximum(last_red_gain, 0.001)
+        last_green_gain = np.maximum(last_green_gain, 0.001)
+        last_blue_gain = np.maximum(last_blue_gain, 0.001)
+
+        # Auto white balance based on full scene matrix
+        normalized_r = matrix_r / last_red_gain
+        normalized_g = matrix_g / last_green_gain
+        normalized_b = matrix_b / last_blue_gain
+        max_rgb = np.maximum(np.maximum(normalized_r, normalized_g), normalized_b)
+        if proposed:
+            # scale normalized RGB values to the gain scale
+            max_rgb = 256.0 * max_rgb
+
+        # Calculate the gains needed to match all channels to max_rgb
+        red_gain = max_rgb / matrix_r * last_red_gain
+        green_gain = max_rgb / matrix_g * last_green_gain
+        blue_gain = max_rgb / matrix_b * last_blue_gain
+
+        # Calculate scene brightness
+        if proposed:
+            scene_brightness = brightness_constant * (matrix_average / (last_shutter * last_analog_gain))
+        else:
+            scene_brightness = brightness_constant * matrix_average / (last_shutter * last_analog_gain)
+
+        # Calculate blending factor based on scene brightness
+        blending_factor = (scene_brightness - wb_min) / (wb_max - wb_min)
+
+        if not proposed:
+            # Limit gain values to prevent overflow
+            red_gain = np.minimum(red_gain, 1023.0/256.0)
+            green_gain = np.minimum(green_gain, 1023.0/256.0)
+            blue_gain = np.minimum(blue_gain, 1023.0/256.0)
+
+        # Limit blending factor to valid range (max(0.0, min(1.0, x)) as in the scalar code)
+        blending_factor = np.where(blending_factor < 1.0, blending_factor, 1.0)
+        blending_factor = np.where(blending_factor > 0.0, blending_factor, 0.0)
+
+        # Apply gradual update to gain values
+        last_red_gain = blending_factor * white_balance_speed * (red_gain - last_red_gain) + last_red_gain
+        last_green_gain = blending_factor * white_balance_speed * (green_gain - last_green_gain) + last_green_gain
+        last_blue_gain = blending_factor * white_balance_speed * (blue_gain - last_blue_gain) + last_blue_gain
+
+        if proposed:
+            # Scale per-channel gains so the largest channel is at most rgb_gain_limit
+            rgb_gain_limit = np.asarray(p['rgb_gain_limit'], dtype=np.float64)
+            max_rgb_gain = np.maximum(np.maximum(last_red_gain, last_green_gain), last_blue_gain)
+            scale = max_rgb_gain > rgb_gain_limit
+            scale_factor = rgb_gain_limit / max_rgb_gain
+            last_red_gain = np.where(scale, last_red_gain * scale_factor, last_red_gain)
+            last_green_gain = np.where(scale, last_green_gain * scale_factor, last_green_gain)
+            last_blue_gain = np.where(scale, last_blue_gain * scale_factor, last_blue_gain)
+
+    result = {
+        "brightness": {
+            "spot": {
+                "r": spot_r,
+                "g": spot_g,
+                "b": spot_b,
+                "average": spot_average
+            },
+            "matrix": {
+                "r": matrix_r,
+                "g": matrix_g,
+                "b": matrix_b,
+                "average": matrix_average
+            },
+            "center_weighted_average": center_weighted_average,
+            "scene": scene_brightness
+        },
+        "error": error,
+        "shutter": last_shutter,
+        "analog_gain": last_analog_gain,
+        "red_gain": last_red_gain,
+        "green_gain": last_green_gain,
+        "blue_gain": last_blue_gain
+    }
+
+    # Save state for next call
+    last_state.update({
+        "shutter": last_shutter,
+        "analog_gain": last_analog_gain,
+        "red_gain": last_red_gain,
+        "green_gain": last_green_gain,
+        "blue_gain": last_blue_gain
+    })
+
+    return result
+
+
+def param_grid(**values) -> Dict[str, np.ndarray]:
+    """
+    Every combination of the given parameter values, as flat arrays of equal length, e.g.
+    param_grid(target_exposure=[0.15, 0.18], shutter_limit=[1600.0, 3072.0]) gives 4 parameter sets
+    """
+    names = list(values)
+    combos = list(itertools.product(*(values[name] for name in names)))
+    return {name: np.array([combo[i] for combo in combos]) for i, name in enumerate(names)}
+
+
+def replay_traces(
+    traces: np.ndarray,
+    initial_state: Optional[dict] = None,
+    variant: str = 'proposed',
+    brightness: bool = False,
+    **params,
+) -> Dict[str, np.ndarray]:
+    """
+    Run the algorithm over recorded metering traces for many streams at once.
+
+    Args:
+        traces: uint8 array of shape (steps, streams, 6) of metering samples, or (steps, 6) for one trace
+            shared by all streams
+        initial_state: Starting state (scalars or per-stream arrays), the variant's main() values by default
+        variant: 'proposed' or 'fw25.031.0924'
+        brightness: Also record the brightness fields of each result, under BRIGHTNESS_KEYS
+        **params: Settings as for camera_auto_exposure_batch, e.g. per-stream arrays from param_grid()
+
+    Returns:
+        dict of (steps, streams) arrays: error and each state field after every step
+    """
+    traces = np.asarray(traces)
+    state = dict(INITIAL_STATE[variant] if initial_state is None else initial_state)
+
+    history = {key: [] for key in ['error'] + STATE_KEYS + (BRIGHTNESS_KEYS if brightness else [])}
+    for step in traces:
+        result = camera_auto_exposure_batch(step[..., None, :] if traces.ndim == 2 else step, state, variant, **params)
+        for key in history:
+            history[key].append(_result_value(result, key))
+
+    return {key: np.array(np.broadcast_arrays(*values)) for key, values in history.items()}
+
+
+def replay_traces_scalar(
+    algo,
+    trace: List[dict],
+    initial_state: dict,
+    brightness: bool = False,
+    **params,
+) -> Dict[str, List[float]]:
+    """Run the scalar camera_auto_exposure_algo over one trace (also recording BRIGHTNESS_KEYS if brightness)"""
+    state = dict(initial_state)
+    history = {key: [] for key in ['error'] + STATE_KEYS + (BRIGHTNESS_KEYS if brightness else [])}
+    for metering_data in trace:
+        result = algo(metering_data=metering_data, last_state=state, **params)
+        for key in history:
+            history[key].append(_result_value(result, key))
+    return history
+
+
+def random_traces(steps: int, streams: int, seed: int = 0) -> np.ndarray:
+    """Synthetic metering traces: a random walk of scene brightness and colour with sensor noise"""
+    rng = np.random.default_rng(seed)
+    level = np.cumsum(rng.normal(0, 12, (steps, streams, 1)), axis=0) + rng.uniform(10, 240, (1, streams, 1))
+    tint = rng.uniform(0.6, 1.2, (1, streams, 3))
+    rgb = level * tint
+    spot = rgb * rng.uniform(0.7, 1.3, (1, streams, 1))
+    samples = np.concatenate((spot, rgb), axis=-1) + rng.normal(0, 3, (steps, streams, 6))
+    return np.clip(np.round(samples), 0, 255).astype(np.uint8)
+
+
+def check_equivalence(variant: str, num_traces: int = 40, steps: int = 30, seed: int = 0) -> int:
+    """
+    Compare the batch and scalar implementations bit for bit over random traces and parameters, in every
+    metering mode: error, state and brightness fields. Returns the number of mismatching values (0 when equivalent)
+    """
+    algo = load_algo(variant)
+    rng = np.random.default_rng(seed)
+    # avoid all-zero metering, where the fw25 scalar code divides by zero
+    traces = np.maximum(random_traces(steps, num_traces, seed), 1)
+
+    params = dict(
+        metering=rng.choice(METERING_MODES, num_traces),
+        target_exposure=rng.uniform(0.05, 0.5, num_traces),
+        exposure_speed=rng.uniform(0.1, 1.0, num_traces),
+        shutter_limit=rng.uniform(100.0, 16383.0, num_traces),
+        analog_gain_limit=rng.uniform(1.0, 248.0, num_traces),
+        white_balance_speed=rng.uniform(0.0, 1.0, num_traces),
+    )
+    if variant == 'proposed':
+        params['rgb_gain_limit'] = rng.uniform(64.0, 1023.0, num_traces)
+
+    batch = replay_traces(traces, variant=variant, brightness=True, **params)
+
+    mismatches = 0
+    for i in range(num_traces):
+        trace = [dict(zip(METERING_KEYS, (int(v) for v in sample))) for sample in traces[:, i]]
+        stream_params = {name: (str(value[i]) if name == 'metering' else float(value[i])) for name, value in params.items()}
+        scalar = replay_traces_scalar(algo, trace, INITIAL_STATE[variant], brightness=True, **stream_params)
+        for key, values in scalar.items():
+            # exact comparison, not allclose
+            mismatches += int(np.count_nonzero(np.array(values, dtype=np.float64) != batch[key][:, i]))
+    return mismatches
+
+
+def benchmark(variant: str, steps: int = 50) -> tuple:
+    """Return (scalar, batch) throughput in metering samples per second"""
+    algo = load_algo(variant)
+
+    grid = param_grid(target_exposure=[0.12, 0.15, 0.18, 0.21, 0.24], exposure_speed=[0.3, 0.5, 0.7],
+                      shutter_limit=[800.0, 1600.0, 3072.0], white_balance_speed=[0.25, 0.5, 0.75])
+    traces_per_config = 40
+    num_configs = len(grid['target_exposure'])
+    streams = num_configs * traces_per_config
+    traces = np.maximum(random_traces(steps, streams), 1)
+    params = {name: np.repeat(values, traces_per_config) for name, values in grid.items()}
+
+    start = time.perf_counter()
+    replay_traces(traces, variant=variant, **params)
+    batch_rate = steps * streams / (time.perf_counter() - start)
+
+    # the scalar function is slow enough that a sample of the streams gives its rate
+    sample_streams = 20
+    start = time.perf_counter()
+    for i in range(sample_streams):
+        trace = [dict(zip(METERING_KEYS, (int(v) for v in sample))) for sample in traces[:, i]]
+        replay_traces_scalar(algo, trace, INITIAL_STATE[variant],
+                             **{name: float(values[i]) for name, values in params.items()})
+    scalar_rate = steps * sample_streams / (time.perf_counter() - start)
+
+    return scalar_rate, batch_rate, streams
+
+
+if __name__ == "__main__":
+    for variant in DEFAULT_PARAMS:
+        mismatches = check_equivalence(variant)
+        print(f"{variant}: {mismatches} values differ between the batch and scalar implementations")
+
+    for variant in DEFAULT_PARAMS:
+        scalar_rate, batch_rate, streams = benchmark(variant)
+        print(f"{variant}: scalar {scalar_rate:,.0f} samples/s, batch ({streams} streams) {batch_rate:,.0f} samples/s, "
+              f"{batch_rate / scalar_rate:.0f}x")
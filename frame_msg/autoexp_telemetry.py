@@ -0,0 +1,198 @@
+import asyncio
+from dataclasses import dataclass
+import logging
+import struct
+from typing import List, Optional
+
+from frame_msg import FrameMsg, RxAutoExpResult
+
+logging.basicConfig()
+_log = logging.getLogger("RxAutoExpTelemetry")
+
+# Host to Frame flag for lua/autoexp_telemetry.lua settings in lua/live_camera_frame_app.lua
+AUTOEXP_TELEMETRY_SETTINGS_MSG = 0x14
+
+# Frame to Host flags: full auto exposure result (as camera.send_autoexp_result) and delta
+AUTOEXP_RESULT_MSG = 0x11
+AUTOEXP_DELTA_MSG = 0x16
+
+# field order of the full result message, also the bit order of the delta bitmask
+RESULT_FIELDS = [
+    'error', 'shutter', 'analog_gain', 'red_gain', 'green_gain', 'blue_gain',
+    'center_weighted_average', 'scene',
+    'matrix_r', 'matrix_g', 'matrix_b', 'matrix_average',
+    'spot_r', 'spot_g', 'spot_b', 'spot_average',
+]
+# fields compared by relative change; the others are 0..1 brightness levels compared by absolute change
+RELATIVE_FIELDS = {'error', 'shutter', 'analog_gain', 'red_gain', 'green_gain', 'blue_gain', 'scene'}
+
+def flatten(result: dict) -> List[float]:
+    """The 16 values of an auto exposure result in RESULT_FIELDS order"""
+    brightness = result['brightness']
+    return [
+        result['error'], result['shutter'], result['analog_gain'],
+        result['red_gain'], result['green_gain'], result['blue_gain'],
+        brightness['center_weighted_average'], brightness['scene'],
+        brightness['matrix']['r'], brightness['matrix']['g'], brightness['matrix']['b'], brightness['matrix']['average'],
+        brightness['spot']['r'], brightness['spot']['g'], brightness['spot']['b'], brightness['spot']['average'],
+    ]
+
+def unflatten(values: List[float]) -> dict:
+    """An auto exposure result dict, in the shape RxAutoExpResult produces, from values in RESULT_FIELDS order"""
+    return {
+        'error': values[0],
+        'shutter': values[1],
+        'analog_gain': values[2],
+        'red_gain': values[3],
+        'green_gain': values[4],
+        'blue_gain': values[5],
+        'brightness': {
+            'center_weighted_average': values[6],
+            'scene': values[7],
+            'matrix': {'r': values[8], 'g': values[9], 'b': values[10], 'average': values[11]},
+            'spot': {'r': values[12], 'g': values[13], 'b': values[14], 'average': values[15]},
+        }
+    }
+
+@dataclass
+class TxAutoExpTelemetrySettings:
+    """
+    Message configuring how lua/autoexp_telemetry.lua sends auto exposure results to the host.
+
+    Attributes:
+        delta: Only send values that moved beyond their threshold (False sends every result in full, as before)
+        min_interval: Shortest time between messages in seconds (0-65.535), capping the rate
+        max_interval: Longest time between full results in seconds (0-65.535, 0 for only the first)
+        register_threshold: Relative change of the error, shutter, gains or scene brightness worth sending
+        brightness_threshold: Absolute change of a 0..1 brightness level worth sending
+    """
+    delta: bool = True
+    min_interval: float = 0.5
+    max_interval: float = 10.0
+    register_threshold: float = 0.02
+    brightness_threshold: float = 0.01
+
+    def pack(self) -> bytes:
+        """Pack the settings into 13 bytes: intervals as big-endian milliseconds, thresholds as little-endian float32"""
+        return struct.pack('>BHH',
+            0x01 if self.delta else 0x00,
+            int(round(self.min_interval * 1000)) & 0xFFFF,
+            int(round(self.max_interval * 1000)) & 0xFFFF,
+        ) + struct.pack('<ff', self.register_threshold, self.brightness_threshold)
+
+class AutoExpTelemetryEncoder:
+    """
+    Python model of lua/autoexp_telemetry.lua, producing the same messages for the same results and times
+    (used by the simulated Frame, and checked against the Lua module in autoexp_telemetry_report.py)
+    """
+    def __init__(self, settings: Optional[TxAutoExpTelemetrySettings] = None):
+        self.set_settings(settings or TxAutoExpTelemetrySettings(delta=False))
+
+    def set_settings(self, settings: TxAutoExpTelemetrySettings):
+        self.set_settings_from_bytes(settings.pack())
+
+    def set_settings_from_bytes(self, payload: bytes):
+        """Apply a TxAutoExpTelemetrySettings message as Frame parses it: whole milliseconds and float32 thresholds"""
+        delta, min_ms, max_ms = struct.unpack('>BHH', payload[0:5])
+        self.delta = delta > 0
+        self.min_interval = min_ms / 1000.0
+        self.max_interval = max_ms / 1000.0
+        self.register_threshold, self.brightness_threshold = struct.unpack('<ff', payload[5:13])
+        self.sent = None
+        self.last_send_time = 0.0
+        self.last_key_time = 0.0
+
+    def _moved(self, i: int, old: float, new: float) -> bool:
+        if RESULT_FIELDS[i] in RELATIVE_FIELDS:
+            return abs(new - old) > self.register_threshold * max(abs(old), 1e-6)
+        return abs(new - old) > self.brightness_threshold
+
+    def encode(self, result: dict, now: float) -> Optional[bytes]:
+        """The message to send for this result at this time, or None"""
+        values = flatten(result)
+        if not self.delta or self.sent is None or (self.max_interval > 0 and now - self.last_key_time >= self.max_interval):
+            if self.delta:
+                self.sent = values
+                self.last_send_time = now
+                self.last_key_time = now
+            return struct.pack('<B16f', AUTOEXP_RESULT_MSG, *values)
+
+        if now - self.last_send_time < self.min_interval:
+            return None
+
+        mask = 0
+        changed = []
+        for i, value in enumerate(values):
+            if self._moved(i, self.sent[i], value):
+                mask |= 1 << i
+                changed.append(value)
+                self.sent[i] = value
+
+        if mask == 0:
+            return None
+
+        self.last_send_time = now
+        return struct.pack(f'<BH{len(changed)}f', AUTOEXP_DELTA_MSG, mask, *changed)
+
+class RxAutoExpTelemetry(RxAutoExpResult):
+    """
+    Receives auto exposure results from lua/autoexp_telemetry.lua in either mode: full results, and deltas
+    applied to the last full state, so the queue always gets complete results in RxAutoExpResult's shape.
+    """
+    def __init__(self, msg_code: int = AUTOEXP_RESULT_MSG, delta_msg_code: int = AUTOEXP_DELTA_MSG):
+        """
+        Args:
+            msg_code: Message type identifier for full auto exposure results
+            delta_msg_code: Message type identifier for auto exposure deltas
+        """
+        super().__init__(msg_code)
+        self.delta_msg_code = delta_msg_code
+        self.values: Optional[List[float]] = None
+
+        # link usage, for comparing telemetry modes
+        self.messages = 0
+        self.bytes_received = 0
+
+    def handle_data(self, data: bytes) -> None:
+        """
+        Process incoming data packets.
+
+        Args:
+            data: A full result (flag byte and 16 floats) or a delta (flag byte, uint16 bitmask, one float per set bit)
+        """
+        if not self.queue:
+            _log.warning("Received data but queue not initialized - call start() first")
+            return
+
+        self.messages += 1
+        self.bytes_received += len(data)
+
+        if data[0] == self.delta_msg_code:
+            if self.values is None:
+                # a delta before any full result has nothing to apply to; the next key frame catches up
+                _log.warning("Received auto exposure delta before a full result, skipping")
+                return
+            mask = struct.unpack_from('<H', data, 1)[0]
+            fields = [i for i in range(len(RESULT_FIELDS)) if mask & (1 << i)]
+            for i, value in zip(fields, struct.unpack_from(f'<{len(fields)}f', data, 3)):
+                self.values[i] = value
+        else:
+            self.values = list(struct.unpack_from('<16f', data, 1))
+
+        asyncio.create_task(self.queue.put(unflatten(self.values)))
+
+    async def attach(self, frame: FrameMsg) -> asyncio.Queue:
+        """
+        Attach the receive handler to the Frame data response and return a queue that will receive complete
+        autoexposure result objects.
+
+        Returns:
+            asyncio.Queue that will receive autoexposure result objects
+        """
+        self.queue = asyncio.Queue()
+        self.values = None
+
+        # subscribe for notifications
+        frame.register_data_response_handler(self, [self.msg_code, self.delta_msg_code], self.handle_data)
+
+        return self.queue
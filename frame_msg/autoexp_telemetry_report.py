@@ -0,0 +1,160 @@
+import argparse
+import asyncio
+import os
+
+import numpy as np
+
+from auto_exposure_batch import INITIAL_STATE, METERING_KEYS, load_algo, random_traces
+from autoexp_telemetry import (AUTOEXP_TELEMETRY_SETTINGS_MSG, RESULT_FIELDS, RELATIVE_FIELDS, AutoExpTelemetryEncoder,
+                               RxAutoExpTelemetry, TxAutoExpTelemetrySettings, flatten)
+from sensor_model import SCENES, SensorModel
+from sim_frame import SimFrame, SimLiveCameraApp, load_scene
+from frame_msg import RxPhoto, TxCaptureSettings
+
+try:
+    from lupa import lua54
+except ImportError:
+    lua54 = None
+
+MODES = {
+    'every result': TxAutoExpTelemetrySettings(delta=False),
+    'delta': TxAutoExpTelemetrySettings(),
+}
+
+def check_lua_encoder(settings: TxAutoExpTelemetrySettings, steps: int = 300, seed: int = 0) -> int:
+    """
+    Run lua/autoexp_telemetry.lua (with the standard camera.lua) and the Python encoder on the same auto exposure
+    results and times, and count the messages that differ
+    """
+    import frame_msg
+    lua_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'lua')
+    with open(os.path.join(os.path.dirname(frame_msg.__file__), 'lua', 'camera.lua'), 'rb') as f:
+        camera_source = f.read()
+    with open(os.path.join(lua_dir, 'autoexp_telemetry.lua')) as f:
+        telemetry_source = f.read()
+
+    lua = lua54.LuaRuntime(encoding=None)
+    now = [0.0]
+    sent = []
+    lua.execute("frame = { time = {} }")
+    lua.globals().frame[b'time'][b'utc'] = lambda: now[0]
+    lua.globals().package[b'preload'][b'camera.min'] = lua.eval("function(source) return function() return load(source)() end end")(camera_source)
+    module = lua.execute(telemetry_source)
+    # camera.lua defines the global send_data when it loads; capture the messages instead of sending them
+    lua.globals().send_data = lambda data: sent.append(bytes(data))
+    module.set_settings(module.parse_settings(settings.pack()))
+
+    encoder = AutoExpTelemetryEncoder(settings)
+    algo = load_algo('proposed')
+    state = dict(INITIAL_STATE['proposed'])
+
+    mismatches = 0
+    for i, sample in enumerate(random_traces(steps, 1, seed)[:, 0]):
+        now[0] = i * 0.1
+        result = algo(metering_data=dict(zip(METERING_KEYS, (int(v) for v in sample))), last_state=state)
+        expected = encoder.encode(result, now[0])
+        count = len(sent)
+        module.send(to_lua(lua, result))
+        actual = sent[count] if len(sent) > count else None
+        mismatches += expected != actual
+    return mismatches
+
+def to_lua(lua, value):
+    if isinstance(value, dict):
+        return lua.table_from({k.encode(): to_lua(lua, v) for k, v in value.items()})
+    return value
+
+async def live_feed(scene, mode: str, resolution: int, seconds: float = 60.0, seed: int = 0) -> dict:
+    """
+    Stream photos back to back from a simulated live camera app for the given time, with the light changing
+    from the office to daylight halfway through so auto exposure has to move again.
+
+    Returns:
+        dict of photos per second, photo bytes per second, telemetry messages and bytes, and the largest
+        difference between the host's reconstructed auto exposure state and Frame's when each photo arrived
+    """
+    sim = SimFrame()
+    sensor = SensorModel.from_scenes(['office'], seed=seed)
+    app = SimLiveCameraApp(sim, sensor, scene, seed=seed)
+
+    rx_photo = RxPhoto(upright=False)
+    photo_queue = await rx_photo.attach(sim)
+    rx_autoexp = RxAutoExpTelemetry()
+    await rx_autoexp.attach(sim)
+
+    await sim.send_message(AUTOEXP_TELEMETRY_SETTINGS_MSG, MODES[mode].pack())
+    app.start()
+
+    photos = 0
+    photo_bytes = 0
+    register_error = 0.0
+    brightness_error = 0.0
+    changed_light = False
+    start = sim.time_utc()
+    while sim.time_utc() - start < seconds:
+        if not changed_light and sim.time_utc() - start >= seconds / 2:
+            sensor.lux = np.array([SCENES['daylight'][0]])
+            sensor.illuminant = np.array([SCENES['daylight'][1]])
+            changed_light = True
+
+        await sim.send_message(0x0d, TxCaptureSettings(resolution=resolution).pack())
+        jpeg_bytes = await photo_queue.get()
+        photos += 1
+        photo_bytes += len(jpeg_bytes)
+
+        if rx_autoexp.values is not None:
+            for name, host, device in zip(RESULT_FIELDS, rx_autoexp.values, flatten(app.results[-1])):
+                if name in RELATIVE_FIELDS:
+                    register_error = max(register_error, abs(host - device) / max(abs(device), 1e-6))
+                else:
+                    brightness_error = max(brightness_error, abs(host - device))
+
+    elapsed = sim.time_utc() - start
+    app.running = False
+    rx_photo.detach(sim)
+    rx_autoexp.detach(sim)
+    return {
+        'photos_per_sec': photos / elapsed,
+        'photo_bytes_per_sec': photo_bytes / elapsed,
+        'telemetry_messages': app.telemetry_messages,
+        'telemetry_bytes': app.telemetry_bytes,
+        'results': len(app.results),
+        'register_error': register_error,
+        'brightness_error': brightness_error,
+    }
+
+async def main():
+    """
+    Check lua/autoexp_telemetry.lua against its Python model, then compare photo throughput of a live feed over
+    the simulated BLE link with every auto exposure result sent in full and with delta telemetry.
+    Optionally pass image files to use as the camera's view, otherwise images/koala.jpg is used.
+    """
+    parser = argparse.ArgumentParser(description="Auto exposure results sent in full against delta telemetry")
+    parser.add_argument('images', nargs='*', default=["images/koala.jpg"],
+                        help="image files to use as the camera's view (default: images/koala.jpg)")
+    args = parser.parse_args()
+
+    if lua54 is not None:
+        for mode, settings in MODES.items():
+            print(f"{check_lua_encoder(settings)} messages differ between lua/autoexp_telemetry.lua and the Python model ({mode})")
+    else:
+        print("Skipping the Lua check, which needs the lupa package: pip install lupa")
+
+    scene = load_scene(args.images)
+    print(f"\nlive feed for 60s on a {SimFrame().link_bytes_per_sec:.0f} bytes/s link, light changing halfway")
+    print(f"{'resolution':>10} {'telemetry':>13} {'photos/s':>9} {'photo B/s':>10} {'messages':>9} {'AE bytes':>9} "
+          f"{'max state error':>22}")
+    for resolution in (256, 512, 720):
+        baseline = None
+        for mode in MODES:
+            stats = await live_feed(scene, mode, resolution)
+            # photo bytes per second rather than photos per second: photo sizes follow the exposure, and a
+            # minute holds only a few large photos
+            gain = "" if baseline is None else f" ({stats['photo_bytes_per_sec'] / baseline - 1:+.1%})"
+            baseline = baseline or stats['photo_bytes_per_sec']
+            print(f"{resolution:>10} {mode:>13} {stats['photos_per_sec']:9.3f} {stats['photo_bytes_per_sec']:10.0f} "
+                  f"{stats['telemetry_messages']:9d} {stats['telemetry_bytes']:9d} "
+                  f"{stats['register_error']:9.1%} reg {stats['brightness_error']:6.3f} lvl{gain}")
+
+if __name__ == "__main__":
+    asyncio.run(main())
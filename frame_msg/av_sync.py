@@ -0,0 +1,258 @@
+import asyncio
+from collections import deque
+import json
+import logging
+import os
+import struct
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from frame_msg import FrameMsg, RxAudio
+
+logging.basicConfig()
+_log = logging.getLogger("RxTimestamp")
+
+# Frame to Host flag for timestamp messages sent by lua/audio_video_frame_app.lua
+TIMESTAMP_MSG = 0x03
+
+# timestamp kinds
+TIMESTAMP_AUDIO = 0
+TIMESTAMP_PHOTO = 1
+
+class RxTimestamp:
+    def __init__(
+        self,
+        msg_code: int = TIMESTAMP_MSG,
+    ):
+        """
+        Initialize receive handler for timestamp messages: one flag byte, one kind byte,
+        the Frame time from frame.time.utc() as a little-endian double, and a Uint32 counter
+        (audio bytes read so far for audio sync points, or the photo number for photos).
+
+        Args:
+            msg_code: Message type identifier for timestamp data
+        """
+        self.msg_code = msg_code
+
+        self.queue: Optional[asyncio.Queue] = None
+
+    def handle_data(self, data: bytes) -> None:
+        """
+        Process incoming data packets, noting the host time of arrival.
+
+        Args:
+            data: Bytes containing the timestamp with flag byte prefix
+        """
+        if not self.queue:
+            _log.warning("Received data but queue not initialized - call start() first")
+            return
+
+        kind, frame_time, counter = struct.unpack("<BdI", data[1:14])
+        result = {
+            'kind': kind,
+            'frame_time': frame_time,
+            'counter': counter,
+            'host_time': time.time(),
+        }
+
+        # Queue the data
+        asyncio.create_task(self.queue.put(result))
+
+    async def attach(self, frame: FrameMsg) -> asyncio.Queue:
+        """
+        Attach the receive handler to the Frame data response and return a queue that will receive timestamps.
+
+        Returns:
+            asyncio.Queue that will receive timestamp dicts
+        """
+        self.queue = asyncio.Queue()
+
+        # subscribe for notifications
+        frame.register_data_response_handler(self, [self.msg_code], self.handle_data)
+
+        return self.queue
+
+    def detach(self, frame: FrameMsg) -> None:
+        """Detach the receive handler from the Frame data response and clean up resources"""
+        frame.unregister_data_response_handler(self)
+        self.queue = None
+
+
+class ClockOffsetEstimator:
+    """
+    Estimates the offset between the Frame clock and the host clock from timestamps sent by Frame.
+
+    Every observation (host arrival time - Frame send time) is the true offset plus a non-negative
+    transmission delay, so the smallest observations in a recent window are the best estimate of
+    the offset; a line fitted through the per-window minima also tracks clock drift.
+    """
+    def __init__(self, window: int = 16, max_windows: int = 32):
+        """
+        Args:
+            window: Number of observations per minimum
+            max_windows: Number of window minima kept for the drift fit
+        """
+        self.window = window
+        self._current: List[tuple] = []
+        self._minima = deque(maxlen=max_windows)
+
+    def add(self, frame_time: float, host_time: float):
+        self._current.append((host_time - frame_time, frame_time))
+        if len(self._current) >= self.window:
+            self._minima.append(min(self._current))
+            self._current = []
+
+    def _points(self) -> List[tuple]:
+        points = list(self._minima)
+        if self._current:
+            points.append(min(self._current))
+        return points
+
+    @property
+    def offset(self) -> Optional[float]:
+        """Latest estimate of host time - Frame time in seconds, or None before any observations"""
+        points = self._points()
+        if not points:
+            return None
+        return self.to_host_time(points[-1][1]) - points[-1][1]
+
+    def to_host_time(self, frame_time: float) -> float:
+        """Map a Frame clock time to host clock time"""
+        points = self._points()
+        if not points:
+            raise ValueError("No timestamps observed yet")
+        if len(points) < 3:
+            return frame_time + min(points)[0]
+
+        # offset(t) = a + b * t through the window minima
+        offsets = np.array([p[0] for p in points])
+        times = np.array([p[1] for p in points])
+        b, a = np.polyfit(times - times[0], offsets, 1)
+        return frame_time + a + b * (frame_time - times[0])
+
+
+class AvTimeline:
+    """
+    Places the streamed audio and the photos captured during it on one timeline, using the
+    Frame-side timestamps: audio sync points tie audio sample indices to Frame time, and each photo
+    carries its Frame capture time. Times can then be expressed as an offset into the audio track
+    (for muxing) or as host wall-clock time (via the clock offset estimator).
+    """
+    def __init__(self, sample_rate: int = 8000, bytes_per_sample: int = 1):
+        self.sample_rate = sample_rate
+        self.bytes_per_sample = bytes_per_sample
+        self.clock = ClockOffsetEstimator()
+
+        self._audio = bytearray()
+        # (sample index, Frame time) pairs
+        self._sync_points: List[tuple] = []
+        # photo number -> Frame capture time, until the photo itself arrives
+        self._pending_photo_times: Dict[int, float] = {}
+        self.photos: List[dict] = []
+
+    def add_audio(self, pcm: bytes):
+        self._audio.extend(pcm)
+
+    def add_timestamp(self, timestamp: dict):
+        """Add a timestamp dict from RxTimestamp"""
+        self.clock.add(timestamp['frame_time'], timestamp['host_time'])
+
+        if timestamp['kind'] == TIMESTAMP_AUDIO:
+            # the last of `counter` bytes was read from the microphone at frame_time
+            sample_index = timestamp['counter'] // self.bytes_per_sample - 1
+            self._sync_points.append((sample_index, timestamp['frame_time']))
+        elif timestamp['kind'] == TIMESTAMP_PHOTO:
+            self._pending_photo_times[timestamp['counter']] = timestamp['frame_time']
+
+    def add_photo(self, jpeg_bytes: bytes, photo_number: Optional[int] = None) -> Optional[dict]:
+        """
+        Add a received photo, matched to its capture timestamp (the oldest unmatched one by default)
+
+        Returns:
+            The photo's timeline entry, or None if no capture timestamp has arrived for it (the photo is not added)
+        """
+        if not self._pending_photo_times:
+            _log.warning("Photo received without a capture timestamp")
+            return None
+        if photo_number is None:
+            photo_number = min(self._pending_photo_times)
+        frame_time = self._pending_photo_times.pop(photo_number)
+        photo = {'number': photo_number, 'frame_time': frame_time, 'jpeg': jpeg_bytes}
+        self.photos.append(photo)
+        return photo
+
+    @property
+    def audio(self) -> bytes:
+        return bytes(self._audio)
+
+    @property
+    def has_audio_sync(self) -> bool:
+        """Whether an audio sync point has arrived, so that audio_position() can place events in the audio track"""
+        return bool(self._sync_points)
+
+    def _audio_fit(self):
+        """Frame time = t0 + sample_index * seconds_per_sample, fitted to the sync points"""
+        if not self._sync_points:
+            raise ValueError("No audio sync points received")
+        if len(self._sync_points) == 1:
+            index, frame_time = self._sync_points[0]
+            return frame_time - index / self.sample_rate, 1.0 / self.sample_rate
+        indices = np.array([p[0] for p in self._sync_points], dtype=np.float64)
+        times = np.array([p[1] for p in self._sync_points])
+        slope, t0 = np.polyfit(indices, times, 1)
+        return t0, slope
+
+    def audio_position(self, frame_time: float) -> float:
+        """Position in seconds within the audio track of an event at the given Frame time"""
+        t0, seconds_per_sample = self._audio_fit()
+        return (frame_time - t0) / seconds_per_sample / self.sample_rate
+
+    def events(self) -> List[dict]:
+        """All photos on the timeline, in capture order, with audio-track and host clock positions"""
+        events = []
+        for photo in sorted(self.photos, key=lambda p: p['frame_time']):
+            events.append({
+                'photo': photo['number'],
+                'frame_time': photo['frame_time'],
+                'audio_position': self.audio_position(photo['frame_time']),
+                'host_time': self.clock.to_host_time(photo['frame_time']),
+                'size': len(photo['jpeg']),
+            })
+        return events
+
+    def save(self, directory: str) -> str:
+        """
+        Write the audio as a WAV file, the photos as JPEGs and the timeline as JSON into directory,
+        ready to be muxed into a single recording.
+
+        Returns:
+            The path of the timeline JSON file
+        """
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, 'audio.wav'), 'wb') as f:
+            f.write(RxAudio.to_wav_bytes(self.audio, sample_rate=self.sample_rate, bits_per_sample=8 * self.bytes_per_sample))
+
+        events = self.events()
+        for event, photo in zip(events, sorted(self.photos, key=lambda p: p['frame_time'])):
+            event['file'] = f"photo_{photo['number']:04d}.jpg"
+            with open(os.path.join(directory, event['file']), 'wb') as f:
+                f.write(photo['jpeg'])
+
+        t0, seconds_per_sample = self._audio_fit()
+        timeline = {
+            'audio': {
+                'file': 'audio.wav',
+                'sample_rate': self.sample_rate,
+                'measured_sample_rate': 1.0 / seconds_per_sample,
+                'start_frame_time': t0,
+                'start_host_time': self.clock.to_host_time(t0),
+            },
+            'clock_offset': self.clock.offset,
+            'photos': events,
+        }
+        path = os.path.join(directory, 'timeline.json')
+        with open(path, 'w') as f:
+            json.dump(timeline, f, indent=2)
+        return path
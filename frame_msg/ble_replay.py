@@ -0,0 +1,325 @@
+import argparse
+import asyncio
+import collections
+import struct
+import sys
+import time
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from frame_msg import FrameMsg, RxAudio, RxAutoExpResult, RxIMU, RxMeteringData, RxPhoto, RxTap
+
+# log file: magic and version, then one record per notification: microseconds since the previous
+# notification (Uint32) and length (Uint16), followed by the notification bytes (flag byte first)
+LOG_MAGIC = b'FRAMELOG'
+_LOG_VERSION = 1
+_LOG_HEADER = struct.Struct('<8sI')
+_RECORD = struct.Struct('<IH')
+_MAX_DELTA = 0xFFFFFFFF
+
+class NotificationRecorder:
+    """
+    Records every data notification Frame sends to the host, with its arrival time, into a compact binary log
+    (6 bytes per notification on top of its bytes) for NotificationReplayer to play back to the receivers later.
+
+    attach() registers it with a FrameMsg (or SimFrame) for every message code, like one more Rx receiver, so it
+    sees exactly what the receivers see without changing them. record() only appends to a buffer, which goes to
+    the file every flush_bytes and on close(), so it adds little to the receive path.
+    """
+    def __init__(self, path: str, clock: Callable[[], float] = time.perf_counter, flush_bytes: int = 65536):
+        """
+        Args:
+            path: Log file to write
+            clock: Source of arrival times in seconds (e.g. lambda: sim.clock to record a SimFrame session)
+            flush_bytes: Bytes to buffer before writing to the file
+        """
+        self.path = path
+        self.clock = clock
+        self.flush_bytes = flush_bytes
+        self._file = open(path, 'wb')
+        self._file.write(_LOG_HEADER.pack(LOG_MAGIC, _LOG_VERSION))
+        self._buffer = bytearray()
+        self._last_time = None
+
+        self.notifications = 0
+        self.bytes = 0
+
+    def attach(self, frame: FrameMsg) -> None:
+        """Record all the data notifications from this Frame from now on"""
+        frame.register_data_response_handler(self, list(range(256)), self.record)
+
+    def detach(self, frame: FrameMsg) -> None:
+        frame.unregister_data_response_handler(self)
+        self.flush()
+
+    def record(self, data: bytes, t: Optional[float] = None) -> None:
+        """
+        Add a notification to the log.
+
+        Args:
+            data: The notification as received (flag byte first)
+            t: Arrival time in seconds on the recorder's clock (now by default)
+        """
+        if t is None:
+            t = self.clock()
+        delta = 0 if self._last_time is None else min(_MAX_DELTA, max(0, round((t - self._last_time) * 1e6)))
+        self._last_time = t
+        self._buffer += _RECORD.pack(delta, len(data))
+        self._buffer += data
+        self.notifications += 1
+        self.bytes += len(data)
+        if len(self._buffer) >= self.flush_bytes:
+            self.flush()
+
+    def flush(self):
+        self._file.write(self._buffer)
+        self._buffer.clear()
+
+    def close(self):
+        self.flush()
+        self._file.close()
+
+def read_log(path: str) -> Iterator[Tuple[float, bytes]]:
+    """(seconds since the first notification, notification bytes) for each notification in a log"""
+    with open(path, 'rb') as f:
+        log = f.read()
+    magic, version = _LOG_HEADER.unpack_from(log, 0)
+    if magic != LOG_MAGIC or version != _LOG_VERSION:
+        raise ValueError(f"{path} is not a version {_LOG_VERSION} notification log")
+    offset = _LOG_HEADER.size
+    t = 0
+    while offset + _RECORD.size <= len(log):
+        delta, length = _RECORD.unpack_from(log, offset)
+        offset += _RECORD.size
+        if offset + length > len(log):
+            # cut off by the end of the recording
+            break
+        t += delta
+        yield t / 1e6, log[offset:offset + length]
+        offset += length
+
+class NotificationReplayer:
+    """
+    A stand-in for FrameMsg that plays a recorded log back to the Rx receivers attached to it (they attach
+    exactly as to a FrameMsg, via register_data_response_handler), at the original pace, faster, or as fast
+    as possible, timing each receiver's handler and the messages that come out of its queue.
+    """
+    def __init__(self, path: str):
+        """
+        Args:
+            path: Log file written by NotificationRecorder
+        """
+        self.notifications = list(read_log(path))
+        self.data_response_handlers = {}
+        # per subscriber: notifications handled, seconds in the handler, and when the latest one was dispatched
+        self._handled: Dict[object, int] = {}
+        self._handler_time: Dict[object, float] = {}
+        self._last_dispatch: Dict[object, float] = {}
+
+    @property
+    def duration(self) -> float:
+        """Seconds from the first to the last notification of the recording"""
+        return self.notifications[-1][0] if self.notifications else 0.0
+
+    def register_data_response_handler(self, subscriber, msg_codes: List[int], handler: Callable[[bytes], None]):
+        """Register a hostside handler for the specified msg codes, as FrameMsg does"""
+        self._handled.setdefault(subscriber, 0)
+        self._handler_time.setdefault(subscriber, 0.0)
+        for code in msg_codes:
+            if code not in self.data_response_handlers:
+                self.data_response_handlers[code] = []
+            self.data_response_handlers[code].append((subscriber, handler))
+
+    def unregister_data_response_handler(self, subscriber):
+        """Unregister all hostside handlers for the subscriber, as FrameMsg does"""
+        for code in list(self.data_response_handlers.keys()):
+            self.data_response_handlers[code] = [
+                (sub, handler) for sub, handler in self.data_response_handlers[code] if sub != subscriber
+            ]
+            if not self.data_response_handlers[code]:
+                del self.data_response_handlers[code]
+
+    def _dispatch(self, data: bytes):
+        for subscriber, handler in self.data_response_handlers.get(data[0], ()):
+            start = time.perf_counter()
+            self._last_dispatch[subscriber] = start
+            handler(data)
+            self._handled[subscriber] += 1
+            self._handler_time[subscriber] += time.perf_counter() - start
+
+    def time_queue(self, subscriber, queue: asyncio.Queue) -> collections.deque:
+        """
+        Note, for each message a receiver puts on its queue, when the notification that completed it was dispatched
+        (the latest one dispatched to the receiver, as the message goes in), in queue order.
+
+        Every put() and put_nowait() ends in put_nowait(), whether it runs in the handler, in a task the handler
+        creates (RxAudio) or after the receiver's own processing (RxPhoto) or hold time (RxTap).
+        """
+        dispatched = collections.deque()
+        put_nowait = queue.put_nowait
+
+        def timed_put_nowait(item):
+            put_nowait(item)
+            dispatched.append(self._last_dispatch.get(subscriber, time.perf_counter()))
+
+        queue.put_nowait = timed_put_nowait
+        return dispatched
+
+    async def replay(self, speed: Optional[float] = 1.0):
+        """
+        Dispatch every notification of the log to the attached receivers.
+
+        Args:
+            speed: 1.0 for the recorded pace, 10.0 for ten times faster, None for as fast as possible
+                   (still letting the event loop run between notifications, as BLE notifications do)
+        """
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        for t, data in self.notifications:
+            if speed:
+                delay = start + t / speed - loop.time()
+                await asyncio.sleep(max(0.0, delay))
+            else:
+                await asyncio.sleep(0)
+            if data:
+                self._dispatch(data)
+
+async def benchmark(path: str, receivers: Dict[str, object], speed: Optional[float] = 1.0,
+                    settle: float = 0.5) -> Dict[str, dict]:
+    """
+    Replay a log to a set of receivers and measure each one.
+
+    Args:
+        path: Log file written by NotificationRecorder
+        receivers: Name to Rx receiver (attached here, e.g. {'photo': RxPhoto()})
+        speed: As for NotificationReplayer.replay()
+        settle: Seconds to wait after the last notification for the last messages (RxTap holds taps for 0.3s)
+
+    Returns:
+        Per receiver: notifications handled, handler microseconds per notification, messages parsed, messages
+        per second of replay, and the latency from the notification that completed a message to the message
+        coming out of the receiver's queue (mean and 95th percentile, in ms)
+    """
+    replayer = NotificationReplayer(path)
+    messages = {name: [] for name in receivers}
+
+    async def drain(name: str, queue: asyncio.Queue, dispatched: collections.deque):
+        while True:
+            message = await queue.get()
+            arrived = time.perf_counter()
+            completed = dispatched.popleft()
+            # RxAudio ends each clip with None
+            if message is not None:
+                messages[name].append(arrived - completed)
+
+    tasks = []
+    for name, receiver in receivers.items():
+        queue = await receiver.attach(replayer)
+        tasks.append(asyncio.create_task(drain(name, queue, replayer.time_queue(receiver, queue))))
+
+    start = time.perf_counter()
+    await replayer.replay(speed)
+    elapsed = time.perf_counter() - start
+    await asyncio.sleep(settle)
+
+    for task in tasks:
+        task.cancel()
+    for receiver in receivers.values():
+        receiver.detach(replayer)
+
+    results = {}
+    for name, receiver in receivers.items():
+        handled = replayer._handled.get(receiver, 0)
+        latencies = messages[name]
+        results[name] = {
+            'notifications': handled,
+            'handler_us': 1e6 * replayer._handler_time.get(receiver, 0.0) / handled if handled else 0.0,
+            'messages': len(latencies),
+            'messages_per_sec': len(latencies) / elapsed if elapsed else 0.0,
+            'latency_ms': 1000 * float(np.mean(latencies)) if latencies else 0.0,
+            'latency_p95_ms': 1000 * float(np.percentile(latencies, 95)) if latencies else 0.0,
+        }
+    results['replay'] = {'seconds': elapsed, 'recorded_seconds': replayer.duration,
+                         'notifications': len(replayer.notifications)}
+    return results
+
+def default_receivers() -> Dict[str, object]:
+    """One of each standard receiver, with the default message codes of the example frame apps"""
+    return {
+        'RxPhoto': RxPhoto(),
+        'RxAudio': RxAudio(),
+        'RxIMU': RxIMU(),
+        'RxTap': RxTap(),
+        'RxMeteringData': RxMeteringData(),
+        'RxAutoExpResult': RxAutoExpResult(),
+    }
+
+def print_results(results: Dict[str, dict]):
+    replay = results['replay']
+    print(f"{replay['notifications']} notifications, {replay['recorded_seconds']:.2f}s recorded, "
+          f"replayed in {replay['seconds']:.2f}s")
+    print(f"{'receiver':<16} {'notifications':>13} {'handler':>9} {'messages':>8} {'per sec':>8} {'latency':>9} {'p95':>9}")
+    for name, r in results.items():
+        if name == 'replay':
+            continue
+        print(f"{name:<16} {r['notifications']:13d} {r['handler_us']:7.1f}us {r['messages']:8d} "
+              f"{r['messages_per_sec']:8.1f} {r['latency_ms']:7.2f}ms {r['latency_p95_ms']:7.2f}ms")
+
+def record_example(path: str, script: str, args: List[str]):
+    """Run an example script as usual, recording the notifications of every FrameMsg it connects"""
+    import runpy
+
+    recorder = NotificationRecorder(path)
+    connect = FrameMsg.connect
+
+    async def connect_and_record(self, *connect_args, **connect_kwargs):
+        result = await connect(self, *connect_args, **connect_kwargs)
+        recorder.attach(self)
+        return result
+
+    FrameMsg.connect = connect_and_record
+    sys.argv = [script] + args
+    try:
+        runpy.run_path(script, run_name='__main__')
+    finally:
+        FrameMsg.connect = connect
+        recorder.close()
+        print(f"Recorded {recorder.notifications} notifications ({recorder.bytes} bytes) to {path}")
+
+def replay_speed(value: str) -> Optional[float]:
+    """A replay speed argument: a positive multiple of the recorded pace, or 'max' for as fast as possible"""
+    if value == 'max':
+        return None
+    try:
+        speed = float(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"speed must be a number or 'max', not {value!r}")
+    if speed <= 0:
+        raise argparse.ArgumentTypeError(f"speed must be positive, not {value}")
+    return speed
+
+def main():
+    """
+    python ble_replay.py record session.frlog camera.py  -- run an example against real Frame, recording
+    python ble_replay.py replay session.frlog [speed|max]  -- replay to one of each receiver and print the stats
+    """
+    parser = argparse.ArgumentParser(description="Record Frame's data notifications, or replay them to the receivers")
+    commands = parser.add_subparsers(dest='command', required=True)
+    record = commands.add_parser('record', help="run an example against real Frame, recording its notifications")
+    record.add_argument('log', help="log file to write")
+    record.add_argument('script', help="example script to run, e.g. camera.py")
+    record.add_argument('script_args', nargs=argparse.REMAINDER, help="arguments for the script")
+    replay = commands.add_parser('replay', help="replay a log to one of each receiver and print the stats")
+    replay.add_argument('log', help="log file written by record")
+    replay.add_argument('speed', nargs='?', type=replay_speed, default=1.0,
+                        help="multiple of the recorded pace, or max for as fast as possible (default: 1.0)")
+    args = parser.parse_args()
+
+    if args.command == 'record':
+        record_example(args.log, args.script, args.script_args)
+    else:
+        print_results(asyncio.run(benchmark(args.log, default_receivers(), args.speed)))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+import asyncio
+import io
+import os
+import struct
+import tempfile
+import time
+
+import numpy as np
+from PIL import Image
+
+from ble_replay import NotificationRecorder, benchmark, default_receivers, print_results
+from reassembly import RxAudioBuffered, RxPhotoBuffered
+
+SESSION = 20.0
+# what a 244 byte MTU connection carries in practice, shared by everything Frame sends
+LINK_BYTES_PER_SEC = 60_000
+CHUNK = 243
+
+def session_notifications(seed: int = 0) -> list:
+    """
+    (ready time, notification) for a 20s session of the example frame apps at once: a photo every 2s, a 5s
+    audio clip, IMU at 10Hz, auto exposure results at 5Hz, metering every second and some single, double and
+    triple taps
+    """
+    rng = np.random.default_rng(seed)
+    ready = []
+
+    koala = Image.open("images/koala.jpg").convert('RGB')
+    for i, t in enumerate(np.arange(0.5, SESSION - 2, 2.0)):
+        left = int(rng.integers(0, koala.width // 3))
+        size = min(koala.width - left, koala.height)
+        output = io.BytesIO()
+        koala.crop((left, 0, left + size, size)).resize((720, 720)).save(output, format='JPEG', quality=50)
+        jpeg_bytes = output.getvalue()
+        # the capture takes a while before the first chunk is ready
+        for offset in range(0, len(jpeg_bytes), CHUNK):
+            ready.append((t + 0.3, b'\x07' + jpeg_bytes[offset:offset + CHUNK]))
+        ready.append((t + 0.3, b'\x08'))
+
+    pcm = rng.integers(0, 256, 8000 * 5, dtype=np.uint8).tobytes()
+    for offset in range(0, len(pcm), CHUNK - 1):
+        chunk = pcm[offset:offset + CHUNK - 1]
+        ready.append((6.0 + (offset + len(chunk)) / 8000, b'\x05' + chunk))
+    ready.append((11.0, b'\x06'))
+
+    for t in np.arange(0.0, SESSION, 0.1):
+        ready.append((t, b'\x0a\x00' + struct.pack('<6h', *rng.integers(-2048, 2048, 6))))
+    for t in np.arange(0.0, SESSION, 0.2):
+        ready.append((t, b'\x11' + struct.pack('<16f', *rng.uniform(0, 1, 16))))
+    for t in np.arange(0.0, SESSION, 1.0):
+        ready.append((t, b'\x12' + bytes(rng.integers(0, 256, 6, dtype=np.uint8))))
+    for t in (3.0, 7.0, 7.15, 12.0, 12.15, 12.3, 16.0):
+        ready.append((t, b'\x09'))
+
+    return sorted(ready, key=lambda item: item[0])
+
+def record_session(path: str) -> tuple:
+    """
+    Record the session as it would arrive over the link, each notification once the link is free
+
+    Returns:
+        The recorder, and the seconds spent in record() and close()
+    """
+    recorder = NotificationRecorder(path)
+    link_free = 0.0
+    record_time = 0.0
+    for ready, data in session_notifications():
+        sent = max(ready, link_free)
+        link_free = sent + len(data) / LINK_BYTES_PER_SEC
+        start = time.perf_counter()
+        recorder.record(data, link_free)
+        record_time += time.perf_counter() - start
+    start = time.perf_counter()
+    recorder.close()
+    return recorder, record_time + time.perf_counter() - start
+
+def buffered_receivers() -> dict:
+    receivers = default_receivers()
+    receivers['RxPhoto'] = RxPhotoBuffered()
+    receivers['RxAudio'] = RxAudioBuffered()
+    return receivers
+
+async def main():
+    """
+    Record a 20s session of every kind of notification the example frame apps send into a log, then replay it
+    to one of each standard receiver at the recorded pace, 10 times faster and as fast as possible, and replay
+    it again to the preallocated-buffer photo and audio receivers for a like-for-like comparison.
+    """
+    directory = tempfile.mkdtemp(prefix="frame_replay_")
+    path = os.path.join(directory, 'session.frlog')
+
+    recorder, record_time = record_session(path)
+    print(f"recorded {recorder.notifications} notifications, {recorder.bytes / 1000:.0f}kB, "
+          f"into a {os.path.getsize(path) / 1000:.0f}kB log "
+          f"({1e6 * record_time / recorder.notifications:.1f}us per notification)\n")
+
+    for speed in (1.0, 10.0, None):
+        print(f"speed {'max' if speed is None else f'{speed:g}x'}:")
+        print_results(await benchmark(path, default_receivers(), speed))
+        print()
+
+    print("speed max, RxPhotoBuffered and RxAudioBuffered:")
+    print_results(await benchmark(path, buffered_receivers(), None))
+
+if __name__ == "__main__":
+    asyncio.run(main())
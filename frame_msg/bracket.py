@@ -0,0 +1,284 @@
+import asyncio
+from concurrent.futures import Executor, ThreadPoolExecutor
+from dataclasses import dataclass, field
+import io
+import os
+import struct
+import tempfile
+import time
+from typing import List, Optional, Sequence
+
+import numpy as np
+from PIL import Image
+
+from frame_msg import FrameMsg, TxCaptureSettings, TxManualExpSettings
+
+from timelapse import RxPhotoBatch
+
+# Host to Frame flag handled by lua/bracket_frame_app.lua (the burst is triggered by a TxCaptureSettings message)
+BRACKET_SETTINGS_MSG = 0x22
+
+@dataclass
+class TxBracketSettings:
+    """
+    Message for the bracketing frame app (lua/bracket_frame_app.lua): the exposures to capture back to back
+    on the next TxCaptureSettings message, and how long to let each one settle.
+
+    Attributes:
+        exposures: Manual exposure settings for each photo of the burst, in capture order (up to 255)
+        gated: Capture as soon as the metering shows the new exposure has taken effect (after min_settle),
+            instead of always waiting max_settle
+        min_settle: Shortest wait after changing the exposure in seconds (0-65.535)
+        max_settle: Longest wait after changing the exposure in seconds (0-65.535); new settings take up to 200ms
+    """
+    exposures: List[TxManualExpSettings] = field(default_factory=list)
+    gated: bool = True
+    min_settle: float = 0.02
+    max_settle: float = 0.2
+
+    @classmethod
+    def around(cls, base: TxManualExpSettings, stops: Sequence[float] = (-2.0, 0.0, 2.0),
+               shutter_limit: int = 16383, analog_gain_limit: int = 248, **kwargs) -> 'TxBracketSettings':
+        """
+        A bracket of exposures the given numbers of stops from base, keeping its white balance.
+        Each exposure uses the longest shutter within the limit before raising the analog gain.
+        """
+        exposures = []
+        for stop in stops:
+            exposure = base.manual_shutter * base.manual_analog_gain * 2.0 ** stop
+            shutter = int(np.clip(round(exposure), 4, shutter_limit))
+            gain = int(np.clip(round(exposure / shutter), 1, analog_gain_limit))
+            exposures.append(TxManualExpSettings(manual_shutter=shutter, manual_analog_gain=gain,
+                manual_red_gain=base.manual_red_gain, manual_green_gain=base.manual_green_gain,
+                manual_blue_gain=base.manual_blue_gain))
+        return cls(exposures=exposures, **kwargs)
+
+    def relative_exposures(self) -> np.ndarray:
+        """Exposure (shutter times analog gain) of each photo relative to the first"""
+        exposure = np.array([e.manual_shutter * e.manual_analog_gain for e in self.exposures], dtype=np.float32)
+        return exposure / exposure[0]
+
+    def pack(self) -> bytes:
+        """Pack the settings into 6 bytes plus 9 per exposure."""
+        return struct.pack('>BHHB',
+            0x01 if self.gated else 0x00,
+            int(round(self.min_settle * 1000)) & 0xFFFF,
+            int(round(self.max_settle * 1000)) & 0xFFFF,
+            len(self.exposures) & 0xFF,
+        ) + b''.join(e.pack() for e in self.exposures)
+
+# 5-tap binomial kernel of the Gaussian and Laplacian pyramids
+_KERNEL = (1.0 / 16, 4.0 / 16, 6.0 / 16)
+
+def _blur(x: np.ndarray) -> np.ndarray:
+    """Separable 5-tap binomial blur over axes 1 and 2 (rows and columns) of a stack of images or weights"""
+    rest = [(0, 0)] * (x.ndim - 3)
+    h, w = x.shape[1], x.shape[2]
+    p = np.pad(x, [(0, 0), (2, 2), (0, 0)] + rest, mode='reflect')
+    x = (p[:, 0:h] + p[:, 4:h + 4]) * _KERNEL[0] + (p[:, 1:h + 1] + p[:, 3:h + 3]) * _KERNEL[1] + p[:, 2:h + 2] * _KERNEL[2]
+    p = np.pad(x, [(0, 0), (0, 0), (2, 2)] + rest, mode='reflect')
+    return (p[:, :, 0:w] + p[:, :, 4:w + 4]) * _KERNEL[0] + (p[:, :, 1:w + 1] + p[:, :, 3:w + 3]) * _KERNEL[1] + p[:, :, 2:w + 2] * _KERNEL[2]
+
+def _pyr_down(x: np.ndarray) -> np.ndarray:
+    return _blur(x)[:, ::2, ::2]
+
+def _pyr_up(x: np.ndarray, shape: tuple) -> np.ndarray:
+    up = np.zeros(shape, dtype=x.dtype)
+    up[:, ::2, ::2] = x * 4.0
+    return _blur(up)
+
+def decode(jpeg_bytes: bytes) -> np.ndarray:
+    """Decode a JPEG to float32 RGB in 0..1"""
+    return np.asarray(Image.open(io.BytesIO(jpeg_bytes)).convert('RGB'), dtype=np.float32) * (1.0 / 255)
+
+def fusion_weights(image: np.ndarray, contrast: float = 1.0, saturation: float = 1.0,
+                   well_exposedness: float = 1.0, sigma: float = 0.2) -> np.ndarray:
+    """
+    Exposure fusion weight of each pixel of one image: local contrast (Laplacian of the grey image),
+    saturation (spread of the channels) and well-exposedness (closeness of each channel to mid grey)
+    """
+    grey = image @ np.array([0.299, 0.587, 0.114], dtype=np.float32)
+    p = np.pad(grey, 1, mode='reflect')
+    laplacian = np.abs(p[:-2, 1:-1] + p[2:, 1:-1] + p[1:-1, :-2] + p[1:-1, 2:] - 4.0 * grey)
+    weight = laplacian ** contrast
+    if saturation:
+        weight = weight * image.std(axis=2) ** saturation
+    if well_exposedness:
+        weight = weight * np.exp(-((image - 0.5) ** 2).sum(axis=2) * (well_exposedness / (2.0 * sigma * sigma)))
+    return weight + 1e-12
+
+def fuse_exposures(images: np.ndarray, weights: np.ndarray, levels: Optional[int] = None) -> np.ndarray:
+    """
+    Exposure fusion (Mertens et al.): blend a stack of differently exposed images with per-pixel weights,
+    one Laplacian pyramid level at a time so the seams between exposures don't show.
+    The whole stack is processed at once at each level.
+
+    Args:
+        images: float32 (N, H, W, 3) in 0..1
+        weights: (N, H, W) from fusion_weights(), normalized here
+        levels: Pyramid levels (by default down to a single pixel, as OpenCV's MergeMertens)
+
+    Returns:
+        float32 (H, W, 3) in 0..1
+    """
+    if levels is None:
+        levels = max(1, int(np.log2(min(images.shape[1:3]))))
+    weights = (weights / weights.sum(axis=0, keepdims=True))[..., None].astype(np.float32)
+
+    fused = []
+    image_level = images
+    weight_level = weights
+    for _ in range(levels - 1):
+        down = _pyr_down(image_level)
+        fused.append((weight_level * (image_level - _pyr_up(down, image_level.shape))).sum(axis=0))
+        image_level = down
+        weight_level = _pyr_down(weight_level)
+    result = (weight_level * image_level).sum(axis=0)
+
+    for laplacian in reversed(fused):
+        result = _pyr_up(result[None], (1,) + laplacian.shape)[0] + laplacian
+    return np.clip(result, 0.0, 1.0)
+
+def merge_radiance(images: np.ndarray, exposures: np.ndarray, gamma: float = 2.2) -> np.ndarray:
+    """
+    Merge a stack into relative scene radiance: each pixel's linearized values divided by the exposure,
+    averaged with weights that fall towards black (noise) and white (clipping); a pixel clipped in every
+    photo keeps an equal-weighted average so it stays bright
+
+    Args:
+        images: float32 (N, H, W, 3) in 0..1 (or a band of rows of the stack)
+        exposures: Relative exposure of each image
+        gamma: Camera response as a power law (1.0 for linear values)
+    """
+    weight = np.maximum(1.0 - np.abs(2.0 * images - 1.0) ** 12, 1e-4)
+    linear = images ** gamma if gamma != 1.0 else images
+    inverse_exposure = (1.0 / np.asarray(exposures, dtype=np.float32)).reshape(-1, 1, 1, 1)
+    return (weight * linear * inverse_exposure).sum(axis=0) / weight.sum(axis=0)
+
+def tone_map(radiance: np.ndarray, key: float = 0.18, gamma: float = 2.2) -> np.ndarray:
+    """Global Reinhard tone mapping of relative radiance to display values in 0..1"""
+    luminance = radiance.mean(axis=2)
+    scaled = radiance * (key / np.exp(np.log(luminance + 1e-6).mean()))
+    return (scaled / (1.0 + scaled)) ** (1.0 / gamma)
+
+def _decode_and_weigh(jpeg_bytes: bytes) -> tuple:
+    image = decode(jpeg_bytes)
+    return image, fusion_weights(image)
+
+def process_burst(jpegs: List[bytes], exposures: np.ndarray, pool: Optional[Executor] = None, bands: Optional[int] = None,
+                  gamma: float = 2.2) -> dict:
+    """
+    Decode a bracketed burst and merge it, both as exposure fusion and as tone mapped HDR.
+    The work that is independent per photo (decoding and fusion weights) and per band of rows (the radiance
+    merge) runs in the pool (a thread pool by default: PIL decoding and the large NumPy operations release the GIL).
+
+    Args:
+        jpegs: The photos of the burst
+        exposures: Relative exposure of each photo (TxBracketSettings.relative_exposures())
+        pool: Executor to run the work in, or None for a thread pool per burst
+        bands: Bands of rows to split the radiance merge into (the number of CPUs by default)
+        gamma: Camera response as a power law for the radiance merge
+
+    Returns:
+        dict of 'fused' and 'hdr' float32 (H, W, 3) images and the seconds spent decoding and merging
+    """
+    own_pool = pool is None
+    if own_pool:
+        pool = ThreadPoolExecutor(max_workers=min(len(jpegs), os.cpu_count() or 1))
+    try:
+        start = time.perf_counter()
+        decoded = list(pool.map(_decode_and_weigh, jpegs))
+        images = np.stack([image for image, _ in decoded])
+        weights = np.stack([weight for _, weight in decoded])
+        decoded_time = time.perf_counter()
+
+        fused = fuse_exposures(images, weights)
+
+        bounds = np.linspace(0, images.shape[1], (bands or os.cpu_count() or 1) + 1).astype(int)
+        bands = pool.map(lambda band: merge_radiance(images[:, band[0]:band[1]], exposures, gamma),
+                         zip(bounds[:-1], bounds[1:]))
+        hdr = tone_map(np.concatenate(list(bands)), gamma=gamma)
+        merged_time = time.perf_counter()
+    finally:
+        if own_pool:
+            pool.shutdown()
+
+    return {
+        'fused': fused,
+        'hdr': hdr,
+        'decode_time': decoded_time - start,
+        'merge_time': merged_time - decoded_time,
+    }
+
+def to_image(result: np.ndarray, upright: bool = True) -> Image.Image:
+    """A merged result as an 8-bit image, rotated upright as RxPhoto does (the burst is received unrotated)"""
+    pixels = np.round(result * 255).astype(np.uint8)
+    return Image.fromarray(np.rot90(pixels) if upright else pixels)
+
+async def main():
+    """
+    Capture a 3 exposure bracket (-2, 0, +2 stops) back to back on Frame, then merge it on the host and save
+    the photos, the exposure fusion and the tone mapped HDR to a temporary directory
+    """
+    frame = FrameMsg()
+    try:
+        await frame.connect()
+
+        # Let the user know we're starting
+        await frame.print_short_text('Loading...')
+
+        # send the std lua files to Frame that our app needs to handle data accumulation and camera
+        await frame.upload_stdlua_libs(lib_names=['data', 'camera', 'code'])
+
+        # Send the main lua application from this project to Frame that will run the app
+        await frame.upload_frame_app(local_filename="lua/bracket_frame_app.lua")
+
+        # attach the print response handler so we can see stdout from Frame Lua print() statements
+        frame.attach_print_response_handler()
+
+        # "require" the main frame_app lua file to run it, and block until it has started.
+        await frame.start_frame_app()
+
+        # hook up the batch receiver; the merged images are rotated instead of each photo
+        rx_batch = RxPhotoBatch(upright=False)
+        batch_queue = await rx_batch.attach(frame)
+
+        # queue the bracket on Frame, then trigger the burst with the capture settings
+        bracket = TxBracketSettings.around(TxManualExpSettings(manual_shutter=1600, manual_analog_gain=4))
+        await frame.send_message(BRACKET_SETTINGS_MSG, bracket.pack())
+
+        start = time.perf_counter()
+        await frame.send_message(0x0d, TxCaptureSettings(resolution=720).pack())
+        batch = await asyncio.wait_for(batch_queue.get(), timeout=60.0)
+        received = time.perf_counter()
+
+        result = process_burst([photo['jpeg'] for photo in batch], bracket.relative_exposures())
+        done = time.perf_counter()
+
+        directory = tempfile.mkdtemp(prefix="frame_bracket_")
+        for photo in batch:
+            with open(os.path.join(directory, f"exposure_{photo['index']}.jpg"), 'wb') as f:
+                f.write(photo['jpeg'])
+        to_image(result['fused']).save(os.path.join(directory, "fused.jpg"))
+        to_image(result['hdr']).save(os.path.join(directory, "hdr.jpg"))
+
+        print(f"Burst of {len(batch)} captured over {batch[-1]['frame_time'] - batch[0]['frame_time']:.2f}s and received "
+              f"in {received - start:.2f}s, merged in {done - received:.2f}s: {done - start:.2f}s in total, saved to {directory}")
+
+        # stop the batch receiver and clean up its resources
+        rx_batch.detach(frame)
+
+        # unhook the print handler
+        frame.detach_print_response_handler()
+
+        # break out of the frame app loop and reboot Frame
+        await frame.stop_frame_app()
+
+    except Exception as e:
+        print(f"An error occurred: {e}")
+    finally:
+        # clean disconnection
+        await frame.disconnect()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,148 @@
+import argparse
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+import time
+
+import numpy as np
+
+from bracket import (BRACKET_SETTINGS_MSG, TxBracketSettings, decode, fuse_exposures, fusion_weights, merge_radiance,
+                     process_burst, tone_map)
+from sensor_model import SensorModel
+from sim_frame import SimBracketApp, SimExposureApp, SimFrame, load_scene
+from timelapse import RxPhotoBatch
+from frame_msg import RxPhoto, TxCaptureSettings, TxManualExpSettings
+
+try:
+    import cv2
+except ImportError:
+    cv2 = None
+
+SCENE = 'backlit window'
+
+def base_exposure(sensor: SensorModel, level: float = 64.0) -> TxManualExpSettings:
+    """Manual exposure settings that put the scene's matrix metering at about the given level"""
+    per_line = sensor.levels(1, 1, 256, 256, 256).reshape(6)[3:6].mean()
+    exposure = level / per_line
+    shutter = int(np.clip(round(exposure), 4, 16383))
+    gain = int(np.clip(round(exposure / shutter), 1, 248))
+    return TxManualExpSettings(manual_shutter=shutter, manual_analog_gain=gain,
+                               manual_red_gain=256, manual_green_gain=256, manual_blue_gain=256)
+
+def wrong_exposures(app: SimExposureApp, bracket: TxBracketSettings) -> int:
+    """Number of photos taken with other registers than the bracket asked for"""
+    asked = [(e.manual_shutter, e.manual_analog_gain, e.manual_red_gain, e.manual_green_gain, e.manual_blue_gain)
+             for e in bracket.exposures]
+    return sum(tuple(registers) != tuple(expected) for (_, registers), expected in zip(app.captured, asked))
+
+async def one_at_a_time(scene, bracket: TxBracketSettings, capture_settings: TxCaptureSettings, seed: int = 0):
+    """
+    Take the bracket as manual_exposure.py takes a photo: send the exposure, wait 200ms, request the photo
+    and receive it, then the next exposure
+    """
+    sim = SimFrame()
+    app = SimExposureApp(sim, SensorModel.from_scenes([SCENE], seed=seed), scene, seed=seed)
+    rx_photo = RxPhoto(upright=False)
+    photo_queue = await rx_photo.attach(sim)
+
+    jpegs = []
+    for exposure in bracket.exposures:
+        await sim.send_message(0x0c, exposure.pack())
+        # the host's asyncio.sleep(0.2), on the simulated clock
+        await sim.sleep(0.2)
+        await sim.send_message(0x0d, capture_settings.pack())
+        jpegs.append(await photo_queue.get())
+
+    rx_photo.detach(sim)
+    return sim, app, jpegs
+
+async def burst(scene, bracket: TxBracketSettings, capture_settings: TxCaptureSettings, seed: int = 0):
+    """Queue the bracket on Frame and take it back to back with one capture request"""
+    sim = SimFrame()
+    app = SimBracketApp(sim, SensorModel.from_scenes([SCENE], seed=seed), scene, seed=seed)
+    rx_batch = RxPhotoBatch(upright=False)
+    batch_queue = await rx_batch.attach(sim)
+
+    await sim.send_message(BRACKET_SETTINGS_MSG, bracket.pack())
+    sim.reset_stats()
+    await sim.send_message(0x0d, capture_settings.pack())
+    batch = await batch_queue.get()
+
+    rx_batch.detach(sim)
+    return sim, app, [photo['jpeg'] for photo in batch]
+
+def merge_benchmark(jpegs, exposures, repeats: int = 5):
+    """Per-burst merge times: serially, in a thread pool, and OpenCV's exposure fusion for reference"""
+    def best(run):
+        times = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            output = run()
+            times.append(time.perf_counter() - start)
+        return min(times), output
+
+    def serial():
+        images = np.stack([decode(jpeg) for jpeg in jpegs])
+        weights = np.stack([fusion_weights(image) for image in images])
+        return fuse_exposures(images, weights), tone_map(merge_radiance(images, exposures))
+
+    rows = [('serial', *best(serial))]
+    with ThreadPoolExecutor(max_workers=len(jpegs)) as pool:
+        seconds, result = best(lambda: process_burst(jpegs, exposures, pool=pool, bands=len(jpegs)))
+        rows.append((f'thread pool ({len(jpegs)} workers)', seconds, (result['fused'], result['hdr'])))
+
+    fused = rows[0][2][0]
+    print(f"{'merge per burst':<28} {'fusion + HDR':>13}")
+    for name, seconds, _ in rows:
+        print(f"{name:<28} {seconds * 1000:11.1f}ms")
+    if not all(np.allclose(output[0], fused, atol=1e-5) and np.allclose(output[1], rows[0][2][1], atol=1e-5) for _, _, output in rows):
+        print("merged images differ between serial and pooled runs")
+
+    if cv2 is not None:
+        stack = [cv2.imdecode(np.frombuffer(jpeg, np.uint8), cv2.IMREAD_COLOR) for jpeg in jpegs]
+        # OpenCV leaves the well-exposedness weight out by default
+        merge = cv2.createMergeMertens(contrast_weight=1.0, saturation_weight=1.0, exposure_weight=1.0)
+        seconds, reference = best(lambda: merge.process(stack))
+        reference = np.clip(reference[..., ::-1], 0.0, 1.0)
+        print(f"{'cv2 MergeMertens (fusion)':<28} {seconds * 1000:11.1f}ms   "
+              f"mean difference from ours {np.abs(reference - fused).mean() * 255:.1f} levels")
+    print(f"(on {len(jpegs)} {fused.shape[0]}x{fused.shape[1]} photos, {os.cpu_count()} CPUs)")
+
+async def main():
+    """
+    Compare taking an exposure bracket one photo at a time from the host with a burst queued on Frame, with a
+    fixed and a metering-gated settle, over the simulated BLE link; then time the host-side merge.
+    Optionally pass image files to use as the camera's view, otherwise images/koala.jpg is used.
+    """
+    parser = argparse.ArgumentParser(description="Exposure brackets from the host against bursts queued on Frame")
+    parser.add_argument('images', nargs='*', default=["images/koala.jpg"],
+                        help="image files to use as the camera's view (default: images/koala.jpg)")
+    scene = load_scene(parser.parse_args().images)
+    capture_settings = TxCaptureSettings(resolution=512, quality_index=3)
+    base = base_exposure(SensorModel.from_scenes([SCENE]))
+
+    print(f"'{SCENE}' scene, {capture_settings.resolution}px photos, link {SimFrame().link_bytes_per_sec:.0f} bytes/s\n")
+    print(f"{'photos':>6} {'mode':<24} {'capture span':>13} {'on host':>8} {'merged':>8} {'wrong exposure':>15}")
+
+    for stops in ((-2.0, 0.0, 2.0), (-4.0, -2.0, 0.0, 2.0, 4.0)):
+        modes = (
+            ('one at a time (200ms)', one_at_a_time, TxBracketSettings.around(base, stops)),
+            ('burst, fixed 50ms', burst, TxBracketSettings.around(base, stops, gated=False, max_settle=0.05)),
+            ('burst, fixed 200ms', burst, TxBracketSettings.around(base, stops, gated=False)),
+            ('burst, metering gated', burst, TxBracketSettings.around(base, stops)),
+        )
+        for name, run, bracket in modes:
+            sim, app, jpegs = await run(scene, bracket, capture_settings)
+            # capture span: from the first exposure to the last, which is what moves between the photos
+            span = app.captured[-1][0] - app.captured[0][0]
+            result = process_burst(jpegs, bracket.relative_exposures())
+            merge_time = result['decode_time'] + result['merge_time']
+            print(f"{len(stops):>6} {name:<24} {span:12.2f}s {sim.clock:7.2f}s {sim.clock + merge_time:7.2f}s "
+                  f"{wrong_exposures(app, bracket):>10} of {len(stops)}")
+
+    print()
+    _, _, jpegs = await burst(scene, TxBracketSettings.around(base), TxCaptureSettings(resolution=720, quality_index=3))
+    merge_benchmark(jpegs, TxBracketSettings.around(base).relative_exposures())
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,76 @@
+from dataclasses import dataclass
+import struct
+from typing import Optional, Sequence
+
+# Host to Frame flags handled by lua/gated_camera_frame_app.lua (answered with RxMeteringData's 0x12)
+CAPTURE_GATE_SETTINGS_MSG = 0x23
+METERING_QUERY_MSG = 0x12
+
+@dataclass
+class TxCaptureGateSettings:
+    """
+    Message for the capture gate (lua/capture_gate.lua) in lua/gated_camera_frame_app.lua.
+
+    While enabled, a TxCaptureSettings message starts a gated feed instead of taking one photo: Frame compares
+    its metering with the metering of the last photo it sent every 100ms, and captures and sends a photo with
+    those capture settings only when a value has moved beyond its threshold or max_interval has passed.
+    Disabling the gate stops the feed.
+
+    Attributes:
+        enabled: Whether capture settings start a gated feed (False takes single photos on request, as before)
+        spot_threshold: Change of a spot r/g/b metering value (0-255) that counts as a new scene
+        matrix_threshold: Change of a matrix r/g/b metering value (0-255) that counts as a new scene
+        max_interval: Longest time between photos in seconds, changed or not (0.1-6553.5, in steps of 0.1)
+    """
+    enabled: bool = True
+    spot_threshold: int = 8
+    matrix_threshold: int = 4
+    max_interval: float = 5.0
+
+    def pack(self) -> bytes:
+        """Pack the settings into 5 bytes."""
+        return struct.pack('>BBBH',
+            0x01 if self.enabled else 0x00,
+            self.spot_threshold & 0xFF,
+            self.matrix_threshold & 0xFF,
+            int(round(self.max_interval * 10)) & 0xFFFF,
+        )
+
+class CaptureGate:
+    """
+    The capture decision of lua/capture_gate.lua: whether the metering has moved since the last photo.
+    Hostside, it gates photo requests on metering queries; the simulated Frame uses it as the on-device gate.
+    """
+    def __init__(self, settings: Optional[TxCaptureGateSettings] = None):
+        self.set_settings(settings or TxCaptureGateSettings())
+
+    def set_settings(self, settings: TxCaptureGateSettings):
+        self.set_settings_from_bytes(settings.pack())
+
+    def set_settings_from_bytes(self, payload: bytes):
+        """Apply a TxCaptureGateSettings message as Frame parses it"""
+        enabled, self.spot_threshold, self.matrix_threshold, max_interval = struct.unpack('>BBBH', payload[0:5])
+        self.enabled = enabled > 0
+        self.max_interval = max_interval / 10.0
+        self.reference = None
+        self.reference_time = 0.0
+
+    def changed(self, metering: Sequence[int], now: float) -> bool:
+        """
+        Whether to take a photo: the first time, after max_interval, or when any of the 6 metering values
+        (spot r,g,b, matrix r,g,b) differs from the metering of the last photo by more than its threshold.
+        A photo taken makes this metering the new reference.
+        """
+        changed = self.reference is None or now - self.reference_time >= self.max_interval
+        if not changed:
+            thresholds = (self.spot_threshold,) * 3 + (self.matrix_threshold,) * 3
+            changed = any(abs(int(new) - int(old)) > threshold
+                          for new, old, threshold in zip(metering, self.reference, thresholds))
+        if changed:
+            self.reference = tuple(int(v) for v in metering)
+            self.reference_time = now
+        return changed
+
+def metering_values(metering_data: dict) -> tuple:
+    """The 6 values of an RxMeteringData result in metering order"""
+    return tuple(metering_data[key] for key in ('spot_r', 'spot_g', 'spot_b', 'matrix_r', 'matrix_g', 'matrix_b'))
@@ -0,0 +1,208 @@
+import argparse
+import asyncio
+import io
+import os
+from typing import Optional
+
+import numpy as np
+from PIL import Image
+
+from capture_gate import (CAPTURE_GATE_SETTINGS_MSG, METERING_QUERY_MSG, CaptureGate, TxCaptureGateSettings,
+                          metering_values)
+from recorder import read_avi_frames
+from sim_frame import SimFrame, SimGatedCameraApp
+from frame_msg import RxMeteringData, RxPhoto, TxCaptureSettings, TxCode
+
+try:
+    from lupa import lua54
+except ImportError:
+    lua54 = None
+
+class Session:
+    """
+    The camera's view over a session, in frame slots: the frames of a recording made by
+    live-camera-feed-with-options.py, or a synthetic minute made from one image (still, a pan, still, the light
+    dimming, someone walking past)
+    """
+    def __init__(self, duration: float, fps: float, frame_at):
+        self.duration = duration
+        self.fps = fps
+        self._frame_at = frame_at
+        self._cache = {}
+
+    @classmethod
+    def recorded(cls, path: str) -> 'Session':
+        fps, frames = read_avi_frames(path)
+        return cls(len(frames) / fps, fps,
+                   lambda slot: Image.open(io.BytesIO(frames[min(slot, len(frames) - 1)])).convert('RGB'))
+
+    @classmethod
+    def synthetic(cls, path: str = "images/koala.jpg", duration: float = 60.0, fps: float = 10.0) -> 'Session':
+        source = np.asarray(Image.open(path).convert('RGB'), dtype=np.float32)
+        side = min(source.shape[0], source.shape[1]) * 4 // 5
+        pan = source.shape[1] - side
+
+        def frame_at(slot: int) -> Image.Image:
+            t = slot / fps
+            x = int(np.interp(t, [15, 25], [0, pan]))
+            view = source[:side, x:x + side] * np.interp(t, [38, 40], [1.0, 0.45])
+            if 50 <= t < 53:
+                # a dark figure crossing the view
+                left = int((t - 50) / 3 * (side + side // 4)) - side // 4
+                view = view.copy()
+                view[side // 5:, max(0, left):max(0, left + side // 4)] *= 0.2
+            return Image.fromarray(np.clip(view, 0, 255).astype(np.uint8))
+
+        return cls(duration, fps, frame_at)
+
+    def view(self, t: float, size: int) -> Image.Image:
+        """The view at time t, at size x size pixels"""
+        key = (int(t * self.fps), size)
+        if key not in self._cache:
+            if len(self._cache) > 64:
+                self._cache.clear()
+            self._cache[key] = self._frame_at(key[0]).resize((size, size))
+        return self._cache[key]
+
+    def thumbnail(self, t: float) -> np.ndarray:
+        return np.asarray(self.view(t, 32).convert('L'), dtype=np.float32)
+
+def staleness(session: Session, captured: list, arrived: list) -> np.ndarray:
+    """
+    For every frame slot of the session once the first photo has arrived, how far the photo on show differs from
+    the view at that moment (mean absolute difference of 32x32 grey thumbnails, in 8-bit levels)
+    """
+    errors = []
+    for t in np.arange(0, session.duration, 1.0 / session.fps):
+        shown = [c for c, a in zip(captured, arrived) if a <= t]
+        if shown:
+            errors.append(np.abs(session.thumbnail(t) - session.thumbnail(shown[-1])).mean())
+    return np.array(errors)
+
+def check_lua_gate(settings: TxCaptureGateSettings, steps: int = 600, seed: int = 0) -> int:
+    """
+    Run lua/capture_gate.lua and CaptureGate on the same metering (a random walk with jumps) and times,
+    and count the decisions that differ
+    """
+    with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'lua', 'capture_gate.lua')) as f:
+        gate_source = f.read()
+
+    lua = lua54.LuaRuntime(encoding=None)
+    now = [0.0]
+    metering = [b'']
+    lua.execute("frame = { time = {} }")
+    lua.globals().frame[b'time'][b'utc'] = lambda: now[0]
+    lua.globals().frame[b'fpga_read'] = lambda register, length: metering[0]
+    module = lua.execute(gate_source)
+    module.set_settings(module.parse_settings(settings.pack()))
+
+    gate = CaptureGate(settings)
+    rng = np.random.default_rng(seed)
+    values = np.full(6, 128.0)
+    mismatches = 0
+    for i in range(steps):
+        now[0] = i * 0.1
+        values = np.clip(values + rng.normal(0, 2, 6) + (rng.random() < 0.02) * rng.normal(0, 30, 6), 0, 255)
+        metering[0] = bytes(values.astype(np.uint8))
+        mismatches += module.changed() != gate.changed(metering[0], now[0])
+    return mismatches
+
+async def run(session: Session, mode: str, capture_settings: TxCaptureSettings,
+              gate_settings: Optional[TxCaptureGateSettings] = None) -> dict:
+    """
+    Run a live feed over the session the way live-camera-feed-with-options.py does, in one of three modes:
+    'every frame' requests a photo, waits for it and sleeps 100ms, over and over;
+    'host gate' queries the metering instead and only requests a photo when CaptureGate says it changed;
+    'frame gate' enables the capture gate on Frame, which sends photos by itself when the metering changes
+    """
+    sim = SimFrame()
+    app = SimGatedCameraApp(sim, session.view)
+    rx_photo = RxPhoto(upright=False)
+    photo_queue = await rx_photo.attach(sim)
+    rx_metering = RxMeteringData()
+    metering_queue = await rx_metering.attach(sim)
+    gate = CaptureGate(gate_settings)
+
+    arrived = []
+    if mode == 'frame gate':
+        await sim.send_message(CAPTURE_GATE_SETTINGS_MSG, (gate_settings or TxCaptureGateSettings()).pack())
+        await sim.send_message(0x0d, capture_settings.pack())
+        app.start()
+        while sim.time_utc() < session.duration:
+            while not photo_queue.empty():
+                photo_queue.get_nowait()
+                arrived.append(sim.time_utc())
+            await asyncio.sleep(0)
+        app.running = False
+    else:
+        while sim.time_utc() < session.duration:
+            if mode == 'host gate':
+                await sim.send_message(METERING_QUERY_MSG, TxCode().pack())
+                metering = metering_values(await metering_queue.get())
+                take_photo = gate.changed(metering, sim.time_utc())
+            else:
+                take_photo = True
+
+            if take_photo:
+                await sim.send_message(0x0d, capture_settings.pack())
+                await photo_queue.get()
+                arrived.append(sim.time_utc())
+
+            # the host's asyncio.sleep(0.1) between iterations, on the simulated clock
+            await sim.sleep(0.1)
+
+    rx_photo.detach(sim)
+    rx_metering.detach(sim)
+    captured = app.captured[:len(arrived)]
+    errors = staleness(session, captured, arrived)
+    return {
+        'photos': len(arrived),
+        'bytes_to_host': sim.bytes_to_host,
+        'bytes_to_frame': sim.bytes_to_frame,
+        'airtime': sim.airtime,
+        'clock': sim.clock,
+        'staleness_mean': errors.mean(),
+        'staleness_p95': np.percentile(errors, 95),
+    }
+
+async def main():
+    """
+    Compare a live feed that requests a photo every time with feeds gated on the metering, from the host and on
+    Frame, over a session: a recording from live-camera-feed-with-options.py if one is given
+    (python capture_gate_report.py recording.avi), otherwise a synthetic minute made from images/koala.jpg.
+    Reports the photos sent, link bytes and radio airtime (what costs battery) and how stale the photo on show was.
+    """
+    parser = argparse.ArgumentParser(description="Photos, link bytes and radio time with and without capture gating")
+    parser.add_argument('recording', nargs='?',
+                        help="AVI recording from live-camera-feed-with-options.py (default: a synthetic minute)")
+    recording = parser.parse_args().recording
+    session = Session.recorded(recording) if recording else Session.synthetic()
+    capture_settings = TxCaptureSettings(resolution=256, quality_index=0)
+
+    runs = [
+        ('every frame', 'every frame', None),
+        ('host gate', 'host gate', TxCaptureGateSettings()),
+        ('frame gate', 'frame gate', TxCaptureGateSettings()),
+        ('frame gate, thresholds 4/2', 'frame gate', TxCaptureGateSettings(spot_threshold=4, matrix_threshold=2)),
+        ('frame gate, thresholds 16/8', 'frame gate', TxCaptureGateSettings(spot_threshold=16, matrix_threshold=8)),
+    ]
+    if lua54 is not None:
+        mismatches = sum(check_lua_gate(gate_settings) for _, mode, gate_settings in runs if mode == 'frame gate')
+        print(f"lua/capture_gate.lua vs CaptureGate: {mismatches} differing decisions\n")
+
+    print(f"{session.duration:.0f}s session, {capture_settings.resolution}px photos, "
+          f"link {SimFrame().link_bytes_per_sec:.0f} bytes/s\n")
+    print(f"{'mode':<28} {'photos':>6} {'to host':>9} {'to Frame':>9} {'airtime':>8} {'saved':>6} "
+          f"{'staleness mean / p95':>21}")
+    baseline = None
+    for name, mode, gate_settings in runs:
+        stats = await run(session, mode, capture_settings, gate_settings)
+        # airtime per second of session, so runs that overshoot the end by a photo compare fairly
+        airtime = stats['airtime'] / stats['clock']
+        baseline = baseline or airtime
+        print(f"{name:<28} {stats['photos']:6d} {stats['bytes_to_host']:9d} {stats['bytes_to_frame']:9d} "
+              f"{airtime:7.1%} {1 - airtime / baseline:6.0%} "
+              f"{stats['staleness_mean']:9.1f} / {stats['staleness_p95']:5.1f} lvl")
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,162 @@
+from dataclasses import dataclass
+from typing import List, Optional, Sequence, Tuple
+
+from frame_msg import TxCaptureSettings
+
+# Capture settings from cheapest to dearest, as (resolution, quality_index, typical JPEG bytes of a detailed
+# scene); resolution goes up at medium quality first, and quality only once the resolution is at its maximum
+LADDER: Tuple[Tuple[int, int, int], ...] = (
+    (256, 0, 4500),
+    (256, 1, 8200),
+    (320, 1, 12200),
+    (384, 1, 17300),
+    (384, 2, 27000),
+    (448, 2, 36000),
+    (512, 2, 46000),
+    (576, 2, 56500),
+    (640, 2, 70000),
+    (720, 2, 81500),
+    (720, 3, 119000),
+    (720, 4, 192000),
+)
+
+@dataclass
+class RateDecision:
+    """A change of capture settings made by CaptureRateController, and what it was based on"""
+    time: float
+    old: Tuple[int, int]
+    new: Tuple[int, int]
+    elapsed: float
+    throughput: float
+    reason: str
+
+    def __str__(self) -> str:
+        return (f"{self.time:7.1f}s  {self.old[0]}px q{self.old[1]} -> {self.new[0]}px q{self.new[1]}  "
+                f"(last photo {self.elapsed:.2f}s, link {self.throughput:.0f} B/s: {self.reason})")
+
+class CaptureRateController:
+    """
+    Chooses the resolution and quality_index of each photo from the link throughput measured on the photos
+    before it, so that a photo arrives within a time budget: as good a photo as the link allows rather than
+    a fixed choice that either wastes frame rate on a slow link or quality on a fast one.
+
+    Each received photo gives a throughput sample (its bytes over its transfer time, less a fixed overhead for
+    the request and the capture), and its size against the typical size for its settings gives the scene's
+    complexity; both are smoothed, throughput drops faster than rises. Settings step down (as far as needed) as
+    soon as the predicted time of the current settings exceeds the budget, and step up one rung at a time only
+    when the next rung would fit in headroom x budget and the current settings have been held for a number of
+    photos. That number doubles (up to max_hold) whenever a step up has to be undone within it, so that a link
+    that keeps dropping out doesn't make the settings flap, and returns to `hold` once a rung has lasted
+    max_hold photos. Every change is recorded in `decisions`.
+    """
+    def __init__(
+        self,
+        budget: float = 1.0,
+        ladder: Sequence[Tuple[int, int, int]] = LADDER,
+        start: int = 0,
+        overhead: float = 0.15,
+        headroom: float = 0.8,
+        hold: int = 3,
+        max_hold: int = 48,
+        smoothing: float = 0.3,
+        drop_smoothing: float = 0.7,
+        quiet: bool = True,
+    ):
+        """
+        Args:
+            budget: Longest time in seconds from a photo request to the whole photo arriving
+            ladder: (resolution, quality_index, typical bytes) from cheapest to dearest
+            start: Index into the ladder of the settings to start with
+            overhead: Seconds of each request that don't depend on the photo size (latency and capture time)
+            headroom: Fraction of the budget the next rung up has to fit in before stepping up
+            hold: Photos to take with new settings before stepping up again
+            max_hold: Longest hold after steps up that had to be undone
+            smoothing: Weight of each new sample in the throughput and scene complexity estimates
+            drop_smoothing: Weight of a throughput sample below the estimate
+            quiet: Don't print decisions as they are made
+        """
+        self.budget = budget
+        self.ladder = list(ladder)
+        self.rung = start
+        self.overhead = overhead
+        self.headroom = headroom
+        self.hold = hold
+        self.max_hold = max_hold
+        self.smoothing = smoothing
+        self.drop_smoothing = drop_smoothing
+        self.quiet = quiet
+
+        self.throughput: Optional[float] = None
+        self.complexity = 1.0
+        self.held = 0
+        self.up_hold = hold
+        self.stepped_up = False
+        self.decisions: List[RateDecision] = []
+
+    @classmethod
+    def for_frame_rate(cls, fps: float, loop_delay: float = 0.1, **kwargs) -> 'CaptureRateController':
+        """A controller for a capture loop that waits loop_delay seconds after each photo and should run at fps"""
+        return cls(budget=max(1.0 / fps - loop_delay, 0.01), **kwargs)
+
+    @property
+    def settings(self) -> TxCaptureSettings:
+        """The capture settings for the next photo"""
+        resolution, quality_index, _ = self.ladder[self.rung]
+        return TxCaptureSettings(resolution=resolution, quality_index=quality_index)
+
+    def predicted_time(self, rung: int) -> float:
+        """Seconds a photo with the settings of the rung is expected to take, with the current estimates"""
+        if self.throughput is None:
+            return self.overhead
+        return self.overhead + self.ladder[rung][2] * self.complexity / self.throughput
+
+    def update(self, num_bytes: int, elapsed: float, now: float = 0.0) -> TxCaptureSettings:
+        """
+        Account for a photo taken with the current settings and choose the settings of the next one.
+
+        Args:
+            num_bytes: Size of the JPEG received
+            elapsed: Seconds from sending the capture request until the whole photo had arrived
+            now: Time of arrival (only used in the decision log)
+
+        Returns:
+            The capture settings for the next photo
+        """
+        # a photo that arrived faster than the overhead can't say much about the link, so limit its weight
+        sample = num_bytes / max(elapsed - self.overhead, self.overhead / 4)
+        complexity = num_bytes / self.ladder[self.rung][2]
+        if self.throughput is None:
+            self.throughput = sample
+            self.complexity = complexity
+        else:
+            weight = self.drop_smoothing if sample < self.throughput else self.smoothing
+            self.throughput += weight * (sample - self.throughput)
+            self.complexity += self.smoothing * (complexity - self.complexity)
+        self.held += 1
+
+        if self.held >= self.max_hold:
+            self.up_hold = self.hold
+
+        old = self.rung
+        if self.predicted_time(self.rung) > self.budget and self.rung > 0:
+            while self.rung > 0 and self.predicted_time(self.rung) > self.budget:
+                self.rung -= 1
+            reason = f"predicted {self.predicted_time(old):.2f}s over the {self.budget:.2f}s budget"
+            if self.stepped_up and self.held < self.up_hold:
+                # the last step up didn't last: wait longer before the next one
+                self.up_hold = min(2 * self.up_hold, self.max_hold)
+                reason += f", next step up after {self.up_hold} photos"
+        elif (self.held >= self.up_hold and self.rung + 1 < len(self.ladder)
+              and self.predicted_time(self.rung + 1) <= self.headroom * self.budget):
+            self.rung += 1
+            reason = f"predicted {self.predicted_time(self.rung):.2f}s for the next rung fits"
+
+        if self.rung != old:
+            decision = RateDecision(now, self.ladder[old][:2], self.ladder[self.rung][:2], elapsed, self.throughput, reason)
+            self.decisions.append(decision)
+            self.stepped_up = self.rung > old
+            self.held = 0
+            if not self.quiet:
+                print(decision)
+
+        return self.settings
@@ -0,0 +1,96 @@
+import asyncio
+from typing import Optional
+
+import numpy as np
+
+from capture_rate import LADDER, CaptureRateController
+from sim_frame import SimFrame, SimCameraApp, load_scene
+from frame_msg import RxPhoto, TxCaptureSettings
+
+# link throughput (bytes/s) over the session: close to the phone, walking away, back, then interference
+PROFILE_TIMES = [0, 30, 45, 75, 90, 150]
+PROFILE_RATES = [30000, 30000, 8000, 8000, 30000, 30000]
+PHASES = [(0, 30, 'near'), (30, 45, 'walking away'), (45, 75, 'far'), (75, 90, 'coming back'),
+          (90, 120, 'interference'), (120, 150, 'near again')]
+
+def bandwidth(t: float) -> float:
+    rate = float(np.interp(t, PROFILE_TIMES, PROFILE_RATES))
+    if 90 <= t < 120 and int(t / 5) % 2:
+        # a busy 2.4GHz band every other 5 seconds
+        rate *= 0.25
+    return rate
+
+async def live_feed(scene, settings: Optional[TxCaptureSettings], budget: float, duration: float = 150.0) -> dict:
+    """
+    Run the capture loop of live-camera-feed.py (request a photo, wait for it, sleep 100ms) over the varying
+    link, with fixed settings or, if settings is None, with a CaptureRateController choosing them
+    """
+    sim = SimFrame(link_bytes_per_sec=bandwidth)
+    SimCameraApp(sim, scene)
+    rx_photo = RxPhoto(upright=False)
+    photo_queue = await rx_photo.attach(sim)
+    controller = CaptureRateController(budget=budget) if settings is None else None
+
+    photos = []
+    while sim.time_utc() < duration:
+        capture_settings = controller.settings if controller else settings
+        start = sim.time_utc()
+        await sim.send_message(0x0d, capture_settings.pack())
+        jpeg_bytes = await photo_queue.get()
+        elapsed = sim.time_utc() - start
+        photos.append((start, elapsed, len(jpeg_bytes), capture_settings.resolution, capture_settings.quality_index))
+        if controller:
+            controller.update(len(jpeg_bytes), elapsed, sim.time_utc())
+        await sim.sleep(0.1)
+
+    rx_photo.detach(sim)
+    return {
+        'photos': np.array(photos),
+        'duration': sim.time_utc(),
+        'decisions': controller.decisions if controller else [],
+    }
+
+def summary(photos: np.ndarray, duration: float, budget: float) -> str:
+    elapsed = photos[:, 1]
+    return (f"{len(photos):6d} {len(photos) / duration:6.2f} {elapsed.mean():7.2f}s {np.percentile(elapsed, 95):7.2f}s "
+            f"{(elapsed > budget).mean():6.0%} {photos[:, 3].mean():6.0f}px {photos[:, 4].mean():4.1f} "
+            f"{photos[:, 2].mean() / 1000:7.1f}kB")
+
+async def main():
+    """
+    Validate CaptureRateController on the simulated link with a throughput that varies over a 150s session
+    (30kB/s near the phone down to 8kB/s far from it, and a quarter of that in bursts of interference),
+    against the fixed capture settings the examples use.
+    Reports photos per second, request to photo latency (mean, 95th percentile, share over the budget) and the
+    resolution, quality index and size of the photos, then the adaptive run per phase and its decision log.
+    """
+    scene = load_scene(["images/koala.jpg"])
+    budget = 1.0
+
+    print(f"Latency budget {budget:.1f}s per photo, link {min(PROFILE_RATES) / 4000:.0f}-{max(PROFILE_RATES) / 1000:.0f}kB/s\n")
+    header = f"{'photos':>6} {'per s':>6} {'latency':>8} {'p95':>8} {'over':>6} {'res':>8} {'q':>4} {'size':>9}"
+    print(f"{'settings':<24} {header}")
+
+    runs = [
+        ('fixed 720px q4', TxCaptureSettings(resolution=720)),
+        ('fixed 512px q0', TxCaptureSettings(resolution=512, quality_index=0)),
+        ('fixed 256px q4', TxCaptureSettings(resolution=256)),
+        ('fixed 256px q0', TxCaptureSettings(resolution=256, quality_index=0)),
+        ('adaptive', None),
+    ]
+    for name, settings in runs:
+        result = await live_feed(scene, settings, budget)
+        print(f"{name:<24} {summary(result['photos'], result['duration'], budget)}")
+
+    print(f"\nadaptive, by phase\n{'phase':<24} {header}")
+    photos = result['photos']
+    for start, end, phase in PHASES:
+        in_phase = photos[(photos[:, 0] >= start) & (photos[:, 0] < end)]
+        print(f"{phase:<24} {summary(in_phase, end - start, budget)}")
+
+    print(f"\n{len(result['decisions'])} decisions over {len(LADDER)} rungs:")
+    for decision in result['decisions']:
+        print(decision)
+
+if __name__ == "__main__":
+    asyncio.run(main())
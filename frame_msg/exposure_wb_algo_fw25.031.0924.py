@@ -4,6 +4,8 @@ import io
 
 from frame_msg import FrameMsg, RxPhoto, RxMeteringData, TxCode, TxManualExpSettings, TxCaptureSettings
 
+from ae_history import print_debug
+
 def camera_auto_exposure_algo(
     # Metering data (6 uint8 values: spot_r/g/b, matrix_r/g/b)
     metering_data,
@@ -23,6 +25,8 @@ def camera_auto_exposure_algo(
     white_balance_min_activation=50,
     white_balance_max_activation=200,
 
+    # Optional debug hook called with each stage's intermediate values, e.g. ae_history.print_debug
+    debug=None,
 ):
     """
     Auto-adjusts camera exposure and white balance based on scene metrics.
@@ -38,6 +42,7 @@ def camera_auto_exposure_algo(
         brightness_constant: Constant for brightness calculation
         white_balance_min_activation: Minimum brightness for white balance
         white_balance_max_activation: Maximum brightness for white balance
+        debug: Optional callable, debug(stage, **values), for the intermediate values (not evaluated when None)
         last_state: Previous state of the camera settings
 
     Returns:
@@ -139,7 +144,8 @@ def camera_auto_exposure_algo(
     last_red_gain = max(last_red_gain, 0.001)
     last_green_gain = max(last_green_gain, 0.001)
     last_blue_gain = max(last_blue_gain, 0.001)
-    print(f'last_red_gain: {last_red_gain} / last_green_gain: {last_green_gain} / last_blue_gain: {last_blue_gain}')
+    if debug:
+        debug('last gains', last_red_gain=last_red_gain, last_green_gain=last_green_gain, last_blue_gain=last_blue_gain)
 
     # Auto white balance based on full scene matrix
     # Find the channel with the highest normalized value
@@ -147,23 +153,27 @@ def camera_auto_exposure_algo(
     normalized_g = matrix_g / last_green_gain
     normalized_b = matrix_b / last_blue_gain
     max_rgb = max(normalized_r, normalized_g, normalized_b)
-    print(f'normalized_r: {normalized_r} / normalized_g: {normalized_g} / normalized_b: {normalized_b} / max_rgb: {max_rgb}')
+    if debug:
+        debug('normalized', normalized_r=normalized_r, normalized_g=normalized_g, normalized_b=normalized_b, max_rgb=max_rgb)
 
     # Calculate the gains needed to match all channels to max_rgb
     red_gain = max_rgb / matrix_r * last_red_gain
     green_gain = max_rgb / matrix_g * last_green_gain
     blue_gain = max_rgb / matrix_b * last_blue_gain
-    print(f'red_gain: {red_gain} / green_gain: {green_gain} / blue_gain: {blue_gain}')
+    if debug:
+        debug('target gains', red_gain=red_gain, green_gain=green_gain, blue_gain=blue_gain)
 
     # Calculate scene brightness
     scene_brightness = brightness_constant * matrix_average / (last_shutter * last_analog_gain)
-    print('Scene brightness: ' + str(scene_brightness))
+    if debug:
+        debug('scene brightness', scene_brightness=scene_brightness)
 
     # Calculate blending factor based on scene brightness
     blending_factor = (scene_brightness - white_balance_min_activation) / (
         white_balance_max_activation - white_balance_min_activation
     )
-    print('Blending factor: ' + str(blending_factor))
+    if debug:
+        debug('blending factor', blending_factor=blending_factor)
 
     # Limit gain values to prevent overflow
     red_gain = min(red_gain, 1023.0/256.0)
@@ -177,7 +187,8 @@ def camera_auto_exposure_algo(
     last_red_gain = blending_factor * white_balance_speed * (red_gain - last_red_gain) + last_red_gain
     last_green_gain = blending_factor * white_balance_speed * (green_gain - last_green_gain) + last_green_gain
     last_blue_gain = blending_factor * white_balance_speed * (blue_gain - last_blue_gain) + last_blue_gain
-    print(f'last_red_gain: {last_red_gain} / last_green_gain: {last_green_gain} / last_blue_gain: {last_blue_gain}')
+    if debug:
+        debug('blended gains', last_red_gain=last_red_gain, last_green_gain=last_green_gain, last_blue_gain=last_blue_gain)
 
     # Convert to integer values for hardware
     red_gain_uint16 = int(last_red_gain * 256.0)
@@ -188,7 +199,8 @@ def camera_auto_exposure_algo(
     red_gain_uint16 = min(red_gain_uint16, 1023)
     green_gain_uint16 = min(green_gain_uint16, 1023)
     blue_gain_uint16 = min(blue_gain_uint16, 1023)
-    print(f'red_gain_uint16: {red_gain_uint16} / green_gain_uint16: {green_gain_uint16} / blue_gain_uint16: {blue_gain_uint16}')
+    if debug:
+        debug('gain registers', red_gain_uint16=red_gain_uint16, green_gain_uint16=green_gain_uint16, blue_gain_uint16=blue_gain_uint16)
 
     # Camera registers for white balance will be updated after function returns
 
@@ -247,6 +259,9 @@ async def main():
         # send the std lua files to Frame that our app needs to handle data accumulation and camera
         await frame.upload_stdlua_libs(lib_names=['data', 'camera', 'code'])
 
+        # the on-device exposure/white balance algorithm module the frame app loads (unused unless selected with 0x13)
+        await frame.upload_file("lua/exposure_wb.lua", "exposure_wb.lua")
+
         # Send the main lua application from this project to Frame that will run the app
         # to take a photo and send it back when the TxCaptureSettings messages arrive
         await frame.upload_frame_app(local_filename="lua/exposure_wb_frame_app.lua")
@@ -299,7 +314,8 @@ async def main():
                                                     analog_gain_limit=60,
                                                     white_balance_speed=0.5,
                                                     white_balance_min_activation=50,
-                                                    white_balance_max_activation=200
+                                                    white_balance_max_activation=200,
+                                                    debug=print_debug
                                                     )
 
             print(algo_result)
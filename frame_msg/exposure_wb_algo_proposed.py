@@ -2,7 +2,9 @@ import asyncio
 from PIL import Image
 import io
 
-from frame_msg import FrameMsg, RxPhoto, RxMeteringData, TxCode, TxManualExpSettings, TxCaptureSettings
+from frame_msg import FrameMsg, RxPhoto, RxMeteringData, TxCaptureSettings
+
+from ae_controller import AutoExposureController
 
 def camera_auto_exposure_algo(
     # Metering data (6 uint8 values: spot_r/g/b, matrix_r/g/b)
@@ -24,6 +26,8 @@ def camera_auto_exposure_algo(
     white_balance_min_activation=50,
     white_balance_max_activation=200,
 
+    # Optional debug hook called with each stage's intermediate values, e.g. ae_history.print_debug
+    debug=None,
 ):
     """
     Auto-adjusts camera exposure and white balance based on scene metrics.
@@ -40,6 +44,7 @@ def camera_auto_exposure_algo(
         brightness_constant: Constant for brightness calculation
         white_balance_min_activation: Minimum brightness for white balance
         white_balance_max_activation: Maximum brightness for white balance
+        debug: Optional callable, debug(stage, **values), for the intermediate values (not evaluated when None)
         last_state: Previous state of the camera settings
 
     Returns:
@@ -152,24 +157,28 @@ def camera_auto_exposure_algo(
     normalized_b = matrix_b / last_blue_gain
     # scale normalized RGB values to the gain scale
     max_rgb = 256.0 * max(normalized_r, normalized_g, normalized_b)
-    print(f'normalized_r: {normalized_r} / normalized_g: {normalized_g} / normalized_b: {normalized_b} / max_rgb: {max_rgb}')
+    if debug:
+        debug('normalized', normalized_r=normalized_r, normalized_g=normalized_g, normalized_b=normalized_b, max_rgb=max_rgb)
 
     # Calculate the gains needed to match all channels to max_rgb
     red_gain = max_rgb / matrix_r * last_red_gain
     green_gain = max_rgb / matrix_g * last_green_gain
     blue_gain = max_rgb / matrix_b * last_blue_gain
-    print(f'target red_gain: {red_gain} / green_gain: {green_gain} / blue_gain: {blue_gain}')
-    print(f'last_red_gain: {last_red_gain} / last_green_gain: {last_green_gain} / last_blue_gain: {last_blue_gain}')
+    if debug:
+        debug('target gains', red_gain=red_gain, green_gain=green_gain, blue_gain=blue_gain)
+        debug('last gains', last_red_gain=last_red_gain, last_green_gain=last_green_gain, last_blue_gain=last_blue_gain)
 
     # Calculate scene brightness
     scene_brightness = brightness_constant * (matrix_average / (last_shutter * last_analog_gain))
-    print('Scene brightness: ' + str(scene_brightness))
+    if debug:
+        debug('scene brightness', scene_brightness=scene_brightness)
 
     # Calculate blending factor based on scene brightness
     blending_factor = (scene_brightness - white_balance_min_activation) / (
         white_balance_max_activation - white_balance_min_activation
     )
-    print('Blending factor: ' + str(blending_factor))
+    if debug:
+        debug('blending factor', blending_factor=blending_factor)
 
     # Limit blending factor to valid range
     blending_factor = max(0.0, min(1.0, blending_factor))
@@ -178,17 +187,20 @@ def camera_auto_exposure_algo(
     last_red_gain = blending_factor * white_balance_speed * (red_gain - last_red_gain) + last_red_gain
     last_green_gain = blending_factor * white_balance_speed * (green_gain - last_green_gain) + last_green_gain
     last_blue_gain = blending_factor * white_balance_speed * (blue_gain - last_blue_gain) + last_blue_gain
-    print(f'last_red_gain: {last_red_gain} / last_green_gain: {last_green_gain} / last_blue_gain: {last_blue_gain}')
+    if debug:
+        debug('blended gains', last_red_gain=last_red_gain, last_green_gain=last_green_gain, last_blue_gain=last_blue_gain)
 
     # Scale per-channel gains so the largest channel is at most rgb_gain_limit
     max_rgb_gain = max(last_red_gain, last_green_gain, last_blue_gain)
     if (max_rgb_gain > rgb_gain_limit):
-        print('Scaling gains')
+        if debug:
+            debug('scaling gains')
         scale_factor = rgb_gain_limit / max_rgb_gain
         last_red_gain *= scale_factor
         last_green_gain *= scale_factor
         last_blue_gain *= scale_factor
-        print(f'scaled last_red_gain: {last_red_gain} / last_green_gain: {last_green_gain} / last_blue_gain: {last_blue_gain}')
+        if debug:
+            debug('scaled gains', last_red_gain=last_red_gain, last_green_gain=last_green_gain, last_blue_gain=last_blue_gain)
 
     # Camera registers for white balance will be updated after function returns
 
@@ -247,6 +259,9 @@ async def main():
         # send the std lua files to Frame that our app needs to handle data accumulation and camera
         await frame.upload_stdlua_libs(lib_names=['data', 'camera', 'code'])
 
+        # the on-device exposure/white balance algorithm module the frame app loads (unused unless selected with 0x13)
+        await frame.upload_file("lua/exposure_wb.lua", "exposure_wb.lua")
+
         # Send the main lua application from this project to Frame that will run the app
         # to take a photo and send it back when the TxCaptureSettings messages arrive
         await frame.upload_frame_app(local_filename="lua/exposure_wb_frame_app.lua")
@@ -283,37 +298,19 @@ async def main():
             "blue_gain": 140.8
         }
 
-        for i in range(10):
-            # send the code to trigger the query for the metering values
-            await frame.send_message(0x12, TxCode().pack())
-
-            metering_data = await asyncio.wait_for(metering_data_queue.get(), timeout=10.0)
-            print('Metering: ' + str(metering_data))
-
-            algo_result = camera_auto_exposure_algo(metering_data=metering_data,
-                                                    last_state=last_state,
-                                                    # can emulate previous algorithm
-                                                    # shutter_limit=1600,
-                                                    # analog_gain_limit=60,
-                                                    # rgb_gain_limit=1023,
-                                                    )
-
-            print('Algo Result: ' + str(algo_result))
-            print('Last State: ' + str(last_state))
-
-            # take the default manual exposure settings
-            tx_manual_exp = TxManualExpSettings(manual_shutter=int(algo_result['shutter']),
-                                                manual_analog_gain=int(algo_result['analog_gain']),
-                                                manual_red_gain=int(algo_result['red_gain']),
-                                                manual_green_gain=int(algo_result['green_gain']),
-                                                manual_blue_gain=int(algo_result['blue_gain']),
-                                                )
-
-            # send the manual exposure settings to Frame before taking the photo
-            await frame.send_message(0x0c, tx_manual_exp.pack())
-
-            # NOTE: it takes up to 200ms for manual camera settings to take effect!
-            await asyncio.sleep(0.2)
+        # run the algorithm until the exposure is within tolerance and white balance has settled (at most 10 iterations),
+        # waiting after each new setting only until the metering shows it has taken effect
+        controller = AutoExposureController(frame, metering_data_queue,
+                                            algo=camera_auto_exposure_algo,
+                                            # can emulate previous algorithm
+                                            # shutter_limit=1600,
+                                            # analog_gain_limit=60,
+                                            # rgb_gain_limit=1023,
+                                            )
+        ae_result = await controller.run(last_state)
+        print(f"Auto exposure {'converged' if ae_result['converged'] else 'stopped'} after {ae_result['iterations']} iterations "
+              f"and {ae_result['elapsed']:.2f}s ({ae_result['queries']} metering queries)")
+        print('Last State: ' + str(last_state))
 
         # Request the photo by sending a TxCaptureSettings message
         await frame.send_message(0x0d, TxCaptureSettings(resolution=720).pack())
@@ -0,0 +1,145 @@
+import asyncio
+from dataclasses import dataclass
+import io
+import struct
+
+from PIL import Image
+
+from frame_msg import FrameMsg, RxAutoExpResult, RxPhoto, TxCaptureSettings
+
+# Host to Frame flag for lua/exposure_wb.lua settings in lua/exposure_wb_frame_app.lua
+EXPOSURE_WB_SETTINGS_MSG = 0x13
+
+METERING_MODES = ['SPOT', 'CENTER_WEIGHTED', 'AVERAGE']
+
+@dataclass
+class TxExposureWbSettings:
+    """
+    Message selecting and configuring the proposed exposure/white balance algorithm running on Frame (lua/exposure_wb.lua).
+    The settings are those of camera_auto_exposure_algo in exposure_wb_algo_proposed.py.
+
+    Attributes:
+        enabled: Whether the algorithm runs on Frame (once per settle_time); manual exposure settings also turn it off
+        metering: "SPOT", "CENTER_WEIGHTED" or "AVERAGE"
+        target_exposure: Target exposure level (0.0 to 1.0)
+        exposure_speed: Speed of exposure adjustment (0.0 to 1.0)
+        shutter_limit: Maximum shutter duration (4.0 to 16383.0)
+        analog_gain_limit: Maximum analog gain (1.0 to 248.0)
+        rgb_gain_limit: Maximum per-channel RGB gain (0.0 to 1023.0)
+        white_balance_speed: Speed of white balance adjustment (0.0 to 1.0)
+        brightness_constant: Constant for brightness calculation
+        white_balance_min_activation: Minimum brightness for white balance
+        white_balance_max_activation: Maximum brightness for white balance
+        telemetry_interval: Send the result to the host every this many iterations (0-255, 0 for never)
+        settle_time: Seconds to let new settings take effect before the next iteration (0.0-2.55, in steps of 0.01)
+    """
+    enabled: bool = True
+    metering: str = "AVERAGE"
+    target_exposure: float = 0.18
+    exposure_speed: float = 0.50
+    shutter_limit: float = 3072.0
+    analog_gain_limit: float = 16.0
+    rgb_gain_limit: float = 141.0
+    white_balance_speed: float = 0.5
+    brightness_constant: float = 4166400.0
+    white_balance_min_activation: float = 50.0
+    white_balance_max_activation: float = 200.0
+    telemetry_interval: int = 10
+    settle_time: float = 0.2
+
+    def _floats(self):
+        return (self.target_exposure, self.exposure_speed, self.shutter_limit, self.analog_gain_limit,
+                self.rgb_gain_limit, self.white_balance_speed, self.brightness_constant,
+                self.white_balance_min_activation, self.white_balance_max_activation)
+
+    def pack(self) -> bytes:
+        """Pack the settings into 40 bytes (floats as little-endian float32)."""
+        return struct.pack('<BB9fBB',
+            0x01 if self.enabled else 0x00,
+            METERING_MODES.index(self.metering),
+            *self._floats(),
+            self.telemetry_interval & 0xFF,
+            int(round(self.settle_time * 100)) & 0xFF
+        )
+
+    def algo_params(self) -> dict:
+        """
+        Keyword arguments for camera_auto_exposure_algo with the values exactly as Frame receives them
+        (rounded to float32), so the Python reference produces the same results as Frame
+        """
+        names = ['target_exposure', 'exposure_speed', 'shutter_limit', 'analog_gain_limit', 'rgb_gain_limit',
+                 'white_balance_speed', 'brightness_constant', 'white_balance_min_activation', 'white_balance_max_activation']
+        values = struct.unpack('<9f', struct.pack('<9f', *self._floats()))
+        return dict(zip(names, values), metering=self.metering)
+
+
+async def main():
+    """
+    Run the proposed auto exposure and white balance algorithm on Frame itself, watch its periodic results,
+    then take a photo
+    """
+    frame = FrameMsg()
+    try:
+        await frame.connect()
+
+        # Let the user know we're starting
+        await frame.print_short_text('Loading...')
+
+        # send the std lua files to Frame that our app needs to handle data accumulation and camera
+        await frame.upload_stdlua_libs(lib_names=['data', 'camera', 'code'])
+
+        # the on-device exposure/white balance algorithm module
+        await frame.upload_file("lua/exposure_wb.lua", "exposure_wb.lua")
+
+        # Send the main lua application from this project to Frame that will run the app
+        await frame.upload_frame_app(local_filename="lua/exposure_wb_frame_app.lua")
+
+        # attach the print response handler so we can see stdout from Frame Lua print() statements
+        frame.attach_print_response_handler()
+
+        # "require" the main frame_app lua file to run it, and block until it has started.
+        await frame.start_frame_app()
+
+        # hook up the receivers for the periodic algorithm results and the photo
+        rx_autoexp_result = RxAutoExpResult()
+        autoexp_result_queue = await rx_autoexp_result.attach(frame)
+        rx_photo = RxPhoto()
+        photo_queue = await rx_photo.attach(frame)
+
+        # start the algorithm on Frame with a result every 5 iterations (about a second)
+        await frame.send_message(EXPOSURE_WB_SETTINGS_MSG, TxExposureWbSettings(telemetry_interval=5).pack())
+
+        for i in range(6):
+            result = await asyncio.wait_for(autoexp_result_queue.get(), timeout=10.0)
+            print(f"shutter: {result['shutter']:.0f}, analog gain: {result['analog_gain']:.1f}, "
+                  f"rgb gains: {result['red_gain']:.0f}/{result['green_gain']:.0f}/{result['blue_gain']:.0f}, "
+                  f"matrix average: {result['brightness']['matrix']['average']:.3f}")
+
+        # Request the photo by sending a TxCaptureSettings message
+        await frame.send_message(0x0d, TxCaptureSettings(resolution=720).pack())
+
+        # get the jpeg bytes as soon as they're ready
+        jpeg_bytes = await asyncio.wait_for(photo_queue.get(), timeout=10.0)
+
+        # display the image in the system viewer
+        image = Image.open(io.BytesIO(jpeg_bytes))
+        image.show()
+
+        # stop the receivers and clean up their resources
+        rx_photo.detach(frame)
+        rx_autoexp_result.detach(frame)
+
+        # unhook the print handler
+        frame.detach_print_response_handler()
+
+        # break out of the frame app loop and reboot Frame
+        await frame.stop_frame_app()
+
+    except Exception as e:
+        print(f"An error occurred: {e}")
+    finally:
+        # clean disconnection
+        await frame.disconnect()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,161 @@
+import asyncio
+import os
+import sys
+
+import numpy as np
+
+from auto_exposure_batch import INITIAL_STATE, METERING_KEYS, load_algo, random_traces
+from exposure_wb_device import METERING_MODES, TxExposureWbSettings
+from sensor_model import SCENES, SensorModel
+
+try:
+    from lupa import lua54
+except ImportError:
+    lua54 = None
+
+RESULT_KEYS = ['error', 'shutter', 'analog_gain', 'red_gain', 'green_gain', 'blue_gain']
+
+# metering average within this fraction of the target counts as converged
+TOLERANCE = 0.1
+
+def load_module(source: str, frame_setup: str = "frame = {}"):
+    """Run lua/exposure_wb.lua in a fresh Lua 5.4 runtime (as Frame does) and return the runtime and the module table"""
+    lua = lua54.LuaRuntime(encoding=None)
+    lua.execute(frame_setup)
+    module = lua.execute(source)
+    return lua, module
+
+def lua_result(result) -> dict:
+    values = {key: result[key.encode()] for key in RESULT_KEYS}
+    values['matrix_average'] = result[b'brightness'][b'matrix'][b'average']
+    values['scene'] = result[b'brightness'][b'scene']
+    return values
+
+def python_result(result) -> dict:
+    values = {key: result[key] for key in RESULT_KEYS}
+    values['matrix_average'] = result['brightness']['matrix']['average']
+    values['scene'] = result['brightness']['scene']
+    return values
+
+def check_equivalence(source: str, num_traces: int = 40, steps: int = 50, seed: int = 0) -> int:
+    """
+    Replay metering traces through the Lua module and the Python reference with random settings
+    (sent through the settings message, as from the host) and count the values that differ
+    """
+    algo = load_algo('proposed')
+    rng = np.random.default_rng(seed)
+    traces = random_traces(steps, num_traces, seed)
+
+    mismatches = 0
+    for i in range(num_traces):
+        settings = TxExposureWbSettings(
+            metering=str(rng.choice(METERING_MODES)),
+            target_exposure=float(rng.uniform(0.05, 0.5)),
+            exposure_speed=float(rng.uniform(0.1, 1.0)),
+            shutter_limit=float(rng.uniform(100.0, 16383.0)),
+            analog_gain_limit=float(rng.uniform(1.0, 248.0)),
+            rgb_gain_limit=float(rng.uniform(64.0, 1023.0)),
+            white_balance_speed=float(rng.uniform(0.0, 1.0)),
+        )
+        lua, module = load_module(source)
+        module.set_settings(module.parse_settings(settings.pack()))
+
+        state = dict(INITIAL_STATE['proposed'])
+        for sample in traces[:, i]:
+            expected = python_result(algo(metering_data=dict(zip(METERING_KEYS, (int(v) for v in sample))), last_state=state, **settings.algo_params()))
+            actual = lua_result(module.run(sample.tobytes()))
+            # exact comparison, not allclose
+            mismatches += sum(1 for key in expected if expected[key] != actual[key])
+    return mismatches
+
+def on_device_convergence(source: str, scene_name: str, settings: TxExposureWbSettings, seconds: float = 6.0,
+                          loop_period: float = 0.1, settle_time=(0.07, 0.2), seed: int = 0) -> float:
+    """
+    Run the Lua module as lua/exposure_wb_frame_app.lua does (every loop_period seconds) against the synthetic
+    sensor, with camera settings taking effect after the sensor's settle time.
+
+    Returns:
+        Seconds until the metered exposure stays within TOLERANCE of the target, or None if it never settles
+    """
+    rng = np.random.default_rng(seed)
+    sensor = SensorModel.from_scenes([scene_name], seed=seed)
+
+    now = [0.0]
+    registers = [int(INITIAL_STATE['proposed'][key]) for key in ('shutter', 'analog_gain', 'red_gain', 'green_gain', 'blue_gain')]
+    pending = []
+
+    def fpga_read(address, length):
+        # settings written to the camera apply once the sensor has caught up
+        while pending and pending[0][0] <= now[0]:
+            registers[:] = pending.pop(0)[1]
+        return sensor.meter(*registers).reshape(6).tobytes()
+
+    written = {}
+    def set_register(name, *values):
+        written[name] = values
+        if len(written) == 3:
+            new = [written[b'shutter'][0], written[b'gain'][0], *written[b'white_balance']]
+            pending.append((now[0] + rng.uniform(*settle_time), [int(v) for v in new]))
+            written.clear()
+
+    lua, module = load_module(source, "frame = { camera = {}, time = {} }")
+    lua.globals().frame[b'fpga_read'] = fpga_read
+    lua.globals().frame[b'time'][b'utc'] = lambda: now[0]
+    for name in (b'shutter', b'gain', b'white_balance'):
+        lua.globals().frame[b'camera'][b'set_' + name] = (lambda n: lambda *v: set_register(n, *v))(name)
+    module.set_settings(module.parse_settings(settings.pack()))
+
+    times, errors = [], []
+    while now[0] < seconds:
+        result = module.run_auto_exposure()
+        if result is not None:
+            times.append(now[0])
+            errors.append(result[b'brightness'][b'matrix'][b'average'] / settings.target_exposure - 1.0)
+        now[0] += loop_period
+
+    outside = [t for t, e in zip(times, errors) if abs(e) > TOLERANCE]
+    if not outside:
+        return 0.0
+    if outside[-1] == times[-1]:
+        return None
+    return times[times.index(outside[-1]) + 1]
+
+async def host_controller_time(scene_name: str) -> float:
+    """Auto exposure time of the host-driven convergence-aware controller on the simulated Frame, from a cold start"""
+    from ae_controller_report import first_good_photo
+    from PIL import Image
+    images = [Image.new('RGB', (64, 64), (128, 128, 128))]
+    ae_time, _, _, error = await first_good_photo(scene_name, images, 'controller', dict(INITIAL_STATE['proposed']))
+    return ae_time if abs(error) <= TOLERANCE else None
+
+def main():
+    """
+    Check lua/exposure_wb.lua against the Python reference (exposure_wb_algo_proposed.py) bit for bit on
+    random metering traces, then compare its convergence time on Frame with the host-driven controller.
+    Runs the Lua module in a Lua 5.4 interpreter from the lupa package (pip install lupa).
+    """
+    if lua54 is None:
+        print("This check needs the lupa package to run Lua: pip install lupa")
+        sys.exit(1)
+
+    with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'lua', 'exposure_wb.lua')) as f:
+        source = f.read()
+
+    print(f"{check_equivalence(source)} values differ between lua/exposure_wb.lua and the Python reference\n")
+
+    telemetry_interval = TxExposureWbSettings().telemetry_interval
+    print(f"time until exposure stays within {TOLERANCE:.0%} of the target (cold start)")
+    print(f"{'scene':<16} {'on Frame':>9} {'(no settle)':>12} {'host controller':>16}")
+    fmt = lambda t: f"{t:.2f}s" if t is not None else "never"
+    for scene_name in SCENES:
+        on_device = on_device_convergence(source, scene_name, TxExposureWbSettings())
+        no_settle = on_device_convergence(source, scene_name, TxExposureWbSettings(settle_time=0.0))
+        host = asyncio.run(host_controller_time(scene_name))
+        print(f"{scene_name:<16} {fmt(on_device):>9} {fmt(no_settle):>12} {fmt(host):>16}")
+
+    print(f"\nOn Frame, the only Bluetooth traffic is one 65-byte result every {telemetry_interval} iterations "
+          f"(at most {65 / (telemetry_interval * 0.1):.0f} bytes/s); the host-driven loop needs a metering query, "
+          f"a response and a settings message per iteration plus the settle polling.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,221 @@
+from dataclasses import dataclass
+import io
+import struct
+import time
+from multiprocessing import resource_tracker, shared_memory
+from typing import Optional
+
+import numpy as np
+from PIL import Image
+
+# bus header: magic, version, slots, max width, max height, channels, then the latest sequence number at 32
+_BUS_HEADER = struct.Struct('<4sIIIII')
+_LATEST = struct.Struct('<Q')
+_LATEST_OFFSET = 32
+_HEADER_SIZE = 64
+_MAGIC = b'FBUS'
+_VERSION = 1
+
+# slot header: sequence number (0 while being written), then width, height, timestamp at 8; pixels from 64
+_SLOT_SEQ = struct.Struct('<Q')
+_SLOT_HEADER = struct.Struct('<IId')
+_SLOT_HEADER_OFFSET = 8
+_SLOT_HEADER_SIZE = 64
+
+def _attach(name: str) -> shared_memory.SharedMemory:
+    """Attach to an existing segment without this process unlinking it when it exits"""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # before Python 3.13 attaching also registers the segment with the resource tracker, which unlinks it
+        # (and warns) when the subscriber exits, pulling it from under the publisher and the other subscribers
+        register = resource_tracker.register
+        resource_tracker.register = lambda name, rtype: None
+        try:
+            return shared_memory.SharedMemory(name=name)
+        finally:
+            resource_tracker.register = register
+
+@dataclass
+class BusFrame:
+    """
+    A frame read from the bus. pixels is a (height, width, channels) view straight into the shared slot:
+    it stays valid until the publisher comes round to the slot again, num_slots - 1 frames later, which
+    valid() checks after using it. Copy it (np.array(frame.pixels)) to keep it for longer.
+    """
+    seq: int
+    timestamp: float
+    pixels: np.ndarray
+    _subscriber: 'FrameBusSubscriber'
+
+    def valid(self) -> bool:
+        """Whether the slot still holds this frame, i.e. the pixels weren't overwritten while in use"""
+        return self._subscriber._slot_seq(self.seq) == self.seq
+
+class FrameBus:
+    """
+    Publishes decoded camera frames to other local processes through a shared memory ring of preallocated
+    frame slots.
+
+    Each JPEG from RxPhoto is decoded once, copied into the next slot and stamped with a sequence number;
+    subscribers (FrameBusSubscriber, in any process on the machine that knows the bus name) read the latest
+    frame in place, without copying or decoding it again. A subscriber that falls behind skips to the newest
+    frame rather than working through a backlog (latest wins), and the publisher never waits for subscribers.
+
+    Slots are written seqlock fashion: the slot's sequence number is cleared, the pixels and header written,
+    then the sequence number set and the bus's latest sequence number advanced, so a reader can tell from the
+    slot's sequence number whether a frame is complete and whether it has since been overwritten.
+    """
+    def __init__(
+        self,
+        name: Optional[str] = None,
+        num_slots: int = 4,
+        max_width: int = 720,
+        max_height: int = 720,
+        channels: int = 3,
+    ):
+        """
+        Args:
+            name: Shared memory name for subscribers to attach to (None to generate one, see name)
+            num_slots: Frames in the ring; a subscriber has num_slots - 1 frame times to use a frame in place
+            max_width: Largest frame width to publish
+            max_height: Largest frame height to publish
+            channels: Channels per pixel (3 for RGB)
+        """
+        self.num_slots = num_slots
+        self.max_width = max_width
+        self.max_height = max_height
+        self.channels = channels
+        self.slot_size = _SLOT_HEADER_SIZE + max_width * max_height * channels
+
+        self._shm = shared_memory.SharedMemory(name=name, create=True, size=_HEADER_SIZE + num_slots * self.slot_size)
+        self.name = self._shm.name
+        _BUS_HEADER.pack_into(self._shm.buf, 0, _MAGIC, _VERSION, num_slots, max_width, max_height, channels)
+        _LATEST.pack_into(self._shm.buf, _LATEST_OFFSET, 0)
+        for slot in range(num_slots):
+            _SLOT_SEQ.pack_into(self._shm.buf, self._slot_offset(slot), 0)
+        self.seq = 0
+
+    def _slot_offset(self, slot: int) -> int:
+        return _HEADER_SIZE + slot * self.slot_size
+
+    def _begin(self, width: int, height: int) -> tuple:
+        if width > self.max_width or height > self.max_height:
+            raise ValueError(f"{width}x{height} frame is larger than the bus's {self.max_width}x{self.max_height} slots")
+        seq = self.seq + 1
+        offset = self._slot_offset((seq - 1) % self.num_slots)
+        # mark the slot as being written before touching the pixels
+        _SLOT_SEQ.pack_into(self._shm.buf, offset, 0)
+        pixels = np.ndarray((height, width, self.channels), dtype=np.uint8, buffer=self._shm.buf,
+                            offset=offset + _SLOT_HEADER_SIZE)
+        return seq, offset, pixels
+
+    def _commit(self, seq: int, offset: int, width: int, height: int, timestamp: Optional[float]):
+        _SLOT_HEADER.pack_into(self._shm.buf, offset + _SLOT_HEADER_OFFSET, width, height,
+                               time.time() if timestamp is None else timestamp)
+        # the sequence number goes in last, on its own (an aligned 8 byte store), once the frame is complete
+        _SLOT_SEQ.pack_into(self._shm.buf, offset, seq)
+        _LATEST.pack_into(self._shm.buf, _LATEST_OFFSET, seq)
+        self.seq = seq
+
+    def publish(self, pixels: np.ndarray, timestamp: Optional[float] = None) -> int:
+        """
+        Publish a decoded (height, width, channels) uint8 frame.
+
+        Returns:
+            The frame's sequence number
+        """
+        height, width = pixels.shape[:2]
+        seq, offset, slot = self._begin(width, height)
+        slot[...] = pixels.reshape(slot.shape)
+        del slot
+        self._commit(seq, offset, width, height, timestamp)
+        return seq
+
+    def publish_jpeg(self, jpeg_bytes: bytes, timestamp: Optional[float] = None) -> int:
+        """
+        Decode a JPEG (e.g. from RxPhoto) and publish it, so subscribers don't each decode it.
+
+        Returns:
+            The frame's sequence number
+        """
+        image = Image.open(io.BytesIO(jpeg_bytes))
+        if image.mode != 'RGB':
+            image = image.convert('RGB')
+        return self.publish(np.asarray(image), timestamp)
+
+    def close(self):
+        """Remove the bus; subscribers still attached keep their mapping until they close"""
+        self._shm.close()
+        self._shm.unlink()
+
+class FrameBusSubscriber:
+    """Reads the latest frames published on a FrameBus, in place, from any local process"""
+    def __init__(self, name: str, poll_interval: float = 0.001):
+        """
+        Args:
+            name: The bus's name (FrameBus.name)
+            poll_interval: Seconds between checks for a new frame in wait()
+        """
+        self._shm = _attach(name)
+        magic, version, self.num_slots, self.max_width, self.max_height, self.channels = \
+            _BUS_HEADER.unpack_from(self._shm.buf, 0)
+        if magic != _MAGIC or version != _VERSION:
+            self._shm.close()
+            raise ValueError(f"{name} is not a version {_VERSION} frame bus")
+        self.slot_size = _SLOT_HEADER_SIZE + self.max_width * self.max_height * self.channels
+        self.poll_interval = poll_interval
+        self.last_seq = 0
+
+        self.frames = 0
+        self.skipped = 0
+
+    def _slot_offset(self, seq: int) -> int:
+        return _HEADER_SIZE + ((seq - 1) % self.num_slots) * self.slot_size
+
+    def _slot_seq(self, seq: int) -> int:
+        return _SLOT_SEQ.unpack_from(self._shm.buf, self._slot_offset(seq))[0]
+
+    @property
+    def latest_seq(self) -> int:
+        """Sequence number of the newest complete frame (0 before the first)"""
+        return _LATEST.unpack_from(self._shm.buf, _LATEST_OFFSET)[0]
+
+    def latest(self) -> Optional[BusFrame]:
+        """The newest frame if there is one since the last read, else None"""
+        while True:
+            seq = self.latest_seq
+            if seq == self.last_seq:
+                return None
+            offset = self._slot_offset(seq)
+            if self._slot_seq(seq) != seq:
+                # the publisher has lapped the ring since, so try the newer frame
+                continue
+            width, height, timestamp = _SLOT_HEADER.unpack_from(self._shm.buf, offset + _SLOT_HEADER_OFFSET)
+            if self._slot_seq(seq) != seq:
+                # or lapped it while the header was being read
+                continue
+            pixels = np.ndarray((height, width, self.channels), dtype=np.uint8, buffer=self._shm.buf,
+                                offset=offset + _SLOT_HEADER_SIZE)
+            pixels.flags.writeable = False
+
+            if self.last_seq:
+                self.skipped += seq - self.last_seq - 1
+            self.last_seq = seq
+            self.frames += 1
+            return BusFrame(seq, timestamp, pixels, self)
+
+    def wait(self, timeout: Optional[float] = None) -> Optional[BusFrame]:
+        """Wait for a frame newer than the last read; None on timeout"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            frame = self.latest()
+            if frame is not None:
+                return frame
+            if deadline is not None and time.monotonic() >= deadline:
+                return None
+            time.sleep(self.poll_interval)
+
+    def close(self):
+        """Detach from the bus; drop any BusFrames read from it first, since they view its memory"""
+        self._shm.close()
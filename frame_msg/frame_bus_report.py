@@ -0,0 +1,151 @@
+import io
+import multiprocessing
+import os
+import queue
+import time
+
+import numpy as np
+from PIL import Image
+
+from frame_bus import FrameBus, FrameBusSubscriber
+
+WIDTH = HEIGHT = 720
+DURATION = 3.0
+# distinct frames the publisher cycles through, each filled with its own value so overwritten reads show
+NUM_PATTERNS = 8
+
+def pattern_value(seq: int) -> int:
+    return ((seq - 1) % NUM_PATTERNS) * 31
+
+def consume(pixels: np.ndarray) -> float:
+    # stand-in for a light consumer (a detector on a downscaled frame): read a sixteenth of the pixels
+    return float(pixels[::4, ::4].mean())
+
+def bus_subscriber(name: str, stop, results):
+    subscriber = FrameBusSubscriber(name)
+    overwritten = 0
+    latencies = []
+    while not stop.is_set():
+        frame = subscriber.wait(timeout=0.1)
+        if frame is None:
+            continue
+        latencies.append(time.time() - frame.timestamp)
+        expected = pattern_value(frame.seq)
+        level = consume(frame.pixels)
+        if not (frame.pixels[0, 0, 0] == frame.pixels[-1, -1, -1] == expected and abs(level - expected) < 0.5
+                and frame.valid()):
+            overwritten += 1
+        del frame
+    results.put((subscriber.frames, subscriber.skipped, overwritten, float(np.mean(latencies)) if latencies else 0.0))
+    subscriber.close()
+
+def queue_subscriber(frames, stop, results):
+    received = 0
+    overwritten = 0
+    latencies = []
+    while not stop.is_set():
+        try:
+            seq, timestamp, pixels = frames.get(timeout=0.1)
+        except queue.Empty:
+            continue
+        latencies.append(time.time() - timestamp)
+        expected = pattern_value(seq)
+        if not (pixels[0, 0, 0] == pixels[-1, -1, -1] == expected and abs(consume(pixels) - expected) < 0.5):
+            overwritten += 1
+        received += 1
+    results.put((received, 0, overwritten, float(np.mean(latencies)) if latencies else 0.0))
+
+def run(transport: str, num_subscribers: int, frames: list, fps: float = 0.0) -> dict:
+    """
+    Publish frames for DURATION seconds (as fast as possible, or at fps) to num_subscribers processes over the
+    shared memory bus, or over a multiprocessing.Queue per subscriber (each frame pickled and copied to each one,
+    dropped for a subscriber whose queue is full so that it also sees the latest frames)
+    """
+    context = multiprocessing.get_context('spawn')
+    stop = context.Event()
+    results = context.Queue()
+    bus = None
+    queues = []
+    if transport == 'bus':
+        bus = FrameBus(max_width=WIDTH, max_height=HEIGHT)
+        processes = [context.Process(target=bus_subscriber, args=(bus.name, stop, results))
+                     for _ in range(num_subscribers)]
+    else:
+        queues = [context.Queue(maxsize=2) for _ in range(num_subscribers)]
+        processes = [context.Process(target=queue_subscriber, args=(q, stop, results)) for q in queues]
+    for process in processes:
+        process.start()
+    # let the subscribers start up before timing
+    time.sleep(1.0)
+
+    # frames offered, and frames that reached at least one subscriber
+    offered = 0
+    published = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < DURATION:
+        pixels = frames[offered % NUM_PATTERNS]
+        offered += 1
+        if bus:
+            bus.publish(pixels)
+            published += 1
+        else:
+            sent = False
+            for q in queues:
+                try:
+                    q.put_nowait((offered, time.time(), pixels))
+                    sent = True
+                except queue.Full:
+                    pass
+            published += sent
+        if fps:
+            time.sleep(max(0.0, start + offered / fps - time.perf_counter()))
+    elapsed = time.perf_counter() - start
+
+    stop.set()
+    counts = [results.get(timeout=30) for _ in processes]
+    for process in processes:
+        process.join()
+    for q in queues:
+        # frames left in a queue nobody reads any more would keep its feeder thread (and the report) from exiting
+        q.cancel_join_thread()
+    if bus:
+        bus.close()
+    return {
+        'published': published / elapsed,
+        'received': np.mean([c[0] for c in counts]) / elapsed,
+        'skipped': sum(c[1] for c in counts),
+        'overwritten': sum(c[2] for c in counts),
+        'latency': np.mean([c[3] for c in counts]),
+    }
+
+def main():
+    """
+    Measure how many 720x720 RGB frames per second the shared memory frame bus carries to 1, 2 and 4 subscriber
+    processes, against a multiprocessing.Queue per subscriber, with the publisher unpaced and at 30fps.
+    Subscribers check that every frame they read in place wasn't overwritten while in use; each JPEG is decoded once by the publisher.
+    """
+    frames = [np.full((HEIGHT, WIDTH, 3), pattern_value(seq), dtype=np.uint8) for seq in range(1, NUM_PATTERNS + 1)]
+
+    jpeg = io.BytesIO()
+    Image.open("images/koala.jpg").convert('RGB').resize((WIDTH, HEIGHT)).save(jpeg, format='JPEG')
+    bus = FrameBus()
+    start = time.perf_counter()
+    for _ in range(50):
+        bus.publish_jpeg(jpeg.getvalue())
+    print(f"decoding and publishing a {len(jpeg.getvalue()) // 1000}kB 720px JPEG: "
+          f"{1000 * (time.perf_counter() - start) / 50:.1f}ms, once for all subscribers")
+    bus.close()
+
+    print(f"{os.cpu_count()} CPUs, {DURATION:.0f}s per run\n")
+    print(f"{'transport':<10} {'pace':>6} {'subs':>4} {'published/s':>12} {'read/s each':>12} {'skipped':>8} "
+          f"{'overwritten':>11} {'latency':>8}")
+    for fps in (0.0, 30.0):
+        for transport in ('bus', 'queue'):
+            for num_subscribers in (1, 2, 4):
+                result = run(transport, num_subscribers, frames, fps)
+                print(f"{transport:<10} {'max' if not fps else f'{fps:.0f}fps':>6} {num_subscribers:4d} "
+                      f"{result['published']:12.0f} {result['received']:12.0f} {result['skipped']:8d} "
+                      f"{result['overwritten']:11d} {1000 * result['latency']:6.1f}ms")
+
+if __name__ == "__main__":
+    main()
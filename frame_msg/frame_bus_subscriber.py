@@ -0,0 +1,42 @@
+import argparse
+import time
+
+import numpy as np
+
+from frame_bus import FrameBusSubscriber
+
+def main():
+    """
+    Read the frames live-camera-feed-with-options.py publishes on its frame bus (FRAME_BUS = 'frame_feed') from a
+    separate process, as an inference or recording process would, and print the brightness of each one.
+    Any number of these can run at once alongside the viewer.
+    """
+    parser = argparse.ArgumentParser(description="Read and print the frames published on a frame bus")
+    parser.add_argument('name', nargs='?', default='frame_feed', help="frame bus name (default: frame_feed)")
+    name = parser.parse_args().name
+    subscriber = FrameBusSubscriber(name)
+    print(f"Reading frames from {name}, Ctrl-C to stop")
+    try:
+        while True:
+            frame = subscriber.wait(timeout=10.0)
+            if frame is None:
+                print("No frames for 10 seconds")
+                continue
+
+            # the pixels are read in place from shared memory, no copy and no JPEG decode
+            brightness = float(np.mean(frame.pixels[::4, ::4]))
+            if not frame.valid():
+                # the publisher has come round to this slot again while we were reading it
+                print(f"Frame {frame.seq} was overwritten while in use, skipping")
+            else:
+                height, width = frame.pixels.shape[:2]
+                print(f"Frame {frame.seq}: {width}x{height}, brightness {brightness:.1f}, "
+                      f"{1000 * (time.time() - frame.timestamp):.1f}ms after publishing, {subscriber.skipped} skipped so far")
+            del frame
+    except KeyboardInterrupt:
+        pass
+    finally:
+        subscriber.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,342 @@
+import argparse
+import asyncio
+import os
+import struct
+import tempfile
+import time
+from typing import Callable, Dict, List, Optional, Set
+
+from frame_msg import FrameMsg
+
+DEFAULT_SOCKET = os.path.join(tempfile.gettempdir(), 'frame_msg.sock')
+
+# every message on the socket, either way: type (Uint8) and body length (Uint32), then the body
+_HEADER = struct.Struct('<BI')
+
+# client to daemon
+SUBSCRIBE = 0x01    # body: message codes to receive notifications for
+UNSUBSCRIBE = 0x02  # body: message codes to stop receiving
+SEND = 0x03         # body: message code, then the payload for FrameMsg.send_message()
+PRINTS = 0x04       # body: 1 to receive the frame app's print() output, 0 to stop
+
+# daemon to client
+DATA = 0x81         # body: one notification as received (flag byte first)
+SENT = 0x82         # body: empty once a SEND has gone to Frame, or the error message if it failed
+PRINT = 0x83        # body: a line of print() output, UTF-8
+
+def _pack(msg_type: int, body: bytes) -> bytes:
+    return _HEADER.pack(msg_type, len(body)) + body
+
+async def _read_message(reader: asyncio.StreamReader) -> tuple:
+    msg_type, length = _HEADER.unpack(await reader.readexactly(_HEADER.size))
+    return msg_type, await reader.readexactly(length)
+
+class _Client:
+    """A process attached to the daemon: what it subscribed to and what it was sent"""
+    def __init__(self, writer: asyncio.StreamWriter):
+        self.writer = writer
+        self.codes: Set[int] = set()
+        self.prints = False
+        self.notifications = 0
+        self.dropped = 0
+
+class FrameDaemon:
+    """
+    Owns the BLE connection to Frame and one running frame app, and shares them over a Unix socket, so that
+    scripts attach to an already connected and initialized Frame (with FrameClient) in milliseconds instead of
+    scanning, connecting, uploading and starting the app each time, and several processes can use it at once.
+
+    Each client subscribes to the message codes it wants and gets those notifications forwarded unchanged;
+    sends from all clients go to Frame one message at a time. A client that doesn't read its socket has
+    notifications dropped (and counted) once max_buffered_bytes are waiting for it, so it can't hold up
+    the others or the BLE receive path. The frame app is stopped (and Frame rebooted) only when the daemon stops.
+    """
+    def __init__(
+        self,
+        frame_app: Optional[str] = None,
+        lib_names: List[str] = ['data'],
+        socket_path: str = DEFAULT_SOCKET,
+        frame: Optional[FrameMsg] = None,
+        max_buffered_bytes: int = 1 << 20,
+    ):
+        """
+        Args:
+            frame_app: Local path of the frame app to upload and start, e.g. "lua/imu_frame_app.lua"
+                       (None to use the app already on Frame)
+            lib_names: Standard Lua libraries the app needs, as for FrameMsg.upload_stdlua_libs()
+            socket_path: Where to listen; an old socket left there is replaced
+            frame: Connection to use (a FrameMsg by default, or a SimFrame to run without glasses)
+            max_buffered_bytes: Bytes allowed to wait for a client before its notifications are dropped
+        """
+        self.frame_app = frame_app
+        self.lib_names = lib_names
+        self.socket_path = socket_path
+        self.frame = frame or FrameMsg()
+        self.max_buffered_bytes = max_buffered_bytes
+
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._clients: Set[_Client] = set()
+        self._subscribers: Dict[int, Set[_Client]] = {}
+        self._send_lock = asyncio.Lock()
+
+        self.setup_time = 0.0
+        self.notifications = 0
+        self.clients_served = 0
+
+    async def start(self):
+        """Connect to Frame, start the frame app and listen for clients"""
+        start = time.perf_counter()
+        await self.frame.connect()
+        if self.frame_app is not None:
+            await self.frame.upload_stdlua_libs(lib_names=self.lib_names)
+            await self.frame.upload_frame_app(local_filename=self.frame_app)
+        self.frame.attach_print_response_handler(self._forward_print)
+        if self.frame_app is not None:
+            await self.frame.start_frame_app()
+        self.frame.register_data_response_handler(self, list(range(256)), self._forward_data)
+        self.setup_time = time.perf_counter() - start
+
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+        self._server = await asyncio.start_unix_server(self._serve_client, path=self.socket_path)
+
+    async def stop(self):
+        """Disconnect the clients, stop the frame app and disconnect from Frame"""
+        if self._server is not None:
+            self._server.close()
+            self._server = None
+        for client in list(self._clients):
+            client.writer.close()
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+        self.frame.unregister_data_response_handler(self)
+        self.frame.detach_print_response_handler()
+        try:
+            if self.frame_app is not None:
+                await self.frame.stop_frame_app()
+        finally:
+            await self.frame.disconnect()
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.stop()
+
+    def _write(self, client: _Client, message: bytes):
+        if client.writer.transport.get_write_buffer_size() > self.max_buffered_bytes:
+            client.dropped += 1
+            return
+        client.writer.write(message)
+        client.notifications += 1
+
+    def _forward_data(self, data: bytes):
+        # called synchronously for every notification, like the Rx receivers' handlers
+        self.notifications += 1
+        subscribers = self._subscribers.get(data[0])
+        if subscribers:
+            message = _pack(DATA, data)
+            for client in subscribers:
+                self._write(client, message)
+
+    def _forward_print(self, text: str):
+        message = _pack(PRINT, str(text).encode('utf-8'))
+        for client in self._clients:
+            if client.prints:
+                self._write(client, message)
+
+    def _unsubscribe(self, client: _Client, codes):
+        for code in codes:
+            subscribers = self._subscribers.get(code)
+            if subscribers is not None:
+                subscribers.discard(client)
+                if not subscribers:
+                    del self._subscribers[code]
+        client.codes.difference_update(codes)
+
+    async def _serve_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        client = _Client(writer)
+        self._clients.add(client)
+        self.clients_served += 1
+        try:
+            while True:
+                msg_type, body = await _read_message(reader)
+                if msg_type == SUBSCRIBE:
+                    for code in body:
+                        self._subscribers.setdefault(code, set()).add(client)
+                    client.codes.update(body)
+                elif msg_type == UNSUBSCRIBE:
+                    self._unsubscribe(client, list(body))
+                elif msg_type == PRINTS:
+                    client.prints = bool(body and body[0])
+                elif msg_type == SEND:
+                    try:
+                        async with self._send_lock:
+                            await self.frame.send_message(body[0], body[1:])
+                        writer.write(_pack(SENT, b''))
+                    except Exception as e:
+                        writer.write(_pack(SENT, str(e).encode('utf-8') or b'send failed'))
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self._unsubscribe(client, list(client.codes))
+            self._clients.discard(client)
+            writer.close()
+
+    def stats(self) -> str:
+        dropped = sum(client.dropped for client in self._clients)
+        return (f"{len(self._clients)} clients attached ({self.clients_served} so far), "
+                f"{self.notifications} notifications from Frame, {dropped} dropped for slow clients; "
+                f"setup took {self.setup_time:.2f}s")
+
+class FrameClient:
+    """
+    A stand-in for FrameMsg that attaches to a FrameDaemon's connection instead of connecting to Frame itself.
+
+    Rx receivers attach to it exactly as to a FrameMsg, and send_message() sends through the daemon, so an
+    example only needs FrameClient() in place of FrameMsg(). The app lifecycle methods are no-ops: the daemon has
+    already uploaded and started its frame app, and keeps it running (without rebooting Frame) for the next client.
+    """
+    def __init__(self, socket_path: str = DEFAULT_SOCKET):
+        """
+        Args:
+            socket_path: The daemon's socket
+        """
+        self.socket_path = socket_path
+        self.data_response_handlers = {}
+        self._print_response_handler: Optional[Callable[[str], None]] = None
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._read_task: Optional[asyncio.Task] = None
+        # futures of the sends waiting for the daemon, answered in order
+        self._sends: List[asyncio.Future] = []
+
+    async def connect(self, initialize: bool = True):
+        self._reader, self._writer = await asyncio.open_unix_connection(self.socket_path)
+        self._read_task = asyncio.create_task(self._read())
+        if self.data_response_handlers:
+            self._writer.write(_pack(SUBSCRIBE, bytes(self.data_response_handlers.keys())))
+        return True
+
+    async def disconnect(self):
+        if self._read_task is not None:
+            self._read_task.cancel()
+            self._read_task = None
+        if self._writer is not None:
+            self._writer.close()
+            await self._writer.wait_closed()
+            self._writer = None
+
+    def is_connected(self):
+        return self._writer is not None and not self._writer.is_closing()
+
+    async def upload_stdlua_libs(self, lib_names: List[str] = ['data'], minified: bool = True):
+        pass
+
+    async def upload_frame_app(self, local_filename: str, frame_filename: str = 'frame_app.lua'):
+        pass
+
+    async def start_frame_app(self, frame_app_name: str = 'frame_app', await_print: bool = True):
+        pass
+
+    async def stop_frame_app(self, reset: bool = True):
+        pass
+
+    def attach_print_response_handler(self, handler=print):
+        self._print_response_handler = handler
+        if self._writer is not None:
+            self._writer.write(_pack(PRINTS, b'\x01'))
+
+    def detach_print_response_handler(self):
+        self._print_response_handler = None
+        if self._writer is not None:
+            self._writer.write(_pack(PRINTS, b'\x00'))
+
+    async def send_message(self, msg_code: int, payload: bytes, show_me: bool = False) -> None:
+        """Send a message to the frame app through the daemon, returning once it has gone to Frame"""
+        if not self.is_connected():
+            raise ConnectionError("Not attached to the Frame daemon")
+        sent = asyncio.get_running_loop().create_future()
+        self._sends.append(sent)
+        self._writer.write(_pack(SEND, bytes([msg_code]) + bytes(payload)))
+        await sent
+
+    def register_data_response_handler(self, subscriber, msg_codes: List[int], handler: Callable[[bytes], None]):
+        """Register a hostside handler for the specified msg codes, as FrameMsg does"""
+        new_codes = [code for code in msg_codes if code not in self.data_response_handlers]
+        for code in msg_codes:
+            if code not in self.data_response_handlers:
+                self.data_response_handlers[code] = []
+            self.data_response_handlers[code].append((subscriber, handler))
+        if new_codes and self._writer is not None:
+            self._writer.write(_pack(SUBSCRIBE, bytes(new_codes)))
+
+    def unregister_data_response_handler(self, subscriber):
+        """Unregister all hostside handlers for the subscriber, as FrameMsg does"""
+        unused_codes = []
+        for code in list(self.data_response_handlers.keys()):
+            self.data_response_handlers[code] = [
+                (sub, handler) for sub, handler in self.data_response_handlers[code] if sub != subscriber
+            ]
+            if not self.data_response_handlers[code]:
+                del self.data_response_handlers[code]
+                unused_codes.append(code)
+        if unused_codes and self.is_connected():
+            self._writer.write(_pack(UNSUBSCRIBE, bytes(unused_codes)))
+
+    async def _read(self):
+        try:
+            while True:
+                msg_type, body = await _read_message(self._reader)
+                if msg_type == DATA:
+                    for subscriber, handler in self.data_response_handlers.get(body[0], ()):
+                        # not awaited, synchronous call, as in FrameMsg
+                        handler(body)
+                elif msg_type == SENT:
+                    sent = self._sends.pop(0)
+                    if body:
+                        sent.set_exception(Exception(f"Frame daemon failed to send: {body.decode('utf-8')}"))
+                    else:
+                        sent.set_result(None)
+                elif msg_type == PRINT and self._print_response_handler:
+                    self._print_response_handler(body.decode('utf-8'))
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            # the daemon has gone
+            for sent in self._sends:
+                if not sent.done():
+                    sent.set_exception(ConnectionError("Frame daemon closed the connection"))
+            self._sends.clear()
+
+async def run_daemon(frame_app: Optional[str], lib_names: List[str], socket_path: str = DEFAULT_SOCKET):
+    daemon = FrameDaemon(frame_app, lib_names, socket_path)
+    await daemon.start()
+    print(f"Connected to Frame in {daemon.setup_time:.2f}s, serving on {socket_path}, Ctrl-C to stop")
+    try:
+        while True:
+            await asyncio.sleep(60)
+            print(daemon.stats())
+    finally:
+        await daemon.stop()
+
+def main():
+    """
+    python frame_daemon.py lua/imu_frame_app.lua --libs data,code,imu [--socket path]
+    Connect to Frame, start the frame app and share the connection until Ctrl-C; then run scripts that use
+    FrameClient() in place of FrameMsg(), e.g. imu_client.py
+    """
+    parser = argparse.ArgumentParser(description="Share one Frame connection between scripts that use FrameClient()")
+    parser.add_argument('frame_app', help="frame app to upload and start, e.g. lua/imu_frame_app.lua")
+    parser.add_argument('--libs', default='data',
+                        help="comma separated standard Lua libraries the frame app needs (default: data)")
+    parser.add_argument('--socket', default=DEFAULT_SOCKET, help=f"socket to serve on (default: {DEFAULT_SOCKET})")
+    args = parser.parse_args()
+    try:
+        asyncio.run(run_daemon(args.frame_app, args.libs.split(','), args.socket))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
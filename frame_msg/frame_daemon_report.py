@@ -0,0 +1,169 @@
+import argparse
+import asyncio
+from importlib.resources import files
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from frame_msg import RxIMU, TxCode
+from frame_daemon import FrameClient, FrameDaemon
+from sim_frame import SimFrame, SimImuApp
+
+RUNS = 5
+SHARED_CLIENTS = 4
+
+LIB_NAMES = ['data', 'code', 'imu']
+FRAME_APP = "lua/imu_frame_app.lua"
+
+def upload_round_trips(sim: SimFrame) -> int:
+    """
+    Round trips FrameMsg makes to upload the libraries and the frame app: upload_file_from_string() writes each
+    file in escaped chunks of a Lua payload less 22 characters, waiting for a print() after every chunk, plus an
+    open and a close. SimFrame leaves the uploads out, so this gives the part of a cold start it can model.
+    """
+    contents = [files("frame_msg").joinpath(f"lua/{name}.min.lua").read_text() for name in LIB_NAMES]
+    with open(FRAME_APP) as f:
+        contents.append(f.read())
+    chunk_size = sim.mtu - 3 - 22
+    round_trips = 0
+    for content in contents:
+        escaped = (content.replace("\r", "").replace("\\", "\\\\").replace("\n", "\\n").replace("\t", "\\t")
+                   .replace("'", "\\'").replace('"', '\\"'))
+        round_trips += 2 + -(-len(escaped) // chunk_size)
+    return round_trips
+
+async def first_imu(frame) -> tuple:
+    """
+    Connect, attach RxIMU and subscribe as imu.py does
+    Returns (seconds in connect(), seconds to attach, wall clock time of the first update)
+    """
+    start = time.perf_counter()
+    await frame.connect()
+    connected = time.perf_counter() - start
+    await frame.upload_stdlua_libs(lib_names=LIB_NAMES)
+    await frame.upload_frame_app(local_filename=FRAME_APP)
+    await frame.start_frame_app()
+    rx_imu = RxIMU()
+    imu_queue = await rx_imu.attach(frame)
+    await frame.send_message(0x40, TxCode(value=1).pack())
+    attached = time.perf_counter() - start
+    await asyncio.wait_for(imu_queue.get(), timeout=10.0)
+    first = time.time()
+    rx_imu.detach(frame)
+    return connected, attached, first
+
+async def cold():
+    """A script with its own connection (to a simulated Frame: none of the BLE setup is modelled)"""
+    sim = SimFrame(realtime=True)
+    SimImuApp(sim)
+    connected, attached, first = await first_imu(sim)
+    await sim.stop_frame_app()
+    await sim.disconnect()
+    print(connected, attached, first)
+
+async def warm(socket_path: str):
+    """A script attaching to the daemon"""
+    client = FrameClient(socket_path)
+    connected, attached, first = await first_imu(client)
+    await client.disconnect()
+    print(connected, attached, first)
+
+async def daemon(socket_path: str):
+    """The daemon, in front of a simulated Frame, until its stdin closes"""
+    sim = SimFrame(realtime=True)
+    SimImuApp(sim)
+    frame_daemon = FrameDaemon(FRAME_APP, LIB_NAMES, socket_path, frame=sim)
+    await frame_daemon.start()
+    print("ready", flush=True)
+    await asyncio.get_running_loop().run_in_executor(None, sys.stdin.read)
+    # let the last clients' disconnections come through
+    await asyncio.sleep(0.1)
+    print(frame_daemon.stats(), flush=True)
+    await frame_daemon.stop()
+
+def run_script(*args) -> tuple:
+    """Run this file as a separate script; (seconds in connect(), seconds to attach, seconds from launch to the first IMU update)"""
+    launched = time.time()
+    output = subprocess.run([sys.executable, __file__, *args], capture_output=True, text=True, check=True).stdout
+    connected, attached, first = map(float, output.split())
+    return connected, attached, first - launched
+
+async def attach_in_process(socket_path: str) -> tuple:
+    """(seconds in connect(), seconds to attach, seconds from connect() to the first IMU update) in this process"""
+    client = FrameClient(socket_path)
+    start = time.time()
+    connected, attached, first = await first_imu(client)
+    await client.disconnect()
+    return connected, attached, first - start
+
+async def shared(socket_path: str, seconds: float) -> list:
+    """SHARED_CLIENTS clients on one connection at once: IMU updates each one receives"""
+    clients = [FrameClient(socket_path) for _ in range(SHARED_CLIENTS)]
+    queues = []
+    for client in clients:
+        await client.connect()
+        queues.append(await RxIMU().attach(client))
+    await clients[0].send_message(0x40, TxCode(value=1).pack())
+    await asyncio.sleep(seconds)
+    counts = [queue.qsize() for queue in queues]
+    for client in clients:
+        await client.disconnect()
+    return counts
+
+def main():
+    """
+    Measure connect-to-first-message for a script using imu_frame_app.lua: cold (its own connection) against
+    warm (attached to frame_daemon.py), each as a freshly started script, and warm attach within a running
+    process; then share the daemon's connection between several clients at once.
+    Frame is simulated (SimImuApp, an update every 200ms), so the cold figures leave out the BLE scan, connect,
+    Lua uploads and the stop_frame_app() reboot, which the daemon also saves on real glasses.
+    """
+    socket_path = os.path.join(tempfile.mkdtemp(prefix="frame_daemon_"), 'frame.sock')
+    daemon_process = subprocess.Popen([sys.executable, __file__, 'daemon', socket_path],
+                                      stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+    if daemon_process.stdout.readline().strip() != 'ready':
+        raise RuntimeError("Daemon failed to start")
+
+    cold_runs = [run_script('cold') for _ in range(RUNS)]
+    warm_runs = [run_script('warm', socket_path) for _ in range(RUNS)]
+    in_process = [asyncio.run(attach_in_process(socket_path)) for _ in range(RUNS)]
+
+    print(f"{'':<22} {'connect':>9} {'attach':>9} {'to first update':>16}")
+    for name, runs in (('cold script', cold_runs), ('warm script (daemon)', warm_runs), ('warm, in process', in_process)):
+        connected, attached, first = np.array(runs).T
+        print(f"{name:<22} {1000 * np.mean(connected):7.2f}ms {1000 * np.mean(attached):7.1f}ms "
+              f"{1000 * np.mean(first):14.1f}ms (min {1000 * np.min(first):.1f}ms)")
+
+    sim = SimFrame()
+    round_trips = upload_round_trips(sim)
+    print(f"not simulated, saved by every warm attach on real glasses: {round_trips} upload round trips "
+          f"(~{round_trips * 2 * sim.latency:.1f}s at the simulated {1000 * sim.latency:.0f}ms each way), "
+          f"the BLE scan and connect, and the reboot at exit")
+
+    counts = asyncio.run(shared(socket_path, 2.0))
+    print(f"\n{SHARED_CLIENTS} clients sharing the connection for 2s: {counts} IMU updates each")
+
+    daemon_process.stdin.close()
+    print(daemon_process.stdout.read().strip())
+    daemon_process.wait()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Frame daemon connect-to-first-message and sharing report")
+    # the report runs itself in these modes as separate scripts
+    modes = parser.add_subparsers(dest='mode')
+    modes.add_parser('cold', help="a script with its own connection")
+    modes.add_parser('warm', help="a script attaching to the daemon").add_argument('socket')
+    modes.add_parser('daemon', help="the daemon, until its stdin closes").add_argument('socket')
+    args = parser.parse_args()
+    if args.mode == 'cold':
+        asyncio.run(cold())
+    elif args.mode == 'warm':
+        asyncio.run(warm(args.socket))
+    elif args.mode == 'daemon':
+        asyncio.run(daemon(args.socket))
+    else:
+        main()
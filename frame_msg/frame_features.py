@@ -0,0 +1,156 @@
+import asyncio
+from dataclasses import dataclass
+import logging
+import struct
+import time
+from typing import List, Optional
+
+from frame_msg import FrameMsg, TxCode
+
+logging.basicConfig()
+_log = logging.getLogger("RxFeatureState")
+
+# Host to Frame flags of lua/multi_frame_app.lua (the rest are the same as in the single feature frame apps)
+FEATURES_MSG = 0x60
+TEXT_SPRITE_BLOCK_MSG = 0x25
+
+# Frame to Host flag: the features on after a FEATURES_MSG, and the Lua memory in use
+FEATURES_STATE_MSG = 0x17
+
+# feature bits for TxCode(value=...) on FEATURES_MSG
+CAMERA = 0x01
+AUDIO = 0x02
+IMU = 0x04
+TAP = 0x08
+SPRITE = 0x10
+TEXT = 0x20
+TEXT_SPRITE = 0x40
+ALL_FEATURES = CAMERA | AUDIO | IMU | TAP | SPRITE | TEXT | TEXT_SPRITE
+
+# standard Lua libraries each feature loads, as uploaded by FrameMsg.upload_stdlua_libs()
+FEATURE_LIBS = {
+    CAMERA: ['camera'],
+    AUDIO: ['audio'],
+    IMU: ['imu'],
+    TAP: ['tap'],
+    SPRITE: ['sprite'],
+    TEXT: ['plain_text'],
+    TEXT_SPRITE: ['text_sprite_block'],
+}
+# and this project's Lua modules, uploaded by file name
+FEATURE_FILES = {
+    AUDIO: ['lua/vad.lua'],
+}
+
+FEATURE_NAMES = {
+    CAMERA: 'camera', AUDIO: 'audio', IMU: 'imu', TAP: 'tap', SPRITE: 'sprite', TEXT: 'text', TEXT_SPRITE: 'text_sprite',
+}
+
+def feature_names(features: int) -> str:
+    return '+'.join(name for bit, name in FEATURE_NAMES.items() if features & bit) or 'none'
+
+async def upload_multi_frame_app(frame: FrameMsg, features: int = ALL_FEATURES):
+    """
+    Upload lua/multi_frame_app.lua and the Lua modules of the features it may switch on. Files on Frame
+    survive a reboot, so this is only needed once per Frame (and after the Lua files change).
+    """
+    lib_names = ['data', 'code']
+    files = []
+    for bit, libs in FEATURE_LIBS.items():
+        if features & bit:
+            lib_names += libs
+            files += FEATURE_FILES.get(bit, [])
+    await frame.upload_stdlua_libs(lib_names=lib_names)
+    for local_filename in files:
+        await frame.upload_file(local_filename, local_filename.split('/')[-1])
+    await frame.upload_frame_app(local_filename="lua/multi_frame_app.lua")
+
+@dataclass
+class FeatureState:
+    """
+    What lua/multi_frame_app.lua reports after switching features.
+
+    Attributes:
+        features: Feature bits now on
+        memory: Bytes of Lua memory in use after the switch (collectgarbage('count'))
+    """
+    features: int
+    memory: int
+
+class RxFeatureState:
+    """Receives the FeatureState lua/multi_frame_app.lua sends after each FEATURES_MSG"""
+    def __init__(self, msg_code: int = FEATURES_STATE_MSG):
+        """
+        Args:
+            msg_code: Message type identifier for the feature state
+        """
+        self.msg_code = msg_code
+        self.queue: Optional[asyncio.Queue] = None
+
+    def handle_data(self, data: bytes) -> None:
+        """
+        Process incoming data packets.
+
+        Args:
+            data: Flag byte, feature bits (Uint8) and Lua memory in bytes (Uint32)
+        """
+        if not self.queue:
+            _log.warning("Received data but queue not initialized - call start() first")
+            return
+
+        features, memory = struct.unpack_from('<BI', data, 1)
+        asyncio.create_task(self.queue.put(FeatureState(features, memory)))
+
+    async def attach(self, frame: FrameMsg) -> asyncio.Queue:
+        """
+        Attach the receive handler to the Frame data response and return a queue that will receive feature states.
+
+        Returns:
+            asyncio.Queue that will receive FeatureState objects
+        """
+        self.queue = asyncio.Queue()
+        frame.register_data_response_handler(self, [self.msg_code], self.handle_data)
+        return self.queue
+
+    def detach(self, frame: FrameMsg) -> None:
+        """Detach the receive handler from the Frame data response and clean up resources"""
+        frame.unregister_data_response_handler(self)
+        self.queue = None
+
+class FeatureSwitch:
+    """
+    Switches the features of a running lua/multi_frame_app.lua on and off by message, in place of stopping
+    one frame app (which reboots Frame), uploading another and starting it.
+    Rx receivers for the features stay attached throughout; messages for features that are off are dropped on Frame.
+    """
+    def __init__(self, frame: FrameMsg):
+        self.frame = frame
+        self.rx_state = RxFeatureState()
+        self._states: Optional[asyncio.Queue] = None
+        self.state: Optional[FeatureState] = None
+        # seconds from sending each switch to its state coming back
+        self.switch_times: List[float] = []
+
+    async def attach(self):
+        self._states = await self.rx_state.attach(self.frame)
+
+    def detach(self):
+        self.rx_state.detach(self.frame)
+
+    async def set(self, features: int, timeout: float = 5.0) -> FeatureState:
+        """Switch on exactly these features (the others off) and wait for Frame to confirm"""
+        start = time.perf_counter()
+        await self.frame.send_message(FEATURES_MSG, TxCode(value=features).pack())
+        self.state = await asyncio.wait_for(self._states.get(), timeout=timeout)
+        self.switch_times.append(time.perf_counter() - start)
+        if self.state.features != features:
+            raise ValueError(f"Frame switched to features {self.state.features:#04x}, not {features:#04x}")
+        return self.state
+
+    async def enable(self, features: int, timeout: float = 5.0) -> FeatureState:
+        """Switch these features on, leaving the others as they are"""
+        return await self.set((self.state.features if self.state else 0) | features, timeout)
+
+    async def disable(self, features: int, timeout: float = 5.0) -> FeatureState:
+        """Switch these features off, leaving the others as they are"""
+        return await self.set((self.state.features if self.state else 0) & ~features, timeout)
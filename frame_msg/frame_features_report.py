@@ -0,0 +1,225 @@
+import asyncio
+from importlib.resources import files
+import struct
+
+from frame_features import (ALL_FEATURES, AUDIO, CAMERA, FEATURE_NAMES, FEATURES_MSG, FEATURES_STATE_MSG, IMU,
+                            SPRITE, TAP, TEXT, TEXT_SPRITE, RxFeatureState, feature_names)
+from sim_frame import SimFrame
+from frame_msg import RxIMU, TxCode, TxPlainText
+
+try:
+    from lupa import lua54
+except ImportError:
+    lua54 = None
+
+IMU_SUBS_MSG = 0x40
+TEXT_MSG = 0x0a
+STDLUA_DIR = str(files("frame_msg").joinpath("lua"))
+
+# the single feature frame app each feature replaces, with the libraries and files it uploads
+SINGLE_FEATURE_APPS = {
+    CAMERA: ("lua/camera_frame_app.lua", ['data', 'camera'], []),
+    AUDIO: ("lua/audio_frame_app.lua", ['data', 'code', 'audio'], ['lua/vad.lua']),
+    IMU: ("lua/imu_frame_app.lua", ['data', 'code', 'imu'], []),
+    TAP: ("lua/tap_frame_app.lua", ['data', 'code', 'tap'], []),
+    SPRITE: ("lua/sprite_frame_app.lua", ['data', 'sprite'], []),
+    TEXT: ("lua/plain_text_frame_app.lua", ['data', 'plain_text'], []),
+    TEXT_SPRITE: ("lua/text_sprite_block_frame_app.lua", ['data', 'text_sprite_block'], []),
+}
+
+# stand-ins for the parts of the Frame API the app uses outside the ones the harness provides
+FRAME_STUB = """
+host = {}
+frame = {
+    bluetooth = { max_length = function() return 240 end, receive_callback = function(f) host.receive = f end },
+    display = { text = function(text, x, y) host.drawn = (host.drawn or 0) + 1 end, show = function() end,
+                bitmap = function() end, assign_color = function() end },
+    imu = { raw = function() return { compass = {x = 300, y = 0, z = -400}, accelerometer = {x = 0, y = 0, z = 4096} } end,
+            tap_callback = function(f) host.tap_callback = f end },
+    microphone = { start = function() end, stop = function() end, read = function(n) return '' end },
+    camera = { auto = function(settings) return {} end },
+    time = {},
+}
+-- find the minified standard libraries and this project's modules by their file names, as Frame does
+table.insert(package.searchers, 2, function(name)
+    for _, dir in ipairs(LUA_DIRS) do
+        local path = dir .. '/' .. name .. '.lua'
+        local f = io.open(path)
+        if f then
+            f:close()
+            return loadfile(path), path
+        end
+    end
+    return nil
+end)
+"""
+
+class StopApp(Exception):
+    def __str__(self):
+        return 'break signal'
+
+class LuaFrame:
+    """
+    Runs lua/multi_frame_app.lua in a Lua 5.4 interpreter on a virtual clock: frame.sleep() advances the clock and
+    delivers the host messages scheduled by then, through the data.lua receive callback, as BLE would.
+    """
+    def __init__(self, mtu: int = 240):
+        self.mtu = mtu
+        self.clock = 0.0
+        self.sent = []
+        self.printed = []
+        self._schedule = []
+        self._end = 0.0
+        self.lua = lua54.LuaRuntime(encoding=None)
+        self.lua.globals().LUA_DIRS = self.lua.table(STDLUA_DIR.encode(), b'lua')
+        self.lua.execute(FRAME_STUB)
+        frame = self.lua.globals().frame
+        frame[b'bluetooth'][b'send'] = lambda data: self.sent.append((self.clock, bytes(data)))
+        frame[b'time'][b'utc'] = lambda: self.clock
+        frame[b'sleep'] = self._sleep
+        self.lua.globals().print = lambda *args: self.printed.append(
+            b' '.join(arg if isinstance(arg, bytes) else str(arg).encode() for arg in args).decode())
+
+    def at(self, t: float, msg_code: int, payload: bytes):
+        """Send a message from the host at virtual time t"""
+        self._schedule.append((t, msg_code, payload))
+        self._schedule.sort(key=lambda item: item[0])
+
+    def _deliver(self, msg_code: int, payload: bytes):
+        # msg code and Uint16 length header in the first packet, msg code only in the rest, as frame_ble sends them
+        receive = self.lua.globals().host[b'receive']
+        first = self.mtu - 3
+        receive(bytes([msg_code]) + struct.pack('>H', len(payload)) + payload[:first])
+        for offset in range(first, len(payload), self.mtu - 1):
+            receive(bytes([msg_code]) + payload[offset:offset + self.mtu - 1])
+
+    def _sleep(self, secs: float):
+        self.clock += secs
+        # messages arrive while the app sleeps, and are handled when it wakes
+        while self._schedule and self._schedule[0][0] <= self.clock:
+            t, msg_code, payload = self._schedule.pop(0)
+            self.delivered.append((t, msg_code))
+            self._deliver(msg_code, payload)
+        if self.clock >= self._end:
+            # the break signal, caught by the app loop's pcall
+            raise StopApp()
+
+    def run(self, until: float):
+        self._end = until
+        self.delivered = []
+        self.lua.execute(b"dofile('lua/multi_frame_app.lua')")
+
+def state_packets(lua_frame: LuaFrame) -> list:
+    return [(t, data) for t, data in lua_frame.sent if data[0] == FEATURES_STATE_MSG]
+
+def run_scenario() -> LuaFrame:
+    """Switch between features in one run of the app, using each feature on the way"""
+    lua_frame = LuaFrame()
+    steps = [
+        (0.5, FEATURES_MSG, TxCode(value=CAMERA).pack()),
+        (1.0, FEATURES_MSG, TxCode(value=IMU).pack()),
+        (1.1, IMU_SUBS_MSG, TxCode(value=1).pack()),
+        (2.5, FEATURES_MSG, TxCode(value=AUDIO | TAP).pack()),
+        # for the IMU, which is off by now: dropped
+        (2.6, IMU_SUBS_MSG, TxCode(value=0).pack()),
+        (3.0, FEATURES_MSG, TxCode(value=SPRITE | TEXT).pack()),
+        (3.1, TEXT_MSG, TxPlainText(text="Hello\nFrame").pack()),
+        (3.5, FEATURES_MSG, TxCode(value=ALL_FEATURES).pack()),
+        (4.0, FEATURES_MSG, TxCode(value=0).pack()),
+    ]
+    for step in steps:
+        lua_frame.at(*step)
+    lua_frame.run(until=4.5)
+    return lua_frame
+
+def memory_per_feature() -> dict:
+    """Lua memory in use with no features, each feature alone, and all of them, from the app's own reports"""
+    lua_frame = LuaFrame()
+    masks = [0] + list(FEATURE_NAMES.keys()) + [ALL_FEATURES, 0]
+    for i, mask in enumerate(masks):
+        lua_frame.at(0.5 + i, FEATURES_MSG, TxCode(value=mask).pack())
+    lua_frame.run(until=len(masks) + 1)
+    memory = {}
+    for (_, data), mask in zip(state_packets(lua_frame), masks):
+        memory.setdefault(mask, []).append(struct.unpack_from('<BI', data, 1)[1])
+    return memory
+
+def upload_round_trips(lib_names: list, local_files: list, mtu: int) -> int:
+    """
+    Round trips FrameMsg makes to upload these libraries and files: upload_file_from_string() writes each file in
+    escaped chunks of a Lua payload less 22 characters, waiting for a print() after every chunk, plus an open and a close
+    """
+    contents = [files("frame_msg").joinpath(f"lua/{name}.min.lua").read_text() for name in lib_names]
+    for path in local_files:
+        with open(path) as f:
+            contents.append(f.read())
+    chunk_size = mtu - 3 - 22
+    round_trips = 0
+    for content in contents:
+        escaped = (content.replace("\r", "").replace("\\", "\\\\").replace("\n", "\\n").replace("\t", "\\t")
+                   .replace("'", "\\'").replace('"', '\\"'))
+        round_trips += 2 + -(-len(escaped) // chunk_size)
+    return round_trips
+
+async def check_host_receivers(lua_frame: LuaFrame) -> tuple:
+    """Feed what the Lua app sent to the host receivers: (feature states, IMU updates)"""
+    sim = SimFrame()
+    states = await RxFeatureState().attach(sim)
+    imu = await RxIMU().attach(sim)
+    for _, data in lua_frame.sent:
+        await sim.send_to_host(data)
+    await asyncio.sleep(0)
+    return [states.get_nowait() for _ in range(states.qsize())], imu.qsize()
+
+def main():
+    """
+    Run lua/multi_frame_app.lua (in a Lua 5.4 interpreter, against stand-ins for the Frame API) through a session
+    that switches between camera, IMU, audio, tap, sprites and text by message, checking each switch, what gets
+    through for the features that are on and off, and the Lua memory each feature takes; then compare the time a
+    switch takes with stopping one single feature frame app, uploading the next and starting it, on SimFrame's link
+    model.
+    """
+    if lua54 is None:
+        print("This report runs the frame app in Lua and needs the lupa package: pip install lupa")
+        return
+
+    lua_frame = run_scenario()
+    print("session:")
+    pickups = []
+    for t, data in state_packets(lua_frame):
+        features, memory = struct.unpack_from('<BI', data, 1)
+        arrived = max(d for d, code in lua_frame.delivered if code == FEATURES_MSG and d <= t)
+        pickups.append(t - arrived)
+        print(f"  {arrived:5.2f}s {feature_names(features):<52} {memory / 1024:5.1f}kB, "
+              f"switched {1000 * pickups[-1]:5.1f}ms after arriving")
+    imu_sent = [t for t, data in lua_frame.sent if data[0] == 0x0A]
+    print(f"  IMU updates sent {min(imu_sent):.2f}s-{max(imu_sent):.2f}s: {len(imu_sent)}")
+    print(f"  text lines drawn: {lua_frame.lua.globals().host[b'drawn']}")
+    errors = [line for line in lua_frame.printed if 'Error' in line]
+    print(f"  printed: {lua_frame.printed}, {len(errors)} errors")
+
+    states, imu_updates = asyncio.run(check_host_receivers(lua_frame))
+    print(f"  host side: {len(states)} FeatureStates ({', '.join(feature_names(s.features) for s in states)}), "
+          f"{imu_updates} RxIMU updates")
+
+    print("\nLua memory after switching:")
+    for mask, memory in memory_per_feature().items():
+        print(f"  {feature_names(mask):<52} " + ", ".join(f"{m / 1024:.1f}kB" for m in memory))
+
+    sim = SimFrame()
+    round_trip = 2 * sim.latency
+    pickup = sum(pickups) / len(pickups)
+    print(f"\nswitching to a feature, at SimFrame's {1000 * sim.latency:.0f}ms each way "
+          f"(and {1000 * pickup:.0f}ms for the app loop to pick up a message, from the session):")
+    print(f"  {'':<12} {'by message':>10} {'stop, upload and start':>23} {'upload round trips':>18}")
+    for bit, (app, lib_names, local_files) in SINGLE_FEATURE_APPS.items():
+        # a message over and the state back, and the wait for the app loop
+        by_message = round_trip + pickup
+        round_trips = upload_round_trips(lib_names, local_files + [app], sim.mtu)
+        # stop_frame_app(): the break and reset signals wait 200ms each; start_frame_app() waits for the app's print
+        cycle = 0.2 + 0.2 + round_trips * round_trip + round_trip
+        print(f"  {FEATURE_NAMES[bit]:<12} {1000 * by_message:8.0f}ms {cycle:22.2f}s {round_trips:18d}")
+    print("  (the cycle also reboots Frame, and a new script connecting adds the BLE connect and 0.6s of break/reset)")
+
+if __name__ == "__main__":
+    main()
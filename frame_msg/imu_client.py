@@ -0,0 +1,47 @@
+import asyncio
+
+from frame_msg import RxIMU, TxCode
+from frame_daemon import FrameClient
+
+async def main():
+    """
+    imu.py as a client of frame_daemon.py: attach to the Frame connection the daemon already has open, with
+    lua/imu_frame_app.lua running, and print IMU updates. Start the daemon first with
+    python frame_daemon.py lua/imu_frame_app.lua --libs data,code,imu
+    """
+    frame = FrameClient()
+    try:
+        # milliseconds, rather than scanning, connecting, uploading and starting the frame app
+        await frame.connect()
+
+        frame.attach_print_response_handler()
+
+        # hook up the RxIMU receiver
+        rx_imu = RxIMU(smoothing_samples=5)
+        imu_queue = await rx_imu.attach(frame)
+
+        # Subscribe for IMU updates
+        await frame.send_message(0x40, TxCode(value=1).pack())
+
+        for _ in range(1,100):
+            # get the IMU update as soon as it arrives
+            imu_update = await asyncio.wait_for(imu_queue.get(), timeout=10.0)
+            # note that raw eCompass values will need to be calibrated before use
+            print(f"pitch: {imu_update.pitch:.2f} roll: {imu_update.roll:.2f} compass: {imu_update.compass}")
+
+        # Unsubscribe for IMU updates (this stops them for every client of the daemon)
+        await frame.send_message(0x40, TxCode(value=0).pack())
+
+        rx_imu.detach(frame)
+        frame.detach_print_response_handler()
+
+        # the frame app keeps running in the daemon for the next script, so there is no stop_frame_app() reboot
+
+    except Exception as e:
+        print(f"An error occurred: {e}")
+    finally:
+        # detach from the daemon, which stays connected to Frame
+        await frame.disconnect()
+
+if __name__ == "__main__":
+    asyncio.run(main())
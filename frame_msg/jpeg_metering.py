@@ -0,0 +1,287 @@
+import argparse
+import asyncio
+import io
+import time
+from typing import Callable, Optional
+
+import numpy as np
+from PIL import Image
+
+from frame_msg import FrameMsg, TxManualExpSettings
+
+from ae_history import print_debug
+
+METERING_KEYS = ['spot_r', 'spot_g', 'spot_b', 'matrix_r', 'matrix_g', 'matrix_b']
+
+# ITU-R BT.601 luma weights, as JPEG uses
+LUMA_WEIGHTS = np.array([0.299, 0.587, 0.114], dtype=np.float32)
+
+# pixels with any channel at or above this level are treated as clipped highlights
+CLIP_HIGH = 250
+# pixels with luma at or below this level are treated as crushed shadows
+CLIP_LOW = 5
+
+def decode_small(jpeg_bytes: bytes, max_size: int = 96) -> np.ndarray:
+    """
+    Decode a JPEG at low resolution, letting the decoder skip most of the work by scaling the DCT blocks
+    (by 1/2, 1/4 or 1/8) rather than decoding at full size and resizing; a 720x720 photo decodes at 90x90.
+
+    Returns:
+        uint8 array (height, width, 3)
+    """
+    image = Image.open(io.BytesIO(jpeg_bytes))
+    image.draft('RGB', (max_size, max_size))
+    return np.asarray(image.convert('RGB'))
+
+def image_statistics(pixels: np.ndarray, spot_fraction: float = 0.5) -> dict:
+    """
+    Luminance and chroma statistics of an RGB image, as the host-side metering uses them.
+
+    Args:
+        pixels: uint8 array (height, width, 3)
+        spot_fraction: Width and height of the centre spot region as a fraction of the image
+
+    Returns:
+        dict of:
+            histogram: 256-bin luma histogram, normalized to sum to 1
+            matrix, spot: mean r, g, b levels (0-255 floats) of the whole image and of the centre spot
+            clipped_high: fraction of pixels with a channel at or above CLIP_HIGH
+            clipped_low: fraction of pixels with luma at or below CLIP_LOW
+            grey_world: mean r, g, b levels of the pixels that are not clipped (None if all of them are),
+                an estimate of the illuminant colour that clipped highlights don't pull towards white
+            luma_mean, luma_median, luma_p99: luma summary in 0-255 levels
+    """
+    height, width = pixels.shape[:2]
+    flat = pixels.reshape(-1, 3)
+    luma = flat @ LUMA_WEIGHTS
+    histogram = np.bincount(luma.astype(np.uint8), minlength=256).astype(np.float64)
+    histogram /= flat.shape[0]
+    cumulative = np.cumsum(histogram)
+
+    high = flat.max(axis=1) >= CLIP_HIGH
+    unclipped = flat[~high]
+
+    spot_h = max(1, int(round(height * spot_fraction)))
+    spot_w = max(1, int(round(width * spot_fraction)))
+    top, left = (height - spot_h) // 2, (width - spot_w) // 2
+    spot = pixels[top:top + spot_h, left:left + spot_w].reshape(-1, 3)
+
+    return {
+        'histogram': histogram,
+        'matrix': flat.mean(axis=0, dtype=np.float64),
+        'spot': spot.mean(axis=0, dtype=np.float64),
+        'clipped_high': float(high.mean()),
+        'clipped_low': float(cumulative[CLIP_LOW]),
+        'grey_world': unclipped.mean(axis=0, dtype=np.float64) if len(unclipped) else None,
+        'luma_mean': float(luma.mean()),
+        'luma_median': float(np.searchsorted(cumulative, 0.5)),
+        'luma_p99': float(np.searchsorted(cumulative, 0.99)),
+    }
+
+def jpeg_statistics(jpeg_bytes: bytes, max_size: int = 96, spot_fraction: float = 0.5) -> dict:
+    """image_statistics() of a JPEG decoded at low resolution (see decode_small())"""
+    return image_statistics(decode_small(jpeg_bytes, max_size), spot_fraction)
+
+def metering_from_statistics(stats: dict, clip_headroom: float = 2.0) -> dict:
+    """
+    Metering data for camera_auto_exposure_algo from image statistics, in place of the 6 uint8 values from
+    RxMeteringData: float levels (so the algorithm sees more than 8 bits of precision), with clipped
+    highlights counted at clip_headroom times full scale instead of 255 so an overexposed photo reads as
+    overexposed by more than the clipped mean shows, and the matrix colour taken from the grey-world estimate.
+
+    Args:
+        stats: Result of image_statistics() or jpeg_statistics()
+        clip_headroom: Assumed mean level of clipped pixels relative to full scale (1.0 for no correction)
+
+    Returns:
+        dict of spot_r/g/b, matrix_r/g/b as 0-255 floats (possibly above 255 when highlights are clipped)
+    """
+    clipped = stats['clipped_high']
+    scale = 1.0 + clipped * (clip_headroom - 1.0) * 255.0 / max(stats['luma_mean'], 1.0)
+
+    matrix = stats['matrix'] * scale
+    grey_world = stats['grey_world']
+    if grey_world is not None and grey_world.mean() > 0:
+        # same overall level, with the colour balance of the unclipped pixels
+        matrix = grey_world / grey_world.mean() * matrix.mean()
+    spot = stats['spot'] * scale
+
+    return dict(zip(METERING_KEYS, (float(v) for v in np.concatenate([spot, matrix]))))
+
+def metering_from_jpeg(jpeg_bytes: bytes, max_size: int = 96, clip_headroom: float = 2.0) -> dict:
+    """Metering data for camera_auto_exposure_algo computed from a received photo"""
+    return metering_from_statistics(jpeg_statistics(jpeg_bytes, max_size), clip_headroom)
+
+class JpegAutoExposure:
+    """
+    Host-side auto exposure for live feeds, metering from each received photo instead of the FPGA metering.
+
+    Each photo was taken with known, settled settings (the ones sent after the previous photo), so the
+    measurement never lags the settings the way the 100ms on-device loop's does, and the algorithm can take
+    the whole step to the target (exposure_speed 1.0) rather than half of it.
+    """
+    def __init__(
+        self,
+        frame: FrameMsg,
+        manual_exp_settings_msg: int = 0x0f,
+        algo: Optional[Callable] = None,
+        last_state: Optional[dict] = None,
+        max_size: int = 96,
+        clip_headroom: float = 2.0,
+        quiet: bool = True,
+        **algo_params,
+    ):
+        """
+        Args:
+            frame: Connected Frame whose app accepts TxManualExpSettings
+            manual_exp_settings_msg: Message code of the manual exposure settings in the Frame app
+                (0x0f in lua/live_camera_frame_app.lua, 0x0c in lua/exposure_wb_frame_app.lua)
+            algo: camera_auto_exposure_algo to run (the proposed one by default)
+            last_state: Starting exposure/white balance state (the proposed algorithm's default by default)
+            max_size: Decoding size of the photos for the statistics
+            clip_headroom: See metering_from_statistics()
+            quiet: Don't print the algorithm's intermediate values (through its debug hook)
+            **algo_params: Settings passed to the algorithm; exposure_speed defaults to 1.0
+        """
+        from auto_exposure_batch import INITIAL_STATE, load_algo
+        self.frame = frame
+        self.manual_exp_settings_msg = manual_exp_settings_msg
+        self.algo = algo if algo is not None else load_algo('proposed')
+        self.last_state = dict(last_state if last_state is not None else INITIAL_STATE['proposed'])
+        self.max_size = max_size
+        self.clip_headroom = clip_headroom
+        self.quiet = quiet
+        self.algo_params = {'exposure_speed': 1.0, **algo_params}
+
+        self.registers = None
+        self.stats = None
+
+    def _run_algo(self, metering_data: dict) -> dict:
+        return self.algo(metering_data=metering_data, last_state=self.last_state,
+                         debug=None if self.quiet else print_debug, **self.algo_params)
+
+    async def update(self, jpeg_bytes: bytes) -> dict:
+        """
+        Meter a received photo, run one step of the algorithm and send the new settings to Frame if the
+        registers change.
+
+        Returns:
+            The algorithm result, in the same shape as RxAutoExpResult's
+        """
+        self.stats = jpeg_statistics(jpeg_bytes, self.max_size)
+        result = self._run_algo(metering_from_statistics(self.stats, self.clip_headroom))
+
+        registers = [int(self.last_state[key]) for key in ('shutter', 'analog_gain', 'red_gain', 'green_gain', 'blue_gain')]
+        if registers != self.registers:
+            await self.frame.send_message(self.manual_exp_settings_msg, TxManualExpSettings(*registers).pack())
+            self.registers = registers
+        return result
+
+def benchmark(jpeg_bytes: bytes, repeats: int = 50) -> dict:
+    """Milliseconds per photo for the statistics at low resolution and, for comparison, from a full decode"""
+    timings = {}
+    for name, stats in (('low resolution', lambda: jpeg_statistics(jpeg_bytes)),
+                        ('full decode', lambda: image_statistics(np.asarray(Image.open(io.BytesIO(jpeg_bytes)).convert('RGB'))))):
+        stats()
+        start = time.perf_counter()
+        for i in range(repeats):
+            stats()
+        timings[name] = (time.perf_counter() - start) / repeats * 1000.0
+    return timings
+
+async def frames_to_converge(scene_name: str, images, mode: str, max_frames: int = 15, tolerance: float = 0.1,
+                             clip_headroom: float = 2.0, seed: int = 0):
+    """
+    Run a live feed of 720x720 photos on a simulated Frame looking at the scene, with one auto exposure step
+    per photo, from the default starting settings.
+
+    Modes: 'metering' queries the FPGA metering before each step (with the algorithm's default speed, or
+    'metering fast' with exposure_speed 1.0); 'jpeg' meters from the photo itself.
+
+    Returns:
+        (photos until one is within tolerance of the target exposure or None, white balance error of that photo)
+    """
+    from ae_controller import MANUALEXP_SETTINGS_MSG, METERING_QUERY_MSG
+    from auto_exposure_batch import INITIAL_STATE, load_algo
+    from sensor_model import SensorModel
+    from sim_frame import SimFrame, SimExposureApp
+    from frame_msg import RxMeteringData, RxPhoto, TxCaptureSettings, TxCode
+
+    sim = SimFrame()
+    sensor = SensorModel.from_scenes([scene_name], seed=seed)
+    app = SimExposureApp(sim, sensor, images, seed=seed)
+    rx_photo = RxPhoto(upright=False)
+    photo_queue = await rx_photo.attach(sim)
+    rx_metering_data = RxMeteringData()
+    metering_queue = await rx_metering_data.attach(sim)
+
+    algo = load_algo('proposed')
+    last_state = dict(INITIAL_STATE['proposed'])
+    target = 0.18
+    jpeg_ae = JpegAutoExposure(sim, MANUALEXP_SETTINGS_MSG, algo, last_state, clip_headroom=clip_headroom)
+    speed = {'exposure_speed': 1.0} if mode == 'metering fast' else {}
+
+    converged = None
+    for photo in range(1, max_frames + 1):
+        # the app loop leaves at least a second between photos, so settings sent after a photo are in effect by the next
+        await sim.sleep(1.0)
+        await sim.send_message(0x0d, TxCaptureSettings(resolution=720).pack())
+        jpeg_bytes = await photo_queue.get()
+
+        stats = jpeg_statistics(jpeg_bytes)
+        if abs(stats['matrix'].mean() / 255.0 / target - 1.0) <= tolerance:
+            converged = (photo, sensor.white_balance_error(*app.registers[2:5]).item())
+            break
+
+        if mode == 'jpeg':
+            await jpeg_ae.update(jpeg_bytes)
+        else:
+            await sim.send_message(METERING_QUERY_MSG, TxCode().pack())
+            metering_data = await metering_queue.get()
+            algo(metering_data=metering_data, last_state=last_state, **speed)
+            await sim.send_message(MANUALEXP_SETTINGS_MSG, TxManualExpSettings(
+                *[int(last_state[key]) for key in ('shutter', 'analog_gain', 'red_gain', 'green_gain', 'blue_gain')]).pack())
+
+    rx_photo.detach(sim)
+    rx_metering_data.detach(sim)
+    return converged if converged is not None else (None, None)
+
+async def main():
+    """
+    Benchmark the statistics per 720p photo, then compare the number of live feed photos until the exposure
+    is good when metering from the FPGA metering and from the photos, on a simulated Frame for each synthetic scene
+    """
+    from sensor_model import SCENES
+    from sim_frame import load_scene
+
+    parser = argparse.ArgumentParser(description="Metering from received photos against the FPGA metering")
+    parser.add_argument('images', nargs='*', default=["images/koala.jpg"],
+                        help="image files to use as the camera's view (default: images/koala.jpg)")
+    images = load_scene(parser.parse_args().images)
+    output = io.BytesIO()
+    images[0].convert('RGB').resize((720, 720)).save(output, format='JPEG', quality=50)
+    jpeg_bytes = output.getvalue()
+
+    timings = benchmark(jpeg_bytes)
+    print(f"statistics per 720x720 photo ({len(jpeg_bytes)} bytes): "
+          + ", ".join(f"{name} {ms:.2f}ms" for name, ms in timings.items()))
+    stats = jpeg_statistics(jpeg_bytes)
+    print(f"metering from the photo: {({k: round(v, 2) for k, v in metering_from_statistics(stats).items()})}\n")
+
+    modes = ['metering', 'metering fast', 'jpeg']
+    print(f"photos until within 10% of the target exposure (white balance error of that photo)")
+    print(f"{'scene':<16}" + "".join(f"{mode:>20}" for mode in modes))
+    totals = {mode: [] for mode in modes}
+    for scene_name in SCENES:
+        row = f"{scene_name:<16}"
+        for mode in modes:
+            photos, wb_error = await frames_to_converge(scene_name, images, mode)
+            totals[mode].append(photos)
+            row += f"{(f'{photos} ({wb_error:.2f})' if photos is not None else 'never'):>20}"
+        print(row)
+    # scenes outside the exposure limits never converge in any mode, so leave them out of the mean
+    reached = [i for i in range(len(SCENES)) if all(totals[mode][i] is not None for mode in modes)]
+    print(f"{'mean':<16}" + "".join(f"{np.mean([totals[mode][i] for i in reached]):>20.1f}" for mode in modes))
+
+if __name__ == "__main__":
+    asyncio.run(main())
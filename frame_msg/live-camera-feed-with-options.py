@@ -0,0 +1,288 @@
+import asyncio
+from PIL import Image
+import io
+import cv2
+import numpy as np
+import threading
+import os
+import queue
+
+from frame_msg import FrameMsg, RxMeteringData, TxCaptureSettings, TxCode
+
+from capture_rate import CaptureRateController
+from progressive_photo import PartialJpegDecoder, RxPhotoStream
+from reassembly import RxPhotoBuffered
+from capture_gate import CAPTURE_GATE_SETTINGS_MSG, METERING_QUERY_MSG, CaptureGate, TxCaptureGateSettings, metering_values
+from recorder import BackgroundRecorder
+from frame_bus import FrameBus
+from photo_archive import PhotoArchive
+
+# Skip photos of an unchanged scene: None takes a photo every time, 'host' queries the metering first and only
+# requests a photo when it has changed, 'frame' lets Frame do that comparison and send photos by itself
+# (see capture_gate_report.py for the bytes and radio time each saves)
+CAPTURE_GATE = None
+
+# Photos per second to aim for, choosing the resolution and quality of each photo from the link throughput
+# measured on the photos before it (see capture_rate_report.py); None always takes 720px photos
+TARGET_FPS = None
+
+# Show each photo as it arrives, top rows first over the previous photo, rather than once it is complete
+# (see progressive_photo_report.py for how much sooner the first rows show)
+PROGRESSIVE_PREVIEW = False
+
+# Also decode each photo once into a shared memory frame bus of this name, for other local processes
+# (inference, recording) to read in place, e.g. frame_bus_subscriber.py; None to not publish
+# (see frame_bus_report.py for the throughput with several subscribers)
+FRAME_BUS = None
+
+# Also keep every photo, with its capture settings, in a content addressed archive in this directory
+# (see photo_archive_report.py); None to not archive
+ARCHIVE_DIR = None
+
+# Record the feed as an MJPEG AVI in this directory, rolling over to a new file before AVI's 1GB limit;
+# None to not record
+RECORD_DIR = None
+
+class ImageDisplayThread:
+    def __init__(self, window_name="Camera Feed"):
+        self.window_name = window_name
+        self.image_queue = queue.Queue(maxsize=1)
+        self.decoder = PartialJpegDecoder()
+        self.running = True
+        self.thread = threading.Thread(target=self.run)
+        self.thread.daemon = True
+        
+    def start(self):
+        self.thread.start()
+        
+    def stop(self):
+        self.running = False
+        if self.thread.is_alive():
+            self.thread.join(timeout=1.0)
+        cv2.destroyAllWindows()
+        
+    def update_image(self, jpeg_bytes):
+        try:
+            # Replace old image with new one
+            if self.image_queue.full():
+                try:
+                    self.image_queue.get_nowait()
+                except queue.Empty:
+                    pass
+            self.image_queue.put_nowait((jpeg_bytes, True))
+        except queue.Full:
+            pass  # Skip frame if queue is full
+
+    def update_partial(self, jpeg_prefix):
+        # never replace a complete photo waiting to be shown, the next partial will be newer anyway
+        try:
+            self.image_queue.put_nowait((jpeg_prefix, False))
+        except queue.Full:
+            pass
+    
+    def run(self):
+        cv2.namedWindow(self.window_name, cv2.WINDOW_NORMAL)
+        
+        while self.running:
+            try:
+                # Check if there's a new image
+                try:
+                    jpeg_bytes, complete = self.image_queue.get(timeout=0.1)
+
+                    if complete:
+                        pil_image = Image.open(io.BytesIO(jpeg_bytes))
+                        self.decoder.keep(pil_image)
+                    else:
+                        # the rows received so far over the previous photo (None until the image data starts)
+                        pil_image = self.decoder.render(jpeg_bytes)
+
+                    if pil_image is not None:
+                        # Convert PIL Image to OpenCV format
+                        cv_image = np.array(pil_image)
+                        # Convert RGB to BGR (OpenCV uses BGR)
+                        if cv_image.shape[2] == 3:  # If it has 3 channels
+                            cv_image = cv2.cvtColor(cv_image, cv2.COLOR_RGB2BGR)
+
+                        # Display image
+                        cv2.imshow(self.window_name, cv_image)
+                except queue.Empty:
+                    pass
+                
+                # Process events and check for key press
+                key = cv2.waitKey(10) & 0xFF
+                if key == 27:  # ESC key
+                    self.running = False
+                    break
+                    
+            except Exception as e:
+                print(f"Error in display thread: {e}")
+                break
+
+async def main():
+    """
+    Take photos continuously using the Frame camera and display them in an OpenCV window, as live-camera-feed.py
+    does, with the options above for gating, rate control, progressive preview, recording and sharing the feed
+    """
+    frame = None
+    display_thread = None
+    rx_photo = None
+    rx_metering = None
+    preview_task = None
+    recorder = None
+    frame_bus = None
+    archive = None
+    
+    try:
+        # Initialize display thread
+        display_thread = ImageDisplayThread()
+        display_thread.start()
+        
+        frame = FrameMsg()
+        await frame.connect()
+
+        # debug only: check our current battery level and memory usage
+        batt_mem = await frame.send_lua('print(frame.battery_level() .. " / " .. collectgarbage("count"))', await_print=True)
+        print(f"Battery Level/Memory used: {batt_mem}")
+
+        # Let the user know we're starting
+        await frame.print_short_text('Loading...')
+
+        # send the std lua files to Frame
+        await frame.upload_stdlua_libs(lib_names=['data', 'camera'])
+
+        # Send the main lua application
+        if CAPTURE_GATE:
+            await frame.upload_file("lua/capture_gate.lua", "capture_gate.lua")
+            await frame.upload_frame_app(local_filename="lua/gated_camera_frame_app.lua")
+        else:
+            await frame.upload_frame_app(local_filename="lua/camera_frame_app.lua")
+
+        frame.attach_print_response_handler()
+
+        # Start the frame app
+        await frame.start_frame_app()
+
+        # hook up the RxPhoto receiver
+        rx_photo = RxPhotoStream() if PROGRESSIVE_PREVIEW else RxPhotoBuffered()
+        photo_queue = await rx_photo.attach(frame)
+        if PROGRESSIVE_PREVIEW:
+            async def show_partial_photos():
+                while True:
+                    display_thread.update_partial(await rx_photo.partial_queue.get())
+            preview_task = asyncio.create_task(show_partial_photos())
+
+        if CAPTURE_GATE == 'host':
+            rx_metering = RxMeteringData()
+            metering_queue = await rx_metering.attach(frame)
+            gate = CaptureGate()
+
+        # give the frame some time for the autoexposure loop to run
+        print("Letting autoexposure loop run for 5 seconds to settle")
+        await asyncio.sleep(5.0)
+        print("Starting continuous capture")
+
+        # record the received JPEGs as they are into an MJPEG AVI file, off the capture loop
+        if RECORD_DIR:
+            os.makedirs(RECORD_DIR, exist_ok=True)
+            recorder = BackgroundRecorder(os.path.join(RECORD_DIR, 'recording.avi'), fps=10.0, audio_sample_rate=None)
+            recorder.start()
+
+        if FRAME_BUS:
+            frame_bus = FrameBus(name=FRAME_BUS)
+        if ARCHIVE_DIR:
+            archive = PhotoArchive(ARCHIVE_DIR)
+            archive.start()
+
+        capture_settings = TxCaptureSettings(resolution=720)
+        rate_controller = None
+        if TARGET_FPS and CAPTURE_GATE != 'frame':
+            rate_controller = CaptureRateController.for_frame_rate(TARGET_FPS, quiet=False)
+        if CAPTURE_GATE == 'frame':
+            # from here on Frame sends a photo whenever its metering says the scene has changed
+            await frame.send_message(CAPTURE_GATE_SETTINGS_MSG, TxCaptureGateSettings().pack())
+            await frame.send_message(0x0d, capture_settings.pack())
+
+        # Main capture loop
+        capture_count = 0
+        while True:
+            if not display_thread.running:
+                print("Display window closed, exiting...")
+                break
+                
+            if CAPTURE_GATE == 'host':
+                # the metering is 6 bytes, so check it before asking for a whole photo
+                await frame.send_message(METERING_QUERY_MSG, TxCode().pack())
+                metering = await asyncio.wait_for(metering_queue.get(), timeout=10.0)
+                if not gate.changed(metering_values(metering), asyncio.get_running_loop().time()):
+                    await asyncio.sleep(0.1)
+                    continue
+
+            if CAPTURE_GATE == 'frame':
+                # wait for the next photo Frame decides to send (at least every max_interval)
+                jpeg_bytes = await asyncio.wait_for(photo_queue.get(), timeout=10.0)
+            else:
+                if rate_controller:
+                    capture_settings = rate_controller.settings
+                request_time = asyncio.get_running_loop().time()
+
+                # Request a photo
+                await frame.send_message(0x0d, capture_settings.pack())
+
+                # get the jpeg bytes
+                jpeg_bytes = await asyncio.wait_for(photo_queue.get(), timeout=10.0)
+
+                if rate_controller:
+                    now = asyncio.get_running_loop().time()
+                    rate_controller.update(len(jpeg_bytes), now - request_time, now)
+            
+            # Update the display and the recording
+            display_thread.update_image(jpeg_bytes)
+            if recorder:
+                recorder.add_frame(jpeg_bytes)
+            if frame_bus:
+                frame_bus.publish_jpeg(jpeg_bytes)
+            if archive:
+                archive.add(jpeg_bytes, settings=capture_settings)
+            
+            capture_count += 1
+            print(f"Captured frame {capture_count}", end="\r")
+            
+            # Small delay between captures
+            if CAPTURE_GATE != 'frame':
+                await asyncio.sleep(0.1)  # Adjust this value as needed
+            
+    except asyncio.CancelledError:
+        print("\nCapture loop cancelled")
+    except Exception as e:
+        print(f"\nAn error occurred: {e}")
+    finally:
+        # Clean up resources
+        print("\nCleaning up resources...")
+        if preview_task:
+            preview_task.cancel()
+        if rx_photo and frame:
+            rx_photo.detach(frame)
+        if rx_metering and frame:
+            rx_metering.detach(frame)
+        # finish the AVI file and the archive, and release the frame bus's shared memory, before anything on the
+        # BLE side can fail (after a dropped connection, stop_frame_app() raises)
+        if recorder:
+            recorder.stop()
+            print(f"Recording saved to: {', '.join(recorder.paths)}: {recorder.stats()}")
+        if display_thread:
+            display_thread.stop()
+        if frame_bus:
+            frame_bus.close()
+        if archive:
+            archive.stop()
+            print(f"Photos archived in {archive.directory}: {archive.stats()}")
+        if frame:
+            frame.detach_print_response_handler()
+            await frame.stop_frame_app()
+            await frame.disconnect()
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        print("\nProgram interrupted by user")
@@ -1,12 +1,18 @@
 import asyncio
-from PIL import Image
-import io
 import cv2
-import numpy as np
 import threading
 import queue
+import tempfile
 
-from frame_msg import FrameMsg, RxPhoto, RxAutoExpResult, TxCaptureSettings, TxAutoExpSettings, TxManualExpSettings
+from frame_msg import FrameMsg, RxPhoto, TxCaptureSettings, TxAutoExpSettings, TxManualExpSettings
+
+from ae_history import AutoExpHistory
+from autoexp_telemetry import AUTOEXP_TELEMETRY_SETTINGS_MSG, RxAutoExpTelemetry, TxAutoExpTelemetrySettings
+from jpeg_metering import JpegAutoExposure
+from params_overlay import ParamsOverlay
+
+# run auto exposure on the host, metering from each received photo, instead of on Frame from the FPGA metering
+JPEG_METERING = False
 
 class CameraDisplay:
     def __init__(self, window_name="Live Camera Feed"):
@@ -17,7 +23,10 @@ class CameraDisplay:
         self.thread = threading.Thread(target=self.run)
         self.thread.daemon = True
         self.latest_autoexp = None
-        self.last_image = None
+        # preallocated parameters panel and image, composited in place
+        self.overlay = ParamsOverlay()
+        # every auto exposure result for plotting and diagnostics, the last hour's worth at one per 100ms
+        self.history = AutoExpHistory(capacity=36000)
 
     def start(self):
         self.thread.start()
@@ -41,6 +50,7 @@ class CameraDisplay:
             pass  # Skip frame if queue is full
 
     def update_autoexp(self, autoexp_data):
+        self.history.append(autoexp_data)
         try:
             # Replace old data with new one
             if self.autoexp_queue.full():
@@ -52,101 +62,33 @@ class CameraDisplay:
         except queue.Full:
             pass  # Skip data if queue is full
 
-    def create_params_display(self, autoexp_data, width):
-        # Create a blank image for parameters display
-        params_height = 230  # Height of the parameters panel
-        params_img = np.zeros((params_height, width, 3), dtype=np.uint8)
-
-        # Background color - dark gray
-        params_img[:, :] = (25, 25, 25)
-
-        # Display parameters as text
-        font = cv2.FONT_HERSHEY_SIMPLEX
-        font_scale = 0.5
-        color = (255, 255, 255)  # White text
-        thickness = 1
-        line_spacing = 25
-
-        # Format and display the exposure parameters
-        lines = [
-            f"Shutter: {int(autoexp_data['shutter'])}",
-            f"Analog Gain: {int(autoexp_data['analog_gain'])}",
-            f"RGB Gains: R:{autoexp_data['red_gain']:.2f} G:{autoexp_data['green_gain']:.2f} B:{autoexp_data['blue_gain']:.2f}",
-            f"Error: {autoexp_data['error']:.4f}",
-            f"Brightness (Center Weighted): {autoexp_data['brightness']['center_weighted_average']:.2f}",
-            f"Brightness (Scene): {autoexp_data['brightness']['scene']:.2f}"
-        ]
-
-        # Add matrix and spot brightness values
-        matrix = autoexp_data['brightness']['matrix']
-        spot = autoexp_data['brightness']['spot']
-
-        lines.extend([
-            f"Matrix Brightness: R:{matrix['r']:.2f} G:{matrix['g']:.2f} B:{matrix['b']:.2f} Avg:{matrix['average']:.2f}",
-            f"Spot Brightness: R:{spot['r']:.2f} G:{spot['g']:.2f} B:{spot['b']:.2f} Avg:{spot['average']:.2f}"
-        ])
-
-        # Draw each line of text
-        y_pos = 30
-        for line in lines:
-            cv2.putText(params_img, line, (20, y_pos), font, font_scale, color, thickness)
-            y_pos += line_spacing
-
-        return params_img
-
     def run(self):
         cv2.namedWindow(self.window_name, cv2.WINDOW_NORMAL)
         cv2.resizeWindow(self.window_name, 720, 950)  # Adjust initial window size
 
         while self.running:
             try:
-                # Check for new auto-exposure data first
+                # Check for new auto-exposure data first, redrawing only the parameter lines that changed
                 got_new_autoexp = False
                 try:
                     self.latest_autoexp = self.autoexp_queue.get_nowait()
+                    self.overlay.set_params(self.latest_autoexp)
                     got_new_autoexp = True
                 except queue.Empty:
                     pass
 
-                # Check if there's a new image
+                # Check if there's a new image, decoding it straight into the display buffer below the parameters
                 got_new_image = False
                 try:
                     jpeg_bytes = self.image_queue.get(timeout=0.1)
-
-                    # Convert PIL Image to OpenCV format
-                    pil_image = Image.open(io.BytesIO(jpeg_bytes))
-                    cv_image = np.array(pil_image)
-
-                    # Convert RGB to BGR (OpenCV uses BGR)
-                    if cv_image.shape[2] == 3:  # If it has 3 channels
-                        cv_image = cv2.cvtColor(cv_image, cv2.COLOR_RGB2BGR)
-
-                    # Store this image for future auto-exposure updates
-                    self.last_image = cv_image.copy()
+                    self.overlay.set_jpeg(jpeg_bytes)
                     got_new_image = True
-
-                    # Create combined display if we have auto-exposure data
-                    if self.latest_autoexp:
-                        params_display = self.create_params_display(self.latest_autoexp, cv_image.shape[1])
-                        # Stack parameters display above the image
-                        combined_image = np.vstack([params_display, cv_image])
-                        # Display combined image
-                        cv2.imshow(self.window_name, combined_image)
-                    else:
-                        # Display just the image if no auto-exposure data yet
-                        cv2.imshow(self.window_name, cv_image)
-
                 except queue.Empty:
                     pass
 
-                # Update display if we have either new image or new auto-exposure data
-                if (got_new_image or got_new_autoexp) and self.latest_autoexp is not None and self.last_image is not None:
-                    params_display = self.create_params_display(self.latest_autoexp, self.last_image.shape[1])
-                    combined_image = np.vstack([params_display, self.last_image])
-                    cv2.imshow(self.window_name, combined_image)
-                elif got_new_image and self.last_image is not None:
-                    # Display just the image if no auto-exposure data yet
-                    cv2.imshow(self.window_name, self.last_image)
+                # Show the combined image (or just the image if no auto-exposure data yet) once per update
+                if (got_new_image or got_new_autoexp) and self.overlay.has_image:
+                    cv2.imshow(self.window_name, self.overlay.frame())
 
                 # Process events and check for key press
                 key = cv2.waitKey(10) & 0xFF
@@ -185,6 +127,9 @@ async def main():
         # send the std lua files to Frame
         await frame.upload_stdlua_libs(lib_names=['data', 'battery', 'camera', 'code', 'plain_text'])
 
+        # send the module that decides which auto exposure results the frame app sends
+        await frame.upload_file("lua/autoexp_telemetry.lua", "autoexp_telemetry.lua")
+
         # Send the main lua application
         await frame.upload_frame_app(local_filename="lua/live_camera_frame_app.lua")
 
@@ -197,30 +142,40 @@ async def main():
         rx_photo = RxPhoto()
         photo_queue = await rx_photo.attach(frame)
 
-        # hook up the RxAutoExpResult receiver
-        rx_autoexp = RxAutoExpResult()
+        # hook up the auto exposure result receiver, which rebuilds full results from the deltas
+        rx_autoexp = RxAutoExpTelemetry()
         autoexp_queue = await rx_autoexp.attach(frame)
 
+        # only send auto exposure values when they move, and at most twice a second, leaving the link to the photos
+        # (TxAutoExpTelemetrySettings(delta=False) sends every result in full, as before)
+        await frame.send_message(AUTOEXP_TELEMETRY_SETTINGS_MSG, TxAutoExpTelemetrySettings().pack())
+
         # prime the camera with initial settings and give them time to take effect
         #await frame.send_message(0x0f, TxManualExpSettings(manual_shutter=1600).pack())
         #await asyncio.sleep(0.2)
 
-        # custom auto exposure limits can be set here in the constructor
-        # e.g. tx_auto_exp = TxAutoExpSettings(shutter_limit=1600, analog_gain_limit=32, rgb_gain_limit=1023)
-        tx_auto_exp = TxAutoExpSettings(exposure=0.1, shutter_limit=10000, analog_gain_limit=16, rgb_gain_limit=287)
-        #tx_auto_exp = TxAutoExpSettings()
+        jpeg_ae = None
+        if JPEG_METERING:
+            # manual exposure settings (0x0f) from the host after each photo turn off the auto exposure loop on Frame,
+            # and the results go to the display just like the ones Frame sends
+            jpeg_ae = JpegAutoExposure(frame, 0x0f, target_exposure=0.1, shutter_limit=10000, analog_gain_limit=16, rgb_gain_limit=287)
+        else:
+            # custom auto exposure limits can be set here in the constructor
+            # e.g. tx_auto_exp = TxAutoExpSettings(shutter_limit=1600, analog_gain_limit=32, rgb_gain_limit=1023)
+            tx_auto_exp = TxAutoExpSettings(exposure=0.1, shutter_limit=10000, analog_gain_limit=16, rgb_gain_limit=287)
+            #tx_auto_exp = TxAutoExpSettings()
 
-        # send the auto exposure parameters to Frame before iterating over the loop
-        await frame.send_message(0x0e, tx_auto_exp.pack())
+            # send the auto exposure parameters to Frame before iterating over the loop
+            await frame.send_message(0x0e, tx_auto_exp.pack())
 
-        # give the frame some time for the autoexposure loop to run (50 times; every 0.1s)
-        print("Letting autoexposure loop run for 5 seconds to settle")
-        await asyncio.sleep(5.0)
+            # give the frame some time for the autoexposure loop to run (50 times; every 0.1s)
+            print("Letting autoexposure loop run for 5 seconds to settle")
+            await asyncio.sleep(5.0)
 
         print("Starting continuous capture")
 
         # Create tasks for handling both photo and auto-exposure data
-        photo_task = asyncio.create_task(handle_photos(frame, photo_queue, display))
+        photo_task = asyncio.create_task(handle_photos(frame, photo_queue, display, jpeg_ae))
         autoexp_task = asyncio.create_task(handle_autoexp(autoexp_queue, display))
 
         # Wait for either task to complete or the display to close
@@ -254,9 +209,13 @@ async def main():
             await frame.disconnect()
         if display:
             display.stop()
+            if len(display.history):
+                history_path = f"{tempfile.mkdtemp(prefix='frame_autoexp_')}/history.npy"
+                display.history.save(history_path)
+                print(f"Auto exposure history ({len(display.history)} results) saved to: {history_path}")
 
-async def handle_photos(frame, photo_queue, display):
-    """Handle photo capture in a separate task"""
+async def handle_photos(frame, photo_queue, display, jpeg_ae=None):
+    """Handle photo capture in a separate task, running one host-side auto exposure step per photo if jpeg_ae is given"""
     capture_count = 0
     try:
         while True:
@@ -272,6 +231,9 @@ async def handle_photos(frame, photo_queue, display):
             # Update the display
             display.update_image(jpeg_bytes)
 
+            if jpeg_ae:
+                display.update_autoexp(await jpeg_ae.update(jpeg_bytes))
+
             capture_count += 1
             print(f"Captured frame {capture_count}", end="\r")
 
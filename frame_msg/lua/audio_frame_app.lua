@@ -1,12 +1,15 @@
 local data = require('data.min')
 local code = require('code.min')
 local audio = require('audio.min')
+local vad = require('vad')
 
 -- Phone to Frame flags
 AUDIO_SUBS_MSG = 0x30
+VAD_SETTINGS_MSG = 0x31
 
 -- register the message parsers so they are automatically called when matching data comes in
 data.parsers[AUDIO_SUBS_MSG] = code.parse_code
+data.parsers[VAD_SETTINGS_MSG] = vad.parse_vad_settings
 
 -- Main app loop
 function app_loop()
@@ -46,19 +49,25 @@ function app_loop()
 						data.app_data[AUDIO_SUBS_MSG] = nil
 					end
 
+					if (data.app_data[VAD_SETTINGS_MSG] ~= nil) then
+						vad.set_vad_settings(data.app_data[VAD_SETTINGS_MSG])
+						data.app_data[VAD_SETTINGS_MSG] = nil
+					end
+
 				end
 
 				-- send any pending audio data back
 				-- Streams until AUDIO_SUBS_MSG is sent from host with a value of 0
 				if streaming then
-					-- read_and_send_audio() sends one MTU worth of samples
+					-- read_and_send_audio() reads one MTU worth of samples and sends them,
+					-- or gates them as silence if voice activity gating is enabled
 					-- so loop up to 10 times until we have caught up or the stream has stopped
-					local sent = audio.read_and_send_audio()
+					local sent = vad.read_and_send_audio()
 					for i = 1, 10 do
 						if sent == nil or sent == 0 then
 							break
 						end
-						sent = audio.read_and_send_audio()
+						sent = vad.read_and_send_audio()
 					end
 					if sent == nil then
 						streaming = false
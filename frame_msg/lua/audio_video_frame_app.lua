@@ -1,16 +1,38 @@
 local data = require('data.min')
 local code = require('code.min')
 local audio = require('audio.min')
+local vad = require('vad')
 local camera = require('camera.min')
 
 -- Phone to Frame flags
 AUDIO_SUBS_MSG = 0x30
+VAD_SETTINGS_MSG = 0x31
 CAPTURE_SETTINGS_MSG = 0x0d
 
 -- register the message parsers so they are automatically called when matching data comes in
 data.parsers[AUDIO_SUBS_MSG] = code.parse_code
+data.parsers[VAD_SETTINGS_MSG] = vad.parse_vad_settings
 data.parsers[CAPTURE_SETTINGS_MSG] = camera.parse_capture_settings
 
+-- Frame to Phone flags
+TIMESTAMP_MSG = 0x03
+TIMESTAMP_AUDIO = 0
+TIMESTAMP_PHOTO = 1
+
+-- seconds between audio sync points; each costs 14 bytes, vs 8000 bytes/s of audio
+AUDIO_SYNC_INTERVAL = 1.0
+
+-- send a Frame time along with the number of audio bytes read so far, or the photo number
+function send_timestamp(kind, t, counter)
+	local ts = string.pack('<BBdI4', TIMESTAMP_MSG, kind, t, counter)
+	while true do
+		-- If the Bluetooth is busy, this simply tries again until it gets through
+		if (pcall(frame.bluetooth.send, ts)) then
+			break
+		end
+	end
+end
+
 function clear_display()
     frame.display.text(" ", 1, 1)
     frame.display.show()
@@ -31,6 +53,9 @@ function app_loop()
 
 	local streaming = false
 	local last_auto_exp_time = 0
+	local audio_bytes = 0
+	local last_sync_time = 0
+	local photo_count = 0
 
 	-- tell the host program that the frameside app is ready (waiting on await_print)
 	print('Frame app is running')
@@ -49,6 +74,8 @@ function app_loop()
 						if data.app_data[AUDIO_SUBS_MSG].value == 1 then
 							audio_data = ''
 							streaming = true
+							audio_bytes = 0
+							last_sync_time = 0
 							audio.start()
 							frame.display.text("\u{F0010}", 300, 1)
 						else
@@ -62,7 +89,16 @@ function app_loop()
 						data.app_data[AUDIO_SUBS_MSG] = nil
 					end
 
+					if (data.app_data[VAD_SETTINGS_MSG] ~= nil) then
+						vad.set_vad_settings(data.app_data[VAD_SETTINGS_MSG])
+						data.app_data[VAD_SETTINGS_MSG] = nil
+					end
+
 					if (data.app_data[CAPTURE_SETTINGS_MSG] ~= nil) then
+						-- tell the host when this photo was taken, ahead of its image data
+						photo_count = photo_count + 1
+						send_timestamp(TIMESTAMP_PHOTO, frame.time.utc(), photo_count)
+
 						-- visual indicator of capture and send
 						show_flash()
 						rc, err = pcall(camera.capture_and_send, data.app_data[CAPTURE_SETTINGS_MSG])
@@ -80,10 +116,20 @@ function app_loop()
 				-- send any pending audio data back
 				-- Streams until AUDIO_SUBS_MSG is sent from host with a value of 0
 				if streaming then
-					sent = audio.read_and_send_audio()
+					sent = vad.read_and_send_audio()
 
 					if (sent == nil) then
 						streaming = false
+					else
+						audio_bytes = audio_bytes + sent
+
+						-- periodically tie the audio byte count to the Frame clock so the host can
+						-- line photos up with the audio without timestamping every audio packet
+						local t = frame.time.utc()
+						if sent > 0 and (t - last_sync_time) >= AUDIO_SYNC_INTERVAL then
+							send_timestamp(TIMESTAMP_AUDIO, t, audio_bytes)
+							last_sync_time = t
+						end
 					end
 
 					-- 8kHz/8 bit is 8000b/s, which is 33 packets/second, or 1 every 30ms
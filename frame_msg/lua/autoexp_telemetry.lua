@@ -0,0 +1,113 @@
+-- Module deciding which auto exposure results to send to the host, and how.
+-- By default every result goes out in full (camera.send_autoexp_result, 65 bytes every 100ms). In delta mode a
+-- result is only sent when a value has moved beyond its threshold since the host last heard it, no more often
+-- than min_interval, and then only the values that moved; a full result (key frame) goes out first and at
+-- least every max_interval so a host that joins late or misses a message catches up.
+local camera = require('camera.min')
+
+local _M = {}
+
+-- Frame to Host flag for delta messages: uint16 bitmask of the fields that follow, then one float per set bit
+local AUTOEXP_DELTA_MSG = 0x16
+
+-- field order of the full result message (RxAutoExpResult), also the bit order of the delta bitmask
+local NUM_FIELDS = 16
+-- fields 1 (error) to 6 (blue_gain) and 8 (scene brightness) change by ratios, the rest are 0..1 brightness levels
+local RELATIVE_FIELDS = { [1] = true, [2] = true, [3] = true, [4] = true, [5] = true, [6] = true, [8] = true }
+
+local settings = {
+	delta = false,
+	min_interval = 0.5,
+	max_interval = 10.0,
+	register_threshold = 0.02,
+	brightness_threshold = 0.01
+}
+
+-- values as the host last received them, and when
+local sent = nil
+local last_send_time = 0
+local last_key_time = 0
+
+-- parse the telemetry settings message from the host into a table we can use with set_settings()
+function _M.parse_settings(data)
+	local settings = {}
+
+	settings.delta = string.byte(data, 1) > 0
+	settings.min_interval = (string.byte(data, 2) << 8 | string.byte(data, 3)) / 1000.0
+	settings.max_interval = (string.byte(data, 4) << 8 | string.byte(data, 5)) / 1000.0
+	settings.register_threshold, settings.brightness_threshold = string.unpack('<ff', data, 6)
+
+	return settings
+end
+
+-- new settings take effect with a key frame, so the host starts from the full state
+function _M.set_settings(args)
+	for k, v in pairs(args) do
+		if v ~= nil then
+			settings[k] = v
+		end
+	end
+	sent = nil
+end
+
+local function flatten(autoexp)
+	local brightness = autoexp['brightness']
+	return {
+		autoexp['error'], autoexp['shutter'], autoexp['analog_gain'],
+		autoexp['red_gain'], autoexp['green_gain'], autoexp['blue_gain'],
+		brightness['center_weighted_average'], brightness['scene'],
+		brightness['matrix']['r'], brightness['matrix']['g'], brightness['matrix']['b'], brightness['matrix']['average'],
+		brightness['spot']['r'], brightness['spot']['g'], brightness['spot']['b'], brightness['spot']['average']
+	}
+end
+
+local function moved(i, old, new)
+	if RELATIVE_FIELDS[i] then
+		return math.abs(new - old) > settings.register_threshold * math.max(math.abs(old), 1e-6)
+	end
+	return math.abs(new - old) > settings.brightness_threshold
+end
+
+-- send the result of camera.run_auto_exposure() as the settings ask, returning the number of bytes sent
+function _M.send(autoexp)
+	if not settings.delta then
+		camera.send_autoexp_result(autoexp)
+		return 65
+	end
+
+	local now = frame.time.utc()
+	local values = flatten(autoexp)
+
+	if sent == nil or (settings.max_interval > 0 and now - last_key_time >= settings.max_interval) then
+		camera.send_autoexp_result(autoexp)
+		sent = values
+		last_send_time = now
+		last_key_time = now
+		return 65
+	end
+
+	if now - last_send_time < settings.min_interval then
+		return 0
+	end
+
+	local mask = 0
+	local changed = {}
+	for i = 1, NUM_FIELDS do
+		if moved(i, sent[i], values[i]) then
+			mask = mask | (1 << (i - 1))
+			changed[#changed + 1] = values[i]
+			sent[i] = values[i]
+		end
+	end
+
+	if mask == 0 then
+		return 0
+	end
+
+	local data = string.pack('<BI2' .. string.rep('f', #changed), AUTOEXP_DELTA_MSG, mask, table.unpack(changed))
+	send_data(data)
+	last_send_time = now
+	return #data
+end
+
+return _M
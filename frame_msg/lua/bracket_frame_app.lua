@@ -0,0 +1,250 @@
+local data = require('data.min')
+local camera = require('camera.min')
+local code = require('code.min')
+
+-- Phone to Frame flags
+CAPTURE_SETTINGS_MSG = 0x0d
+BRACKET_SETTINGS_MSG = 0x22
+
+-- Frame to Phone flags
+IMAGE_MSG = 0x07
+IMAGE_FINAL_MSG = 0x08
+BATCH_MSG = 0x14
+BATCH_PHOTO_MSG = 0x15
+
+-- parse the bracket settings message: flags (bit 0: gate the settle on the metering), minimum and maximum
+-- settle time in milliseconds (Uint16 each), the number of exposures, then each exposure in the same 9 byte
+-- layout as the manual exposure settings message
+function parse_bracket_settings(data)
+	local settings = {}
+	settings.gated = string.byte(data, 1) & 0x01 > 0
+	settings.min_settle = (string.byte(data, 2) << 8 | string.byte(data, 3)) / 1000.0
+	settings.max_settle = (string.byte(data, 4) << 8 | string.byte(data, 5)) / 1000.0
+	settings.exposures = {}
+	for i = 1, string.byte(data, 6) do
+		local offset = 7 + (i - 1) * 9
+		table.insert(settings.exposures, camera.parse_manual_exp_settings(string.sub(data, offset, offset + 8)))
+	end
+	return settings
+end
+
+-- register the message parsers so they are automatically called when matching data comes in
+data.parsers[CAPTURE_SETTINGS_MSG] = camera.parse_capture_settings
+data.parsers[BRACKET_SETTINGS_MSG] = parse_bracket_settings
+
+local bracket = { gated = true, min_settle = 0.02, max_settle = 0.2, exposures = {} }
+
+-- shutter and analog gain currently in the sensor, from the auto exposure loop or the last bracket exposure
+local current = nil
+
+-- photos of the burst captured but not yet sent to the host: { name, time, size }
+local queued = {}
+
+function clear_display()
+    frame.display.text(" ", 1, 1)
+    frame.display.show()
+    frame.sleep(0.04)
+end
+
+function show_flash()
+    frame.display.bitmap(241, 191, 160, 2, 0, string.rep("\xFF", 400))
+    frame.display.bitmap(311, 121, 20, 2, 0, string.rep("\xFF", 400))
+    frame.display.show()
+    frame.sleep(0.04)
+end
+
+-- send data with retries and no sleeps, bail after 2 seconds
+function send_with_retry(data)
+	local try_until = frame.time.utc() + 2
+
+	while frame.time.utc() < try_until do
+		if pcall(frame.bluetooth.send, data) then
+			return
+		end
+	end
+
+	error('Error sending batch data')
+end
+
+-- mean of the matrix r, g, b metering (0-255)
+function matrix_level()
+	local metering = frame.fpga_read(0x25, 6)
+	return (string.byte(metering, 4) + string.byte(metering, 5) + string.byte(metering, 6)) / 3.0
+end
+
+-- wait for new exposure settings to reach the sensor. New settings take up to 200ms to take effect, so
+-- without gating this waits max_settle; gated, it returns as soon as the matrix metering has moved at least
+-- halfway (in stops) from its level before the change towards the level the change should give
+function wait_for_settle(before, ratio)
+	local start = frame.time.utc()
+
+	local expected = 0
+	local distance = 0
+	if ratio ~= nil then
+		before = math.max(before, 1)
+		expected = math.min(math.max(before * ratio, 1), 255)
+		distance = math.abs(math.log(expected / before))
+	end
+
+	while frame.time.utc() - start < bracket.max_settle do
+		if bracket.gated and ratio ~= nil and frame.time.utc() - start >= bracket.min_settle then
+			-- same exposure: nothing to wait for; a change the metering can't show (clipped): wait it out
+			if ratio == 1 then
+				return
+			end
+			if distance > 0.2 and math.abs(math.log(expected / math.max(matrix_level(), 1))) < distance / 2 then
+				return
+			end
+		end
+		frame.sleep(0.005)
+	end
+end
+
+-- capture a photo and store the JPEG in flash instead of sending it
+function capture_to_file(name, capture_settings)
+	frame.camera.capture { resolution=capture_settings.resolution, quality=capture_settings.quality, pan=capture_settings.pan }
+
+	-- wait until the capture is finished and the image is ready before continuing
+	while not frame.camera.image_ready() do
+		frame.sleep(0.005)
+	end
+
+	local f = frame.file.open(name, 'write')
+	local size = 0
+
+	-- read in the same chunk size that will be sent later, so each read becomes one packet
+	while true do
+		local chunk = frame.camera.read(frame.bluetooth.max_length() - 1)
+		if chunk == nil then
+			break
+		end
+		f:write(chunk)
+		size = size + string.len(chunk)
+	end
+
+	f:close()
+	return size
+end
+
+-- capture every exposure of the bracket back to back, only sending once the last one is taken, so the
+-- exposures are as close together in time as the sensor allows
+function capture_bracket(capture_settings)
+	for i, exposure in ipairs(bracket.exposures) do
+		local before = matrix_level()
+		local ratio = nil
+		if current ~= nil then
+			ratio = (exposure.shutter * exposure.analog_gain) / (current.shutter * current.analog_gain)
+		end
+
+		camera.set_manual_exp_settings(exposure)
+		wait_for_settle(before, ratio)
+		current = { shutter = exposure.shutter, analog_gain = exposure.analog_gain }
+
+		local name = 'bracket_' .. tostring(i) .. '.jpg'
+		local t = frame.time.utc()
+		table.insert(queued, { name = name, time = t, size = capture_to_file(name, capture_settings) })
+	end
+
+	-- back to auto exposure between bursts
+	camera.set_auto_exp_settings({})
+end
+
+-- send the burst in one session, in the timelapse app's batch format: a batch header with the photo count,
+-- then for each photo its capture time and size followed by the usual image chunks
+function send_batch()
+	local chunk_size = frame.bluetooth.max_length() - 1
+
+	send_with_retry(string.pack('<BI2', BATCH_MSG, #queued))
+
+	for i, photo in ipairs(queued) do
+		send_with_retry(string.pack('<BI2dI4', BATCH_PHOTO_MSG, i, photo.time, photo.size))
+
+		local f = frame.file.open(photo.name, 'read')
+		while true do
+			local chunk = f:read(chunk_size)
+			if chunk == nil or chunk == '' then
+				break
+			end
+			send_with_retry(string.char(IMAGE_MSG) .. chunk)
+		end
+		f:close()
+
+		send_with_retry(string.char(IMAGE_FINAL_MSG))
+		frame.file.remove(photo.name)
+	end
+
+	queued = {}
+end
+
+function discard_batch()
+	for _, photo in ipairs(queued) do
+		pcall(frame.file.remove, photo.name)
+	end
+	queued = {}
+end
+
+-- Main app loop
+function app_loop()
+	clear_display()
+
+	-- tell the host program that the frameside app is ready (waiting on await_print)
+	print('Frame app is running')
+
+	while true do
+        rc, err = pcall(
+            function()
+				-- process any raw data items, if ready
+				local items_ready = data.process_raw_items()
+
+				if items_ready > 0 then
+
+					if (data.app_data[BRACKET_SETTINGS_MSG] ~= nil) then
+						bracket = data.app_data[BRACKET_SETTINGS_MSG]
+						data.app_data[BRACKET_SETTINGS_MSG] = nil
+					end
+
+					if (data.app_data[CAPTURE_SETTINGS_MSG] ~= nil) then
+						-- visual indicator of capture and send
+						show_flash()
+						rc, err = pcall(capture_bracket, data.app_data[CAPTURE_SETTINGS_MSG])
+						clear_display()
+
+						if rc == false then
+							print(err)
+							discard_batch()
+						else
+							rc, err = pcall(send_batch)
+							if rc == false then
+								print(err)
+								discard_batch()
+							end
+						end
+
+						data.app_data[CAPTURE_SETTINGS_MSG] = nil
+					end
+
+				end
+
+				-- keep the auto exposure running between bursts, so a burst starts from a known exposure
+				if camera.is_auto_exp then
+					local autoexp = camera.run_auto_exposure()
+					current = { shutter = autoexp['shutter'], analog_gain = autoexp['analog_gain'] }
+				end
+
+				frame.sleep(0.1)
+			end
+		)
+		-- Catch the break signal here and clean up the display
+		if rc == false then
+			-- send the error back on the stdout stream
+			print(err)
+			frame.display.text(" ", 1, 1)
+			frame.display.show()
+			frame.sleep(0.04)
+			break
+		end
+	end
+end
+
+-- run the main app loop
+app_loop()
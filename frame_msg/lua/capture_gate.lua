@@ -0,0 +1,70 @@
+-- Module deciding whether the scene has changed enough since the last photo to be worth another one,
+-- from the FPGA metering (spot r,g,b and matrix r,g,b), which costs a register read rather than a capture
+-- and a transfer of a whole JPEG. A photo is also due every max_interval, changed or not.
+local _M = {}
+
+local settings = {
+	enabled = false,
+	spot_threshold = 8,
+	matrix_threshold = 4,
+	max_interval = 5.0
+}
+
+-- metering when the last photo was taken, and when
+local reference = nil
+local reference_time = 0
+
+-- parse the capture gate settings message from the host into a table we can use with set_settings()
+function _M.parse_settings(data)
+	local settings = {}
+
+	settings.enabled = string.byte(data, 1) > 0
+	settings.spot_threshold = string.byte(data, 2)
+	settings.matrix_threshold = string.byte(data, 3)
+	settings.max_interval = (string.byte(data, 4) << 8 | string.byte(data, 5)) / 10.0
+
+	return settings
+end
+
+-- new settings start from a fresh reference, so the first check takes a photo
+function _M.set_settings(args)
+	for k, v in pairs(args) do
+		if v ~= nil then
+			settings[k] = v
+		end
+	end
+	reference = nil
+end
+
+function _M.enabled()
+	return settings.enabled
+end
+
+-- whether the metering has moved beyond a threshold since the last photo (or max_interval has passed);
+-- returning true makes the current metering the reference for the next check
+function _M.changed()
+	local metering = frame.fpga_read(0x25, 6)
+	local now = frame.time.utc()
+
+	local changed = reference == nil or now - reference_time >= settings.max_interval
+	if not changed then
+		for i = 1, 6 do
+			local threshold = settings.matrix_threshold
+			if i <= 3 then
+				threshold = settings.spot_threshold
+			end
+			if math.abs(string.byte(metering, i) - string.byte(reference, i)) > threshold then
+				changed = true
+				break
+			end
+		end
+	end
+
+	if changed then
+		reference = metering
+		reference_time = now
+	end
+	return changed
+end
+
+return _M
@@ -0,0 +1,237 @@
+-- Module running the proposed auto exposure and white balance algorithm (camera_auto_exposure_algo in
+-- exposure_wb_algo_proposed.py) on Frame, so each iteration needs no metering query, response or manual
+-- exposure message over Bluetooth. The calculation follows the Python reference step for step, so given
+-- the same metering and settings both produce the same results.
+local _M = {}
+
+local metering_values = {'SPOT', 'CENTER_WEIGHTED', 'AVERAGE'}
+
+-- default settings, as in the Python reference; off until the host enables it
+local settings = {
+	enabled = false,
+	metering = 'AVERAGE',
+	target_exposure = 0.18,
+	exposure_speed = 0.50,
+	shutter_limit = 3072.0,
+	analog_gain_limit = 16.0,
+	rgb_gain_limit = 141.0,
+	white_balance_speed = 0.5,
+	brightness_constant = 4166400.0,
+	white_balance_min_activation = 50.0,
+	white_balance_max_activation = 200.0,
+	telemetry_interval = 10,
+	settle_time = 0.2
+}
+
+-- last state of exposure/white balance parameters
+local state = {
+	shutter = 1600.0,
+	analog_gain = 1.0,
+	red_gain = 121.6,
+	green_gain = 64.0,
+	blue_gain = 140.8
+}
+
+-- enabled status and number of iterations run, accessible outside the module
+_M.enabled = false
+_M.iterations = 0
+
+-- earliest time the settings last written to the camera are sure to show in the metering
+local next_run_time = 0
+
+-- parse the exposure/white balance settings message from the host into a table we can use with set_settings()
+-- floats are sent as little-endian float32 so the host can run the Python reference with identical values
+function _M.parse_settings(data)
+	local settings = {}
+
+	settings.enabled = string.byte(data, 1) > 0
+	settings.metering = metering_values[string.byte(data, 2) + 1]
+	settings.target_exposure, settings.exposure_speed, settings.shutter_limit, settings.analog_gain_limit,
+		settings.rgb_gain_limit, settings.white_balance_speed, settings.brightness_constant,
+		settings.white_balance_min_activation, settings.white_balance_max_activation = string.unpack('<fffffffff', data, 3)
+	settings.telemetry_interval = string.byte(data, 39)
+	settings.settle_time = string.byte(data, 40) / 100.0
+
+	return settings
+end
+
+function _M.set_settings(args)
+	for k, v in pairs(args) do
+		if v ~= nil then
+			settings[k] = v
+		end
+	end
+	_M.enabled = settings.enabled
+end
+
+-- start from the given exposure/white balance state, e.g. the manual settings currently in the camera
+function _M.set_state(args)
+	for k, v in pairs(args) do
+		if v ~= nil then
+			state[k] = v + 0.0
+		end
+	end
+end
+
+-- whether the result of the latest iteration should be sent to the host
+function _M.telemetry_due()
+	return settings.telemetry_interval > 0 and _M.iterations % settings.telemetry_interval == 0
+end
+
+-- one step of the algorithm for the 6 metering bytes (spot r/g/b, matrix r/g/b) as read from the FPGA
+-- returns the result table in the same shape as the Python reference (and camera.send_autoexp_result expects)
+function _M.run(metering_data)
+	-- Use current brightness from FPGA, normalized 0..1
+	local spot_r = string.byte(metering_data, 1) / 255.0
+	local spot_g = string.byte(metering_data, 2) / 255.0
+	local spot_b = string.byte(metering_data, 3) / 255.0
+	local matrix_r = string.byte(metering_data, 4) / 255.0
+	local matrix_g = string.byte(metering_data, 5) / 255.0
+	local matrix_b = string.byte(metering_data, 6) / 255.0
+
+	local spot_average = (spot_r + spot_g + spot_b) / 3.0
+	local matrix_average = (matrix_r + matrix_g + matrix_b) / 3.0
+	local center_weighted_average = (spot_average + spot_average + matrix_average) / 3.0
+
+	-- Prevent division by zero by setting a small minimum value
+	spot_average = math.max(spot_average, 0.001)
+	matrix_average = math.max(matrix_average, 0.001)
+	center_weighted_average = math.max(center_weighted_average, 0.001)
+
+	-- Auto exposure based on metering mode
+	local err
+	if settings.metering == 'SPOT' then
+		err = settings.exposure_speed * ((settings.target_exposure / spot_average) - 1) + 1
+	elseif settings.metering == 'CENTER_WEIGHTED' then
+		err = settings.exposure_speed * ((settings.target_exposure / center_weighted_average) - 1) + 1
+	else
+		err = settings.exposure_speed * ((settings.target_exposure / matrix_average) - 1) + 1
+	end
+
+	local last_shutter = state.shutter
+	local last_analog_gain = state.analog_gain
+	local last_red_gain = state.red_gain
+	local last_green_gain = state.green_gain
+	local last_blue_gain = state.blue_gain
+
+	if err > 1 then
+		-- Adjust exposure - increase shutter first, then gain
+		local shutter = last_shutter
+		last_shutter = last_shutter * err
+
+		if last_shutter > settings.shutter_limit then
+			last_shutter = settings.shutter_limit
+		end
+
+		err = err * (shutter / last_shutter)
+
+		if err > 1 then
+			last_analog_gain = last_analog_gain * err
+
+			if last_analog_gain > settings.analog_gain_limit then
+				last_analog_gain = settings.analog_gain_limit
+			end
+		end
+	else
+		-- Adjust exposure - decrease gain first, then shutter
+		local analog_gain = last_analog_gain
+		last_analog_gain = last_analog_gain * err
+
+		if last_analog_gain < 1.0 then
+			last_analog_gain = 1.0
+		end
+
+		err = err * (analog_gain / last_analog_gain)
+
+		if err < 1 then
+			last_shutter = last_shutter * err
+
+			if last_shutter < 4.0 then
+				last_shutter = 4.0
+			end
+		end
+	end
+
+	-- Prevent division by zero in auto white balance
+	matrix_r = math.max(matrix_r, 0.001)
+	matrix_g = math.max(matrix_g, 0.001)
+	matrix_b = math.max(matrix_b, 0.001)
+	last_red_gain = math.max(last_red_gain, 0.001)
+	last_green_gain = math.max(last_green_gain, 0.001)
+	last_blue_gain = math.max(last_blue_gain, 0.001)
+
+	-- Auto white balance based on full scene matrix, normalized RGB values scaled to the gain scale
+	local normalized_r = matrix_r / last_red_gain
+	local normalized_g = matrix_g / last_green_gain
+	local normalized_b = matrix_b / last_blue_gain
+	local max_rgb = 256.0 * math.max(normalized_r, normalized_g, normalized_b)
+
+	-- Calculate the gains needed to match all channels to max_rgb
+	local red_gain = max_rgb / matrix_r * last_red_gain
+	local green_gain = max_rgb / matrix_g * last_green_gain
+	local blue_gain = max_rgb / matrix_b * last_blue_gain
+
+	-- Calculate scene brightness and the white balance blending factor
+	local scene_brightness = settings.brightness_constant * (matrix_average / (last_shutter * last_analog_gain))
+	local blending_factor = (scene_brightness - settings.white_balance_min_activation) / (
+		settings.white_balance_max_activation - settings.white_balance_min_activation)
+	blending_factor = math.max(0.0, math.min(1.0, blending_factor))
+
+	-- Apply gradual update to gain values
+	last_red_gain = blending_factor * settings.white_balance_speed * (red_gain - last_red_gain) + last_red_gain
+	last_green_gain = blending_factor * settings.white_balance_speed * (green_gain - last_green_gain) + last_green_gain
+	last_blue_gain = blending_factor * settings.white_balance_speed * (blue_gain - last_blue_gain) + last_blue_gain
+
+	-- Scale per-channel gains so the largest channel is at most rgb_gain_limit
+	local max_rgb_gain = math.max(last_red_gain, last_green_gain, last_blue_gain)
+	if max_rgb_gain > settings.rgb_gain_limit then
+		local scale_factor = settings.rgb_gain_limit / max_rgb_gain
+		last_red_gain = last_red_gain * scale_factor
+		last_green_gain = last_green_gain * scale_factor
+		last_blue_gain = last_blue_gain * scale_factor
+	end
+
+	-- Save state for next call
+	state.shutter = last_shutter
+	state.analog_gain = last_analog_gain
+	state.red_gain = last_red_gain
+	state.green_gain = last_green_gain
+	state.blue_gain = last_blue_gain
+
+	return {
+		brightness = {
+			spot = { r = spot_r, g = spot_g, b = spot_b, average = spot_average },
+			matrix = { r = matrix_r, g = matrix_g, b = matrix_b, average = matrix_average },
+			center_weighted_average = center_weighted_average,
+			scene = scene_brightness
+		},
+		error = err,
+		shutter = last_shutter,
+		analog_gain = last_analog_gain,
+		red_gain = last_red_gain,
+		green_gain = last_green_gain,
+		blue_gain = last_blue_gain
+	}
+end
+
+-- read the metering from the FPGA, run one step and write the new settings to the camera (call this every 100ms)
+-- steps are skipped (returning nil) until the previous settings have had settle_time to take effect, because
+-- the camera takes up to 200ms to apply them and reacting to stale metering makes the exposure oscillate
+function _M.run_auto_exposure()
+	if frame.time.utc() < next_run_time then
+		return nil
+	end
+
+	local result = _M.run(frame.fpga_read(0x25, 6))
+	_M.iterations = _M.iterations + 1
+
+	-- registers take the integer part, as the host-driven loop does with int()
+	frame.camera.set_shutter(math.floor(result.shutter))
+	frame.camera.set_gain(math.floor(result.analog_gain))
+	frame.camera.set_white_balance(math.floor(result.red_gain), math.floor(result.green_gain), math.floor(result.blue_gain))
+	next_run_time = frame.time.utc() + settings.settle_time
+
+	return result
+end
+
+return _M
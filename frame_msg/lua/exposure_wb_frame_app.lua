@@ -1,16 +1,19 @@
 local data = require('data.min')
 local camera = require('camera.min')
 local code = require('code.min')
+local exposure_wb = require('exposure_wb')
 
 -- Phone to Frame flags
 CAPTURE_SETTINGS_MSG = 0x0d
 MANUALEXP_SETTINGS_MSG = 0x0c
 METERING_QUERY_MSG = 0x12
+EXPOSURE_WB_SETTINGS_MSG = 0x13
 
 -- register the message parser so it's automatically called when matching data comes in
 data.parsers[CAPTURE_SETTINGS_MSG] = camera.parse_capture_settings
 data.parsers[MANUALEXP_SETTINGS_MSG] = camera.parse_manual_exp_settings
 data.parsers[METERING_QUERY_MSG] = code.parse_code
+data.parsers[EXPOSURE_WB_SETTINGS_MSG] = exposure_wb.parse_settings
 
 function clear_display()
     frame.display.text(" ", 1, 1)
@@ -59,10 +62,26 @@ function app_loop()
 					end
 
 					if (data.app_data[MANUALEXP_SETTINGS_MSG] ~= nil) then
+						-- manual settings from the host take over from the on-device algorithm
+						exposure_wb.set_settings({ enabled = false })
 						camera.set_manual_exp_settings(data.app_data[MANUALEXP_SETTINGS_MSG])
 						data.app_data[MANUALEXP_SETTINGS_MSG] = nil
 					end
 
+					if (data.app_data[EXPOSURE_WB_SETTINGS_MSG] ~= nil) then
+						exposure_wb.set_settings(data.app_data[EXPOSURE_WB_SETTINGS_MSG])
+						data.app_data[EXPOSURE_WB_SETTINGS_MSG] = nil
+					end
+
+				end
+
+				-- run the proposed exposure/white balance algorithm on Frame if selected,
+				-- sending only periodic results to the host
+				if exposure_wb.enabled then
+					local result = exposure_wb.run_auto_exposure()
+					if result ~= nil and exposure_wb.telemetry_due() then
+						camera.send_autoexp_result(result)
+					end
 				end
 
 				frame.sleep(0.1)
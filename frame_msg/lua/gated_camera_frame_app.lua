@@ -0,0 +1,113 @@
+local data = require('data.min')
+local camera = require('camera.min')
+local capture_gate = require('capture_gate')
+
+-- Phone to Frame flags
+CAPTURE_SETTINGS_MSG = 0x0d
+METERING_QUERY_MSG = 0x12
+CAPTURE_GATE_SETTINGS_MSG = 0x23
+
+-- the metering query carries no values, any payload asks for the current metering
+function parse_metering_query(data)
+	return true
+end
+
+-- register the message parser so it's automatically called when matching data comes in
+data.parsers[CAPTURE_SETTINGS_MSG] = camera.parse_capture_settings
+data.parsers[METERING_QUERY_MSG] = parse_metering_query
+data.parsers[CAPTURE_GATE_SETTINGS_MSG] = capture_gate.parse_settings
+
+-- capture settings of the gated feed, while it runs
+local feed_settings = nil
+
+function clear_display()
+    frame.display.text(" ", 1, 1)
+    frame.display.show()
+    frame.sleep(0.04)
+end
+
+function show_flash()
+    frame.display.bitmap(241, 191, 160, 2, 0, string.rep("\xFF", 400))
+    frame.display.bitmap(311, 121, 20, 2, 0, string.rep("\xFF", 400))
+    frame.display.show()
+    frame.sleep(0.04)
+end
+
+function capture_and_send(capture_settings)
+	-- visual indicator of capture and send
+	show_flash()
+	local rc, err = pcall(camera.capture_and_send, capture_settings)
+	clear_display()
+
+	if rc == false then
+		print(err)
+	end
+end
+
+-- Main app loop
+function app_loop()
+	clear_display()
+
+	-- tell the host program that the frameside app is ready (waiting on await_print)
+	print('Frame app is running')
+
+	while true do
+        rc, err = pcall(
+            function()
+				-- process any raw data items, if ready (parse into take_photo, then clear data.app_data_block)
+				local items_ready = data.process_raw_items()
+
+				if items_ready > 0 then
+
+					if (data.app_data[CAPTURE_GATE_SETTINGS_MSG] ~= nil) then
+						capture_gate.set_settings(data.app_data[CAPTURE_GATE_SETTINGS_MSG])
+						-- disabling the gate stops the feed
+						if not capture_gate.enabled() then
+							feed_settings = nil
+						end
+						data.app_data[CAPTURE_GATE_SETTINGS_MSG] = nil
+					end
+
+					if (data.app_data[METERING_QUERY_MSG] ~= nil) then
+						camera.send_metering_data()
+						data.app_data[METERING_QUERY_MSG] = nil
+					end
+
+					if (data.app_data[CAPTURE_SETTINGS_MSG] ~= nil) then
+						if capture_gate.enabled() then
+							-- start (or change) the gated feed, which takes its photos below
+							feed_settings = data.app_data[CAPTURE_SETTINGS_MSG]
+						else
+							capture_and_send(data.app_data[CAPTURE_SETTINGS_MSG])
+						end
+						data.app_data[CAPTURE_SETTINGS_MSG] = nil
+					end
+
+				end
+
+				-- only capture when the metering says the scene has changed (or the photo is getting old)
+				if feed_settings ~= nil and capture_gate.changed() then
+					capture_and_send(feed_settings)
+				end
+
+				if camera.is_auto_exp then
+					camera.run_auto_exposure()
+				end
+
+				frame.sleep(0.1)
+			end
+		)
+		-- Catch the break signal here and clean up the display
+		if rc == false then
+			-- send the error back on the stdout stream
+			print(err)
+			frame.display.text(" ", 1, 1)
+			frame.display.show()
+			frame.sleep(0.04)
+			break
+		end
+	end
+end
+
+-- run the main app loop
+app_loop()
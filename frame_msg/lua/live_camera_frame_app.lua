@@ -3,6 +3,7 @@ local battery = require('battery.min')
 local camera = require('camera.min')
 local code = require('code.min')
 local plain_text = require('plain_text.min')
+local autoexp_telemetry = require('autoexp_telemetry')
 
 -- Phone to Frame flags
 CAPTURE_SETTINGS_MSG = 0x0d
@@ -10,6 +11,7 @@ AUTO_EXP_SETTINGS_MSG = 0x0e
 MANUAL_EXP_SETTINGS_MSG = 0x0f
 TEXT_MSG = 0x0a
 TAP_SUBS_MSG = 0x10
+AUTOEXP_TELEMETRY_SETTINGS_MSG = 0x14
 
 -- register the message parser so it's automatically called when matching data comes in
 data.parsers[CAPTURE_SETTINGS_MSG] = camera.parse_capture_settings
@@ -17,6 +19,7 @@ data.parsers[AUTO_EXP_SETTINGS_MSG] = camera.parse_auto_exp_settings
 data.parsers[MANUAL_EXP_SETTINGS_MSG] = camera.parse_manual_exp_settings
 data.parsers[TEXT_MSG] = plain_text.parse_plain_text
 data.parsers[TAP_SUBS_MSG] = code.parse_code
+data.parsers[AUTOEXP_TELEMETRY_SETTINGS_MSG] = autoexp_telemetry.parse_settings
 
 -- Frame to Host flags
 TAP_MSG = 0x09
@@ -105,6 +108,11 @@ function app_loop()
 						data.app_data[MANUAL_EXP_SETTINGS_MSG] = nil
 					end
 
+					if (data.app_data[AUTOEXP_TELEMETRY_SETTINGS_MSG] ~= nil) then
+						autoexp_telemetry.set_settings(data.app_data[AUTOEXP_TELEMETRY_SETTINGS_MSG])
+						data.app_data[AUTOEXP_TELEMETRY_SETTINGS_MSG] = nil
+					end
+
 					if (data.app_data[TEXT_MSG] ~= nil and data.app_data[TEXT_MSG].string ~= nil) then
 						print_text()
 						frame.display.show()
@@ -134,8 +142,8 @@ function app_loop()
 
 				if camera.is_auto_exp then
 					autoexp_result = camera.run_auto_exposure()
-					-- send the current auto exposure result back to the host
-					camera.send_autoexp_result(autoexp_result)
+					-- send the current auto exposure result back to the host (every time, or only what changed in delta mode)
+					autoexp_telemetry.send(autoexp_result)
 				end
 
 				frame.sleep(0.1)
@@ -0,0 +1,453 @@
+local data = require('data.min')
+local code = require('code.min')
+
+-- Phone to Frame flags
+FEATURES_MSG = 0x60
+TEXT_MSG = 0x0a
+CAPTURE_SETTINGS_MSG = 0x0d
+AUTO_EXP_SETTINGS_MSG = 0x0e
+MANUAL_EXP_SETTINGS_MSG = 0x0f
+TAP_SUBS_MSG = 0x10
+USER_SPRITE = 0x20
+-- 0x20 in text_sprite_block_frame_app.lua, moved here since the sprite feature has 0x20
+TEXT_SPRITE_BLOCK = 0x25
+AUDIO_SUBS_MSG = 0x30
+VAD_SETTINGS_MSG = 0x31
+IMU_SUBS_MSG = 0x40
+
+-- Frame to Phone flags
+FEATURES_STATE_MSG = 0x17
+IMU_DATA_MSG = 0x0A
+
+-- feature bits in the value of the FEATURES_MSG code
+CAMERA = 0x01
+AUDIO = 0x02
+IMU = 0x04
+TAP = 0x08
+SPRITE = 0x10
+TEXT = 0x20
+TEXT_SPRITE = 0x40
+
+-- IMU readings are sent every IMU_PERIOD seconds, as imu_frame_app.lua does from its 200ms loop
+IMU_PERIOD = 0.2
+
+-- messages for features that are switched off are parsed to nothing (and dropped) rather than
+-- left unparsed in data.app_data_block, where process_raw_items() would report them every loop
+local function discard(block, prev)
+	return nil
+end
+
+-- modules are loaded when their feature is switched on, and unloaded when it is switched off
+-- so that only the features in use take up memory
+local function unload(name)
+	package.loaded[name] = nil
+end
+
+function clear_display()
+	frame.display.text(" ", 1, 1)
+	frame.display.show()
+	frame.sleep(0.04)
+end
+
+function show_flash()
+	frame.display.bitmap(241, 191, 160, 2, 0, string.rep("\xFF", 400))
+	frame.display.bitmap(311, 121, 20, 2, 0, string.rep("\xFF", 400))
+	frame.display.show()
+	frame.sleep(0.04)
+end
+
+-- draw the specified text on the display
+function print_text(text)
+	local i = 0
+	for line in text:gmatch('([^\n]*)\n?') do
+		if line ~= "" then
+			frame.display.text(line, 1, i * 60 + 1)
+			i = i + 1
+		end
+	end
+end
+
+-- Each feature lists the message codes it handles, loads its modules and registers its parsers in enable(),
+-- releases everything in disable(), and does its share of the app loop in run(), which returns the longest
+-- it can wait for the next loop (the app loop sleeps for the shortest wait of the features that are on)
+
+local camera = nil
+local camera_feature = {
+	codes = {CAPTURE_SETTINGS_MSG, AUTO_EXP_SETTINGS_MSG, MANUAL_EXP_SETTINGS_MSG},
+
+	enable = function()
+		camera = require('camera.min')
+		data.parsers[CAPTURE_SETTINGS_MSG] = camera.parse_capture_settings
+		data.parsers[AUTO_EXP_SETTINGS_MSG] = camera.parse_auto_exp_settings
+		data.parsers[MANUAL_EXP_SETTINGS_MSG] = camera.parse_manual_exp_settings
+	end,
+
+	disable = function()
+		camera = nil
+		unload('camera.min')
+	end,
+
+	run = function()
+		if data.app_data[CAPTURE_SETTINGS_MSG] ~= nil then
+			-- visual indicator of capture and send
+			show_flash()
+			rc, err = pcall(camera.capture_and_send, data.app_data[CAPTURE_SETTINGS_MSG])
+			clear_display()
+
+			if rc == false then
+				print(err)
+			end
+
+			data.app_data[CAPTURE_SETTINGS_MSG] = nil
+		end
+
+		if data.app_data[AUTO_EXP_SETTINGS_MSG] ~= nil then
+			camera.set_auto_exp_settings(data.app_data[AUTO_EXP_SETTINGS_MSG])
+			data.app_data[AUTO_EXP_SETTINGS_MSG] = nil
+		end
+
+		if data.app_data[MANUAL_EXP_SETTINGS_MSG] ~= nil then
+			camera.set_manual_exp_settings(data.app_data[MANUAL_EXP_SETTINGS_MSG])
+			data.app_data[MANUAL_EXP_SETTINGS_MSG] = nil
+		end
+
+		if camera.is_auto_exp then
+			camera.run_auto_exposure()
+		end
+
+		return 0.1
+	end
+}
+
+local audio = nil
+local vad = nil
+local audio_streaming = false
+local audio_feature = {
+	codes = {AUDIO_SUBS_MSG, VAD_SETTINGS_MSG},
+
+	enable = function()
+		audio = require('audio.min')
+		vad = require('vad')
+		data.parsers[AUDIO_SUBS_MSG] = code.parse_code
+		data.parsers[VAD_SETTINGS_MSG] = vad.parse_vad_settings
+	end,
+
+	disable = function()
+		if audio_streaming then
+			-- flush the microphone and send the end of the stream, so the host's clip is complete
+			audio.stop()
+			for i = 1, 200 do
+				if vad.read_and_send_audio() == nil then
+					break
+				end
+			end
+			audio_streaming = false
+		end
+		audio = nil
+		vad = nil
+		unload('audio.min')
+		unload('vad')
+	end,
+
+	run = function()
+		if data.app_data[AUDIO_SUBS_MSG] ~= nil then
+			if data.app_data[AUDIO_SUBS_MSG].value == 1 then
+				audio_streaming = true
+				audio.start()
+			else
+				-- audio_streaming is cleared once all the audio data is flushed
+				audio.stop()
+			end
+			data.app_data[AUDIO_SUBS_MSG] = nil
+		end
+
+		if data.app_data[VAD_SETTINGS_MSG] ~= nil then
+			vad.set_vad_settings(data.app_data[VAD_SETTINGS_MSG])
+			data.app_data[VAD_SETTINGS_MSG] = nil
+		end
+
+		if audio_streaming then
+			-- catch up with the microphone, as audio_frame_app.lua does
+			local sent = vad.read_and_send_audio()
+			for i = 1, 10 do
+				if sent == nil or sent == 0 then
+					break
+				end
+				sent = vad.read_and_send_audio()
+			end
+			if sent == nil then
+				audio_streaming = false
+			end
+
+			-- 8kHz/8 bit is ~33 packets/second, or 1 every 30ms
+			return 0.005
+		end
+
+		return 0.1
+	end
+}
+
+local imu = nil
+local imu_streaming = false
+local imu_next_send = 0
+local imu_feature = {
+	codes = {IMU_SUBS_MSG},
+
+	enable = function()
+		imu = require('imu.min')
+		data.parsers[IMU_SUBS_MSG] = code.parse_code
+	end,
+
+	disable = function()
+		imu_streaming = false
+		imu = nil
+		unload('imu.min')
+	end,
+
+	run = function()
+		if data.app_data[IMU_SUBS_MSG] ~= nil then
+			imu_streaming = data.app_data[IMU_SUBS_MSG].value == 1
+			data.app_data[IMU_SUBS_MSG] = nil
+		end
+
+		if imu_streaming then
+			local now = frame.time.utc()
+			if now >= imu_next_send then
+				imu.send_imu_data(IMU_DATA_MSG)
+				imu_next_send = now + IMU_PERIOD
+			end
+			return IMU_PERIOD
+		end
+
+		return 0.1
+	end
+}
+
+local tap = nil
+local tap_feature = {
+	codes = {TAP_SUBS_MSG},
+
+	enable = function()
+		tap = require('tap.min')
+		data.parsers[TAP_SUBS_MSG] = code.parse_code
+	end,
+
+	disable = function()
+		frame.imu.tap_callback(nil)
+		tap = nil
+		unload('tap.min')
+	end,
+
+	run = function()
+		if data.app_data[TAP_SUBS_MSG] ~= nil then
+			if data.app_data[TAP_SUBS_MSG].value == 1 then
+				frame.imu.tap_callback(tap.send_tap)
+			else
+				frame.imu.tap_callback(nil)
+			end
+			data.app_data[TAP_SUBS_MSG] = nil
+		end
+
+		return 0.01
+	end
+}
+
+local sprite = nil
+local sprite_feature = {
+	codes = {USER_SPRITE},
+
+	enable = function()
+		sprite = require('sprite.min')
+		data.parsers[USER_SPRITE] = sprite.parse_sprite
+	end,
+
+	disable = function()
+		sprite = nil
+		unload('sprite.min')
+	end,
+
+	run = function()
+		if data.app_data[USER_SPRITE] ~= nil then
+			local spr = data.app_data[USER_SPRITE]
+
+			-- set the palette in case it's different to the standard palette
+			sprite.set_palette(spr.num_colors, spr.palette_data)
+
+			-- show the sprite
+			frame.display.bitmap(1, 1, spr.width, 2^spr.bpp, 0, spr.pixel_data)
+			frame.display.show()
+
+			-- clear the object and run the garbage collector right away
+			data.app_data[USER_SPRITE] = nil
+			collectgarbage('collect')
+		end
+
+		-- can't sleep for long, might be lots of incoming bluetooth data to process
+		return 0.001
+	end
+}
+
+local plain_text = nil
+local text_feature = {
+	codes = {TEXT_MSG},
+
+	enable = function()
+		plain_text = require('plain_text.min')
+		data.parsers[TEXT_MSG] = plain_text.parse_plain_text
+	end,
+
+	disable = function()
+		plain_text = nil
+		unload('plain_text.min')
+	end,
+
+	run = function()
+		if data.app_data[TEXT_MSG] ~= nil and data.app_data[TEXT_MSG].string ~= nil then
+			print_text(data.app_data[TEXT_MSG].string)
+			frame.display.show()
+
+			-- clear the object and run the garbage collector right away
+			data.app_data[TEXT_MSG] = nil
+			collectgarbage('collect')
+		end
+
+		return 0.001
+	end
+}
+
+local text_sprite_block = nil
+-- set when a text sprite block message is parsed, so the block is only redrawn after a new message arrives
+local text_sprite_updated = false
+local text_sprite_feature = {
+	codes = {TEXT_SPRITE_BLOCK},
+
+	enable = function()
+		text_sprite_block = require('text_sprite_block.min')
+		data.parsers[TEXT_SPRITE_BLOCK] = function(block, prev)
+			text_sprite_updated = true
+			return text_sprite_block.parse_text_sprite_block(block, prev)
+		end
+	end,
+
+	disable = function()
+		text_sprite_updated = false
+		text_sprite_block = nil
+		unload('text_sprite_block.min')
+	end,
+
+	run = function()
+		if not text_sprite_updated then
+			return 0.001
+		end
+		text_sprite_updated = false
+
+		local tsb = data.app_data[TEXT_SPRITE_BLOCK]
+		-- sprites accumulate in the block (the parser gets the previous value), so it's left in app_data
+		if tsb ~= nil and tsb.first_sprite_index > 0 then
+			-- either we have all the sprites, or we want to do progressive/incremental rendering
+			if tsb.progressive_render or (tsb.active_sprites == tsb.total_sprites) then
+				for index, spr in ipairs(tsb.sprites) do
+					frame.display.bitmap(1, tsb.offsets[index].y + 1, spr.width, 2^spr.bpp, 0+index, spr.pixel_data)
+				end
+				frame.display.show()
+			end
+		end
+
+		return 0.001
+	end
+}
+
+-- in the order of their bits
+local features = {
+	{bit = CAMERA, feature = camera_feature},
+	{bit = AUDIO, feature = audio_feature},
+	{bit = IMU, feature = imu_feature},
+	{bit = TAP, feature = tap_feature},
+	{bit = SPRITE, feature = sprite_feature},
+	{bit = TEXT, feature = text_feature},
+	{bit = TEXT_SPRITE, feature = text_sprite_feature},
+}
+
+local enabled = 0
+
+-- switch features on and off to match the bits of the mask, and tell the host the result
+-- and the memory in use afterwards
+function set_features(mask)
+	for _, f in ipairs(features) do
+		local on = (mask & f.bit) ~= 0
+		local was_on = (enabled & f.bit) ~= 0
+		if on and not was_on then
+			f.feature.enable()
+		elseif was_on and not on then
+			f.feature.disable()
+			for _, msg_code in ipairs(f.feature.codes) do
+				data.parsers[msg_code] = discard
+				data.app_data[msg_code] = nil
+			end
+		end
+	end
+	enabled = mask
+	collectgarbage('collect')
+
+	local state = string.pack('<BBI4', FEATURES_STATE_MSG, enabled, math.floor(collectgarbage('count') * 1024))
+	while true do
+		-- If the Bluetooth is busy, this simply tries again until it gets through
+		if (pcall(frame.bluetooth.send, state)) then
+			break
+		end
+		frame.sleep(0.0025)
+	end
+end
+
+-- register the message parsers so they are automatically called when matching data comes in:
+-- the features message, and every feature's messages (dropped until the feature is switched on)
+data.parsers[FEATURES_MSG] = code.parse_code
+for _, f in ipairs(features) do
+	for _, msg_code in ipairs(f.feature.codes) do
+		data.parsers[msg_code] = discard
+	end
+end
+
+-- Main app loop
+function app_loop()
+	frame.display.text('Frame App Started', 1, 1)
+	frame.display.show()
+
+	-- tell the host program that the frameside app is ready (waiting on await_print)
+	print('Frame app is running')
+
+	while true do
+		rc, err = pcall(
+			function()
+				-- process any raw data items, if ready
+				data.process_raw_items()
+
+				if data.app_data[FEATURES_MSG] ~= nil then
+					set_features(data.app_data[FEATURES_MSG].value)
+					data.app_data[FEATURES_MSG] = nil
+				end
+
+				-- let each feature that is on do its part, and sleep for as long as all of them can wait
+				local wait = 0.1
+				for _, f in ipairs(features) do
+					if (enabled & f.bit) ~= 0 then
+						wait = math.min(wait, f.feature.run())
+					end
+				end
+
+				frame.sleep(wait)
+			end
+		)
+		-- Catch an error (including the break signal) here
+		if rc == false then
+			-- send the error back on the stdout stream and clear the display
+			print(err)
+			frame.display.text(' ', 1, 1)
+			frame.display.show()
+			break
+		end
+	end
+end
+
+-- run the main app loop
+app_loop()
@@ -0,0 +1,59 @@
+-- Module to take a photo for a region of interest and send only the part of the JPEG the region needs.
+-- The FPGA encodes the sensor image top rows first, so a region that ends before the last row only needs
+-- the JPEG up to the MCU row holding its last row: the host works out that byte count (max_bytes) from
+-- earlier photos, and the rest of the JPEG is never read out. The downscale comes from the resolution.
+local camera = require('camera.min')
+
+local _M = {}
+
+-- Frame to phone flags
+local IMAGE_MSG = 0x07
+local IMAGE_FINAL_MSG = 0x08
+
+-- parse the ROI capture settings message from the host: the capture settings message followed by
+-- a Uint32 byte limit (0 for the whole photo)
+function _M.parse_settings(data)
+	local settings = camera.parse_capture_settings(data)
+
+	settings.max_bytes = string.byte(data, 7) << 24 | string.byte(data, 8) << 16 | string.byte(data, 9) << 8 | string.byte(data, 10)
+
+	return settings
+end
+
+-- takes a settings table from parse_settings() and sends the image data up to max_bytes to the host
+function _M.capture_and_send(args)
+	frame.camera.capture { resolution=args.resolution, quality=args.quality, pan=args.pan }
+
+	-- wait until the capture is finished and the image is ready before continuing
+	while not frame.camera.image_ready() do
+		frame.sleep(0.005)
+	end
+
+	local data = ''
+	local remaining = args.max_bytes
+	if remaining == 0 then
+		remaining = math.maxinteger
+	end
+
+	while remaining > 0 do
+		local length = math.min(frame.bluetooth.max_length() - 1, remaining)
+
+		-- skip the 623 byte header if the caller requested raw data
+		if (args.raw) then
+			data = frame.camera.read_raw(length)
+		else
+			data = frame.camera.read(length)
+		end
+
+		if (data == nil) then
+			break
+		end
+
+		send_data(string.char(IMAGE_MSG) .. data)
+		remaining = remaining - #data
+	end
+
+	send_data(string.char(IMAGE_FINAL_MSG))
+end
+
+return _M
@@ -0,0 +1,210 @@
+local data = require('data.min')
+local camera = require('camera.min')
+local code = require('code.min')
+
+-- Phone to Frame flags
+CAPTURE_SETTINGS_MSG = 0x0d
+TIMELAPSE_SETTINGS_MSG = 0x20
+TRANSFER_MSG = 0x21
+
+-- Frame to Phone flags
+IMAGE_MSG = 0x07
+IMAGE_FINAL_MSG = 0x08
+BATCH_MSG = 0x14
+BATCH_PHOTO_MSG = 0x15
+
+-- parse the timelapse settings message: interval in tenths of a second (Uint16), maximum photos to queue, and running flag
+function parse_timelapse_settings(data)
+	local settings = {}
+	settings.interval = (string.byte(data, 1) << 8 | string.byte(data, 2)) / 10.0
+	settings.max_photos = string.byte(data, 3)
+	settings.running = string.byte(data, 4) > 0
+	return settings
+end
+
+-- register the message parsers so they are automatically called when matching data comes in
+data.parsers[CAPTURE_SETTINGS_MSG] = camera.parse_capture_settings
+data.parsers[TIMELAPSE_SETTINGS_MSG] = parse_timelapse_settings
+data.parsers[TRANSFER_MSG] = code.parse_code
+
+-- current capture settings for timelapse photos (updated by CAPTURE_SETTINGS_MSG)
+local capture_settings = { resolution = 512, quality = 'VERY_HIGH', pan = 0 }
+
+-- photos captured but not yet sent to the host: { name, time, size }
+local queued = {}
+
+function clear_display()
+    frame.display.text(" ", 1, 1)
+    frame.display.show()
+    frame.sleep(0.04)
+end
+
+function show_status(running)
+	local status = running and 'Timelapse' or 'Paused'
+	frame.display.text(status .. ': ' .. tostring(#queued) .. ' queued', 1, 1)
+	frame.display.show()
+end
+
+-- send data with retries and no sleeps, bail after 2 seconds
+function send_with_retry(data)
+	local try_until = frame.time.utc() + 2
+
+	while frame.time.utc() < try_until do
+		if pcall(frame.bluetooth.send, data) then
+			return
+		end
+	end
+
+	error('Error sending batch data')
+end
+
+-- capture a photo and store the JPEG in flash instead of sending it
+function capture_to_file(name)
+	frame.camera.capture { resolution=capture_settings.resolution, quality=capture_settings.quality, pan=capture_settings.pan }
+
+	-- wait until the capture is finished and the image is ready before continuing
+	while not frame.camera.image_ready() do
+		frame.sleep(0.005)
+	end
+
+	local f = frame.file.open(name, 'write')
+	local size = 0
+
+	-- read in the same chunk size that will be sent later, so each read becomes one packet
+	while true do
+		local chunk = frame.camera.read(frame.bluetooth.max_length() - 1)
+		if chunk == nil then
+			break
+		end
+		f:write(chunk)
+		size = size + string.len(chunk)
+	end
+
+	f:close()
+	return size
+end
+
+-- send every queued photo in one session: a batch header with the photo count, then for each photo
+-- its capture time and size followed by the usual image chunks, so RxPhoto reassembles each one
+function send_batch()
+	local chunk_size = frame.bluetooth.max_length() - 1
+
+	send_with_retry(string.pack('<BI2', BATCH_MSG, #queued))
+
+	for i, photo in ipairs(queued) do
+		send_with_retry(string.pack('<BI2dI4', BATCH_PHOTO_MSG, i, photo.time, photo.size))
+
+		local f = frame.file.open(photo.name, 'read')
+		while true do
+			local chunk = f:read(chunk_size)
+			if chunk == nil or chunk == '' then
+				break
+			end
+			send_with_retry(string.char(IMAGE_MSG) .. chunk)
+		end
+		f:close()
+
+		send_with_retry(string.char(IMAGE_FINAL_MSG))
+		frame.file.remove(photo.name)
+	end
+
+	queued = {}
+end
+
+function discard_batch()
+	for _, photo in ipairs(queued) do
+		pcall(frame.file.remove, photo.name)
+	end
+	queued = {}
+end
+
+-- Main app loop
+function app_loop()
+	clear_display()
+
+	local running = false
+	local interval = 5.0
+	local max_photos = 20
+	local next_capture_time = 0
+	local photo_number = 0
+
+	-- tell the host program that the frameside app is ready (waiting on await_print)
+	print('Frame app is running')
+
+	while true do
+        rc, err = pcall(
+            function()
+				-- process any raw data items, if ready
+				local items_ready = data.process_raw_items()
+
+				if items_ready > 0 then
+
+					if (data.app_data[CAPTURE_SETTINGS_MSG] ~= nil) then
+						capture_settings = data.app_data[CAPTURE_SETTINGS_MSG]
+						data.app_data[CAPTURE_SETTINGS_MSG] = nil
+					end
+
+					if (data.app_data[TIMELAPSE_SETTINGS_MSG] ~= nil) then
+						local settings = data.app_data[TIMELAPSE_SETTINGS_MSG]
+						interval = settings.interval
+						max_photos = settings.max_photos
+						running = settings.running
+						next_capture_time = frame.time.utc()
+						show_status(running)
+						data.app_data[TIMELAPSE_SETTINGS_MSG] = nil
+					end
+
+					if (data.app_data[TRANSFER_MSG] ~= nil) then
+						-- 1: send everything queued so far in one bulk session, 0: discard the queue
+						if data.app_data[TRANSFER_MSG].value == 1 then
+							rc, err = pcall(send_batch)
+							if rc == false then
+								print(err)
+							end
+						else
+							discard_batch()
+						end
+						show_status(running)
+						data.app_data[TRANSFER_MSG] = nil
+					end
+
+				end
+
+				-- capture on schedule while there is room in the queue
+				if running and #queued < max_photos and frame.time.utc() >= next_capture_time then
+					local t = frame.time.utc()
+					next_capture_time = t + interval
+					photo_number = photo_number + 1
+
+					local name = 'tl_' .. tostring(photo_number) .. '.jpg'
+					rc, err = pcall(capture_to_file, name)
+					if rc == false then
+						print(err)
+					else
+						table.insert(queued, { name = name, time = t, size = err })
+					end
+					show_status(running)
+				end
+
+				-- keep the auto exposure running between captures
+				if camera.is_auto_exp then
+					camera.run_auto_exposure()
+				end
+
+				frame.sleep(0.1)
+			end
+		)
+		-- Catch the break signal here and clean up the display
+		if rc == false then
+			-- send the error back on the stdout stream
+			print(err)
+			frame.display.text(" ", 1, 1)
+			frame.display.show()
+			frame.sleep(0.04)
+			break
+		end
+	end
+end
+
+-- run the main app loop
+app_loop()
@@ -0,0 +1,142 @@
+-- Module for sending microphone audio gated by a simple energy/zero-crossing voice activity detector.
+-- Chunks classified as silence are not sent as PCM; instead a small marker carrying the number of
+-- gated bytes is sent so the host can reconstruct the original timing.
+-- Drop-in replacement for audio.read_and_send_audio(); with gating disabled the packets are identical.
+local _M = {}
+
+-- Frame to Host flags
+local AUDIO_SILENCE_MSG = 0x04
+local AUDIO_DATA_NON_FINAL_MSG = 0x05
+local AUDIO_DATA_FINAL_MSG = 0x06
+
+local MTU = frame.bluetooth.max_length()
+-- data buffer needs to be even for reading from microphone
+if MTU % 2 == 1 then MTU = MTU - 1 end
+
+-- default settings: gating is off until the host enables it
+local vad_settings = {
+	enabled = false,
+	energy_threshold = 4,
+	zcr_threshold = 64,
+	hangover = 8,
+	max_silence_bytes = 8000
+}
+
+-- gating state
+local silent_bytes = 0
+local hangover_left = 0
+
+-- parse the voice activity settings message from the host into a table we can use with set_vad_settings()
+function _M.parse_vad_settings(data)
+	local settings = {}
+
+	settings.enabled = string.byte(data, 1) > 0
+	settings.energy_threshold = string.byte(data, 2) & 0x7F
+	settings.zcr_threshold = string.byte(data, 3)
+	settings.hangover = string.byte(data, 4)
+	settings.max_silence_bytes = string.byte(data, 5) << 8 | string.byte(data, 6)
+
+	return settings
+end
+
+function _M.set_vad_settings(args)
+	for k, v in pairs(args) do
+		if v ~= nil then
+			vad_settings[k] = v
+		end
+	end
+	silent_bytes = 0
+	hangover_left = 0
+end
+
+-- classify a chunk of signed 8-bit samples as speech (true) or silence (false)
+-- speech if the mean absolute amplitude reaches energy_threshold, or if it reaches half of that
+-- and the zero crossing rate reaches zcr_threshold (crossings per 256 samples)
+function _M.is_speech(audio_data)
+	local n = string.len(audio_data)
+	local samples = { string.byte(audio_data, 1, n) }
+	local sum_abs = 0
+	local crossings = 0
+	local prev_neg = samples[1] > 127
+
+	for i = 1, n do
+		local s = samples[i]
+		local neg = s > 127
+		if neg then
+			sum_abs = sum_abs + 256 - s
+		else
+			sum_abs = sum_abs + s
+		end
+		if neg ~= prev_neg then
+			crossings = crossings + 1
+		end
+		prev_neg = neg
+	end
+
+	if sum_abs >= vad_settings.energy_threshold * n then
+		return true
+	end
+
+	return crossings * 256 >= vad_settings.zcr_threshold * n and sum_abs * 2 >= vad_settings.energy_threshold * n
+end
+
+local function send_with_retry(data)
+	while true do
+		-- If the Bluetooth is busy, this simply tries again until it gets through
+		if (pcall(frame.bluetooth.send, data)) then
+			break
+		end
+	end
+end
+
+-- report any accumulated silence as a single marker
+local function flush_silence()
+	if silent_bytes > 0 then
+		send_with_retry(string.pack('>BI2', AUDIO_SILENCE_MSG, silent_bytes))
+		silent_bytes = 0
+	end
+end
+
+-- reads an MTU-sized amount of audio data and sends it (or a silence marker) to the host
+-- ensure this function is called frequently enough to keep up with realtime audio
+-- as the Frame buffer is ~32k
+-- Returns nil when the stream has ended, otherwise the number of bytes read from the microphone
+function _M.read_and_send_audio()
+	local audio_data = frame.microphone.read(MTU)
+
+	-- If frame.microphone.stop() is called, a nil will be read() here
+	if audio_data == nil then
+		flush_silence()
+		-- send an end-of-stream message back to the host
+		send_with_retry(string.char(AUDIO_DATA_FINAL_MSG))
+		return nil
+
+	elseif audio_data ~= '' then
+		local len = string.len(audio_data)
+
+		if vad_settings.enabled then
+			if _M.is_speech(audio_data) then
+				hangover_left = vad_settings.hangover
+			elseif hangover_left > 0 then
+				hangover_left = hangover_left - 1
+			else
+				-- gate this chunk, just count it
+				silent_bytes = silent_bytes + len
+				if silent_bytes >= vad_settings.max_silence_bytes then
+					flush_silence()
+				end
+				return len
+			end
+		end
+
+		-- speech resumed: the host needs the silence first to keep the timeline in order
+		flush_silence()
+		send_with_retry(string.char(AUDIO_DATA_NON_FINAL_MSG) .. audio_data)
+		return len
+	end
+
+	-- no data read, no data sent
+	return 0
+end
+
+return _M
@@ -0,0 +1,82 @@
+import asyncio
+from PIL import Image
+import io
+
+from frame_msg import FrameMsg, RxIMU, RxPhoto, TxCaptureSettings, TxCode, TxPlainText
+from frame_features import CAMERA, IMU, TEXT, FeatureSwitch, feature_names, upload_multi_frame_app
+
+async def main():
+    """
+    Take a photo, then read the IMU, then show text, switching the features of lua/multi_frame_app.lua
+    on and off by message instead of uploading and restarting a frame app for each one
+    """
+    frame = FrameMsg()
+    try:
+        await frame.connect()
+
+        # Let the user know we're starting
+        await frame.print_short_text('Loading...')
+
+        # send the std lua files of every feature and the multi feature app; these stay on Frame,
+        # so later runs could skip this and go straight to start_frame_app()
+        await upload_multi_frame_app(frame)
+
+        # attach the print response handler so we can see stdout from Frame Lua print() statements
+        frame.attach_print_response_handler()
+
+        # "require" the main frame_app lua file to run it, and block until it has started.
+        await frame.start_frame_app()
+
+        # hook up the receivers of all the features we'll use, and the switch
+        rx_photo = RxPhoto()
+        photo_queue = await rx_photo.attach(frame)
+        rx_imu = RxIMU(smoothing_samples=5)
+        imu_queue = await rx_imu.attach(frame)
+        features = FeatureSwitch(frame)
+        await features.attach()
+
+        # camera: let the autoexposure loop settle, then take a photo
+        state = await features.set(CAMERA)
+        print(f"{feature_names(state.features)} on, {state.memory / 1024:.1f}kB of Lua memory in use")
+        await asyncio.sleep(3.0)
+        await frame.send_message(0x0d, TxCaptureSettings(resolution=720).pack())
+        jpeg_bytes = await asyncio.wait_for(photo_queue.get(), timeout=10.0)
+        Image.open(io.BytesIO(jpeg_bytes)).show()
+
+        # IMU in place of the camera
+        state = await features.set(IMU)
+        print(f"{feature_names(state.features)} on, {state.memory / 1024:.1f}kB of Lua memory in use")
+        await frame.send_message(0x40, TxCode(value=1).pack())
+        for _ in range(10):
+            imu_update = await asyncio.wait_for(imu_queue.get(), timeout=10.0)
+            print(f"pitch: {imu_update.pitch:.2f} roll: {imu_update.roll:.2f}")
+        await frame.send_message(0x40, TxCode(value=0).pack())
+
+        # text, keeping the IMU on
+        state = await features.enable(TEXT)
+        print(f"{feature_names(state.features)} on, {state.memory / 1024:.1f}kB of Lua memory in use")
+        await frame.send_message(0x0a, TxPlainText(text="Switched without\na reboot").pack())
+        await asyncio.sleep(3.0)
+
+        await features.set(0)
+        print("feature switches took " + ", ".join(f"{1000 * t:.0f}ms" for t in features.switch_times))
+
+        # stop the receivers and clean up their resources
+        features.detach()
+        rx_imu.detach(frame)
+        rx_photo.detach(frame)
+
+        # unhook the print handler
+        frame.detach_print_response_handler()
+
+        # break out of the frame app loop and reboot Frame
+        await frame.stop_frame_app()
+
+    except Exception as e:
+        print(f"An error occurred: {e}")
+    finally:
+        # clean disconnection
+        await frame.disconnect()
+
+if __name__ == "__main__":
+    asyncio.run(main())
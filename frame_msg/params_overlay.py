@@ -0,0 +1,166 @@
+import io
+import time
+from typing import List, Optional
+
+import cv2
+import numpy as np
+from PIL import Image
+
+PANEL_HEIGHT = 230
+PANEL_COLOR = (25, 25, 25)  # dark gray
+TEXT_COLOR = (255, 255, 255)  # white
+FONT = cv2.FONT_HERSHEY_SIMPLEX
+FONT_SCALE = 0.5
+THICKNESS = 1
+FIRST_BASELINE = 30
+LINE_SPACING = 25
+# rows above and below a line's baseline that its text can touch: each line owns one LINE_SPACING high band
+BAND_ABOVE = 18
+
+def params_lines(autoexp_data: dict) -> List[str]:
+    """The lines of text shown for an auto exposure result (from RxAutoExpResult or camera_auto_exposure_algo)"""
+    matrix = autoexp_data['brightness']['matrix']
+    spot = autoexp_data['brightness']['spot']
+    return [
+        f"Shutter: {int(autoexp_data['shutter'])}",
+        f"Analog Gain: {int(autoexp_data['analog_gain'])}",
+        f"RGB Gains: R:{autoexp_data['red_gain']:.2f} G:{autoexp_data['green_gain']:.2f} B:{autoexp_data['blue_gain']:.2f}",
+        f"Error: {autoexp_data['error']:.4f}",
+        f"Brightness (Center Weighted): {autoexp_data['brightness']['center_weighted_average']:.2f}",
+        f"Brightness (Scene): {autoexp_data['brightness']['scene']:.2f}",
+        f"Matrix Brightness: R:{matrix['r']:.2f} G:{matrix['g']:.2f} B:{matrix['b']:.2f} Avg:{matrix['average']:.2f}",
+        f"Spot Brightness: R:{spot['r']:.2f} G:{spot['g']:.2f} B:{spot['b']:.2f} Avg:{spot['average']:.2f}",
+    ]
+
+class ParamsOverlay:
+    """
+    Composites camera images below a panel of auto exposure parameters into one preallocated BGR buffer.
+
+    The buffer is allocated once per image resolution; decoded images are converted straight into its image
+    region, and only the text lines whose values changed are cleared and redrawn, so an image with unchanged
+    parameters costs one decode and one colour conversion, and nothing is stacked or copied afterwards.
+    """
+    def __init__(self):
+        self.buffer: Optional[np.ndarray] = None
+        self.has_image = False
+        self.has_params = False
+        self._lines: List[Optional[str]] = []
+        self._params: Optional[dict] = None
+        self.lines_drawn = 0
+
+    def _allocate(self, height: int, width: int):
+        self.buffer = np.empty((PANEL_HEIGHT + height, width, 3), dtype=np.uint8)
+        self.buffer[:PANEL_HEIGHT] = PANEL_COLOR
+        self._lines = []
+        self.has_image = False
+        if self._params is not None:
+            self._draw_lines(params_lines(self._params))
+
+    def _draw_lines(self, lines: List[str]):
+        panel = self.buffer[:PANEL_HEIGHT]
+        if len(self._lines) < len(lines):
+            self._lines += [None] * (len(lines) - len(self._lines))
+        for i, line in enumerate(lines):
+            if line == self._lines[i]:
+                continue
+            baseline = FIRST_BASELINE + i * LINE_SPACING
+            panel[max(0, baseline - BAND_ABOVE):baseline - BAND_ABOVE + LINE_SPACING] = PANEL_COLOR
+            cv2.putText(panel, line, (20, baseline), FONT, FONT_SCALE, TEXT_COLOR, THICKNESS)
+            self._lines[i] = line
+            self.lines_drawn += 1
+
+    def image_region(self, height: int, width: int) -> np.ndarray:
+        """The part of the buffer for an image of this size (reallocating the buffer if the size changed)"""
+        if self.buffer is None or self.buffer.shape[0] != PANEL_HEIGHT + height or self.buffer.shape[1] != width:
+            self._allocate(height, width)
+        return self.buffer[PANEL_HEIGHT:]
+
+    def set_image(self, rgb: np.ndarray):
+        """Convert an RGB image (height, width, 3) into the image region"""
+        cv2.cvtColor(rgb, cv2.COLOR_RGB2BGR, dst=self.image_region(rgb.shape[0], rgb.shape[1]))
+        self.has_image = True
+
+    def set_jpeg(self, jpeg_bytes: bytes):
+        """Decode a JPEG into the image region"""
+        self.set_image(np.asarray(Image.open(io.BytesIO(jpeg_bytes)).convert('RGB')))
+
+    def set_params(self, autoexp_data: dict):
+        """Show a new auto exposure result, redrawing only the lines that changed"""
+        self._params = autoexp_data
+        self.has_params = True
+        if self.buffer is not None:
+            self._draw_lines(params_lines(autoexp_data))
+
+    def frame(self) -> Optional[np.ndarray]:
+        """The image to show: the panel and the image once both have arrived, else just the image (None before any image)"""
+        if not self.has_image:
+            return None
+        return self.buffer if self.has_params else self.buffer[PANEL_HEIGHT:]
+
+def composite_by_stacking(rgb: np.ndarray, autoexp_data: dict) -> np.ndarray:
+    """The previous per-frame compositing, for comparison: convert, copy, draw a new panel and stack them"""
+    cv_image = cv2.cvtColor(rgb, cv2.COLOR_RGB2BGR)
+    last_image = cv_image.copy()
+    panel = np.zeros((PANEL_HEIGHT, last_image.shape[1], 3), dtype=np.uint8)
+    panel[:, :] = PANEL_COLOR
+    for i, line in enumerate(params_lines(autoexp_data)):
+        cv2.putText(panel, line, (20, FIRST_BASELINE + i * LINE_SPACING), FONT, FONT_SCALE, TEXT_COLOR, THICKNESS)
+    return np.vstack([panel, last_image])
+
+def _per_frame_ms(composite, frames: int, repeats: int = 5) -> float:
+    best = float('inf')
+    for r in range(repeats):
+        start = time.perf_counter()
+        for i in range(frames):
+            composite(i)
+        best = min(best, time.perf_counter() - start)
+    return best / frames * 1000.0
+
+def main():
+    """
+    Benchmark per-frame compositing of a 720x720 photo and its parameters, stacking against the overlay,
+    with the image already decoded (the compositing alone) and including the JPEG decode
+    """
+    from auto_exposure_batch import INITIAL_STATE, METERING_KEYS, load_algo, random_traces
+
+    output = io.BytesIO()
+    Image.open("images/koala.jpg").convert('RGB').resize((720, 720)).save(output, format='JPEG', quality=50)
+    jpeg_bytes = output.getvalue()
+    rgb = np.asarray(Image.open(io.BytesIO(jpeg_bytes)).convert('RGB'))
+
+    algo = load_algo('proposed')
+    state = dict(INITIAL_STATE['proposed'])
+    results = [algo(metering_data=dict(zip(METERING_KEYS, (int(v) for v in sample))), last_state=state)
+               for sample in random_traces(200, 1, seed=0)[:, 0]]
+    frames = len(results)
+
+    # each image with a new result, and images arriving between results (the results come at their own rate)
+    overlay = ParamsOverlay()
+    overlay.set_params(results[0])
+    overlay.set_image(rgb)
+
+    def overlay_new_result(i):
+        overlay.set_image(rgb)
+        overlay.set_params(results[i])
+
+    print(f"{'per 720x720 frame':<34} {'stacking':>9} {'overlay':>9}")
+    rows = [
+        ('new result with each image', lambda i: composite_by_stacking(rgb, results[i]), overlay_new_result),
+        ('image only', lambda i: composite_by_stacking(rgb, results[0]), lambda i: overlay.set_image(rgb)),
+        ('new result with each JPEG', lambda i: composite_by_stacking(np.asarray(Image.open(io.BytesIO(jpeg_bytes))), results[i]),
+            lambda i: (overlay.set_jpeg(jpeg_bytes), overlay.set_params(results[i]))),
+    ]
+    for name, stacking, overlaid in rows:
+        print(f"{name:<34} {_per_frame_ms(stacking, frames):8.3f}ms {_per_frame_ms(overlaid, frames):8.3f}ms")
+
+    # redrawing only the changed lines leaves the same pixels as drawing the whole panel afresh
+    overlay_new_result(frames - 1)
+    assert np.array_equal(composite_by_stacking(rgb, results[-1]), overlay.frame()), "overlay differs from stacking"
+
+    overlay.lines_drawn = 0
+    for i in range(frames):
+        overlay_new_result(i)
+    print(f"lines redrawn per new result: {overlay.lines_drawn / frames:.1f} of {len(params_lines(results[0]))}")
+
+if __name__ == "__main__":
+    main()
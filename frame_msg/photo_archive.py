@@ -0,0 +1,251 @@
+import hashlib
+import os
+import queue
+import threading
+import time
+from typing import Iterator, Optional, Tuple
+
+import numpy as np
+
+from frame_msg import TxCaptureSettings
+
+# one photo per record: 62 bytes, fixed size so the index can be memory-mapped and searched in place
+PHOTO_RECORD_DTYPE = np.dtype([
+    ('time', '<f8'),
+    ('digest', 'V16'),
+    ('offset', '<u8'),
+    ('size', '<u4'),
+    ('resolution', '<u2'),
+    ('quality_index', 'u1'),
+    ('flags', 'u1'),
+    ('pan', '<i2'),
+    ('shutter', '<f4'),
+    ('analog_gain', '<f4'),
+    ('red_gain', '<f4'),
+    ('green_gain', '<f4'),
+    ('blue_gain', '<f4'),
+])
+
+# flags
+RAW = 0x01
+DUPLICATE = 0x02
+
+PACK_FILE = 'photos.pack'
+INDEX_FILE = 'index.bin'
+# index file header: magic, version, record size
+_INDEX_MAGIC = b'FPHOTOIX'
+_INDEX_VERSION = 1
+_INDEX_HEADER_SIZE = 16
+
+def photo_digest(jpeg_bytes: bytes) -> bytes:
+    """The content address of a photo: a 16 byte BLAKE2b hash of its bytes"""
+    return hashlib.blake2b(jpeg_bytes, digest_size=16).digest()
+
+def _index_header() -> bytes:
+    return _INDEX_MAGIC + _INDEX_VERSION.to_bytes(4, 'little') + PHOTO_RECORD_DTYPE.itemsize.to_bytes(4, 'little')
+
+class PhotoArchive:
+    """
+    Stores received photos in a directory, addressed by the hash of their bytes, from a background writer
+    thread so that add() returns immediately.
+
+    The JPEGs go into one append-only pack file, each distinct photo once: a photo whose bytes match one
+    already stored (an unchanged scene, a resent photo) only gets an index record pointing at the stored copy.
+    The index is an append-only file of fixed-size PHOTO_RECORD_DTYPE records (time, digest, offset and size in
+    the pack, capture settings and auto exposure settings) behind a 16 byte header, which PhotoArchiveReader
+    memory-maps. Each photo is written to the pack before its record, so a reader (even in another process,
+    while the archive is being written) never sees a record for bytes that aren't there yet; a record cut off
+    by a crash is dropped when the archive is reopened.
+
+    Photos wait for the writer in a bounded queue; if the disk falls behind and the queue is full, new photos
+    are dropped and counted rather than blocking the caller, as in BackgroundRecorder.
+    """
+    def __init__(self, directory: str, max_queued_photos: int = 64):
+        """
+        Args:
+            directory: Archive directory, created if needed; an existing archive is appended to
+            max_queued_photos: Photos allowed to wait for the writer before new photos are dropped
+        """
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._pack = open(os.path.join(directory, PACK_FILE), 'ab')
+        self._index = self._open_index(os.path.join(directory, INDEX_FILE))
+
+        # digest -> (offset, size) of every photo stored, from the existing index
+        records = PhotoArchiveReader(directory).records()
+        self._stored = {bytes(record['digest']): (int(record['offset']), int(record['size']))
+                        for record in records[records['flags'] & DUPLICATE == 0]}
+        self._photos = queue.Queue(maxsize=max_queued_photos)
+
+        self.photos_received = 0
+        self.photos_dropped = 0
+        self.photos_stored = 0
+        self.duplicates = 0
+        self.bytes_received = 0
+        self.bytes_stored = 0
+        self.write_time = 0.0
+
+        self.running = True
+        self.thread = threading.Thread(target=self.run)
+        self.thread.daemon = True
+
+    def _open_index(self, path: str):
+        if not os.path.exists(path) or os.path.getsize(path) < _INDEX_HEADER_SIZE:
+            with open(path, 'wb') as f:
+                f.write(_index_header())
+        else:
+            with open(path, 'rb') as f:
+                if f.read(_INDEX_HEADER_SIZE) != _index_header():
+                    raise ValueError(f"{path} is not a version {_INDEX_VERSION} photo archive index")
+            # drop a record cut off part way through writing
+            size = os.path.getsize(path)
+            complete = size - (size - _INDEX_HEADER_SIZE) % PHOTO_RECORD_DTYPE.itemsize
+            if complete != size:
+                os.truncate(path, complete)
+        return open(path, 'ab')
+
+    def start(self):
+        self.thread.start()
+
+    def add(self, jpeg_bytes: bytes, timestamp: Optional[float] = None, settings: Optional[TxCaptureSettings] = None,
+            auto_exposure: Optional[dict] = None):
+        """
+        Queue a photo for archiving.
+
+        Args:
+            jpeg_bytes: The JPEG as received from RxPhoto
+            timestamp: Capture time in seconds (time.time() by default)
+            settings: The capture settings the photo was requested with, if known
+            auto_exposure: The auto exposure result in effect (from RxAutoExpResult or AutoExpHistory), if known
+        """
+        if timestamp is None:
+            timestamp = time.time()
+        self.photos_received += 1
+        self.bytes_received += len(jpeg_bytes)
+        try:
+            self._photos.put_nowait((jpeg_bytes, timestamp, settings, auto_exposure))
+        except queue.Full:
+            self.photos_dropped += 1
+
+    def _write(self, jpeg_bytes: bytes, timestamp: float, settings: Optional[TxCaptureSettings],
+               auto_exposure: Optional[dict]):
+        digest = photo_digest(jpeg_bytes)
+        flags = 0
+        if digest in self._stored:
+            offset, size = self._stored[digest]
+            flags |= DUPLICATE
+            self.duplicates += 1
+        else:
+            offset, size = self._pack.tell(), len(jpeg_bytes)
+            self._pack.write(jpeg_bytes)
+            # the bytes must be in the pack before a reader can find their record
+            self._pack.flush()
+            self._stored[digest] = (offset, size)
+            self.photos_stored += 1
+            self.bytes_stored += size
+
+        record = np.zeros(1, dtype=PHOTO_RECORD_DTYPE)
+        record['time'] = timestamp
+        record['digest'] = np.void(digest)
+        record['offset'] = offset
+        record['size'] = size
+        if settings is not None:
+            record['resolution'] = settings.resolution
+            record['quality_index'] = settings.quality_index
+            record['pan'] = settings.pan
+            if settings.raw:
+                flags |= RAW
+        record['flags'] = flags
+        for name in ('shutter', 'analog_gain', 'red_gain', 'green_gain', 'blue_gain'):
+            record[name] = auto_exposure[name] if auto_exposure is not None else np.nan
+        self._index.write(record.tobytes())
+        self._index.flush()
+
+    def run(self):
+        while self.running or not self._photos.empty():
+            try:
+                photo = self._photos.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            start = time.perf_counter()
+            self._write(*photo)
+            self.write_time += time.perf_counter() - start
+
+    def stop(self):
+        """Write out everything still queued and close the files"""
+        self.running = False
+        if self.thread.is_alive():
+            self.thread.join()
+        self._pack.close()
+        self._index.close()
+
+    def stats(self) -> str:
+        stored = self.photos_received - self.photos_dropped
+        return (f"{stored} of {self.photos_received} photos archived ({self.photos_dropped} dropped), "
+                f"{self.duplicates} duplicates; {self.bytes_stored} bytes stored for {self.bytes_received} received, "
+                f"{self.write_time:.2f}s spent writing")
+
+class PhotoArchiveReader:
+    """
+    Queries an archive written by PhotoArchive through a memory map of its index, without loading it.
+    Safe to use while the archive is being written, from any process; refresh() picks up new records.
+    """
+    def __init__(self, directory: str):
+        """
+        Args:
+            directory: The archive directory
+        """
+        self.directory = directory
+        self._index_path = os.path.join(directory, INDEX_FILE)
+        self._pack_path = os.path.join(directory, PACK_FILE)
+        self._records = np.zeros(0, dtype=PHOTO_RECORD_DTYPE)
+        self._pack = None
+        self._sorted = True
+        self.refresh()
+
+    def refresh(self):
+        """Map the index again to include records added since"""
+        size = os.path.getsize(self._index_path) if os.path.exists(self._index_path) else 0
+        count = max(0, size - _INDEX_HEADER_SIZE) // PHOTO_RECORD_DTYPE.itemsize
+        if count == len(self._records):
+            return
+        with open(self._index_path, 'rb') as f:
+            if f.read(_INDEX_HEADER_SIZE) != _index_header():
+                raise ValueError(f"{self._index_path} is not a version {_INDEX_VERSION} photo archive index")
+        self._records = np.memmap(self._index_path, dtype=PHOTO_RECORD_DTYPE, mode='r', offset=_INDEX_HEADER_SIZE,
+                                  shape=(count,))
+        # records are in arrival order, which is time order unless timestamps were given out of order
+        self._sorted = bool(np.all(np.diff(self._records['time']) >= 0))
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def records(self) -> np.ndarray:
+        """All the records, in the order the photos were added (a read-only view of the index)"""
+        return self._records
+
+    def range(self, start: float, end: float) -> np.ndarray:
+        """Records of the photos taken at start <= time < end"""
+        times = self._records['time']
+        if self._sorted:
+            first, last = np.searchsorted(times, [start, end])
+            return self._records[first:last]
+        return self._records[(times >= start) & (times < end)]
+
+    def read(self, record: np.void) -> bytes:
+        """The JPEG of a record"""
+        if self._pack is None:
+            self._pack = open(self._pack_path, 'rb')
+        self._pack.seek(int(record['offset']))
+        return self._pack.read(int(record['size']))
+
+    def photos(self, start: float = -np.inf, end: float = np.inf) -> Iterator[Tuple[np.void, bytes]]:
+        """(record, JPEG bytes) of the photos taken at start <= time < end, e.g. to replay a session"""
+        for record in self.range(start, end):
+            yield record, self.read(record)
+
+    def close(self):
+        if self._pack is not None:
+            self._pack.close()
+            self._pack = None
+        self._records = np.zeros(0, dtype=PHOTO_RECORD_DTYPE)
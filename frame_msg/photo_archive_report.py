@@ -0,0 +1,114 @@
+import io
+import json
+import os
+import tempfile
+import time
+
+import numpy as np
+from PIL import Image
+
+from photo_archive import PhotoArchive, PhotoArchiveReader, photo_digest
+from frame_msg import TxCaptureSettings
+
+NUM_PHOTOS = 3000
+INTERVAL = 0.1
+
+def session(seed: int = 0) -> list:
+    """
+    (jpeg_bytes, settings, auto exposure) for a live feed session: distinct photos of a changing scene, each
+    repeated byte for byte 1-4 times (identical captures of a still scene, photos sent again)
+    """
+    rng = np.random.default_rng(seed)
+    koala = Image.open("images/koala.jpg").convert('RGB')
+    photos = []
+    while len(photos) < NUM_PHOTOS:
+        left, top = rng.integers(0, koala.width // 3), rng.integers(0, koala.height // 3)
+        size = int(min(koala.width - left, koala.height - top))
+        settings = TxCaptureSettings(resolution=int(rng.choice([256, 512, 720])), quality_index=int(rng.integers(0, 5)))
+        image = koala.crop((left, top, left + size, top + size)).resize((settings.resolution, settings.resolution))
+        output = io.BytesIO()
+        image.save(output, format='JPEG', quality=[10, 25, 50, 75, 90][settings.quality_index])
+        auto_exposure = {'shutter': float(rng.uniform(4, 16383)), 'analog_gain': float(rng.uniform(1, 248)),
+                         'red_gain': 1.9, 'green_gain': 1.0, 'blue_gain': 2.2}
+        photos += [(output.getvalue(), settings, auto_exposure)] * int(rng.integers(1, 5))
+    return photos[:NUM_PHOTOS]
+
+def write_json_index(path: str, archive_dir: str):
+    """The same index as JSON lines, the obvious alternative, for comparison"""
+    reader = PhotoArchiveReader(archive_dir)
+    with open(path, 'w') as f:
+        for record in reader.records():
+            f.write(json.dumps({name: (bytes(record[name]).hex() if name == 'digest' else record[name].item())
+                                for name in record.dtype.names}) + "\n")
+    reader.close()
+
+def main():
+    """
+    Archive a 3000 photo live feed session (10 photos a second, with the repeats of a still scene) and measure
+    the cost of add() on the capture loop, the writer, the space deduplication saves and the index size; then
+    time opening the index and time range queries on its memory map, against a JSON lines index, and replay a
+    window of photos, checking every one against its content address.
+    """
+    photos = session()
+    directory = tempfile.mkdtemp(prefix="frame_archive_")
+    archive = PhotoArchive(directory, max_queued_photos=NUM_PHOTOS)
+    archive.start()
+
+    start_time = 1_700_000_000.0
+    add_times = []
+    for i, (jpeg_bytes, settings, auto_exposure) in enumerate(photos):
+        start = time.perf_counter()
+        archive.add(jpeg_bytes, timestamp=start_time + i * INTERVAL, settings=settings, auto_exposure=auto_exposure)
+        add_times.append(time.perf_counter() - start)
+    start = time.perf_counter()
+    archive.stop()
+    drain_time = time.perf_counter() - start
+    print(archive.stats())
+
+    pack_size = os.path.getsize(os.path.join(directory, 'photos.pack'))
+    index_size = os.path.getsize(os.path.join(directory, 'index.bin'))
+    print(f"add(): {1e6 * np.mean(add_times):.1f}us mean, {1e6 * np.max(add_times):.0f}us max; "
+          f"writer {1000 * archive.write_time / NUM_PHOTOS:.2f}ms per photo, {drain_time:.2f}s to drain at stop")
+    print(f"pack {pack_size / 1e6:.1f}MB for {archive.bytes_received / 1e6:.1f}MB received "
+          f"({1 - pack_size / archive.bytes_received:.0%} saved by deduplication); "
+          f"index {index_size / 1000:.0f}kB, {(index_size - 16) / NUM_PHOTOS:.0f} bytes per photo")
+
+    json_path = os.path.join(directory, 'index.jsonl')
+    write_json_index(json_path, directory)
+    print(f"\nindex as JSON lines: {os.path.getsize(json_path) / 1000:.0f}kB")
+
+    start = time.perf_counter()
+    reader = PhotoArchiveReader(directory)
+    open_time = time.perf_counter() - start
+    start = time.perf_counter()
+    with open(json_path) as f:
+        json_records = [json.loads(line) for line in f]
+    json_open_time = time.perf_counter() - start
+    print(f"open: memory map {1000 * open_time:.2f}ms, JSON lines {1000 * json_open_time:.1f}ms")
+
+    rng = np.random.default_rng(1)
+    session_length = NUM_PHOTOS * INTERVAL
+    for window in (1.0, 30.0):
+        starts = start_time + rng.uniform(0, session_length - window, 200)
+        start = time.perf_counter()
+        counts = [len(reader.range(t, t + window)) for t in starts]
+        map_time = (time.perf_counter() - start) / len(starts)
+        start = time.perf_counter()
+        json_counts = [sum(1 for r in json_records if t <= r['time'] < t + window) for t in starts]
+        json_time = (time.perf_counter() - start) / len(starts)
+        if counts != json_counts:
+            raise ValueError("range queries disagree")
+        print(f"{window:4.0f}s range query ({np.mean(counts):.0f} photos): memory map {1e6 * map_time:.1f}us, "
+              f"JSON lines scan {1e6 * json_time:.0f}us")
+
+    start = time.perf_counter()
+    replayed = [(record, jpeg_bytes) for record, jpeg_bytes in reader.photos(start_time + 60, start_time + 90)]
+    replay_time = time.perf_counter() - start
+    mismatches = sum(photo_digest(jpeg_bytes) != bytes(record['digest']) for record, jpeg_bytes in replayed)
+    expected = [photos[i][0] for i in range(600, 900)]
+    mismatches += sum(jpeg_bytes != photo for (_, jpeg_bytes), photo in zip(replayed, expected))
+    print(f"replay 30s: {len(replayed)} photos read in {1000 * replay_time:.1f}ms, {mismatches} mismatches")
+    reader.close()
+
+if __name__ == "__main__":
+    main()
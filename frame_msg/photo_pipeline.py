@@ -0,0 +1,220 @@
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+import io
+import multiprocessing
+import os
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+# stages in the order they run: waiting for a worker, the work in the worker, and handing the result back
+STAGES = ['queue', 'decode', 'rotate', 'resize', 'thumbnail', 'save', 'return']
+
+@dataclass
+class PhotoResult:
+    """
+    What the pipeline made of one photo.
+
+    Attributes:
+        seq: Order in which the photo was submitted, from 1
+        size: (width, height) of the decoded (upright) photo
+        paths: Files written, by kind ('photo', 'resized', 'thumbnail'), empty if nothing was saved
+        thumbnail: The thumbnail as JPEG bytes
+        timings: Seconds spent in each stage (see STAGES), and 'total' from submit to result
+    """
+    seq: int
+    size: Tuple[int, int]
+    paths: Dict[str, str] = field(default_factory=dict)
+    thumbnail: bytes = b''
+    timings: Dict[str, float] = field(default_factory=dict)
+
+def process_photo(jpeg_bytes: bytes, seq: int, submitted: float, upright: bool, resize_to: Optional[Tuple[int, int]],
+                  thumbnail_size: Tuple[int, int], directory: Optional[str], quality: int) -> PhotoResult:
+    """
+    Process pool worker: decode a received JPEG, rotate it upright, resize it, make a thumbnail and save them.
+    Timestamps are time.time() so they compare across processes.
+    """
+    timings = {'queue': time.time() - submitted}
+    start = time.perf_counter()
+
+    def lap(stage: str):
+        nonlocal start
+        now = time.perf_counter()
+        timings[stage] = now - start
+        start = now
+
+    image = Image.open(io.BytesIO(jpeg_bytes))
+    image.load()
+    lap('decode')
+
+    if upright:
+        # Rotate image -90 degrees (or 90 degrees counterclockwise, in PIL), as RxPhoto does
+        image = image.transpose(Image.ROTATE_90)
+    lap('rotate')
+
+    resized = image
+    if resize_to is not None and image.size != tuple(resize_to):
+        resized = image.resize(resize_to, Image.LANCZOS)
+    lap('resize')
+
+    thumbnail = image.copy()
+    thumbnail.thumbnail(thumbnail_size)
+    thumbnail_jpeg = io.BytesIO()
+    thumbnail.save(thumbnail_jpeg, format='JPEG', quality=quality)
+    lap('thumbnail')
+
+    paths = {}
+    if directory is not None:
+        paths['photo'] = os.path.join(directory, f"photo_{seq:05d}.jpg")
+        if upright:
+            image.save(paths['photo'], format='JPEG', quality=quality)
+        else:
+            # as received, not re-encoded
+            with open(paths['photo'], 'wb') as f:
+                f.write(jpeg_bytes)
+        if resized is not image:
+            paths['resized'] = os.path.join(directory, f"photo_{seq:05d}_{resized.width}x{resized.height}.jpg")
+            resized.save(paths['resized'], format='JPEG', quality=quality)
+        paths['thumbnail'] = os.path.join(directory, f"photo_{seq:05d}_thumb.jpg")
+        with open(paths['thumbnail'], 'wb') as f:
+            f.write(thumbnail_jpeg.getvalue())
+    lap('save')
+
+    timings['finished'] = time.time()
+    return PhotoResult(seq, image.size, paths, thumbnail_jpeg.getvalue(), timings)
+
+def _warm_up():
+    # runs in each worker once so the first photos don't wait for a process to start
+    time.sleep(0.05)
+
+class PhotoPipeline:
+    """
+    Post-processes received photos in a process pool, so decoding, resizing, thumbnailing and saving never
+    run on the event loop that receives the next photo over BLE.
+
+    submit() ships the JPEG bytes to a worker (process_photo()) and returns a future for the PhotoResult.
+    At most max_pending photos are in the pool at once: when the pool falls behind, submit() waits for room,
+    holding up the capture loop rather than letting photos pile up in memory; try_submit() drops the photo
+    instead, for live feeds where only the latest photos matter. Each result carries the time spent in every
+    stage, and stats() sums them up.
+
+    Use RxPhoto(upright=False) with upright=True here, so the rotation (a decode and re-encode in RxPhoto)
+    happens in the pool as well.
+    """
+    def __init__(
+        self,
+        directory: Optional[str] = None,
+        upright: bool = True,
+        resize_to: Optional[Tuple[int, int]] = (512, 512),
+        thumbnail_size: Tuple[int, int] = (160, 160),
+        quality: int = 90,
+        workers: Optional[int] = None,
+        max_pending: Optional[int] = None,
+    ):
+        """
+        Args:
+            directory: Where to save the photo, the resized photo and the thumbnail (None to save nothing)
+            upright: Whether to rotate photos -90 degrees to correct for sensor orientation
+            resize_to: (width, height) to resize photos to, or None to skip resizing
+            thumbnail_size: Bounding box of the thumbnail, which keeps the aspect ratio
+            quality: JPEG quality of the images saved
+            workers: Processes in the pool (the number of CPUs by default)
+            max_pending: Photos allowed in the pool at once before submit() waits (twice the workers by default)
+        """
+        self.directory = directory
+        self.upright = upright
+        self.resize_to = resize_to
+        self.thumbnail_size = thumbnail_size
+        self.quality = quality
+        self.workers = workers or os.cpu_count() or 1
+        self.max_pending = max_pending or 2 * self.workers
+
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._pending = set()
+
+        self.submitted = 0
+        self.dropped = 0
+        self.waited = 0.0
+        self.timings: Dict[str, List[float]] = {stage: [] for stage in STAGES + ['total']}
+
+    async def start(self):
+        """Start the worker processes"""
+        if self.directory is not None:
+            os.makedirs(self.directory, exist_ok=True)
+        # spawn rather than fork, since the event loop (and BLE) threads of this process mustn't be copied
+        self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context('spawn'))
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*[loop.run_in_executor(self._pool, _warm_up) for _ in range(self.workers)])
+
+    async def close(self):
+        """Wait for the photos still in the pool and stop the workers"""
+        if self._pending:
+            await asyncio.gather(*self._pending, return_exceptions=True)
+        if self._pool:
+            self._pool.shutdown()
+            self._pool = None
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    @property
+    def pending(self) -> int:
+        """Photos in the pool"""
+        return len(self._pending)
+
+    def _submit(self, jpeg_bytes: bytes) -> asyncio.Future:
+        self.submitted += 1
+        loop = asyncio.get_running_loop()
+        submitted = time.time()
+        work = loop.run_in_executor(self._pool, process_photo, jpeg_bytes, self.submitted, submitted, self.upright,
+                                    self.resize_to, self.thumbnail_size, self.directory, self.quality)
+
+        async def finish() -> PhotoResult:
+            result = await work
+            now = time.time()
+            result.timings['return'] = now - result.timings.pop('finished')
+            result.timings['total'] = now - submitted
+            for stage, seconds in result.timings.items():
+                self.timings[stage].append(seconds)
+            return result
+
+        task = asyncio.ensure_future(finish())
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+        return task
+
+    async def submit(self, jpeg_bytes: bytes) -> asyncio.Future:
+        """
+        Send a photo to the pool, first waiting for room if max_pending photos are already in it.
+
+        Returns:
+            A future for the PhotoResult (await it, or leave it and read the stats later)
+        """
+        start = time.perf_counter()
+        while len(self._pending) >= self.max_pending:
+            await asyncio.wait(set(self._pending), return_when=asyncio.FIRST_COMPLETED)
+        self.waited += time.perf_counter() - start
+        return self._submit(jpeg_bytes)
+
+    def try_submit(self, jpeg_bytes: bytes) -> Optional[asyncio.Future]:
+        """Send a photo to the pool if there is room, else drop it and return None"""
+        if len(self._pending) >= self.max_pending:
+            self.dropped += 1
+            return None
+        return self._submit(jpeg_bytes)
+
+    def stats(self) -> str:
+        """Mean and 95th percentile milliseconds per stage, and the photos that waited or were dropped"""
+        parts = []
+        for stage, seconds in self.timings.items():
+            if seconds:
+                parts.append(f"{stage} {1000 * np.mean(seconds):.1f}/{1000 * np.percentile(seconds, 95):.1f}")
+        return (f"{len(self.timings['total'])} of {self.submitted} photos processed, {self.dropped} dropped, "
+                f"{self.waited:.2f}s waiting for the pool; ms mean/p95: " + ", ".join(parts))
@@ -0,0 +1,112 @@
+import asyncio
+import io
+import os
+import tempfile
+import time
+
+import numpy as np
+from PIL import Image
+
+from photo_pipeline import PhotoPipeline, process_photo
+
+NUM_PHOTOS = 24
+# how often the event loop should get to run, like the BLE notifications of a photo arriving
+TICK = 0.005
+# a tick this late would delay the BLE notifications queued behind it noticeably
+LATE = 0.02
+
+def received_photos() -> list:
+    """720px JPEGs as RxPhoto(upright=False) delivers them (sensor orientation)"""
+    photos = []
+    koala = Image.open("images/koala.jpg").convert('RGB').resize((720, 720))
+    for scene in (koala, koala.transpose(Image.FLIP_LEFT_RIGHT), koala.transpose(Image.FLIP_TOP_BOTTOM)):
+        image = scene.transpose(Image.ROTATE_270)
+        output = io.BytesIO()
+        image.save(output, format='JPEG', quality=90)
+        photos.append(output.getvalue())
+    return photos
+
+async def measure_loop_lag(lags: list):
+    """How late each tick runs: the time the receive path would wait for the event loop"""
+    loop = asyncio.get_running_loop()
+    while True:
+        expected = loop.time() + TICK
+        await asyncio.sleep(TICK)
+        lags.append(max(0.0, loop.time() - expected))
+
+async def run(mode: str, photos: list, interval: float, workers: int) -> dict:
+    """
+    Receive NUM_PHOTOS photos, one every interval seconds, and process each one inline on the event loop (as
+    camera.py shows them) or in a PhotoPipeline with submit() (waits for room) or try_submit() (drops)
+    """
+    lags = []
+    lag_task = asyncio.create_task(measure_loop_lag(lags))
+    directory = tempfile.mkdtemp(prefix="frame_pipeline_")
+    pipeline = None
+    if mode != 'inline':
+        pipeline = PhotoPipeline(directory=directory, workers=workers, max_pending=2 * workers)
+        await pipeline.start()
+    await asyncio.sleep(0.1)
+    lags.clear()
+
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    processed = 0
+    for i in range(NUM_PHOTOS):
+        # the next photo arrives
+        await asyncio.sleep(max(0.0, start + i * interval - loop.time()))
+        jpeg_bytes = photos[i % len(photos)]
+        if mode == 'inline':
+            process_photo(jpeg_bytes, i + 1, time.time(), True, (512, 512), (160, 160), directory, 90)
+            processed += 1
+        elif mode == 'submit':
+            await pipeline.submit(jpeg_bytes)
+        else:
+            pipeline.try_submit(jpeg_bytes)
+    receive_time = loop.time() - start
+
+    stats = None
+    if pipeline:
+        await pipeline.close()
+        processed = len(pipeline.timings['total'])
+        stats = pipeline
+    elapsed = loop.time() - start
+    lag_task.cancel()
+
+    return {
+        'receive_time': receive_time,
+        'elapsed': elapsed,
+        'processed': processed,
+        'late': int(np.sum(np.array(lags) > LATE)),
+        'lag_max': np.max(lags),
+        'pipeline': stats,
+    }
+
+async def main():
+    """
+    Measure how long the event loop (which runs the BLE receive path) is held up by post-processing received
+    720px photos (decode, rotate upright, resize to 512px, 160px thumbnail, save) inline, against a PhotoPipeline
+    process pool, for photos arriving at a realistic rate and faster than the pool can keep up with, and the
+    per-stage latency of the pipeline.
+    """
+    photos = received_photos()
+    workers = os.cpu_count() or 1
+    print(f"{NUM_PHOTOS} photos, {workers} CPUs, {workers} workers\n")
+    print(f"{'mode':<8} {'every':>6} {'received in':>11} {'done in':>8} {'processed':>9} "
+          f"{'ticks >20ms late':>16} {'max lag':>8}")
+    pipelines = []
+    for interval in (0.5, 0.1, 0.0):
+        for mode in ('inline', 'submit', 'try'):
+            result = await run(mode, photos, interval, workers)
+            print(f"{mode:<8} {interval:5.1f}s {result['receive_time']:10.2f}s {result['elapsed']:7.2f}s "
+                  f"{result['processed']:5d}/{NUM_PHOTOS:<3d} {result['late']:16d} "
+                  f"{1000 * result['lag_max']:6.1f}ms")
+            if result['pipeline']:
+                pipelines.append((mode, interval, result['pipeline']))
+
+    print("\npipeline stages:")
+    for mode, interval, pipeline in pipelines:
+        print(f"{mode:<8} {interval:5.1f}s {pipeline.stats()}")
+
+if __name__ == "__main__":
+    asyncio.run(main())
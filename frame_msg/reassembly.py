@@ -0,0 +1,242 @@
+import asyncio
+import io
+import logging
+from typing import Optional
+
+from PIL import Image
+
+from frame_msg import FrameMsg, RxAudio, RxPhoto
+
+logging.basicConfig()
+_log = logging.getLogger("Reassembly")
+
+class ReassemblyBuffer:
+    """
+    Collects the chunks of a multi-packet payload (a JPEG, an audio clip) in one preallocated bytearray.
+
+    Each chunk is copied once, into place through a memoryview of the buffer; the buffer is allocated at the
+    size hint, or the size of the previous payload with a little to spare, and doubles if a payload outgrows
+    it, so it isn't reallocated per packet. take() hands out the bytearray itself, trimmed in place, so the
+    finished payload is never copied either; the next buffer is only allocated when the next payload starts.
+    """
+    def __init__(self, size_hint: int = 0, min_capacity: int = 4096):
+        """
+        Args:
+            size_hint: Expected payload size in bytes (0 to size each buffer from the previous payload)
+            min_capacity: Smallest buffer to allocate
+        """
+        self.size_hint = size_hint
+        self.min_capacity = min_capacity
+        self._next_capacity = max(size_hint, min_capacity)
+        self._buffer = bytearray()
+        self._view = memoryview(self._buffer)
+        self.size = 0
+
+        self.payloads = 0
+        self.grows = 0
+
+    @property
+    def capacity(self) -> int:
+        return len(self._buffer)
+
+    def reserve(self, capacity: int):
+        """Make room for a payload of the given size, e.g. from a header announcing it"""
+        if capacity > len(self._buffer):
+            self._resize(capacity)
+
+    def _resize(self, capacity: int):
+        if self._buffer:
+            self.grows += 1
+        buffer = bytearray(capacity)
+        view = memoryview(buffer)
+        view[:self.size] = self._view[:self.size]
+        self._view.release()
+        self._buffer = buffer
+        self._view = view
+
+    def write(self, chunk) -> None:
+        """
+        Append a chunk (bytes, bytearray or memoryview). Packet-sized slices like data[1:] are cheaper to pass
+        as bytes than to wrap in a memoryview first.
+        """
+        size = self.size
+        end = size + len(chunk)
+        if end > len(self._buffer):
+            self._resize(max(end, 2 * len(self._buffer), self._next_capacity))
+        self._view[size:end] = chunk
+        self.size = end
+
+    def view(self) -> memoryview:
+        """
+        The payload so far, without copying it. Release the view (or copy it with bytes()) before the next
+        take(), which can't trim a buffer that is still being viewed.
+        """
+        return self._view[:self.size]
+
+    def take(self) -> bytearray:
+        """Hand out the payload and start over for the next one"""
+        payload = self._buffer
+        self._view.release()
+        # trimming by less than half of the allocation doesn't reallocate
+        del payload[self.size:]
+        self._next_capacity = max(self.size_hint, self.size + self.size // 8, self.min_capacity)
+        self._buffer = bytearray()
+        self._view = memoryview(self._buffer)
+        self.size = 0
+        self.payloads += 1
+        return payload
+
+    def clear(self):
+        """Drop the payload so far, keeping the buffer"""
+        self.size = 0
+
+class RxPhotoBuffered(RxPhoto):
+    def __init__(
+        self,
+        non_final_chunk_flag: int = 0x07,
+        final_chunk_flag: int = 0x08,
+        upright: bool = True,
+        is_raw: bool = False,
+        quality: Optional[str] = None,
+        resolution: Optional[int] = None,
+        size_hint: int = 0,
+    ):
+        """
+        Initialize a photo handler that assembles image chunks into complete JPEG images as RxPhoto does,
+        in a ReassemblyBuffer rather than a list of ints. Images that aren't rotated upright are queued as
+        the bytearray they were assembled in.
+
+        Args:
+            non_final_chunk_flag: Flag indicating a non-final chunk of image data
+            final_chunk_flag: Flag indicating the final chunk of image data
+            upright: Whether to rotate image -90 degrees to correct for sensor orientation
+            is_raw: Whether incoming data will be raw (without JPEG header)
+            quality: JPEG quality level
+            resolution: Image resolution (must be even number between 100 and 720)
+            size_hint: Expected JPEG size in bytes (0 to size the buffer from the previous photo)
+        """
+        super().__init__(non_final_chunk_flag=non_final_chunk_flag, final_chunk_flag=final_chunk_flag,
+                         upright=upright, is_raw=is_raw, quality=quality, resolution=resolution)
+        self._buffer = ReassemblyBuffer(size_hint)
+
+    def _start_image(self):
+        self._buffer.clear()
+        if self.is_raw:
+            # raw images arrive without the JPEG header, so start each one with the stored header
+            key = f"{self.quality}_{self.resolution}"
+            if key in self._jpeg_header_map:
+                self._buffer.write(self._jpeg_header_map[key])
+
+    def handle_data(self, data: bytes) -> None:
+        """
+        Process incoming chunks of image data.
+
+        Args:
+            data: Bytes containing image chunk with flag byte prefix
+        """
+        if not self.queue:
+            _log.warning("Received data but queue not initialized - call start() first")
+            return
+
+        self._buffer.write(data[1:])
+
+        if data[0] == self.final_chunk_flag:
+            # take the image now rather than in the task, so chunks of a next image can't be appended to it
+            jpeg_bytes = self._buffer.take()
+            self._start_image()
+            asyncio.create_task(self._queue_image(jpeg_bytes))
+
+    async def _queue_image(self, jpeg_bytes: bytearray) -> None:
+        if self.is_raw:
+            key = f"{self.quality}_{self.resolution}"
+            if key not in self._jpeg_header_map:
+                raise Exception(
+                    f"No JPEG header found for quality {self.quality} "
+                    f"and resolution {self.resolution} - request full JPEG first"
+                )
+        elif self.quality is not None and self.resolution is not None:
+            # Store JPEG header for future raw images
+            key = f"{self.quality}_{self.resolution}"
+            if key not in self._jpeg_header_map:
+                self._jpeg_header_map[key] = bytes(jpeg_bytes[:623])
+
+        if self.upright:
+            # Rotate image -90 degrees (or 90 degrees counterclockwise, in PIL)
+            img = Image.open(io.BytesIO(jpeg_bytes))
+            img = img.transpose(Image.ROTATE_90)
+            output = io.BytesIO()
+            img.save(output, format='JPEG')
+            jpeg_bytes = output.getvalue()
+
+        await self.queue.put(jpeg_bytes)
+
+    async def attach(self, frame: FrameMsg) -> asyncio.Queue:
+        """
+        Attach the photo handler to the Frame data response and return a queue that will receive complete images.
+
+        Returns:
+            asyncio.Queue that will receive complete JPEG images (bytes, or bytearray if not upright)
+        """
+        queue = await super().attach(frame)
+        self._start_image()
+        return queue
+
+    def detach(self, frame: FrameMsg) -> None:
+        """Detach the photo handler from the Frame data response and clean up resources"""
+        super().detach(frame)
+        self._buffer.clear()
+
+class RxAudioBuffered(RxAudio):
+    def __init__(
+        self,
+        non_final_chunk_flag: int = 0x05,
+        final_chunk_flag: int = 0x06,
+        streaming: bool = False,
+        size_hint: int = 0,
+    ):
+        """
+        Initialize audio handler for processing audio data chunks as RxAudio does, collecting whole clips in a
+        ReassemblyBuffer rather than a BytesIO, which copies the clip again when it is done. Clips are queued
+        as the bytearray they were assembled in; streamed chunks are queued as they arrive, as before.
+
+        Args:
+            non_final_chunk_flag: Flag indicating a non-final chunk of audio data
+            final_chunk_flag: Flag indicating the final chunk of audio data
+            streaming: If True, emit chunks as they arrive; if False, accumulate and emit complete clip
+            size_hint: Expected clip size in bytes, e.g. seconds x 8000 (0 to size the buffer from the previous clip)
+        """
+        super().__init__(non_final_chunk_flag=non_final_chunk_flag, final_chunk_flag=final_chunk_flag,
+                         streaming=streaming)
+        self._buffer = ReassemblyBuffer(size_hint)
+
+    def handle_data(self, data: bytes) -> None:
+        """
+        Process incoming audio data packets with either a non-final or a final msg code.
+
+        Args:
+            data: Bytes containing audio data with flag byte prefix
+        """
+        if self.streaming or not self.queue:
+            super().handle_data(data)
+            return
+
+        self._buffer.write(data[1:])
+
+        if data[0] == self.final_chunk_flag:
+            # Queue the complete audio clip, then signal end with None
+            asyncio.create_task(self.queue.put(self._buffer.take()))
+            asyncio.create_task(self.queue.put(None))
+
+    async def attach(self, frame: FrameMsg) -> asyncio.Queue:
+        """
+        Attach the audio handler to the Frame data response and return a queue that will receive audio data,
+        as for RxAudio.
+        """
+        queue = await super().attach(frame)
+        self._buffer.clear()
+        return queue
+
+    def detach(self, frame: FrameMsg) -> None:
+        """Detach the audio handler from the Frame data response and clean up resources"""
+        super().detach(frame)
+        self._buffer.clear()
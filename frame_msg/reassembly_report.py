@@ -0,0 +1,119 @@
+import asyncio
+import io
+import os
+import time
+import tracemalloc
+
+from reassembly import ReassemblyBuffer, RxAudioBuffered, RxPhotoBuffered
+from frame_msg import RxAudio, RxPhoto
+
+def packets(payload: bytes, chunk_size: int, flag: int, final_flag: int) -> list:
+    """The notifications a payload arrives in: flag byte + chunk, then an empty final chunk"""
+    return ([bytes([flag]) + payload[i:i + chunk_size] for i in range(0, len(payload), chunk_size)]
+            + [bytes([final_flag])])
+
+def concatenate(notifications) -> bytes:
+    payload = b''
+    for data in notifications:
+        payload += data[1:]
+    return payload
+
+def int_list(notifications) -> bytes:
+    # as RxPhoto does
+    image_data = []
+    for data in notifications:
+        image_data.extend(data[1:])
+    return bytes(image_data)
+
+def bytes_io(notifications) -> bytes:
+    # as RxAudio does
+    buffer = io.BytesIO()
+    for data in notifications:
+        buffer.write(data[1:])
+    return buffer.getvalue()
+
+def growing_buffer(notifications) -> bytearray:
+    buffer = ReassemblyBuffer()
+    for data in notifications:
+        buffer.write(data[1:])
+    return buffer.take()
+
+def hinted_buffer(notifications, size_hint: int) -> bytearray:
+    buffer = ReassemblyBuffer(size_hint)
+    for data in notifications:
+        buffer.write(data[1:])
+    return buffer.take()
+
+def measure(assemble, notifications, payload: bytes, repeats: int = 5) -> tuple:
+    """Best time in ms over the repeats, and the peak memory allocated by one run in kB"""
+    result = assemble(notifications)
+    if bytes(result) != payload:
+        raise ValueError(f"{assemble} reassembled the payload wrongly")
+    best = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter()
+        assemble(notifications)
+        best = min(best, time.perf_counter() - start)
+    tracemalloc.start()
+    assemble(notifications)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return 1000 * best, peak / 1000
+
+async def receive(receiver, notifications, repeats: int = 5) -> float:
+    """Best time in ms for a receiver to queue a payload from its notifications"""
+    class Link:
+        def register_data_response_handler(self, subscriber, msg_codes, handler):
+            pass
+
+        def unregister_data_response_handler(self, subscriber):
+            pass
+
+    queue = await receiver.attach(Link())
+    best = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter()
+        for data in notifications:
+            receiver.handle_data(data)
+        await queue.get()
+        best = min(best, time.perf_counter() - start)
+        # RxAudio follows a clip with None
+        while not queue.empty():
+            queue.get_nowait()
+    receiver.detach(Link())
+    return 1000 * best
+
+async def main():
+    """
+    Micro-benchmark the reassembly of 50-200kB payloads from BLE notifications of 20 (the default ATT MTU),
+    182 and 242 bytes (negotiated MTUs): concatenating bytes, RxPhoto's list of ints, RxAudio's BytesIO, and
+    ReassemblyBuffer growing from 4kB or sized from a hint; then the photo and audio receivers end to end.
+    """
+    print(f"{'payload':>8} {'packet':>7}  " + "  ".join(f"{name:>17}" for name in
+          ('bytes +=', 'list of ints', 'BytesIO', 'buffer, growing', 'buffer, hinted')))
+    print(f"{'':>17}" + "  ".join(f"{'ms':>8} {'peak kB':>8}" for _ in range(5)))
+    for size in (50_000, 100_000, 200_000):
+        payload = os.urandom(size)
+        for chunk_size in (20, 182, 242):
+            notifications = packets(payload, chunk_size, 0x07, 0x08)
+            results = [measure(assemble, notifications, payload) for assemble in (
+                concatenate, int_list, bytes_io, growing_buffer, lambda n: hinted_buffer(n, size))]
+            print(f"{size // 1000:7d}k {chunk_size:6d}B  "
+                  + "  ".join(f"{ms:8.2f} {peak:8.0f}" for ms, peak in results))
+
+    print(f"\nreceivers, 242B packets: ms to queue a payload")
+    print(f"{'payload':>8} {'RxPhoto':>9} {'Buffered':>9} {'RxAudio':>9} {'Buffered':>9}")
+    for size in (50_000, 100_000, 200_000):
+        payload = os.urandom(size)
+        photo = packets(payload, 242, 0x07, 0x08)
+        audio = packets(payload, 242, 0x05, 0x06)
+        times = [
+            await receive(RxPhoto(upright=False), photo),
+            await receive(RxPhotoBuffered(upright=False), photo),
+            await receive(RxAudio(), audio),
+            await receive(RxAudioBuffered(), audio),
+        ]
+        print(f"{size // 1000:7d}k " + " ".join(f"{ms:9.2f}" for ms in times))
+
+if __name__ == "__main__":
+    asyncio.run(main())
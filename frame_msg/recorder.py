@@ -0,0 +1,371 @@
+import io
+import os
+import queue
+import struct
+import threading
+import time
+from typing import BinaryIO, List, Optional
+
+import numpy as np
+
+# plain AVI (RIFF with 32-bit sizes) is limited to 1GB, so recordings roll over to a new file before then
+AVI_MAX_BYTES = 1 << 30
+
+def jpeg_size(jpeg_bytes: bytes) -> tuple:
+    """Read (width, height) from the SOF marker of a JPEG without decoding it"""
+    i = 2
+    while i + 9 < len(jpeg_bytes):
+        if jpeg_bytes[i] != 0xFF:
+            i += 1
+            continue
+        marker = jpeg_bytes[i + 1]
+        length = struct.unpack('>H', jpeg_bytes[i + 2:i + 4])[0]
+        # SOF0..SOF15 apart from DHT (C4), JPG (C8) and DAC (CC)
+        if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+            height, width = struct.unpack('>HH', jpeg_bytes[i + 5:i + 9])
+            return width, height
+        i += 2 + length
+    raise ValueError("No SOF marker found in JPEG")
+
+
+class AviMjpegWriter:
+    """
+    Writes JPEG frames as they are (MJPEG, no decode or re-encode) and optionally a PCM audio track
+    into an AVI file.
+
+    AVI streams have a constant frame rate, so each frame is placed in the slot nearest its timestamp and
+    empty (zero-length) video chunks fill the gaps, which players show by holding the previous frame.
+    Header sizes are patched and the idx1 index is written on close(). Plain AVI is limited to 1GB.
+    """
+    def __init__(self, f: BinaryIO, fps: float = 10.0, audio_sample_rate: Optional[int] = 8000):
+        """
+        Args:
+            f: Seekable binary file opened for writing
+            fps: Nominal frame rate of the video stream (the timing resolution for frames)
+            audio_sample_rate: Sample rate of the signed 8-bit mono audio track, or None for video only
+        """
+        self.f = f
+        self.fps = fps
+        self.audio_sample_rate = audio_sample_rate
+
+        self.width = 0
+        self.height = 0
+        self.video_slots = 0
+        self.video_frames = 0
+        self.audio_bytes = 0
+        self.max_chunk = 0
+        self._index: List[tuple] = []
+
+        # header first with placeholder sizes, rewritten in place on close
+        self._write_header()
+        self.f.write(b'LIST\x00\x00\x00\x00movi')
+        self._movi_start = self.f.tell() - 4
+
+    def _chunk(self, fourcc: bytes, data: bytes, flags: int = 0):
+        self._index.append((fourcc, flags, self.f.tell() - self._movi_start, len(data)))
+        self.f.write(fourcc + struct.pack('<I', len(data)))
+        self.f.write(data)
+        if len(data) % 2:
+            self.f.write(b'\x00')
+        self.max_chunk = max(self.max_chunk, len(data))
+
+    def _write_header(self):
+        streams = 2 if self.audio_sample_rate else 1
+        usec_per_frame = int(round(1000000 / self.fps))
+
+        avih = struct.pack('<IIIIIIIIII16x',
+            usec_per_frame,
+            0,                      # max bytes per sec
+            0,                      # padding granularity
+            0x10,                   # AVIF_HASINDEX
+            self.video_slots,
+            0,                      # initial frames
+            streams,
+            self.max_chunk,
+            self.width,
+            self.height)
+
+        # fps as a rational with millisecond-ish precision
+        rate, scale = int(round(self.fps * 1000)), 1000
+        vids_strh = struct.pack('<4s4sIHHIIIIIIII4h',
+            b'vids', b'MJPG', 0, 0, 0, 0,
+            scale, rate, 0, self.video_slots, self.max_chunk, 0xFFFFFFFF, 0,
+            0, 0, self.width, self.height)
+        vids_strf = struct.pack('<IiiHH4sIiiII',
+            40, self.width, self.height, 1, 24, b'MJPG', self.width * self.height * 3, 0, 0, 0, 0)
+        strl = [self._list(b'strl', self._ck(b'strh', vids_strh) + self._ck(b'strf', vids_strf))]
+
+        if self.audio_sample_rate:
+            auds_strh = struct.pack('<4s4sIHHIIIIIIII4h',
+                b'auds', b'\x00\x00\x00\x00', 0, 0, 0, 0,
+                1, self.audio_sample_rate, 0, self.audio_bytes, self.audio_sample_rate, 0xFFFFFFFF, 1,
+                0, 0, 0, 0)
+            # WAVEFORMATEX: 8-bit unsigned mono PCM
+            auds_strf = struct.pack('<HHIIHHH', 1, 1, self.audio_sample_rate, self.audio_sample_rate, 1, 8, 0)
+            strl.append(self._list(b'strl', self._ck(b'strh', auds_strh) + self._ck(b'strf', auds_strf)))
+
+        hdrl = self._list(b'hdrl', self._ck(b'avih', avih) + b''.join(strl))
+        self.f.write(b'RIFF\x00\x00\x00\x00AVI ' + hdrl)
+
+    @staticmethod
+    def _ck(fourcc: bytes, data: bytes) -> bytes:
+        return fourcc + struct.pack('<I', len(data)) + data + (b'\x00' if len(data) % 2 else b'')
+
+    @staticmethod
+    def _list(list_type: bytes, data: bytes) -> bytes:
+        return b'LIST' + struct.pack('<I', len(data) + 4) + list_type + data
+
+    def size_with(self, data_bytes: int) -> int:
+        """Size the file would be on close() after writing another chunk of data_bytes"""
+        return self.f.tell() + 8 + data_bytes + 1 + 16 * (len(self._index) + 2)
+
+    def hold_until(self, t: float):
+        """Hold the previous frame until t seconds, with empty video chunks"""
+        slot = int(round(t * self.fps))
+        while self.video_slots < slot:
+            self._chunk(b'00dc', b'')
+            self.video_slots += 1
+
+    def write_frame(self, jpeg_bytes: bytes, t: float):
+        """Write a JPEG frame shown from t seconds (relative to the start of the recording)"""
+        if self.video_frames == 0:
+            self.width, self.height = jpeg_size(jpeg_bytes)
+
+        # hold the previous frame until this one is due
+        self.hold_until(t)
+
+        self._chunk(b'00dc', jpeg_bytes, flags=0x10)
+        self.video_slots += 1
+        self.video_frames += 1
+
+    def write_audio(self, pcm: bytes):
+        """Append signed 8-bit PCM (as received from Frame) to the audio track"""
+        if not pcm:
+            return
+        # AVI 8-bit PCM is unsigned: flipping the top bit maps -128..127 to 0..255
+        self._chunk(b'01wb', (np.frombuffer(pcm, dtype=np.uint8) ^ 0x80).tobytes())
+        self.audio_bytes += len(pcm)
+
+    def close(self):
+        movi_end = self.f.tell()
+
+        self.f.write(b'idx1' + struct.pack('<I', 16 * len(self._index)))
+        self.f.write(b''.join(struct.pack('<4sIII', *entry) for entry in self._index))
+        file_end = self.f.tell()
+
+        # patch the header now that sizes and counts are known (same length as the placeholder)
+        self.f.seek(0)
+        self._write_header()
+        self.f.seek(4)
+        self.f.write(struct.pack('<I', file_end - 8))
+        self.f.seek(self._movi_start - 4)
+        self.f.write(struct.pack('<I', movi_end - self._movi_start))
+        self.f.seek(file_end)
+        self.f.close()
+
+
+def read_avi_frames(path: str) -> tuple:
+    """
+    Read the video of an AVI written by AviMjpegWriter back as one JPEG per frame slot, repeating the previous
+    frame for the empty slots the writer uses to hold it
+
+    Returns:
+        (fps, list of JPEG bytes)
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+
+    usec_per_frame = struct.unpack('<I', data[data.index(b'avih') + 8:data.index(b'avih') + 12])[0]
+    i = data.index(b'movi') + 4
+    frames = []
+    while i + 8 <= len(data):
+        fourcc = data[i:i + 4]
+        size = struct.unpack('<I', data[i + 4:i + 8])[0]
+        if fourcc == b'idx1':
+            break
+        if fourcc == b'00dc':
+            if size > 0:
+                frames.append(data[i + 8:i + 8 + size])
+            elif frames:
+                frames.append(frames[-1])
+        i += 8 + size + (size % 2)
+    return 1000000 / usec_per_frame, frames
+
+
+class BackgroundRecorder:
+    """
+    Records JPEG frames and audio to an AVI file from a background writer thread, so the capture loop never
+    waits on disk I/O: add_frame() and add_audio() return immediately.
+
+    Frames wait in a bounded queue; if the disk falls behind the link and the queue is full, new frames are
+    dropped and counted rather than blocking the caller. Audio is never dropped (it is small, and gaps would
+    break the timing), it is buffered and written out between frames.
+
+    A recording that would grow past max_file_bytes rolls over to a new file (recording_001.avi,
+    recording_002.avi, ...), each one a complete AVI starting where the last one ended.
+    """
+    def __init__(self, path: str, fps: float = 10.0, audio_sample_rate: Optional[int] = 8000, max_queued_frames: int = 8,
+                 max_file_bytes: int = AVI_MAX_BYTES):
+        """
+        Args:
+            path: AVI file to write
+            fps: Nominal frame rate of the video stream
+            audio_sample_rate: Sample rate of the signed 8-bit audio track, or None for video only
+            max_queued_frames: Frames allowed to wait for the writer before new frames are dropped
+            max_file_bytes: Size at which to roll over to a new file, at most AVI_MAX_BYTES
+        """
+        self.path = path
+        self.paths = [path]
+        self.fps = fps
+        self.audio_sample_rate = audio_sample_rate
+        self.max_file_bytes = min(max_file_bytes, AVI_MAX_BYTES)
+        self._writer = AviMjpegWriter(open(path, 'wb'), fps=fps, audio_sample_rate=audio_sample_rate)
+        # seconds of recording in the files before the current one
+        self._file_start = 0.0
+        self._closed_frames = 0
+        self._closed_audio_bytes = 0
+        self._frames = queue.Queue(maxsize=max_queued_frames)
+        self._audio = bytearray()
+        self._audio_lock = threading.Lock()
+        self._start_time = None
+
+        self.frames_received = 0
+        self.frames_dropped = 0
+        self.write_time = 0.0
+
+        self.running = True
+        self.thread = threading.Thread(target=self.run)
+        self.thread.daemon = True
+
+    def start(self):
+        self._start_time = time.monotonic()
+        self.thread.start()
+
+    def add_frame(self, jpeg_bytes: bytes, t: Optional[float] = None):
+        """
+        Queue a JPEG frame for writing.
+
+        Args:
+            jpeg_bytes: The JPEG as received from RxPhoto
+            t: Seconds since the start of the recording (e.g. from AvTimeline.audio_position()),
+               or None to use the host time of arrival
+        """
+        if t is None:
+            t = time.monotonic() - self._start_time
+        self.frames_received += 1
+        try:
+            self._frames.put_nowait((jpeg_bytes, t))
+        except queue.Full:
+            self.frames_dropped += 1
+
+    def add_audio(self, pcm: bytes):
+        """Append signed 8-bit audio samples as received from RxAudio"""
+        with self._audio_lock:
+            self._audio.extend(pcm)
+
+    def _roll_over_for(self, data_bytes: int):
+        """Close the current file and start the next one if data_bytes more would take it past max_file_bytes"""
+        if self._writer.video_slots == 0 and self._writer.audio_bytes == 0:
+            return
+        if self._writer.size_with(data_bytes) <= self.max_file_bytes:
+            return
+        if self.audio_sample_rate:
+            # the next file's audio starts where this file's audio ends, so its video has to start there too
+            duration = self._writer.audio_bytes / self.audio_sample_rate
+            self._writer.hold_until(duration)
+        else:
+            duration = self._writer.video_slots / self.fps
+        self._file_start += duration
+        self._closed_frames += self._writer.video_frames
+        self._closed_audio_bytes += self._writer.audio_bytes
+        self._writer.close()
+
+        root, ext = os.path.splitext(self.path)
+        path = f"{root}_{len(self.paths):03d}{ext}"
+        self.paths.append(path)
+        self._writer = AviMjpegWriter(open(path, 'wb'), fps=self.fps, audio_sample_rate=self.audio_sample_rate)
+
+    def _write_pending_audio(self):
+        with self._audio_lock:
+            pcm = bytes(self._audio)
+            self._audio.clear()
+        self._roll_over_for(len(pcm))
+        self._writer.write_audio(pcm)
+
+    def run(self):
+        while self.running or not self._frames.empty():
+            try:
+                jpeg_bytes, t = self._frames.get(timeout=0.1)
+            except queue.Empty:
+                jpeg_bytes = None
+
+            start = time.perf_counter()
+            self._write_pending_audio()
+            if jpeg_bytes is not None:
+                # the empty chunks holding the previous frame until this one is due are 8 bytes each on disk
+                gap = max(0, int(round((t - self._file_start) * self.fps)) - self._writer.video_slots)
+                self._roll_over_for(len(jpeg_bytes) + 24 * gap)
+                self._writer.write_frame(jpeg_bytes, t - self._file_start)
+            self.write_time += time.perf_counter() - start
+
+    def stop(self):
+        """Write out everything still queued and close the file"""
+        self.running = False
+        if self.thread.is_alive():
+            self.thread.join()
+        self._write_pending_audio()
+        self._writer.close()
+
+    def stats(self) -> str:
+        return (f"{self._closed_frames + self._writer.video_frames} frames written in {len(self.paths)} file(s), "
+                f"{self.frames_dropped} of {self.frames_received} dropped, "
+                f"{self._closed_audio_bytes + self._writer.audio_bytes} audio bytes, {self.write_time:.2f}s spent writing")
+
+
+if __name__ == "__main__":
+    # record synthetic frames and audio, once to a normal file and once through a deliberately slow "disk"
+    import tempfile
+    from PIL import Image
+
+    frames = []
+    for i in range(20):
+        image = Image.new('RGB', (512, 512), (i * 12, 80, 255 - i * 12))
+        output = io.BytesIO()
+        image.save(output, format='JPEG')
+        frames.append(output.getvalue())
+
+    for slow in (False, True):
+        path = os.path.join(tempfile.mkdtemp(prefix="frame_rec_"), "recording.avi")
+        recorder = BackgroundRecorder(path)
+        if slow:
+            # a disk that takes 50ms per frame, slower than frames arrive
+            write_frame = recorder._writer.write_frame
+            def slow_write_frame(jpeg_bytes, t):
+                time.sleep(0.05)
+                write_frame(jpeg_bytes, t)
+            recorder._writer.write_frame = slow_write_frame
+        recorder.start()
+
+        capture_start = time.perf_counter()
+        for i, jpeg in enumerate(frames):
+            recorder.add_frame(jpeg, t=i * 0.1)
+            recorder.add_audio(bytes(800))
+            time.sleep(0.01)
+        capture_time = time.perf_counter() - capture_start
+
+        recorder.stop()
+        print(f"{'slow' if slow else 'normal'} disk: capture loop {capture_time:.2f}s, {recorder.stats()}, saved to {path}")
+
+    # the same frames with a small file size limit, rolling over to new files along the way
+    path = os.path.join(tempfile.mkdtemp(prefix="frame_rec_"), "recording.avi")
+    recorder = BackgroundRecorder(path, max_file_bytes=8 * len(frames[0]))
+    recorder.start()
+    for i, jpeg in enumerate(frames):
+        recorder.add_frame(jpeg, t=i * 0.1)
+        recorder.add_audio(bytes(800))
+        time.sleep(0.01)
+    recorder.stop()
+    read_back = [len(read_avi_frames(part)[1]) for part in recorder.paths]
+    largest = max(os.path.getsize(part) for part in recorder.paths)
+    print(f"rolling over at {recorder.max_file_bytes} bytes: {recorder.stats()}, frame slots read back per file {read_back}, "
+          f"largest file {largest} bytes")
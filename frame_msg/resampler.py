@@ -0,0 +1,146 @@
+from math import gcd
+import time
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+class StreamingResampler:
+    """
+    Stateful polyphase FIR resampler for chunked audio, e.g. from the 8kHz signed 8-bit stream of RxAudio
+    to the 16kHz or 48kHz signed 16-bit PCM that speech recognizers and output devices expect.
+
+    Each chunk is filtered in one vectorized step, and the filter history and output phase are carried
+    over between chunks, so the output is identical to resampling the whole stream in one go
+    (no clicks at chunk boundaries) no matter how the input is split up.
+    """
+    def __init__(
+        self,
+        in_rate: int = 8000,
+        out_rate: int = 16000,
+        taps_per_phase: int = 24,
+        cutoff: float = 0.9,
+        kaiser_beta: float = 8.0,
+    ):
+        """
+        Args:
+            in_rate: Sample rate of the incoming audio
+            out_rate: Sample rate of the resampled audio
+            taps_per_phase: FIR length of each polyphase branch (longer = sharper anti-aliasing, more delay)
+            cutoff: Low pass cutoff as a fraction of the lower of the two Nyquist frequencies
+            kaiser_beta: Kaiser window shape parameter for the prototype filter
+        """
+        g = gcd(in_rate, out_rate)
+        self.in_rate = in_rate
+        self.out_rate = out_rate
+        self.up = out_rate // g
+        self.down = in_rate // g
+        self.taps_per_phase = taps_per_phase
+
+        # windowed-sinc prototype low pass filter at the upsampled rate
+        num_taps = self.up * taps_per_phase
+        fc = 0.5 * cutoff / max(self.up, self.down)
+        t = np.arange(num_taps) - (num_taps - 1) / 2.0
+        h = 2.0 * fc * np.sinc(2.0 * fc * t) * np.kaiser(num_taps, kaiser_beta)
+        # unity passband gain after zero-stuffing by the upsampling factor
+        h *= self.up / h.sum()
+
+        # phase p uses taps h[p], h[p + up], h[p + 2up], ...; reversed so they line up with
+        # input windows in time order (oldest sample first)
+        self._phases = h.reshape(taps_per_phase, self.up).T[:, ::-1].astype(np.float32).copy()
+
+        self.reset()
+
+    def reset(self):
+        """Clear the filter history, e.g. at the start of a new stream"""
+        self._history = np.zeros(self.taps_per_phase - 1, dtype=np.float32)
+        # index of the next output sample, and of the first sample of the next input chunk
+        self._next_out = 0
+        self._next_in = 0
+
+    @property
+    def delay(self) -> float:
+        """Group delay of the filter in seconds"""
+        return (self.up * self.taps_per_phase - 1) / 2.0 / (self.up * self.in_rate)
+
+    def process(self, samples: np.ndarray) -> np.ndarray:
+        """
+        Resample the next chunk of the stream.
+
+        Args:
+            samples: Float samples in the range -1.0 to 1.0 at in_rate
+
+        Returns:
+            float32 samples at out_rate; all outputs that depend only on input received so far
+        """
+        samples = np.asarray(samples, dtype=np.float32)
+        if len(samples) == 0:
+            return samples
+
+        start = self._next_in
+        end = start + len(samples)
+
+        buf = np.concatenate((self._history, samples))
+
+        # output n sits at input position n * down / up; emit every output whose position has arrived
+        last_out = -(-end * self.up // self.down)
+        n = np.arange(self._next_out, last_out, dtype=np.int64)
+        pos = n * self.down
+        in_idx = pos // self.up - start
+        phase = pos % self.up
+
+        # window i of buf holds the taps_per_phase samples ending at input (start + i)
+        windows = sliding_window_view(buf, self.taps_per_phase)[in_idx]
+        out = np.einsum('ij,ij->i', windows, self._phases[phase])
+
+        self._history = buf[len(buf) - (self.taps_per_phase - 1):]
+        self._next_out = last_out
+        self._next_in = end
+
+        return out
+
+    def process_frame_pcm(self, pcm: bytes) -> np.ndarray:
+        """
+        Resample a chunk of signed 8-bit PCM as delivered by RxAudio into signed 16-bit PCM samples.
+        """
+        samples = np.frombuffer(pcm, dtype=np.int8).astype(np.float32) / 128.0
+        return to_int16(self.process(samples))
+
+    def flush(self) -> np.ndarray:
+        """Push the filter tail out at the end of a stream, returning the last float32 samples"""
+        tail = self.process(np.zeros(self.taps_per_phase, dtype=np.float32))
+        self.reset()
+        return tail
+
+
+def to_int16(samples: np.ndarray) -> np.ndarray:
+    """Convert float samples in the range -1.0 to 1.0 to signed 16-bit PCM, with clipping"""
+    return np.clip(np.round(samples * 32767.0), -32768, 32767).astype('<i2')
+
+
+def benchmark(out_rate, seconds=60.0, chunk_size=242, in_rate=8000):
+    """Resample a stream of Frame-sized chunks and return how many times faster than real time it ran"""
+    rng = np.random.default_rng(0)
+    pcm = rng.integers(-128, 128, int(seconds * in_rate), dtype=np.int8).tobytes()
+    chunks = [pcm[i:i + chunk_size] for i in range(0, len(pcm), chunk_size)]
+
+    resampler = StreamingResampler(in_rate, out_rate)
+    start = time.perf_counter()
+    for chunk in chunks:
+        resampler.process_frame_pcm(chunk)
+    elapsed = time.perf_counter() - start
+
+    return seconds / elapsed
+
+if __name__ == "__main__":
+    # chunked output must match resampling the whole signal at once, with chunks of any size
+    rng = np.random.default_rng(1)
+    signal = rng.uniform(-1.0, 1.0, 8000).astype(np.float32)
+    for out_rate in (16000, 48000, 22050):
+        whole = StreamingResampler(8000, out_rate).process(signal)
+        resampler = StreamingResampler(8000, out_rate)
+        splits = np.sort(rng.choice(np.arange(1, len(signal)), 50, replace=False))
+        chunked = np.concatenate([resampler.process(part) for part in np.split(signal, splits)])
+        print(f"8000 -> {out_rate}: {len(chunked)} samples, max chunked/whole difference {np.max(np.abs(chunked - whole)):.2e}")
+
+    for out_rate in (16000, 48000):
+        print(f"8000 -> {out_rate}: {benchmark(out_rate):.0f}x real time (single core, 242-byte chunks)")
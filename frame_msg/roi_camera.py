@@ -0,0 +1,84 @@
+import asyncio
+
+from frame_msg import FrameMsg, RxPhoto
+
+from roi_capture import ROI_CAPTURE_SETTINGS_MSG, Roi, RoiCapture
+
+# the region to capture, as fractions of the upright photo from the top left, and the size to resize it to
+ROI = Roi(0.0, 0.25, 0.5, 0.5)
+OUTPUT_SIZE = (256, 256)
+NUM_PHOTOS = 5
+
+async def main():
+    """
+    Take photos of a region of interest using the Frame camera, sending only as much of each JPEG as the
+    region needs, and display the last region in the system viewer
+    """
+    frame = FrameMsg()
+    try:
+        await frame.connect()
+
+        # debug only: check our current battery level and memory usage (which varies between 16kb and 31kb or so even after the VM init)
+        batt_mem = await frame.send_lua('print(frame.battery_level() .. " / " .. collectgarbage("count"))', await_print=True)
+        print(f"Battery Level/Memory used: {batt_mem}")
+
+        # Let the user know we're starting
+        await frame.print_short_text('Loading...')
+
+        # send the std lua files to Frame that our app needs to handle data accumulation and camera
+        await frame.upload_stdlua_libs(lib_names=['data', 'camera'])
+
+        # send the region of interest capture module used by the frame app
+        await frame.upload_file("lua/roi_capture.lua", "roi_capture.lua")
+
+        # Send the main lua application from this project to Frame that will run the app
+        # to take a photo and send back the part the region needs when the TxRoiCaptureSettings messages arrive
+        await frame.upload_frame_app(local_filename="lua/roi_camera_frame_app.lua")
+
+        # attach the print response handler so we can see stdout from Frame Lua print() statements
+        frame.attach_print_response_handler()
+
+        # "require" the main frame_app lua file to run it, and block until it has started.
+        # It signals that it is ready by sending something on the string response channel.
+        await frame.start_frame_app()
+
+        # hook up the RxPhoto receiver, leaving the photos in sensor orientation for RoiCapture to decode
+        rx_photo = RxPhoto(upright=False)
+        photo_queue = await rx_photo.attach(frame)
+
+        # give the frame some time for the autoexposure loop to run (50 times; every 0.1s)
+        print("Letting autoexposure loop run for 5 seconds to settle")
+        await asyncio.sleep(5.0)
+
+        # the first photo is sent whole, then each one only up to the byte count the region needed in the one before
+        roi_capture = RoiCapture(ROI, OUTPUT_SIZE)
+        region = None
+        for i in range(NUM_PHOTOS):
+            settings = roi_capture.settings
+            await frame.send_message(ROI_CAPTURE_SETTINGS_MSG, settings.pack())
+            jpeg_bytes = await asyncio.wait_for(photo_queue.get(), timeout=10.0)
+            region = roi_capture.process(jpeg_bytes) or region
+            print(f"Photo {i + 1}: {settings.resolution}px, {len(jpeg_bytes)} bytes "
+                  f"(limit {settings.max_bytes or 'none'}), {roi_capture.misses} misses so far")
+
+        # display the region in the system viewer
+        if region is not None:
+            region.show()
+
+        # stop the photo receiver and clean up its resources
+        rx_photo.detach(frame)
+
+        # unhook the print handler
+        frame.detach_print_response_handler()
+
+        # break out of the frame app loop and reboot Frame
+        await frame.stop_frame_app()
+
+    except Exception as e:
+        print(f"An error occurred: {e}")
+    finally:
+        # clean disconnection
+        await frame.disconnect()
+
+if __name__ == "__main__":
+    asyncio.run(main())
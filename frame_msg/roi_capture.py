@@ -0,0 +1,161 @@
+from dataclasses import dataclass
+import math
+import struct
+from typing import Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+from progressive_photo import PartialJpegDecoder
+from frame_msg import TxCaptureSettings
+
+# Host to Frame flag handled by lua/roi_capture.lua in lua/roi_camera_frame_app.lua
+ROI_CAPTURE_SETTINGS_MSG = 0x24
+
+# capture resolutions the camera accepts
+MIN_RESOLUTION = 256
+MAX_RESOLUTION = 720
+
+@dataclass
+class TxRoiCaptureSettings:
+    """
+    Message for a region of interest capture (lua/roi_capture.lua): the capture settings message followed by
+    a byte limit, after which Frame stops reading out the JPEG and sends the final chunk.
+
+    Attributes:
+        resolution: Image resolution (256-720, must be even)
+        quality_index: Index into [VERY_LOW, LOW, MEDIUM, HIGH, VERY_HIGH]
+        pan: Image pan value (-140 to 140)
+        raw: Whether to capture in RAW format
+        max_bytes: Bytes of the JPEG to send (counted without the header for raw captures), 0 for all of it
+    """
+    resolution: int = 512
+    quality_index: int = 4
+    pan: int = 0
+    raw: bool = False
+    max_bytes: int = 0
+
+    def pack(self) -> bytes:
+        """Pack the settings into 10 bytes."""
+        capture_settings = TxCaptureSettings(resolution=self.resolution, quality_index=self.quality_index,
+                                             pan=self.pan, raw=self.raw)
+        return capture_settings.pack() + struct.pack('>I', self.max_bytes & 0xFFFFFFFF)
+
+@dataclass
+class Roi:
+    """A region of the upright photo, as fractions (0-1) of its width and height from the top left"""
+    x: float
+    y: float
+    width: float
+    height: float
+
+    def box(self, size: int) -> Tuple[int, int, int, int]:
+        """(left, top, right, bottom) in pixels of a size x size photo, rounded outwards"""
+        return (int(math.floor(self.x * size)), int(math.floor(self.y * size)),
+                min(size, int(math.ceil((self.x + self.width) * size))),
+                min(size, int(math.ceil((self.y + self.height) * size))))
+
+def plan_resolution(roi: Roi, output_size: Optional[Tuple[int, int]] = None) -> int:
+    """
+    The lowest capture resolution at which the region still has at least output_size pixels, so the
+    downscale happens on Frame before the JPEG is encoded (the full resolution if no output size is given)
+    """
+    if output_size is None:
+        return MAX_RESOLUTION
+    needed = max(output_size[0] / roi.width, output_size[1] / roi.height)
+    resolution = 2 * math.ceil(needed / 2)
+    return max(MIN_RESOLUTION, min(MAX_RESOLUTION, resolution))
+
+def bytes_for_rows(jpeg_bytes: bytes, rows: int, decoder: Optional[PartialJpegDecoder] = None) -> int:
+    """
+    The shortest start of the JPEG that decodes to at least the first `rows` complete rows
+    (in sensor orientation), found by bisecting on the prefix length
+    """
+    decoder = decoder or PartialJpegDecoder(upright=False)
+    low, high = 0, len(jpeg_bytes)
+    while low < high:
+        middle = (low + high) // 2
+        if decoder.decode(jpeg_bytes[:middle])[1] >= rows:
+            high = middle
+        else:
+            low = middle + 1
+    return high
+
+class RoiCapture:
+    """
+    Captures a region of interest of the upright photo, sending as little of each JPEG as the region needs.
+
+    Frame's camera can't crop to a rectangle, but it can scale the whole view down (the resolution) and the
+    FPGA encodes the sensor image top rows first, which end up as the left-hand columns of the upright photo.
+    So the resolution is the lowest that keeps the output size (plan_resolution()), and after the first
+    (whole) photo each request carries the byte count that covered the region's last sensor row in the photo
+    before, plus a margin. If a photo still comes up short (the scene got busier), it's dropped and the next
+    one is requested whole to relearn the count. The region is cropped and resized on the host.
+    Regions towards the right of the upright photo need nearly the whole JPEG and save only by the downscale.
+    """
+    def __init__(
+        self,
+        roi: Roi,
+        output_size: Optional[Tuple[int, int]] = None,
+        quality_index: int = 4,
+        pan: int = 0,
+        resolution: Optional[int] = None,
+        margin: float = 0.1,
+    ):
+        """
+        Args:
+            roi: Region of the upright photo to capture
+            output_size: (width, height) to resize the region to, or None to keep the captured pixels
+            quality_index: Index into [VERY_LOW, LOW, MEDIUM, HIGH, VERY_HIGH]
+            pan: Image pan value (-140 to 140)
+            resolution: Capture resolution, rather than planning it from the output size
+            margin: Fraction added to the learned byte count to allow for the next photo being busier
+        """
+        self.roi = roi
+        self.output_size = output_size
+        self.quality_index = quality_index
+        self.pan = pan
+        self.resolution = resolution or plan_resolution(roi, output_size)
+        self.margin = margin
+
+        # the upright photo's columns are the sensor rows, so the region needs the sensor rows up to its right edge
+        self.box = roi.box(self.resolution)
+        self.rows_needed = self.box[2]
+        self.max_bytes = 0
+        self.decoder = PartialJpegDecoder(upright=False)
+
+        self.photos = 0
+        self.misses = 0
+
+    @property
+    def settings(self) -> TxRoiCaptureSettings:
+        """The message to send for the next photo"""
+        return TxRoiCaptureSettings(resolution=self.resolution, quality_index=self.quality_index, pan=self.pan,
+                                    max_bytes=self.max_bytes)
+
+    def process(self, jpeg_bytes: bytes) -> Optional[Image.Image]:
+        """
+        Crop the region from a photo received for settings (with RxPhoto(upright=False)), and learn the byte count
+        for the next request.
+
+        Returns:
+            The region (resized to the output size), or None if the photo didn't reach the region's last row
+        """
+        self.photos += 1
+        pixels, rows = self.decoder.decode(jpeg_bytes)
+        if pixels is None or rows < self.rows_needed:
+            self.misses += 1
+            self.max_bytes = 0
+            return None
+
+        if self.rows_needed >= pixels.shape[0]:
+            self.max_bytes = 0
+        else:
+            self.max_bytes = int(bytes_for_rows(jpeg_bytes, self.rows_needed, self.decoder) * (1 + self.margin))
+
+        # Rotate image -90 degrees (or 90 degrees counterclockwise, as RxPhoto does in PIL)
+        upright = Image.fromarray(np.ascontiguousarray(np.rot90(pixels)))
+        region = upright.crop(self.box)
+        if self.output_size is not None and region.size != tuple(self.output_size):
+            region = region.resize(self.output_size, Image.LANCZOS)
+        return region
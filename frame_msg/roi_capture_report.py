@@ -0,0 +1,130 @@
+import asyncio
+import io
+import os
+
+import numpy as np
+from PIL import Image
+
+from roi_capture import ROI_CAPTURE_SETTINGS_MSG, Roi, RoiCapture, TxRoiCaptureSettings
+from sim_frame import SimFrame, SimRoiCameraApp, load_scene
+from frame_msg import RxPhoto
+
+try:
+    from lupa import lua54
+except ImportError:
+    lua54 = None
+
+# typical regions: what the user looks at, a sign or label off to one side, a code held up in the middle
+ROIS = [
+    ('centre half -> 256px', Roi(0.25, 0.25, 0.5, 0.5), (256, 256)),
+    ('left third -> 240px', Roi(0.0, 0.3, 1 / 3, 0.4), (240, 288)),
+    ('right third -> 240px', Roi(2 / 3, 0.3, 1 / 3, 0.4), (240, 288)),
+    ('centre quarter -> 128px', Roi(0.375, 0.375, 0.25, 0.25), (128, 128)),
+    ('centre quarter, 720px', Roi(0.375, 0.375, 0.25, 0.25), None),
+]
+
+def check_lua_roi_capture(jpeg_bytes: bytes, settings: TxRoiCaptureSettings, mtu: int = 243) -> bool:
+    """
+    Run lua/roi_capture.lua (with the standard camera.lua) against a camera that holds jpeg_bytes and check
+    that it sends exactly the first max_bytes of it (all of it for 0), followed by the final chunk
+    """
+    import frame_msg
+    with open(os.path.join(os.path.dirname(frame_msg.__file__), 'lua', 'camera.lua'), 'rb') as f:
+        camera_source = f.read()
+    with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'lua', 'roi_capture.lua')) as f:
+        roi_source = f.read()
+
+    lua = lua54.LuaRuntime(encoding=None)
+    offset = [0]
+    sent = []
+
+    def read(length):
+        chunk = jpeg_bytes[offset[0]:offset[0] + length]
+        offset[0] += len(chunk)
+        return chunk or None
+
+    lua.execute("frame = { camera = {}, bluetooth = {} }")
+    frame = lua.globals().frame
+    frame[b'camera'][b'capture'] = lambda args: None
+    frame[b'camera'][b'image_ready'] = lambda: True
+    frame[b'camera'][b'read'] = read
+    frame[b'bluetooth'][b'max_length'] = lambda: mtu
+    lua.globals().package[b'preload'][b'camera.min'] = lua.eval("function(source) return function() return load(source)() end end")(camera_source)
+    module = lua.execute(roi_source)
+    # camera.lua defines the global send_data when it loads; capture the messages instead of sending them
+    lua.globals().send_data = lambda data: sent.append(bytes(data))
+
+    module.capture_and_send(module.parse_settings(settings.pack()))
+    expected = jpeg_bytes[:settings.max_bytes] if settings.max_bytes else jpeg_bytes
+    return (all(len(packet) <= mtu for packet in sent) and sent[-1] == b'\x08'
+            and b''.join(packet[1:] for packet in sent[:-1]) == expected)
+
+async def capture(scene, roi: Roi, output_size, num_photos: int) -> dict:
+    """
+    Take num_photos of the region three ways over the simulated link: the whole 720px photo cropped on the host
+    (the reference), at the planned resolution only, and at the planned resolution cut after the region's rows
+    """
+    results = {}
+    for mode in ('host crop', 'downscale', 'downscale + cut'):
+        sim = SimFrame()
+        SimRoiCameraApp(sim, scene)
+        rx_photo = RxPhoto(upright=False)
+        photo_queue = await rx_photo.attach(sim)
+        roi_capture = RoiCapture(roi, output_size, resolution=720 if mode == 'host crop' else None)
+
+        regions = []
+        for _ in range(num_photos):
+            settings = roi_capture.settings
+            if mode != 'downscale + cut':
+                settings.max_bytes = 0
+            await sim.send_message(ROI_CAPTURE_SETTINGS_MSG, settings.pack())
+            regions.append(roi_capture.process(await photo_queue.get()))
+
+        rx_photo.detach(sim)
+        results[mode] = {
+            'bytes': sim.bytes_to_host / num_photos,
+            'resolution': roi_capture.resolution,
+            'misses': roi_capture.misses,
+            'regions': regions,
+        }
+    return results
+
+async def main():
+    """
+    Measure the bytes per photo a region of interest capture sends for typical regions, against taking the
+    whole 720px photo and cropping it on the host, over the simulated BLE link. A steady scene shows the cut
+    once the byte count is learned; a scene that turns upside down every photo shows the misses when the count
+    from the photo before doesn't hold.
+    """
+    if lua54 is not None:
+        jpeg = io.BytesIO()
+        Image.open("images/koala.jpg").convert('RGB').resize((512, 512)).save(jpeg, format='JPEG')
+        checks = [check_lua_roi_capture(jpeg.getvalue(), TxRoiCaptureSettings(max_bytes=n))
+                  for n in (0, 1, 242, 243, 5000, len(jpeg.getvalue()) - 1, len(jpeg.getvalue()) + 1000)]
+        print(f"lua/roi_capture.lua sends exactly max_bytes: {sum(checks)} of {len(checks)} cases\n")
+
+    koala = load_scene(["images/koala.jpg"])
+    scenes = [
+        ('steady', koala),
+        ('changing', koala + [koala[0].transpose(Image.FLIP_TOP_BOTTOM)]),
+    ]
+    num_photos = 10
+    print(f"{'region':<26} {'scene':<9} {'720px crop':>10} {'downscale':>15} {'+ cut':>19} {'misses':>7} {'diff':>6}")
+    for name, roi, output_size in ROIS:
+        for scene_name, scene in scenes:
+            results = await capture(scene, roi, output_size, num_photos)
+            reference = results['host crop']
+            downscale = results['downscale']
+            cut = results['downscale + cut']
+
+            # how far the regions received differ from the reference crop (8-bit levels)
+            diffs = [np.abs(np.asarray(a, dtype=np.float32) - np.asarray(b.resize(a.size), dtype=np.float32)).mean()
+                     for a, b in zip(cut['regions'], reference['regions']) if a is not None and b is not None]
+
+            print(f"{name:<26} {scene_name:<9} {reference['bytes'] / 1000:9.1f}k "
+                  f"{downscale['bytes'] / 1000:6.1f}k {1 - downscale['bytes'] / reference['bytes']:4.0%} {downscale['resolution']:3d}px "
+                  f"{cut['bytes'] / 1000:6.1f}k {1 - cut['bytes'] / reference['bytes']:4.0%} saved "
+                  f"{cut['misses']:3d}/{num_photos:<3d} {np.mean(diffs):6.1f}")
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,100 @@
+import numpy as np
+
+# test scenes: (illuminance in lux, sensor response to a grey card under the light at unity RGB gains,
+# brightness of the centre spot relative to the whole frame)
+SCENES = {
+    'night street':     (8.0,     (0.85, 1.0, 0.40), 1.6),
+    'dim tungsten':     (60.0,    (0.90, 1.0, 0.35), 1.0),
+    'office':           (400.0,   (0.65, 1.0, 0.55), 0.9),
+    'overcast':         (2000.0,  (0.50, 1.0, 0.80), 1.1),
+    'shade':            (6000.0,  (0.45, 1.0, 0.85), 0.7),
+    'daylight':         (20000.0, (0.55, 1.0, 0.70), 1.0),
+    'backlit window':   (8000.0,  (0.55, 1.0, 0.70), 0.35),
+}
+
+class SensorModel:
+    """
+    Synthetic model of the Frame camera's metering response, for evaluating auto exposure and white
+    balance algorithms without real glasses pointed at real scenes.
+
+    Each metering channel is linear in scene illuminance, shutter (in lines) and analog gain, scaled so that
+    the algorithms' scene brightness estimate (brightness_constant * average / (shutter * gain)) recovers the
+    illuminance of a grey scene, then multiplied by the illuminant's colour and the channel's RGB gain,
+    quantized to 8 bits and clipped as the FPGA metering is. All arguments broadcast, so one model can
+    evaluate many scenes and settings at once.
+    """
+    def __init__(
+        self,
+        lux,
+        illuminant,
+        spot_ratio=1.0,
+        noise: float = 1.0,
+        rgb_gain_unity: float = 256.0,
+        brightness_constant: float = 4166400.0,
+        seed: int = 0,
+    ):
+        """
+        Args:
+            lux: Scene illuminance, scalar or array of shape (...)
+            illuminant: Sensor (r, g, b) response to a grey card under the scene light, shape (..., 3)
+            spot_ratio: Brightness of the centre spot relative to the whole frame
+            noise: Standard deviation of the metering noise in 8-bit levels
+            rgb_gain_unity: RGB gain register value that leaves a channel unchanged
+            brightness_constant: Constant relating metering to illuminance, as in camera_auto_exposure_algo
+            seed: Seed for the metering noise
+        """
+        self.lux = np.asarray(lux, dtype=np.float64)
+        self.illuminant = np.asarray(illuminant, dtype=np.float64)
+        self.spot_ratio = np.asarray(spot_ratio, dtype=np.float64)
+        self.noise = noise
+        self.rgb_gain_unity = rgb_gain_unity
+        self.brightness_constant = brightness_constant
+        self.rng = np.random.default_rng(seed)
+
+    @classmethod
+    def from_scenes(cls, names=None, **kwargs) -> 'SensorModel':
+        """A model of the named scenes from SCENES (all of them by default), one per entry of the first axis"""
+        names = list(SCENES) if names is None else names
+        lux, illuminant, spot_ratio = zip(*(SCENES[name] for name in names))
+        return cls(np.array(lux), np.array(illuminant), np.array(spot_ratio), **kwargs)
+
+    def levels(self, shutter, analog_gain, red_gain, green_gain, blue_gain) -> np.ndarray:
+        """
+        Noise-free mean levels the given register settings produce, before quantization and clipping
+        (so an overexposed scene reads above 255).
+
+        Returns:
+            float64 array (..., 6) of spot_r/g/b, matrix_r/g/b in 8-bit levels
+        """
+        exposure = self.lux * np.asarray(shutter, dtype=np.float64) * np.asarray(analog_gain, dtype=np.float64) / self.brightness_constant
+        gains = np.stack(np.broadcast_arrays(
+            np.asarray(red_gain, dtype=np.float64),
+            np.asarray(green_gain, dtype=np.float64),
+            np.asarray(blue_gain, dtype=np.float64)), axis=-1) / self.rgb_gain_unity
+
+        matrix = exposure[..., None] * self.illuminant * gains
+        spot = matrix * self.spot_ratio[..., None]
+        return 255.0 * np.concatenate(np.broadcast_arrays(spot, matrix), axis=-1)
+
+    def meter(self, shutter, analog_gain, red_gain, green_gain, blue_gain) -> np.ndarray:
+        """
+        Metering the FPGA would report with the given register settings.
+
+        Returns:
+            uint8 array (..., 6) of spot_r/g/b, matrix_r/g/b
+        """
+        levels = self.levels(shutter, analog_gain, red_gain, green_gain, blue_gain)
+        if self.noise:
+            levels = levels + self.rng.normal(0.0, self.noise, levels.shape)
+        return np.clip(np.round(levels), 0, 255).astype(np.uint8)
+
+    def white_balance_error(self, red_gain, green_gain, blue_gain) -> np.ndarray:
+        """
+        How far a grey card renders from neutral with the given RGB gains: the spread of the rendered
+        channels relative to their mean (0 for perfect white balance)
+        """
+        rendered = self.illuminant * np.stack(np.broadcast_arrays(
+            np.asarray(red_gain, dtype=np.float64),
+            np.asarray(green_gain, dtype=np.float64),
+            np.asarray(blue_gain, dtype=np.float64)), axis=-1)
+        return (rendered.max(axis=-1) - rendered.min(axis=-1)) / rendered.mean(axis=-1)
@@ -0,0 +1,795 @@
+import asyncio
+import io
+import struct
+from typing import Callable, Dict, List, Union
+
+import numpy as np
+from PIL import Image
+
+class SimFrame:
+    """
+    A stand-in for FrameMsg that runs Python models of Frameside apps instead of talking to real glasses.
+
+    Rx* receivers attach to a SimFrame exactly as they attach to a FrameMsg (via register_data_response_handler),
+    and hostside code sends messages with send_message() as usual. Frameside app models register handlers for
+    the message codes they parse, and send data back to the host with send_to_host(), which charges each packet
+    against a simple BLE link model so that byte counts and radio time can be compared between approaches.
+    """
+    def __init__(
+        self,
+        mtu: int = 243,
+        link_bytes_per_sec: Union[float, Callable[[float], float]] = 6000.0,
+        packet_overhead: int = 13,
+        latency: float = 0.03,
+        realtime: bool = False,
+    ):
+        """
+        Args:
+            mtu: Largest single notification Frame can send (frame.bluetooth.max_length())
+            link_bytes_per_sec: Link throughput, or a function of the simulated clock (seconds) returning throughput
+            packet_overhead: Per-packet bytes spent on the air on top of the payload (L2CAP/ATT headers, MIC etc.)
+            latency: Delay in seconds before a message from the host reaches the Frameside app
+                     (waiting for connection events and the acknowledgement of each packet)
+            realtime: If True, sleep for the simulated airtime so the link runs at wall-clock speed,
+                      otherwise only advance the simulated clock and run as fast as possible
+        """
+        self.mtu = mtu
+        self.link_bytes_per_sec = link_bytes_per_sec
+        self.packet_overhead = packet_overhead
+        self.latency = latency
+        self.realtime = realtime
+
+        self.data_response_handlers = {}
+        self.frame_app_handlers: Dict[int, Callable[[bytes], None]] = {}
+        self._print_response_handler = None
+        self._tasks = set()
+        self._connected = False
+
+        self.reset_stats()
+
+    def reset_stats(self):
+        """Reset the simulated clock and the link counters"""
+        self.clock = 0.0
+        self.airtime = 0.0
+        self.bytes_to_host = 0
+        self.packets_to_host = 0
+        self.bytes_to_frame = 0
+        self.packets_to_frame = 0
+
+    # FrameMsg-compatible connection and app lifecycle methods, mostly no-ops
+
+    async def connect(self, initialize: bool = True):
+        self._connected = True
+        return True
+
+    async def disconnect(self):
+        for task in list(self._tasks):
+            task.cancel()
+        self._connected = False
+
+    def is_connected(self):
+        return self._connected
+
+    async def print_short_text(self, text: str = ''):
+        pass
+
+    async def upload_stdlua_libs(self, lib_names: List[str] = ['data'], minified: bool = True):
+        pass
+
+    async def upload_file(self, local_file_path: str, frame_file_path: str = "main.lua"):
+        pass
+
+    async def upload_frame_app(self, local_filename: str, frame_filename: str = 'frame_app.lua'):
+        pass
+
+    async def start_frame_app(self, frame_app_name: str = 'frame_app', await_print: bool = True):
+        pass
+
+    async def stop_frame_app(self, reset: bool = True):
+        for task in list(self._tasks):
+            task.cancel()
+
+    def attach_print_response_handler(self, handler=print):
+        self._print_response_handler = handler
+
+    def detach_print_response_handler(self):
+        self._print_response_handler = None
+
+    def max_data_payload(self):
+        return self.mtu - 1
+
+    def register_data_response_handler(self, subscriber, msg_codes: List[int], handler: Callable[[bytes], None]):
+        """Register a hostside handler for the specified msg codes, as FrameMsg does"""
+        for code in msg_codes:
+            if code not in self.data_response_handlers:
+                self.data_response_handlers[code] = []
+            self.data_response_handlers[code].append((subscriber, handler))
+
+    def unregister_data_response_handler(self, subscriber):
+        """Unregister all hostside handlers for the subscriber, as FrameMsg does"""
+        for code in list(self.data_response_handlers.keys()):
+            self.data_response_handlers[code] = [
+                (sub, handler) for sub, handler in self.data_response_handlers[code] if sub != subscriber
+            ]
+            if not self.data_response_handlers[code]:
+                del self.data_response_handlers[code]
+
+    # Link model
+
+    def bandwidth(self) -> float:
+        """Current link throughput in bytes/second at the simulated clock time"""
+        if callable(self.link_bytes_per_sec):
+            return self.link_bytes_per_sec(self.clock)
+        return self.link_bytes_per_sec
+
+    async def _spend_airtime(self, num_bytes: int):
+        airtime = (num_bytes + self.packet_overhead) / self.bandwidth()
+        self.airtime += airtime
+        self.clock += airtime
+        if self.realtime:
+            await asyncio.sleep(airtime)
+        else:
+            # still yield so that the hostside tasks queued by the Rx handlers get to run
+            await asyncio.sleep(0)
+
+    async def send_message(self, msg_code: int, payload: bytes, show_me: bool = False) -> None:
+        """
+        Hostside to Frameside: deliver the message to the frame app model registered for msg_code.
+        Handlers that return a coroutine are run as a background task, like the Frameside app loop picking up
+        the message while send_message() has already returned on the host.
+        """
+        # msg code and Uint16 length header as sent by frame_ble, split into MTU-sized packets
+        num_bytes = len(payload) + 3
+        num_packets = max(1, -(-num_bytes // self.mtu))
+        self.bytes_to_frame += num_bytes
+        self.packets_to_frame += num_packets
+        await self._spend_airtime(num_bytes + (num_packets - 1) * self.packet_overhead)
+        await self.sleep(self.latency)
+
+        handler = self.frame_app_handlers.get(msg_code)
+        if handler is None:
+            if self._print_response_handler:
+                self._print_response_handler(f'Error: No parser for flag: {msg_code}')
+            return
+
+        result = handler(payload)
+        if asyncio.iscoroutine(result):
+            task = asyncio.create_task(result)
+            self._tasks.add(task)
+            task.add_done_callback(self._task_done)
+
+    def _task_done(self, task: asyncio.Task):
+        self._tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            # errors in the Frameside app come back on the stdout stream, as the Lua apps print(err)
+            (self._print_response_handler or print)(f'Error in simulated frame app: {task.exception()}')
+
+    async def send_to_host(self, data: bytes) -> None:
+        """Frameside to hostside: send one notification (at most mtu bytes) and dispatch it to the Rx handlers"""
+        if len(data) > self.mtu:
+            raise ValueError(f"Packet of {len(data)} bytes exceeds the MTU of {self.mtu}")
+
+        self.bytes_to_host += len(data)
+        self.packets_to_host += 1
+        await self._spend_airtime(len(data))
+
+        if data and data[0] in self.data_response_handlers:
+            for subscriber, handler in self.data_response_handlers[data[0]]:
+                handler(data)
+
+    async def sleep(self, secs: float) -> None:
+        """Frameside frame.sleep(): advance the simulated clock (and the wall clock if realtime)"""
+        self.clock += secs
+        if self.realtime:
+            await asyncio.sleep(secs)
+        else:
+            await asyncio.sleep(0)
+
+    def time_utc(self) -> float:
+        """Frameside frame.time.utc(), taken from the simulated clock"""
+        return self.clock
+
+
+class SimAudioApp:
+    """
+    Model of lua/audio_frame_app.lua that streams a prerecorded clip of signed 8-bit PCM
+    instead of the microphone, at the real-time rate of the microphone.
+    """
+    AUDIO_SUBS_MSG = 0x30
+    VAD_SETTINGS_MSG = 0x31
+
+    AUDIO_DATA_NON_FINAL_MSG = 0x05
+    AUDIO_DATA_FINAL_MSG = 0x06
+
+    def __init__(self, sim: SimFrame, pcm: Union[bytes, np.ndarray], sample_rate: int = 8000):
+        """
+        Args:
+            sim: The simulated Frame to attach to
+            pcm: Signed 8-bit mono PCM to play in place of the microphone
+            sample_rate: Rate at which the microphone produces samples
+        """
+        # imported here so the plain link simulation doesn't depend on the audio gating code
+        from vad import VadGate
+
+        self.sim = sim
+        self.pcm = bytes(np.asarray(pcm, dtype=np.int8).tobytes()) if isinstance(pcm, np.ndarray) else bytes(pcm)
+        self.sample_rate = sample_rate
+        self.gate = VadGate()
+        self.streaming = False
+        self._stop = False
+
+        # same even-length buffer the Lua audio module reads from the microphone
+        self.chunk_size = sim.mtu - (sim.mtu % 2)
+
+        sim.frame_app_handlers[self.AUDIO_SUBS_MSG] = self.handle_subs
+        sim.frame_app_handlers[self.VAD_SETTINGS_MSG] = self.handle_vad_settings
+
+    def handle_vad_settings(self, payload: bytes):
+        self.gate.set_settings_from_bytes(payload)
+
+    def handle_subs(self, payload: bytes):
+        if payload[0] == 1:
+            if not self.streaming:
+                self.streaming = True
+                self._stop = False
+                return self._stream()
+        else:
+            self._stop = True
+
+    async def _stream(self):
+        offset = 0
+
+        while not self._stop and offset < len(self.pcm):
+            chunk = self.pcm[offset:offset + self.chunk_size]
+            offset += len(chunk)
+
+            # wait for the microphone to have produced this chunk
+            await self.sim.sleep(len(chunk) / self.sample_rate)
+
+            for packet in self.gate.process(chunk):
+                await self.sim.send_to_host(packet)
+
+        for packet in self.gate.flush():
+            await self.sim.send_to_host(packet)
+        await self.sim.send_to_host(bytes([self.AUDIO_DATA_FINAL_MSG]))
+        self.streaming = False
+
+
+class SimImuApp:
+    """
+    Model of lua/imu_frame_app.lua: while subscribed, sends a raw IMU reading (3-axis magnetometer,
+    3-axis accelerometer) every app loop, with a little noise around a head held level and facing north.
+    """
+    IMU_SUBS_MSG = 0x40
+
+    IMU_DATA_MSG = 0x0A
+
+    def __init__(self, sim: SimFrame, loop_period: float = 0.2, seed: int = 0):
+        """
+        Args:
+            sim: The simulated Frame to attach to
+            loop_period: Seconds between readings (the app loop's frame.sleep())
+        """
+        self.sim = sim
+        self.loop_period = loop_period
+        self.rng = np.random.default_rng(seed)
+        self.streaming = False
+
+        sim.frame_app_handlers[self.IMU_SUBS_MSG] = self.handle_subs
+
+    def handle_subs(self, payload: bytes):
+        if payload[0] == 1:
+            if not self.streaming:
+                self.streaming = True
+                return self._stream()
+        else:
+            self.streaming = False
+
+    def reading(self) -> bytes:
+        compass = np.array([300, 0, -400]) + self.rng.integers(-20, 21, 3)
+        accel = np.array([0, 0, 4096]) + self.rng.integers(-50, 51, 3)
+        return bytes([self.IMU_DATA_MSG, 0]) + struct.pack('<6h', *compass, *accel)
+
+    async def _stream(self):
+        while self.streaming:
+            await self.sim.send_to_host(self.reading())
+            await self.sim.sleep(self.loop_period)
+
+
+class SimCameraApp:
+    """
+    Model of lua/camera_frame_app.lua: on a TxCaptureSettings message, "captures" the next image of a scene
+    (a list of images cycled through in place of the sensor), encodes it as a JPEG at the requested
+    resolution and quality, and sends it to the host in MTU-sized chunks as camera.capture_and_send() does.
+    """
+    CAPTURE_SETTINGS_MSG = 0x0d
+
+    IMAGE_MSG = 0x07
+    IMAGE_FINAL_MSG = 0x08
+
+    # JPEG quality used for each of TxCaptureSettings' VERY_LOW..VERY_HIGH quality indices
+    JPEG_QUALITY = [10, 25, 50, 75, 90]
+
+    def __init__(self, sim: SimFrame, scene: List[Image.Image], capture_time: float = 0.1):
+        """
+        Args:
+            sim: The simulated Frame to attach to
+            scene: Images captured in turn by successive captures
+            capture_time: Seconds from a capture request until the JPEG is ready to read
+        """
+        self.sim = sim
+        self.scene = scene
+        self.capture_time = capture_time
+        self.captures = 0
+        self._jpeg_cache = {}
+
+        sim.frame_app_handlers[self.CAPTURE_SETTINGS_MSG] = self.handle_capture_settings
+
+    @staticmethod
+    def parse_capture_settings(payload: bytes) -> dict:
+        """Parse TxCaptureSettings bytes, as camera.parse_capture_settings() does"""
+        return {
+            'quality_index': payload[0],
+            'resolution': (payload[1] << 8 | payload[2]) * 2,
+            'pan': (payload[3] << 8 | payload[4]) - 140,
+            'raw': payload[5] > 0,
+        }
+
+    def capture(self, settings: dict) -> bytes:
+        """Encode the next scene image with the capture settings and return the JPEG bytes"""
+        key = (self.captures % len(self.scene), settings['resolution'], settings['quality_index'])
+        self.captures += 1
+        if key not in self._jpeg_cache:
+            image = self.scene[key[0]].convert('RGB').resize((key[1], key[1]))
+            output = io.BytesIO()
+            image.save(output, format='JPEG', quality=self.JPEG_QUALITY[key[2]])
+            self._jpeg_cache[key] = output.getvalue()
+        return self._jpeg_cache[key]
+
+    async def send_image(self, jpeg_bytes: bytes):
+        """Send a JPEG as a series of non-final image chunks followed by an empty final chunk"""
+        chunk_size = self.sim.mtu - 1
+        for offset in range(0, len(jpeg_bytes), chunk_size):
+            await self.sim.send_to_host(bytes([self.IMAGE_MSG]) + jpeg_bytes[offset:offset + chunk_size])
+        await self.sim.send_to_host(bytes([self.IMAGE_FINAL_MSG]))
+
+    def handle_capture_settings(self, payload: bytes):
+        return self._capture_and_send(self.parse_capture_settings(payload))
+
+    async def _capture_and_send(self, settings: dict):
+        await self.sim.sleep(self.capture_time)
+        await self.send_image(self.capture(settings))
+
+
+def load_scene(paths: List[str], count: int = 1) -> List[Image.Image]:
+    """Load images to use as the simulated camera's view, repeated to make up count images"""
+    images = [Image.open(path) for path in paths]
+    return [images[i % len(images)] for i in range(max(count, len(images)))]
+
+
+class SimTimelapseApp(SimCameraApp):
+    """
+    Model of lua/timelapse_frame_app.lua: captures at an interval into a queue on Frame instead of sending
+    each photo, and sends the whole queue in one bulk session (batch header, then a header and the image
+    chunks for each photo) when the host asks for it.
+    """
+    TIMELAPSE_SETTINGS_MSG = 0x20
+    TRANSFER_MSG = 0x21
+
+    BATCH_MSG = 0x14
+    BATCH_PHOTO_MSG = 0x15
+
+    def __init__(self, sim: SimFrame, scene: List[Image.Image], capture_time: float = 0.1):
+        super().__init__(sim, scene, capture_time)
+        self.capture_settings = self.parse_capture_settings(bytes([4, 1, 0, 0, 140, 0]))
+        self.queued: List[tuple] = []
+        self.running = False
+        self.interval = 5.0
+        self.max_photos = 20
+
+        sim.frame_app_handlers[self.TIMELAPSE_SETTINGS_MSG] = self.handle_timelapse_settings
+        sim.frame_app_handlers[self.TRANSFER_MSG] = self.handle_transfer
+
+    def handle_capture_settings(self, payload: bytes):
+        self.capture_settings = self.parse_capture_settings(payload)
+
+    def handle_timelapse_settings(self, payload: bytes):
+        was_running = self.running
+        self.interval = (payload[0] << 8 | payload[1]) / 10.0
+        self.max_photos = payload[2]
+        self.running = payload[3] > 0
+        if self.running and not was_running:
+            return self._capture_loop()
+
+    def handle_transfer(self, payload: bytes):
+        if payload[0] == 1:
+            return self.send_batch()
+        self.queued = []
+
+    async def _capture_loop(self):
+        while self.running and len(self.queued) < self.max_photos:
+            await self.sim.sleep(self.capture_time)
+            self.queued.append((self.sim.time_utc(), self.capture(self.capture_settings)))
+            await self.sim.sleep(self.interval - self.capture_time)
+
+    async def send_batch(self):
+        await self.sim.send_to_host(struct.pack('<BH', self.BATCH_MSG, len(self.queued)))
+        for index, (capture_time, jpeg_bytes) in enumerate(self.queued, start=1):
+            await self.sim.send_to_host(struct.pack('<BHdI', self.BATCH_PHOTO_MSG, index, capture_time, len(jpeg_bytes)))
+            await self.send_image(jpeg_bytes)
+        self.queued = []
+
+
+class SimExposureApp(SimCameraApp):
+    """
+    Model of lua/exposure_wb_frame_app.lua in front of a synthetic sensor (sensor_model.SensorModel for one scene):
+    answers metering queries, applies manual exposure settings after a sensor pipeline delay, and captures
+    the scene images rendered with the current exposure and white balance.
+    """
+    MANUALEXP_SETTINGS_MSG = 0x0c
+    METERING_QUERY_MSG = 0x12
+
+    METERING_DATA_MSG = 0x12
+
+    def __init__(
+        self,
+        sim: SimFrame,
+        sensor,
+        scene: List[Image.Image],
+        settle_time: Union[float, tuple] = (0.07, 0.2),
+        loop_delay: float = 0.05,
+        capture_time: float = 0.1,
+        seed: int = 0,
+    ):
+        """
+        Args:
+            sim: The simulated Frame to attach to
+            sensor: sensor_model.SensorModel of the scene in view
+            scene: Images captured in turn, rendered with the sensor's metering levels
+            settle_time: Seconds until new manual exposure settings show up in the metering, or a (min, max)
+                range to draw from (the hardware takes up to 200ms)
+            loop_delay: Seconds until the app loop picks up a message (it polls every 100ms)
+            capture_time: Seconds from a capture request until the JPEG is ready to read
+        """
+        super().__init__(sim, scene, capture_time)
+        self.sensor = sensor
+        self.settle_time = settle_time
+        self.loop_delay = loop_delay
+        self.rng = np.random.default_rng(seed)
+
+        # registers in effect, and settings waiting to take effect: (time, registers)
+        self.registers = (1600, 1, 121, 64, 140)
+        self._pending = None
+        # (time, registers) of each capture, to check photos were taken with the settings asked for
+        self.captured: List[tuple] = []
+
+        sim.frame_app_handlers[self.MANUALEXP_SETTINGS_MSG] = self.handle_manual_exp_settings
+        sim.frame_app_handlers[self.METERING_QUERY_MSG] = self.handle_metering_query
+
+    def _update_registers(self):
+        if self._pending is not None and self.sim.time_utc() >= self._pending[0]:
+            self.registers = self._pending[1]
+            self._pending = None
+
+    def handle_manual_exp_settings(self, payload: bytes):
+        settings = struct.unpack('>HBHHH', payload[0:9])
+        settle_time = self.settle_time
+        if isinstance(settle_time, tuple):
+            settle_time = self.rng.uniform(*settle_time)
+        self._pending = (self.sim.time_utc() + self.loop_delay + settle_time, settings)
+
+    def metering(self) -> np.ndarray:
+        """The 6 metering values for the registers currently in effect"""
+        self._update_registers()
+        return self.sensor.meter(*self.registers).reshape(6)
+
+    def handle_metering_query(self, payload: bytes):
+        return self._send_metering()
+
+    async def _send_metering(self):
+        await self.sim.sleep(self.loop_delay)
+        await self.sim.send_to_host(bytes([self.METERING_DATA_MSG]) + self.metering().tobytes())
+
+    def capture(self, settings: dict) -> bytes:
+        """
+        Render the next scene image so its channel means match the sensor's matrix levels, then encode it.
+        Overexposed pixels clip at 255 as in a real photo, rather than the whole image being scaled to the clipped metering.
+        """
+        self._update_registers()
+        self.captured.append((self.sim.time_utc(), self.registers))
+        levels = self.sensor.levels(*self.registers).reshape(6)[3:6].astype(np.float32)
+        image = self.scene[self.captures % len(self.scene)].convert('RGB').resize((settings['resolution'], settings['resolution']))
+        self.captures += 1
+        pixels = np.asarray(image, dtype=np.float32)
+        pixels *= levels / np.maximum(pixels.mean(axis=(0, 1)), 1.0)
+        output = io.BytesIO()
+        Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8)).save(output, format='JPEG', quality=self.JPEG_QUALITY[settings['quality_index']])
+        return output.getvalue()
+
+    async def _capture_and_send(self, settings: dict):
+        await self.sim.sleep(self.loop_delay)
+        await super()._capture_and_send(settings)
+
+
+class SimLiveCameraApp(SimExposureApp):
+    """
+    Model of lua/live_camera_frame_app.lua: one app loop that takes and sends a photo when asked, then runs
+    an auto exposure step against the synthetic sensor and sends the result through the telemetry encoder
+    (lua/autoexp_telemetry.lua), every 100ms. A photo transfer holds up the loop, as on Frame.
+    """
+    AUTOEXP_TELEMETRY_SETTINGS_MSG = 0x14
+
+    def __init__(
+        self,
+        sim: SimFrame,
+        sensor,
+        scene: List[Image.Image],
+        settle_time: Union[float, tuple] = (0.07, 0.2),
+        loop_period: float = 0.1,
+        capture_time: float = 0.1,
+        seed: int = 0,
+    ):
+        """
+        Args:
+            sim: The simulated Frame to attach to
+            sensor: sensor_model.SensorModel of the scene in view
+            scene: Images captured in turn, rendered with the sensor's levels
+            settle_time: Seconds until new exposure settings show up in the sensor, or a (min, max) range
+            loop_period: Sleep at the end of each app loop iteration
+            capture_time: Seconds from a capture request until the JPEG is ready to read
+        """
+        # imported here so the plain link simulation doesn't depend on the auto exposure code
+        from auto_exposure_batch import INITIAL_STATE, load_algo
+        from autoexp_telemetry import AutoExpTelemetryEncoder
+
+        super().__init__(sim, sensor, scene, settle_time, 0.0, capture_time, seed)
+        self.loop_period = loop_period
+        self.algo = load_algo('proposed')
+        self.state = dict(INITIAL_STATE['proposed'])
+        self.telemetry = AutoExpTelemetryEncoder()
+        self._capture_request = None
+        self.running = False
+        self.results: List[dict] = []
+        self.telemetry_messages = 0
+        self.telemetry_bytes = 0
+
+        sim.frame_app_handlers[self.AUTOEXP_TELEMETRY_SETTINGS_MSG] = self.handle_telemetry_settings
+
+    def handle_capture_settings(self, payload: bytes):
+        self._capture_request = self.parse_capture_settings(payload)
+
+    def handle_telemetry_settings(self, payload: bytes):
+        self.telemetry.set_settings_from_bytes(payload)
+
+    def start(self):
+        """Start the app loop, as start_frame_app() does on Frame"""
+        self.running = True
+        task = asyncio.create_task(self._app_loop())
+        self.sim._tasks.add(task)
+        task.add_done_callback(self.sim._task_done)
+
+    async def _app_loop(self):
+        while self.running:
+            if self._capture_request is not None:
+                settings, self._capture_request = self._capture_request, None
+                await self.sim.sleep(self.capture_time)
+                await self.send_image(self.capture(settings))
+
+            result = self.algo(metering_data=dict(zip(
+                ['spot_r', 'spot_g', 'spot_b', 'matrix_r', 'matrix_g', 'matrix_b'], (int(v) for v in self.metering()))),
+                last_state=self.state)
+            # the new settings reach the sensor after its settle time
+            settle_time = self.settle_time
+            if isinstance(settle_time, tuple):
+                settle_time = self.rng.uniform(*settle_time)
+            self._pending = (self.sim.time_utc() + settle_time, tuple(int(self.state[key]) for key in
+                             ('shutter', 'analog_gain', 'red_gain', 'green_gain', 'blue_gain')))
+            self.results.append(result)
+
+            message = self.telemetry.encode(result, self.sim.time_utc())
+            if message is not None:
+                self.telemetry_messages += 1
+                self.telemetry_bytes += len(message)
+                await self.sim.send_to_host(message)
+
+            await self.sim.sleep(self.loop_period)
+
+
+class SimBracketApp(SimExposureApp):
+    """
+    Model of lua/bracket_frame_app.lua: on a TxCaptureSettings message, sets each exposure of the bracket in turn,
+    waits for it to settle (a fixed time, or until the metering shows it, polling every 5ms), captures it
+    into a queue, and sends the whole burst in the timelapse app's batch format once the last one is taken.
+    """
+    BRACKET_SETTINGS_MSG = 0x22
+
+    BATCH_MSG = 0x14
+    BATCH_PHOTO_MSG = 0x15
+
+    def __init__(
+        self,
+        sim: SimFrame,
+        sensor,
+        scene: List[Image.Image],
+        settle_time: Union[float, tuple] = (0.07, 0.2),
+        capture_time: float = 0.1,
+        seed: int = 0,
+    ):
+        super().__init__(sim, sensor, scene, settle_time, 0.05, capture_time, seed)
+        self.gated = True
+        self.min_settle = 0.02
+        self.max_settle = 0.2
+        self.exposures: List[tuple] = []
+        self.queued: List[tuple] = []
+
+        sim.frame_app_handlers[self.BRACKET_SETTINGS_MSG] = self.handle_bracket_settings
+
+    def handle_bracket_settings(self, payload: bytes):
+        flags, min_ms, max_ms, count = struct.unpack('>BHHB', payload[0:6])
+        self.gated = flags & 0x01 > 0
+        self.min_settle = min_ms / 1000.0
+        self.max_settle = max_ms / 1000.0
+        self.exposures = [struct.unpack('>HBHHH', payload[6 + i * 9:15 + i * 9]) for i in range(count)]
+
+    def handle_capture_settings(self, payload: bytes):
+        return self._capture_bracket(self.parse_capture_settings(payload))
+
+    def _matrix_level(self) -> float:
+        return float(self.metering()[3:6].mean())
+
+    async def _wait_for_settle(self, before: float, ratio: float):
+        start = self.sim.time_utc()
+        before = max(before, 1.0)
+        expected = min(max(before * ratio, 1.0), 255.0)
+        distance = abs(np.log(expected / before))
+        while self.sim.time_utc() - start < self.max_settle:
+            if self.gated and self.sim.time_utc() - start >= self.min_settle:
+                if ratio == 1:
+                    return
+                if distance > 0.2 and abs(np.log(expected / max(self._matrix_level(), 1.0))) < distance / 2:
+                    return
+            await self.sim.sleep(0.005)
+
+    async def _capture_bracket(self, settings: dict):
+        await self.sim.sleep(self.loop_delay)
+        for exposure in self.exposures:
+            self._update_registers()
+            current = self._pending[1] if self._pending is not None else self.registers
+            before = self._matrix_level()
+            settle_time = self.settle_time
+            if isinstance(settle_time, tuple):
+                settle_time = self.rng.uniform(*settle_time)
+            self._pending = (self.sim.time_utc() + settle_time, exposure)
+
+            await self._wait_for_settle(before, (exposure[0] * exposure[1]) / (current[0] * current[1]))
+            # the exposure starts with the capture request; the JPEG is ready capture_time later
+            capture_start = self.sim.time_utc()
+            jpeg_bytes = self.capture(settings)
+            await self.sim.sleep(self.capture_time)
+            self.queued.append((capture_start, jpeg_bytes))
+
+        await self.sim.send_to_host(struct.pack('<BH', self.BATCH_MSG, len(self.queued)))
+        for index, (capture_time, jpeg_bytes) in enumerate(self.queued, start=1):
+            await self.sim.send_to_host(struct.pack('<BHdI', self.BATCH_PHOTO_MSG, index, capture_time, len(jpeg_bytes)))
+            await self.send_image(jpeg_bytes)
+        self.queued = []
+
+
+class SimGatedCameraApp(SimCameraApp):
+    """
+    Model of lua/gated_camera_frame_app.lua in front of a scene that changes over time: view(t, size) gives the
+    camera's view at simulated time t. Answers metering queries from the view, takes single photos on request,
+    and while the capture gate is enabled runs the gated feed from its app loop (see start()), capturing only
+    when capture_gate.CaptureGate says the metering has changed.
+    """
+    METERING_QUERY_MSG = 0x12
+    CAPTURE_GATE_SETTINGS_MSG = 0x23
+
+    METERING_DATA_MSG = 0x12
+
+    def __init__(
+        self,
+        sim: SimFrame,
+        view: Callable[[float, int], Image.Image],
+        metering_noise: float = 1.0,
+        loop_period: float = 0.1,
+        capture_time: float = 0.1,
+        seed: int = 0,
+    ):
+        """
+        Args:
+            sim: The simulated Frame to attach to
+            view: Function of the simulated time and a size in pixels returning the square camera view
+            metering_noise: Standard deviation of the metering noise in 8-bit levels
+            loop_period: Sleep at the end of each app loop iteration
+            capture_time: Seconds from a capture request until the JPEG is ready to read
+        """
+        # imported here so the plain link simulation doesn't depend on the gate
+        from capture_gate import CaptureGate, TxCaptureGateSettings
+
+        super().__init__(sim, [], capture_time)
+        self.view = view
+        self.metering_noise = metering_noise
+        self.loop_period = loop_period
+        self.rng = np.random.default_rng(seed)
+        self.gate = CaptureGate(TxCaptureGateSettings(enabled=False))
+        self.feed_settings = None
+        self.running = False
+        # simulated time of each capture
+        self.captured: List[float] = []
+
+        sim.frame_app_handlers[self.METERING_QUERY_MSG] = self.handle_metering_query
+        sim.frame_app_handlers[self.CAPTURE_GATE_SETTINGS_MSG] = self.handle_gate_settings
+
+    def metering(self) -> np.ndarray:
+        """Spot (the centre quarter) and matrix r, g, b means of the current view, as the FPGA reports them"""
+        pixels = np.asarray(self.view(self.sim.time_utc(), 64).convert('RGB'), dtype=np.float32)
+        values = np.concatenate([pixels[16:48, 16:48].mean(axis=(0, 1)), pixels.mean(axis=(0, 1))])
+        if self.metering_noise:
+            values += self.rng.normal(0.0, self.metering_noise, 6)
+        return np.clip(np.round(values), 0, 255).astype(np.uint8)
+
+    def capture(self, settings: dict) -> bytes:
+        """Encode the current view with the capture settings"""
+        self.captured.append(self.sim.time_utc())
+        self.captures += 1
+        output = io.BytesIO()
+        self.view(self.sim.time_utc(), settings['resolution']).convert('RGB').save(
+            output, format='JPEG', quality=self.JPEG_QUALITY[settings['quality_index']])
+        return output.getvalue()
+
+    async def _capture_and_send(self, settings: dict):
+        # the exposure starts with the capture request; the JPEG is ready capture_time later
+        jpeg_bytes = self.capture(settings)
+        await self.sim.sleep(self.capture_time)
+        await self.send_image(jpeg_bytes)
+
+    def handle_capture_settings(self, payload: bytes):
+        settings = self.parse_capture_settings(payload)
+        if self.gate.enabled:
+            self.feed_settings = settings
+            return None
+        return self._capture_and_send(settings)
+
+    def handle_metering_query(self, payload: bytes):
+        return self.sim.send_to_host(bytes([self.METERING_DATA_MSG]) + self.metering().tobytes())
+
+    def handle_gate_settings(self, payload: bytes):
+        self.gate.set_settings_from_bytes(payload)
+        if not self.gate.enabled:
+            self.feed_settings = None
+
+    def start(self):
+        """Start the app loop that runs the gated feed, as start_frame_app() does on Frame"""
+        self.running = True
+        task = asyncio.create_task(self._app_loop())
+        self.sim._tasks.add(task)
+        task.add_done_callback(self.sim._task_done)
+
+    async def _app_loop(self):
+        while self.running:
+            if self.feed_settings is not None and self.gate.changed(self.metering(), self.sim.time_utc()):
+                await self._capture_and_send(self.feed_settings)
+            await self.sim.sleep(self.loop_period)
+
+
+class SimRoiCameraApp(SimCameraApp):
+    """
+    Model of lua/roi_camera_frame_app.lua (the region of interest capture in lua/roi_capture.lua): takes photos for
+    TxCaptureSettings as SimCameraApp does, and for TxRoiCaptureSettings sends only the first max_bytes of the JPEG.
+    """
+    ROI_CAPTURE_SETTINGS_MSG = 0x24
+
+    def __init__(self, sim: SimFrame, scene: List[Image.Image], capture_time: float = 0.1):
+        super().__init__(sim, scene, capture_time)
+        sim.frame_app_handlers[self.ROI_CAPTURE_SETTINGS_MSG] = self.handle_roi_capture_settings
+
+    def handle_roi_capture_settings(self, payload: bytes):
+        settings = self.parse_capture_settings(payload)
+        max_bytes = struct.unpack('>I', payload[6:10])[0]
+        return self._capture_and_send_roi(settings, max_bytes)
+
+    async def _capture_and_send_roi(self, settings: dict, max_bytes: int):
+        await self.sim.sleep(self.capture_time)
+        jpeg_bytes = self.capture(settings)
+        await self.send_image(jpeg_bytes[:max_bytes] if max_bytes else jpeg_bytes)
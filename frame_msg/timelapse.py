@@ -0,0 +1,218 @@
+import asyncio
+from dataclasses import dataclass
+import io
+import logging
+import os
+import struct
+import tempfile
+from typing import List, Optional
+
+from PIL import Image
+
+from reassembly import RxPhotoBuffered
+from frame_msg import FrameMsg, TxCaptureSettings, TxCode
+
+logging.basicConfig()
+_log = logging.getLogger("RxPhotoBatch")
+
+# Host to Frame flags handled by lua/timelapse_frame_app.lua
+TIMELAPSE_SETTINGS_MSG = 0x20
+TRANSFER_MSG = 0x21
+
+# Frame to Host flags for a bulk transfer: a batch header with the photo count,
+# then a header per photo (index, capture time, size) followed by its image chunks
+BATCH_MSG = 0x14
+BATCH_PHOTO_MSG = 0x15
+
+@dataclass
+class TxTimelapseSettings:
+    """
+    Message for the timelapse frame app (lua/timelapse_frame_app.lua).
+
+    Attributes:
+        interval: Seconds between captures (0.1-6553.5, in steps of 0.1)
+        max_photos: Largest number of photos kept on Frame awaiting transfer (capturing pauses when full)
+        running: Whether to capture photos (False pauses the timelapse, keeping queued photos)
+    """
+    interval: float = 5.0
+    max_photos: int = 20
+    running: bool = True
+
+    def pack(self) -> bytes:
+        """Pack the settings into 4 bytes."""
+        return struct.pack('>HBB',
+            int(round(self.interval * 10)) & 0xFFFF,
+            self.max_photos & 0xFF,
+            0x01 if self.running else 0x00
+        )
+
+
+class RxPhotoBatch(RxPhotoBuffered):
+    def __init__(
+        self,
+        batch_flag: int = BATCH_MSG,
+        batch_photo_flag: int = BATCH_PHOTO_MSG,
+        non_final_chunk_flag: int = 0x07,
+        final_chunk_flag: int = 0x08,
+        upright: bool = True,
+    ):
+        """
+        Initialize a receive handler for bulk photo transfers from the timelapse frame app.
+        Image chunks are reassembled as RxPhotoBuffered does, into a buffer sized from the header that preceded
+        each JPEG, and each JPEG is paired with that header; the queue receives one list per batch, once every
+        photo in it has arrived.
+
+        Args:
+            batch_flag: Flag of the batch header (Uint16 photo count)
+            batch_photo_flag: Flag of the per-photo header (Uint16 index, double capture time, Uint32 size)
+            non_final_chunk_flag: Flag indicating a non-final chunk of image data
+            final_chunk_flag: Flag indicating the final chunk of image data
+            upright: Whether to rotate images -90 degrees to correct for sensor orientation
+        """
+        super().__init__(non_final_chunk_flag=non_final_chunk_flag, final_chunk_flag=final_chunk_flag, upright=upright)
+        self.batch_flag = batch_flag
+        self.batch_photo_flag = batch_photo_flag
+
+        self._expected = 0
+        self._photo_info: Optional[dict] = None
+        self._batch: List[dict] = []
+
+    def handle_data(self, data: bytes) -> None:
+        """
+        Process batch headers, photo headers and image chunks.
+
+        Args:
+            data: Bytes containing the message with flag byte prefix
+        """
+        if not self.queue:
+            _log.warning("Received data but queue not initialized - call start() first")
+            return
+
+        flag = data[0]
+
+        if flag == self.batch_flag:
+            self._expected = struct.unpack('<H', data[1:3])[0]
+            self._batch = []
+            self._buffer.clear()
+            if self._expected == 0:
+                asyncio.create_task(self.queue.put([]))
+
+        elif flag == self.batch_photo_flag:
+            index, frame_time, size = struct.unpack('<HdI', data[1:15])
+            self._photo_info = {'index': index, 'frame_time': frame_time, 'size': size}
+            self._buffer.reserve(size)
+
+        else:
+            self._buffer.write(data[1:])
+
+            if flag == self.final_chunk_flag:
+                # take the image now rather than in a task, because the next photo's chunks
+                # follow straight away in a bulk transfer and would be appended to this one
+                self._add_photo(self._buffer.take())
+
+    def _add_photo(self, jpeg_bytes: bytes) -> None:
+        info = self._photo_info or {'index': len(self._batch) + 1, 'frame_time': None, 'size': len(jpeg_bytes)}
+        self._photo_info = None
+
+        if info['size'] != len(jpeg_bytes):
+            _log.warning(f"Photo {info['index']}: expected {info['size']} bytes, received {len(jpeg_bytes)}")
+
+        if self.upright:
+            # Rotate image -90 degrees (or 90 degrees counterclockwise, in PIL)
+            img = Image.open(io.BytesIO(jpeg_bytes))
+            img = img.transpose(Image.ROTATE_90)
+            output = io.BytesIO()
+            img.save(output, format='JPEG')
+            jpeg_bytes = output.getvalue()
+
+        self._batch.append(dict(info, jpeg=jpeg_bytes))
+
+        if len(self._batch) >= self._expected:
+            batch, self._batch = self._batch, []
+            asyncio.create_task(self.queue.put(batch))
+
+    async def attach(self, frame: FrameMsg) -> asyncio.Queue:
+        """
+        Attach the receive handler to the Frame data response and return a queue that will receive batches.
+
+        Returns:
+            asyncio.Queue that will receive lists of dicts with index, frame_time, size and jpeg
+        """
+        self.queue = asyncio.Queue()
+        self._buffer.clear()
+        self._batch = []
+        self._photo_info = None
+
+        # subscribe for notifications
+        frame.register_data_response_handler(self,
+            [self.batch_flag, self.batch_photo_flag, self.non_final_chunk_flag, self.final_chunk_flag],
+            self.handle_data)
+
+        return self.queue
+
+
+async def main():
+    """
+    Run a timelapse that stores photos on Frame, then fetch them all in a single bulk transfer
+    and save them to a temporary directory
+    """
+    frame = FrameMsg()
+    try:
+        await frame.connect()
+
+        # Let the user know we're starting
+        await frame.print_short_text('Loading...')
+
+        # send the std lua files to Frame that our app needs to handle data accumulation, camera and code messages
+        await frame.upload_stdlua_libs(lib_names=['data', 'camera', 'code'])
+
+        # Send the main lua application from this project to Frame that will run the app
+        await frame.upload_frame_app(local_filename="lua/timelapse_frame_app.lua")
+
+        # attach the print response handler so we can see stdout from Frame Lua print() statements
+        frame.attach_print_response_handler()
+
+        # "require" the main frame_app lua file to run it, and block until it has started.
+        await frame.start_frame_app()
+
+        # hook up the batch receiver before asking for any photos
+        rx_batch = RxPhotoBatch()
+        batch_queue = await rx_batch.attach(frame)
+
+        # set the photo size and quality, then start capturing every 2 seconds; photos stay on Frame
+        # and the radio is idle apart from these few messages
+        await frame.send_message(0x0d, TxCaptureSettings(resolution=512, quality_index=3).pack())
+        await frame.send_message(TIMELAPSE_SETTINGS_MSG, TxTimelapseSettings(interval=2.0, max_photos=10).pack())
+
+        print("Capturing a photo every 2 seconds for 20 seconds")
+        await asyncio.sleep(20.0)
+
+        # pause the timelapse and fetch everything queued in one session
+        await frame.send_message(TIMELAPSE_SETTINGS_MSG, TxTimelapseSettings(running=False).pack())
+        await frame.send_message(TRANSFER_MSG, TxCode(value=1).pack())
+
+        batch = await asyncio.wait_for(batch_queue.get(), timeout=60.0)
+
+        directory = tempfile.mkdtemp(prefix="frame_timelapse_")
+        for photo in batch:
+            with open(os.path.join(directory, f"photo_{photo['index']:04d}.jpg"), 'wb') as f:
+                f.write(photo['jpeg'])
+        print(f"Received {len(batch)} photos ({sum(p['size'] for p in batch)} bytes), saved to {directory}")
+
+        # stop the batch receiver and clean up its resources
+        rx_batch.detach(frame)
+
+        # unhook the print handler
+        frame.detach_print_response_handler()
+
+        # break out of the frame app loop and reboot Frame
+        await frame.stop_frame_app()
+
+    except Exception as e:
+        print(f"An error occurred: {e}")
+    finally:
+        # clean disconnection
+        await frame.disconnect()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,84 @@
+import argparse
+import asyncio
+
+from sim_frame import SimFrame, SimCameraApp, SimTimelapseApp, load_scene
+from timelapse import RxPhotoBatch, TxTimelapseSettings, TIMELAPSE_SETTINGS_MSG, TRANSFER_MSG
+from frame_msg import RxPhoto, TxCaptureSettings, TxCode
+
+async def per_photo(scene, num_photos, capture_settings):
+    """
+    Transfer num_photos the way camera.py does: request each photo and receive it straight away.
+    Returns the link statistics for the transfers (the idle time between photos isn't counted)
+    """
+    sim = SimFrame()
+    SimCameraApp(sim, scene)
+
+    rx_photo = RxPhoto(upright=False)
+    photo_queue = await rx_photo.attach(sim)
+
+    sessions = 0
+    image_bytes = 0
+    for _ in range(num_photos):
+        await sim.send_message(0x0d, capture_settings.pack())
+        jpeg_bytes = await photo_queue.get()
+        image_bytes += len(jpeg_bytes)
+        sessions += 1
+
+    rx_photo.detach(sim)
+    return sim, sessions, image_bytes, num_photos
+
+async def bulk(scene, num_photos, capture_settings):
+    """
+    Capture num_photos into the timelapse queue on Frame, then fetch them all with one transfer request.
+    Returns the link statistics for the transfer alone
+    """
+    sim = SimFrame()
+    app = SimTimelapseApp(sim, scene)
+
+    rx_batch = RxPhotoBatch(upright=False)
+    batch_queue = await rx_batch.attach(sim)
+
+    await sim.send_message(0x0d, capture_settings.pack())
+    await sim.send_message(TIMELAPSE_SETTINGS_MSG, TxTimelapseSettings(interval=5.0, max_photos=num_photos).pack())
+    while len(app.queued) < num_photos:
+        await asyncio.sleep(0)
+    await sim.send_message(TIMELAPSE_SETTINGS_MSG, TxTimelapseSettings(running=False).pack())
+
+    # only measure the transfer
+    sim.reset_stats()
+    await sim.send_message(TRANSFER_MSG, TxCode(value=1).pack())
+    batch = await batch_queue.get()
+
+    rx_batch.detach(sim)
+    if len(batch) != num_photos or any(p['size'] != len(p['jpeg']) for p in batch):
+        print(f"Bulk transfer reassembly error: {[(p['index'], p['size'], len(p['jpeg'])) for p in batch]}")
+    return sim, 1, sum(len(p['jpeg']) for p in batch), 1
+
+async def main():
+    """
+    Compare transferring timelapse photos one at a time as they are captured with storing them on
+    Frame and transferring the queue in one bulk session, over the simulated BLE link.
+    Optionally pass image files to use as the camera's view, otherwise images/koala.jpg is used.
+    """
+    parser = argparse.ArgumentParser(description="Timelapse transfer one photo at a time against in bulk")
+    parser.add_argument('images', nargs='*', default=["images/koala.jpg"],
+                        help="image files to use as the camera's view (default: images/koala.jpg)")
+    paths = parser.parse_args().images
+    num_photos = 20
+
+    print(f"{num_photos} photos per run, link {SimFrame().link_bytes_per_sec:.0f} bytes/s, "
+          f"{SimFrame().latency * 1000:.0f}ms request latency\n")
+    print(f"{'resolution':>10} {'mode':>10} {'link time':>10} {'throughput':>12} {'packets':>8} {'requests':>9} {'wakeups':>8}")
+
+    for resolution in (256, 512, 720):
+        scene = load_scene(paths, num_photos)
+        capture_settings = TxCaptureSettings(resolution=resolution, quality_index=3)
+
+        for mode, run in (('per-photo', per_photo), ('bulk', bulk)):
+            sim, requests, image_bytes, wakeups = await run(scene, num_photos, capture_settings)
+            # link time covers each request reaching Frame, the capture (per-photo only) and the transfer
+            print(f"{resolution:>10} {mode:>10} {sim.clock:9.2f}s {image_bytes / sim.clock:8.0f} B/s "
+                  f"{sim.packets_to_host:8d} {requests:9d} {wakeups:8d}")
+
+if __name__ == "__main__":
+    asyncio.run(main())
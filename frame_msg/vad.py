@@ -0,0 +1,172 @@
+from dataclasses import dataclass
+import logging
+import struct
+from typing import List
+
+import numpy as np
+
+from reassembly import RxAudioBuffered
+from frame_msg import FrameMsg
+
+logging.basicConfig()
+_log = logging.getLogger("RxAudioVad")
+
+# Frame to Host flag for a run of audio that was gated out as silence (see lua/vad.lua)
+AUDIO_SILENCE_MSG = 0x04
+
+@dataclass
+class TxVadSettings:
+    """
+    Message for the voice activity gate in the audio frame apps (lua/vad.lua).
+
+    Attributes:
+        enabled: Whether silent chunks are replaced by silence markers (PCM is sent for every chunk if False)
+        energy_threshold: Mean absolute amplitude (0-127) at or above which a chunk counts as speech
+        zcr_threshold: Zero crossings per 256 samples at or above which a quieter chunk
+            (at least half of energy_threshold) still counts as speech, e.g. fricatives
+        hangover: Number of chunks still sent as PCM after the last speech chunk so word endings aren't clipped
+        max_silence_bytes: Largest run of gated PCM bytes (1-65535) reported in a single silence marker
+    """
+    enabled: bool = True
+    energy_threshold: int = 4
+    zcr_threshold: int = 64
+    hangover: int = 8
+    max_silence_bytes: int = 8000
+
+    def pack(self) -> bytes:
+        """Pack the settings into 6 bytes."""
+        return struct.pack('>BBBBH',
+            0x01 if self.enabled else 0x00,
+            self.energy_threshold & 0x7F,
+            self.zcr_threshold & 0xFF,
+            self.hangover & 0xFF,
+            max(1, self.max_silence_bytes) & 0xFFFF
+        )
+
+    @classmethod
+    def unpack(cls, data: bytes) -> 'TxVadSettings':
+        """Parse the packed settings, as the Frameside parser does"""
+        enabled, energy, zcr, hangover, max_silence = struct.unpack('>BBBBH', data[0:6])
+        return cls(enabled > 0, energy, zcr, hangover, max_silence)
+
+
+def is_speech(chunk: bytes, settings: TxVadSettings) -> bool:
+    """
+    Python reference of the Frameside vad.is_speech(): classifies one chunk of signed 8-bit PCM
+    using only integer arithmetic so that it agrees exactly with the Lua implementation.
+    """
+    n = len(chunk)
+    if n == 0:
+        return False
+
+    samples = np.frombuffer(chunk, dtype=np.int8).astype(np.int32)
+    sum_abs = int(np.abs(samples).sum())
+    if sum_abs >= settings.energy_threshold * n:
+        return True
+
+    negative = samples < 0
+    crossings = int(np.count_nonzero(negative[1:] != negative[:-1]))
+    return crossings * 256 >= settings.zcr_threshold * n and sum_abs * 2 >= settings.energy_threshold * n
+
+
+class VadGate:
+    """
+    Python reference of the Frameside gating state machine in lua/vad.lua.
+    Turns each chunk read from the microphone into the packets that Frame would send for it.
+    """
+    def __init__(self, settings: TxVadSettings = None, non_final_chunk_flag: int = 0x05):
+        self.settings = settings if settings is not None else TxVadSettings(enabled=False)
+        self.non_final_chunk_flag = non_final_chunk_flag
+        self.silent_bytes = 0
+        self.hangover_left = 0
+
+    def set_settings_from_bytes(self, data: bytes):
+        self.settings = TxVadSettings.unpack(data)
+        self.silent_bytes = 0
+        self.hangover_left = 0
+
+    def flush(self) -> List[bytes]:
+        """Packets for any silence accumulated but not yet reported"""
+        if self.silent_bytes == 0:
+            return []
+        packet = struct.pack('>BH', AUDIO_SILENCE_MSG, self.silent_bytes)
+        self.silent_bytes = 0
+        return [packet]
+
+    def process(self, chunk: bytes) -> List[bytes]:
+        """Packets sent for one chunk of microphone data"""
+        if not chunk:
+            return []
+
+        if self.settings.enabled:
+            if is_speech(chunk, self.settings):
+                self.hangover_left = self.settings.hangover
+            elif self.hangover_left > 0:
+                self.hangover_left -= 1
+            else:
+                self.silent_bytes += len(chunk)
+                if self.silent_bytes >= self.settings.max_silence_bytes:
+                    return self.flush()
+                return []
+
+        return self.flush() + [bytes([self.non_final_chunk_flag]) + chunk]
+
+
+class RxAudioVad(RxAudioBuffered):
+    """
+    RxAudioBuffered that also accepts the silence markers sent by the voice activity gate on Frame,
+    and expands each one to the same number of bytes of digital silence so that the clip
+    or stream keeps its original timing.
+    """
+    def __init__(self, silence_flag: int = AUDIO_SILENCE_MSG, **kwargs):
+        """
+        Args:
+            silence_flag: Flag indicating a silence marker (a Uint16 count of gated PCM bytes)
+            kwargs: Passed through to RxAudioBuffered
+        """
+        super().__init__(**kwargs)
+        self.silence_flag = silence_flag
+        self._reset_stats()
+
+    def _reset_stats(self):
+        self.pcm_bytes = 0
+        self.silent_bytes = 0
+        self.silence_markers = 0
+
+    def handle_data(self, data: bytes) -> None:
+        """
+        Process incoming audio packets and silence markers.
+
+        Args:
+            data: Bytes containing audio data or a silence marker with flag byte prefix
+        """
+        if not self.queue:
+            _log.warning("Received data but queue not initialized - call start() first")
+            return
+
+        if data[0] == self.silence_flag:
+            silent_bytes = struct.unpack('>H', data[1:3])[0]
+            self.silent_bytes += silent_bytes
+            self.silence_markers += 1
+            # hand the gated span to RxAudio as a chunk of zero-valued (signed) samples
+            super().handle_data(bytes([self.non_final_chunk_flag]) + bytes(silent_bytes))
+        else:
+            self.pcm_bytes += len(data) - 1
+            super().handle_data(data)
+
+    async def attach(self, frame: FrameMsg):
+        """
+        Attach the audio handler to the Frame data response for the audio and silence marker flags.
+
+        Returns:
+            asyncio.Queue that will receive bytes containing audio data, as for RxAudio
+        """
+        queue = await super().attach(frame)
+        self._reset_stats()
+        frame.register_data_response_handler(self, [self.silence_flag], self.handle_data)
+        return queue
+
+    @property
+    def bytes_saved(self) -> int:
+        """PCM bytes that did not need to cross the link, less the cost of the silence markers"""
+        return self.silent_bytes - 3 * self.silence_markers